@@ -31,6 +31,8 @@ from src.benchmark.utils.dataset_handler import (
 from src.benchmark.utils.result_handler import result_handler
 from src.benchmark.utils.progress_tracker import progress_tracker
 from src.benchmark.utils.test_execution.test_executor import execute_test, calculate_metrics
+from src.benchmark.utils.test_execution.connection_pool import summarize_connection_results
+from src.utils.cancel_token import CancelToken
 
 # 设置日志记录器
 logger = setup_logger("benchmark_manager")
@@ -54,6 +56,7 @@ class BenchmarkManager:
         self.dataset_info = None
         self.test_data = None  # 添加test_data属性初始化
         self.running = False
+        self.cancel_token = None  # 当前测试的取消令牌，停止测试时触发
         self.progress_callback = None
         self.dataset_updated = False  # 初始化数据集更新标志为False
         
@@ -580,6 +583,7 @@ class BenchmarkManager:
         
         # 设置测试运行状态为True
         self.running = True
+        self.cancel_token = CancelToken()
         
         try:
             # 确保已加载测试数据
@@ -618,7 +622,8 @@ class BenchmarkManager:
                 "api_url": api_url,
                 "running": self.running,
                 "progress_callback": progress_tracker.update_progress,
-                "api_timeout": api_timeout  # 添加API超时设置
+                "api_timeout": api_timeout,  # 添加API超时设置
+                "cancel_token": self.cancel_token
             }
             
             test_results = await execute_test(self.test_data, config)
@@ -873,7 +878,8 @@ class BenchmarkManager:
                 "nickname": self.nickname,  # 添加设备名称
                 "truncated_tasks": truncated_tasks,
                 "truncated_rate": truncated_rate,
-                "char_token_ratio": char_token_ratio
+                "char_token_ratio": char_token_ratio,
+                "connection_summary": summarize_connection_results(test_results)  # 冷/热连接延迟对比
             }
             
             # 保存测试模式，以便确定用户后续的询问是否上传
@@ -893,6 +899,8 @@ class BenchmarkManager:
         if self.running:
             logger.info("正在停止跑分测试...")
             self.running = False
+            if self.cancel_token:
+                self.cancel_token.cancel()
             logger.info("跑分测试已停止")
     
     def load_dataset(self, dataset_path: str) -> bool:
@@ -2,4 +2,4 @@
 测试执行模块初始化
 """
 # 导入子模块
-from src.benchmark.utils.test_execution.test_executor import execute_test, calculate_metrics 
\ No newline at end of file
+from src.benchmark.utils.test_execution.test_executor import execute_test, calculate_metrics, compare_stream_overhead 
\ No newline at end of file
@@ -0,0 +1,125 @@
+"""
+测试结果流式聚合模块，每个结果完成时累加一次，进度快照的计算量与已完成数量无关
+"""
+from typing import Any, Dict
+
+from src.engine.latency_histogram import LatencyHistogram
+
+# 计为失败的结果状态
+FAILED_STATUSES = ("error", "timeout", "shed")
+# 停止测试时被取消的结果状态，既不算成功也不算失败，不计入成功率的分母
+CANCELLED_STATUS = "cancelled"
+
+
+class ResultAggregator:
+    """测试结果聚合器，维护计数、累加和及延迟直方图"""
+
+    def __init__(self):
+        self.count = 0
+        self.status_counts = {"success": 0, "error": 0, "timeout": 0}
+        self.total_input_chars = 0
+        self.total_output_chars = 0
+        self.total_tokens = 0
+        # 以下只累加成功的请求
+        self.success_count = 0
+        self.total_latency = 0.0
+        self.total_throughput = 0.0
+        self.total_token_throughput = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.total_ttft = 0.0
+        self.latency_histogram = LatencyHistogram()
+        self.ttft_histogram = LatencyHistogram()
+        # 重试单独统计，latency_histogram只记录最后一次尝试的延迟
+        self.retried_count = 0
+        self.retry_attempts = 0
+        self.retry_latency_histogram = LatencyHistogram()
+
+    @property
+    def failed_count(self) -> int:
+        """失败数量，超时和被熔断器拒绝也计为失败"""
+        return sum(self.status_counts.get(status, 0) for status in FAILED_STATUSES)
+
+    @property
+    def finished_count(self) -> int:
+        """已得出结果的数量，不含被取消的请求，是成功率的分母"""
+        return self.count - self.status_counts.get(CANCELLED_STATUS, 0)
+
+    def add(self, result: Dict[str, Any]):
+        """
+        累加一个测试结果
+
+        Args:
+            result: execute_test生成的单个测试结果
+        """
+        status = result.get("status", "unknown")
+        self.count += 1
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        self.total_input_chars += len(result.get("input", ""))
+        self.total_output_chars += len(result.get("output", ""))
+        self.total_tokens += result.get("tokens", 0)
+        attempts = result.get("attempts", 1)
+        if attempts > 1:
+            self.retried_count += 1
+            self.retry_attempts += attempts - 1
+            if status == "success":
+                self.retry_latency_histogram.record(result.get("total_latency", 0))
+
+        if status == "success":
+            self.success_count += 1
+            latency = result.get("latency", 0)
+            self.total_latency += latency
+            self.total_throughput += result.get("throughput", 0)
+            self.total_token_throughput += result.get("token_throughput", 0)
+            self.input_tokens += result.get("input_tokens", 0)
+            self.output_tokens += result.get("output_tokens", 0)
+            self.latency_histogram.record(latency)
+            ttft = result.get("ttft", latency)
+            self.total_ttft += ttft
+            self.ttft_histogram.record(ttft)
+
+    def snapshot(self, total_items: int, elapsed: float, concurrency: int,
+                 progress: float = None) -> Dict[str, Any]:
+        """
+        生成进度回调使用的统计快照
+
+        Args:
+            total_items: 测试项总数
+            elapsed: 已耗时（秒）
+            concurrency: 并发数
+            progress: 进度百分比，未指定时按已完成数量计算
+
+        Returns:
+            Dict[str, Any]: 进度数据
+        """
+        if progress is None:
+            progress = (self.count / total_items) * 100 if total_items else 0
+        successes = self.success_count
+        total_chars = self.total_input_chars + self.total_output_chars
+
+        return {
+            "progress": progress,
+            "current_item": self.count,
+            "total_items": total_items,
+            "latency": self.total_latency / successes if successes else 0,
+            "ttft": self.total_ttft / successes if successes else 0,
+            "throughput": self.total_throughput / successes if successes else 0,
+            "token_throughput": self.total_token_throughput / successes if successes else 0,
+            "input_tps": self.input_tokens / elapsed if elapsed > 0 else 0,
+            "output_tps": self.output_tokens / elapsed if elapsed > 0 else 0,
+            "combined_tps": (self.input_tokens + self.output_tokens) / elapsed if elapsed > 0 else 0,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "total_time": elapsed,
+            "total_tokens": self.total_tokens,
+            "total_bytes": total_chars,
+            "total_chars": total_chars,
+            "success_rate": successes / self.finished_count if self.finished_count else 1.0,
+            "status_counts": dict(self.status_counts),
+            "retried": self.retried_count,
+            "retry_attempts": self.retry_attempts,
+            "retry_latency_percentiles": self.retry_latency_histogram.percentiles(),
+            "latency_percentiles": self.latency_histogram.percentiles(),
+            "ttft_percentiles": self.ttft_histogram.percentiles(),
+            "concurrency": concurrency
+        }
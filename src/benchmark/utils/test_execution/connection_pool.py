@@ -0,0 +1,167 @@
+"""
+连接池模块，负责为基准测试创建共享的HTTP会话并统计连接复用情况
+"""
+import aiohttp
+from typing import Dict, Any, Optional
+from src.utils.logger import setup_logger
+
+# 设置日志记录器
+logger = setup_logger("connection_pool")
+
+# 连接器默认参数
+DEFAULT_CONNECTOR_CONFIG = {
+    "limit": None,              # 连接池总上限，None表示跟随并发数
+    "limit_per_host": 0,        # 单主机连接上限，0表示不限制
+    "keepalive_timeout": 30,    # 空闲连接保活时间（秒）
+    "ttl_dns_cache": 300,       # DNS缓存时间（秒）
+}
+
+
+class ConnectionStats:
+    """连接统计，记录新建连接（握手）与复用连接的次数"""
+
+    def __init__(self):
+        self.created = 0
+        self.reused = 0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+
+    @property
+    def total(self) -> int:
+        """获取连接获取总次数"""
+        return self.created + self.reused
+
+    @property
+    def reuse_rate(self) -> float:
+        """计算连接复用率"""
+        if self.total == 0:
+            return 0.0
+        return self.reused / self.total
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            "new_connections": self.created,
+            "reused_connections": self.reused,
+            "reuse_rate": self.reuse_rate,
+            "dns_cache_hits": self.dns_cache_hits,
+            "dns_cache_misses": self.dns_cache_misses
+        }
+
+
+def resolve_connector_config(connector_config: Optional[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    """
+    合并连接器配置
+
+    优先级: 调用方传入的配置 > 全局配置benchmark.connector > 默认值
+
+    Args:
+        connector_config: 调用方传入的连接器配置
+        concurrency: 测试并发数，用于推导连接池上限
+
+    Returns:
+        Dict[str, Any]: 合并后的连接器配置
+    """
+    resolved = dict(DEFAULT_CONNECTOR_CONFIG)
+    try:
+        from src.utils.config import config as global_config
+        resolved.update(global_config.get("benchmark.connector", {}) or {})
+    except Exception as e:
+        logger.warning(f"读取全局连接器配置失败，使用默认值: {e}")
+
+    if connector_config:
+        resolved.update(connector_config)
+
+    # 连接池上限未设置时跟随并发数，避免连接池成为隐性的并发限制
+    if not resolved.get("limit"):
+        resolved["limit"] = max(1, concurrency)
+
+    return resolved
+
+
+def create_trace_config(stats: ConnectionStats) -> aiohttp.TraceConfig:
+    """
+    创建用于统计连接复用的TraceConfig
+
+    每个请求可以通过trace_request_ctx传入一个字典，
+    若该请求新建了连接，字典中的new_connection会被置为True。
+
+    Args:
+        stats: 连接统计对象
+
+    Returns:
+        aiohttp.TraceConfig: 追踪配置
+    """
+    trace_config = aiohttp.TraceConfig()
+
+    async def on_connection_create_end(session, trace_config_ctx, params):
+        stats.created += 1
+        request_ctx = trace_config_ctx.trace_request_ctx
+        if isinstance(request_ctx, dict):
+            request_ctx["new_connection"] = True
+
+    async def on_connection_reuseconn(session, trace_config_ctx, params):
+        stats.reused += 1
+
+    async def on_dns_cache_hit(session, trace_config_ctx, params):
+        stats.dns_cache_hits += 1
+
+    async def on_dns_cache_miss(session, trace_config_ctx, params):
+        stats.dns_cache_misses += 1
+
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+    trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+    return trace_config
+
+
+def create_session(connector_config: Dict[str, Any], stats: ConnectionStats) -> aiohttp.ClientSession:
+    """
+    创建测试运行期间共享的HTTP会话
+
+    Args:
+        connector_config: 已合并的连接器配置
+        stats: 连接统计对象
+
+    Returns:
+        aiohttp.ClientSession: 共享会话
+    """
+    connector = aiohttp.TCPConnector(
+        limit=connector_config["limit"],
+        limit_per_host=connector_config.get("limit_per_host", 0),
+        keepalive_timeout=connector_config.get("keepalive_timeout", 30),
+        ttl_dns_cache=connector_config.get("ttl_dns_cache", 300)
+    )
+    logger.info(
+        f"创建共享HTTP会话: limit={connector_config['limit']}, "
+        f"limit_per_host={connector_config.get('limit_per_host', 0)}, "
+        f"keepalive_timeout={connector_config.get('keepalive_timeout', 30)}s, "
+        f"ttl_dns_cache={connector_config.get('ttl_dns_cache', 300)}s"
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        trace_configs=[create_trace_config(stats)]
+    )
+
+
+def summarize_connection_results(test_results) -> Dict[str, Any]:
+    """
+    按冷连接（新建握手）与热连接（复用）分组统计延迟
+
+    Args:
+        test_results: 测试结果列表
+
+    Returns:
+        Dict[str, Any]: 冷热连接对比统计
+    """
+    cold = [r.get("latency", 0) for r in test_results
+            if r.get("status") == "success" and r.get("connection_reused") is False]
+    warm = [r.get("latency", 0) for r in test_results
+            if r.get("status") == "success" and r.get("connection_reused") is True]
+    return {
+        "cold_requests": len(cold),
+        "warm_requests": len(warm),
+        "cold_avg_latency": sum(cold) / len(cold) if cold else 0,
+        "warm_avg_latency": sum(warm) / len(warm) if warm else 0
+    }
@@ -4,9 +4,11 @@
 import time
 import asyncio
 import traceback
+from contextlib import nullcontext
 from typing import Dict, List, Any, Callable
 from src.utils.logger import setup_logger
-from src.utils.token_counter import token_counter
+from src.utils.token_counter import token_counter, async_token_counter
+from src.benchmark.utils.test_execution.aggregator import ResultAggregator
 
 # 设置日志记录器
 logger = setup_logger("test_executor")
@@ -64,6 +66,11 @@ async def execute_test(test_data: List[Dict[str, Any]], config: Dict[str, Any])
     precision = config.get("precision", "FP16")
     use_gpu = config.get("use_gpu", True)
     running = config.get("running", True)  # 测试是否在运行的标志
+    # 取消令牌由调用方在停止测试时触发，running只是启动时的快照
+    cancel_token = config.get("cancel_token")
+    
+    def is_running() -> bool:
+        return running and not (cancel_token and cancel_token.cancelled)
     
     # 获取API请求超时设置，如果未设置则为None（无超时限制）
     api_timeout = config.get("api_timeout", None)
@@ -143,244 +150,374 @@ async def execute_test(test_data: List[Dict[str, Any]], config: Dict[str, Any])
 
     logger.info(f"测试将使用并发数: {concurrency}")
     
+    # 流式模式下延迟包含完整响应体，并额外记录首token延迟；未指定时读取全局配置benchmark.stream_mode
+    stream = config.get("stream")
+    include_usage = True
+    try:
+        from src.utils.config import config as global_config
+        if stream is None:
+            stream = global_config.get("benchmark.stream_mode", False)
+        include_usage = global_config.get("openai_api.include_usage", True)
+    except Exception as e:
+        logger.warning(f"获取流式设置失败，使用非流式模式: {e}")
+        stream = bool(stream)
+    logger.info(f"测试请求模式: {'流式' if stream else '非流式'}")
+    
     # 导入需要的模块用于API调用
     import aiohttp
     import json
+    from src.benchmark.utils.test_execution.connection_pool import (
+        ConnectionStats, resolve_connector_config, create_session
+    )
+    from src.engine.sse_parser import SSEParser, decode_event, drain_stream, extract_delta
+
+    def new_stream_state() -> Dict[str, Any]:
+        """流式读取状态：已收到的内容块、usage以及首/末个内容块到达时间（perf_counter）"""
+        return {"parts": [], "usage": {}, "first_chunk_time": None, "last_chunk_time": None}
+
+    async def read_stream(response, state: Dict[str, Any]):
+        """读取流式响应体，边读边更新state，请求被取消时state中保留已收到的部分内容"""
+        parser = SSEParser()
+        parts = state["parts"]
+        usage = state["usage"]
+
+        def consume(events):
+            for data in events:
+                for event in decode_event(data):
+                    content, event_usage = extract_delta(event)
+                    if event_usage:
+                        usage.update(event_usage)
+                    if content:
+                        now = time.perf_counter()
+                        if state["first_chunk_time"] is None:
+                            state["first_chunk_time"] = now
+                        state["last_chunk_time"] = now
+                        parts.append(content)
+
+        # 收到[DONE]即停止读取，剩余的响应体在记录延迟后由drain_stream读完
+        async for chunk in response.content.iter_any():
+            consume(parser.feed(chunk))
+            if parser.done:
+                return
+        consume(parser.flush())
+
+    # 创建整个测试运行共享的HTTP会话，避免每个测试项重复进行TCP/TLS握手
+    connection_stats = ConnectionStats()
+    connector_config = resolve_connector_config(config.get("connector"), concurrency)
+    session = create_session(connector_config, connection_stats)
+
+    # 按数据集版本加载输入token数缓存，重复测试同一数据集时输入无需再次分词
+    cache_model_name = model_config.get("model") or config.get("model", "gpt-3.5-turbo")
+    dataset_version = config.get("dataset_version")
+    if not dataset_version and isinstance(test_data, dict):
+        dataset_version = test_data.get("version")
+    if dataset_version:
+        token_counter.load_prompt_cache(dataset_version)
+
+    #######################################################################
+    # 重要提示: API请求中的模型名称必须使用model_config["model"]字段
+    # 而不是model_config["name"]字段!
+    # 使用错误的字段会导致API请求404错误
+    #######################################################################
+    
+    # 模型名称、参数和请求头在整个测试中固定，只解析一次
+    if model_config and "model" in model_config:
+        model_name = model_config["model"]
+        logger.info(f"使用model_config['model']作为模型名称: {model_name}")
+    else:
+        # 后备使用config中的model参数
+        model_name = config.get("model", "gpt-3.5-turbo")
+        logger.warning(f"未找到model_config['model']，使用默认model参数: {model_name}")
+    
+    # 确保不误用name字段
+    if model_config and "name" in model_config and "model" not in model_config:
+        logger.warning(f"警告: model_config中存在'name'字段({model_config['name']})，但找不到'model'字段。'name'字段是展示用的，不能用于API调用!")
+    
+    request_params = {
+        "temperature": model_config.get("temperature", 0.7) if model_config else 0.7
+    }
+    if stream:
+        request_params["stream"] = True
+        if include_usage:
+            request_params["stream_options"] = {"include_usage": True}
+    # 如果配置中有其他参数，也加入请求
+    if model_config:
+        if "max_tokens" in model_config:
+            request_params["max_tokens"] = model_config["max_tokens"]
+        if "top_p" in model_config:
+            request_params["top_p"] = model_config["top_p"]
+    
+    # 构建请求头，包含认证信息
+    api_key = model_config.get("api_key", "")
+    headers = {"Content-Type": "application/json"}
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+        logger.debug(f"使用API密钥认证: {api_key[:4]}***")
+    else:
+        logger.warning("未提供API密钥，API请求可能会被拒绝")
+    logger.info(
+        f"调用API: URL={api_url}, 模型={model_name}, temperature={request_params.get('temperature')}, "
+        f"max_tokens={request_params.get('max_tokens')}, top_p={request_params.get('top_p')}"
+    )
+    
+    def compile_item(index, item):
+        """编码单个测试项的请求体，非字典类型的测试项返回None"""
+        if not isinstance(item, dict):
+            return None
+        input_text = item.get("text", item.get("input", ""))
+        request_data = {
+            "model": model_name,  # 使用正确的模型名称，不要使用model_config["name"]
+            "messages": [
+                {"role": "user", "content": input_text}
+            ],
+            **request_params
+        }
+        return {
+            "id": item.get("id", f"item-{index}"),
+            "input": input_text,
+            "body": json.dumps(request_data, ensure_ascii=False).encode("utf-8")
+        }
     
-    # 创建一个执行单个测试项的协程函数
-    async def process_item(index, item):
-        if not running:
+    # 跑分请求的重试策略和熔断器，默认只尝试一次
+    from src.utils.retry_policy import (
+        RetryPolicy, get_circuit_breaker, is_endpoint_failure, parse_retry_after, reset_circuit_breakers
+    )
+    retry_policy = RetryPolicy.from_config("benchmark.retry", max_attempts=config.get("max_attempts"))
+    # 每次跑分使用按当前配置新建的熔断器，不继承上一次运行的状态
+    reset_circuit_breakers()
+    circuit_breaker = get_circuit_breaker(api_url, "benchmark.retry.circuit_breaker")
+
+    # 创建一个执行单个测试项一次请求的协程函数
+    async def process_attempt(index, item, compiled):
+        if not is_running():
             return None
         
         try:
-            # 确保item是字典类型
-            if not isinstance(item, dict):
+            # 非字典类型的测试项编码时已标记为None
+            if compiled is None:
                 logger.warning(f"跳过非字典类型的测试项 #{index}: {type(item)}")
                 return None
             
-            # 获取测试输入
-            input_text = item.get("text", item.get("input", ""))
-            item_id = item.get("id", f"item-{index}")
+            input_text = compiled["input"]
+            item_id = compiled["id"]
             
             # 记录开始时间
             start_time = time.time()
             start_timestamp = int(start_time * 1000)  # 毫秒时间戳，用于记录
             
-            #######################################################################
-            # 重要提示: API请求中的模型名称必须使用model_config["model"]字段
-            # 而不是model_config["name"]字段!
-            # 使用错误的字段会导致API请求404错误
-            #######################################################################
-            
-            # 获取正确的模型名称 - 从model_config["model"]中获取，而不是使用默认的model参数或name字段
-            model_config = config.get("model_config", {})
-            
-            # 优先使用model_config中的model字段 - 不要使用name字段，否则会导致API调用失败
-            if model_config and "model" in model_config:
-                model_name = model_config["model"]
-                logger.info(f"使用model_config['model']作为模型名称: {model_name}")
-            else:
-                # 后备使用config中的model参数
-                model_name = config.get("model", "gpt-3.5-turbo")
-                logger.warning(f"未找到model_config['model']，使用默认model参数: {model_name}")
-            
-            # 确保不误用name字段
-            if model_config and "name" in model_config and "model" not in model_config:
-                logger.warning(f"警告: model_config中存在'name'字段({model_config['name']})，但找不到'model'字段。'name'字段是展示用的，不能用于API调用!")
-                
-            request_data = {
-                "model": model_name,  # 使用正确的模型名称，不要使用model_config["name"]
-                "messages": [
-                    {"role": "user", "content": input_text}
-                ],
-                "temperature": model_config.get("temperature", 0.7) if model_config else 0.7
-            }
-            
-            # 如果配置中有其他参数，也加入请求
-            if model_config:
-                if "max_tokens" in model_config:
-                    request_data["max_tokens"] = model_config["max_tokens"]
-                if "top_p" in model_config:
-                    request_data["top_p"] = model_config["top_p"]
-            
-            # 记录更详细的API调用信息 - 添加这部分日志
-            logger.info(f"测试项 #{index} 调用API: URL={api_url}, 模型={model_name}")
-            logger.debug(f"测试项 #{index} 请求头: {{'Content-Type': 'application/json'}}")
-            # 仅记录请求体的摘要，避免日志过大
-            content_summary = input_text[:50] + "..." if len(input_text) > 50 else input_text
-            # 添加更详细的请求信息
-            logger.debug(f"测试项 #{index} 完整请求数据: model={model_name}, temperature={request_data.get('temperature')}, max_tokens={request_data.get('max_tokens')}, top_p={request_data.get('top_p')}")
-            logger.debug(f"测试项 #{index} 请求体摘要: 模型={model_name}, 输入={content_summary}")
-            
             logger.debug(f"测试项 #{index} 发送请求: {input_text[:50]}...")
-            
-            # 实际调用API
-            async with aiohttp.ClientSession() as session:
-                try:
-                    # 获取API密钥
-                    api_key = model_config.get("api_key", "")
-                    
-                    # 构建请求头，包含认证信息
-                    headers = {
-                        "Content-Type": "application/json"
-                    }
-                    
-                    # 如果有API密钥，添加认证头部
-                    if api_key:
-                        headers["Authorization"] = f"Bearer {api_key}"
-                        logger.debug(f"测试项 #{index} 使用API密钥认证: {api_key[:4]}***")
-                    else:
-                        logger.warning(f"测试项 #{index} 未提供API密钥，API请求可能会被拒绝")
-                    
-                    # 记录更详细的API调用信息
-                    logger.debug(f"测试项 #{index} 发送请求到: {api_url}")
-                    logger.debug(f"测试项 #{index} 请求数据: {json.dumps(request_data)[:100]}...")
+
+            # 使用共享会话调用API，trace_ctx用于记录本次请求是否新建了连接
+            trace_ctx = {"new_connection": False}
+            try:
+                # 延迟使用单调时钟计算，start_time/end_time仅用于记录
+                stream_state = new_stream_state()
+                request_start = time.perf_counter()
+                async with session.post(
+                    api_url, 
+                    data=compiled["body"],  # 取出测试项时编码的请求体
+                    headers=headers,  # 使用包含认证信息的请求头
+                    timeout=api_timeout,  # 使用从config中获取的超时设置
+                    trace_request_ctx=trace_ctx
+                ) as response:
+                    # 收到响应头的时间，只反映排队和预填充开始，不代表用户感知的延迟
+                    header_latency = time.perf_counter() - request_start
                     
-                    async with session.post(
-                        api_url, 
-                        json=request_data,
-                        headers=headers,  # 使用包含认证信息的请求头
-                        timeout=api_timeout  # 使用从config中获取的超时设置
-                    ) as response:
+                    if response.status == 200:
+                        # 成功获取响应，延迟以完整读取响应体为准
+                        first_chunk_time = None
+                        last_chunk_time = None
+                        if stream:
+                            await read_stream(response, stream_state)
+                            output_text = "".join(stream_state["parts"])
+                            usage = stream_state["usage"]
+                            first_chunk_time = stream_state["first_chunk_time"]
+                            last_chunk_time = stream_state["last_chunk_time"]
+                        else:
+                            response_data = await response.json()
+                            
+                            # 提取模型输出
+                            output_text = ""
+                            if "choices" in response_data and len(response_data["choices"]) > 0:
+                                output_text = response_data["choices"][0].get("message", {}).get("content", "")
+                            usage = response_data.get("usage") or {}
+                        
                         # 记录结束时间
+                        latency = time.perf_counter() - request_start
                         end_time = time.time()
                         end_timestamp = int(end_time * 1000)  # 毫秒时间戳，用于记录
-                        latency = end_time - start_time
+                        if stream:
+                            await drain_stream(response)
+                        # 非流式响应一次性返回全部内容，首token延迟即完整延迟
+                        ttft = first_chunk_time - request_start if first_chunk_time is not None else latency
                         
                         # 计算吞吐量（字符数/秒）
                         input_length = len(input_text)
                         throughput = input_length / latency if latency > 0 else 0
                         
-                        if response.status == 200:
-                            # 成功获取响应
-                            response_data = await response.json()
-                            
-                            # 提取模型输出
-                            output_text = ""
-                            if "choices" in response_data and len(response_data["choices"]) > 0:
-                                output_text = response_data["choices"][0].get("message", {}).get("content", "")
-                            
-                            logger.debug(f"测试项 #{index} 收到响应: 状态码={response.status}, 延迟={latency:.4f}秒")
-                            
-                            # 使用token_counter计算token数量
-                            input_tokens = token_counter.count_tokens(input_text, model_name)
-                            output_tokens = token_counter.count_tokens(output_text, model_name)
-                            total_tokens = input_tokens + output_tokens
-                            
-                            # 计算基于token的吞吐量（tokens/秒）
-                            token_throughput = total_tokens / latency if latency > 0 else 0
-                            
-                            # 添加更详细的日志记录
-                            logger.debug(f"测试项 #{index} token计算: 输入={input_tokens}, 输出={output_tokens}, 总计={total_tokens}")
-                            logger.debug(f"测试项 #{index} latency={latency:.4f}秒, token吞吐量={token_throughput:.4f} tokens/s")
-                            
-                            # 获取格式化的时间字符串
-                            start_time_fmt = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start_timestamp/1000))
-                            start_time_ms = start_timestamp % 1000
-                            start_time_str = f"{start_time_fmt}.{start_time_ms:03d}"
-                            
-                            end_time_fmt = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(end_timestamp/1000))
-                            end_time_ms = end_timestamp % 1000
-                            end_time_str = f"{end_time_fmt}.{end_time_ms:03d}"
-                            
-                            # 构造测试结果
-                            return {
-                                "id": item_id,
-                                "input": input_text,
-                                "output": output_text,
-                                "expected_output": item.get("expected_output", ""),
-                                "latency": latency,
-                                "throughput": throughput,  # 保留原有的字符吞吐量
-                                "token_throughput": token_throughput,  # 添加基于token的吞吐量
-                                "input_tokens": input_tokens,
-                                "output_tokens": output_tokens,
-                                "tokens": total_tokens,
-                                "status": "success",
-                                "timestamp": int(time.time() * 1000),
-                                "start_time": start_timestamp,  # 保留原始时间戳
-                                "end_time": end_timestamp,  # 保留原始时间戳
-                                "start_time_str": start_time_str,  # 添加格式化的开始时间
-                                "end_time_str": end_time_str  # 添加格式化的结束时间
-                            }
+                        logger.debug(f"测试项 #{index} 收到响应: 状态码={response.status}, 延迟={latency:.4f}秒, 首token延迟={ttft:.4f}秒")
+                        
+                        # 优先使用服务端返回的usage统计，缺失时才使用token_counter本地计算
+                        if usage.get("prompt_tokens") is not None and usage.get("completion_tokens") is not None:
+                            input_tokens = usage["prompt_tokens"]
+                            output_tokens = usage["completion_tokens"]
+                            token_count_source = "server"
                         else:
-                            # API调用失败 - 添加更详细的错误日志
-                            error_text = await response.text()
-                            logger.warning(f"测试项 #{index} API调用失败: URL={api_url}, 状态码={response.status}, 错误={error_text}")
-                            # 获取格式化的时间字符串
-                            start_time_fmt = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start_timestamp/1000))
-                            start_time_ms = start_timestamp % 1000
-                            start_time_str = f"{start_time_fmt}.{start_time_ms:03d}"
-                            
-                            current_time = int(time.time() * 1000)
-                            end_time_fmt = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(current_time/1000))
-                            end_time_ms = current_time % 1000
-                            end_time_str = f"{end_time_fmt}.{end_time_ms:03d}"
-                            
-                            return {
-                                "id": item_id,
-                                "input": input_text,
-                                "error": f"API调用失败: 状态码={response.status}, 错误={error_text}",
-                                "latency": latency,
-                                "throughput": 0,
-                                "status": "error",
-                                "timestamp": int(time.time() * 1000),
-                                "start_time": start_timestamp,
-                                "end_time": end_timestamp,
-                                "start_time_str": start_time_str,  # 添加格式化的开始时间
-                                "end_time_str": end_time_str  # 添加格式化的结束时间
-                            }
-                except asyncio.TimeoutError:
-                    # 超时错误 - 添加更详细的错误日志
-                    logger.warning(f"测试项 #{index} API调用超时: URL={api_url}, 超时阈值={api_timeout}秒")
-                    # 获取格式化的时间字符串
-                    start_time_fmt = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start_timestamp/1000))
-                    start_time_ms = start_timestamp % 1000
-                    start_time_str = f"{start_time_fmt}.{start_time_ms:03d}"
-                    
-                    current_time = int(time.time() * 1000)
-                    end_time_fmt = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(current_time/1000))
-                    end_time_ms = current_time % 1000
-                    end_time_str = f"{end_time_fmt}.{end_time_ms:03d}"
-                    
-                    return {
-                        "id": item_id,
-                        "input": input_text,
-                        "error": "API调用超时",
-                        "latency": api_timeout if api_timeout is not None else 30.0,  # 使用从config中获取的超时设置
-                        "throughput": 0,
-                        "status": "timeout",
-                        "timestamp": int(time.time() * 1000),
-                        "start_time": start_timestamp,
-                        "end_time": current_time,
-                        "start_time_str": start_time_str,  # 添加格式化的开始时间
-                        "end_time_str": end_time_str  # 添加格式化的结束时间
-                    }
-                except Exception as e:
-                    # 其他异常 - 添加更详细的错误日志
-                    logger.error(f"测试项 #{index} 请求异常: URL={api_url}, 错误类型={type(e).__name__}, 错误={str(e)}")
-                    # 获取格式化的时间字符串
-                    start_time_fmt = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start_timestamp/1000))
-                    start_time_ms = start_timestamp % 1000
-                    start_time_str = f"{start_time_fmt}.{start_time_ms:03d}"
-                    
-                    current_time = int(time.time() * 1000)
-                    end_time_fmt = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(current_time/1000))
-                    end_time_ms = current_time % 1000
-                    end_time_str = f"{end_time_fmt}.{end_time_ms:03d}"
-                    
-                    return {
-                        "id": item_id,
-                        "input": input_text,
-                        "error": f"请求异常: {str(e)}",
-                        "latency": time.time() - start_time,
-                        "throughput": 0,
-                        "status": "error",
-                        "timestamp": int(time.time() * 1000),
-                        "start_time": start_timestamp,
-                        "end_time": current_time,
-                        "start_time_str": start_time_str,  # 添加格式化的开始时间
-                        "end_time_str": end_time_str  # 添加格式化的结束时间
-                    }
+                            input_tokens, output_tokens = await asyncio.gather(
+                                async_token_counter.count_prompt_tokens(input_text, model_name),
+                                async_token_counter.count_tokens(output_text, model_name)
+                            )
+                            token_count_source = "local"
+                        total_tokens = input_tokens + output_tokens
+                        # 每输出token耗时只在流式且输出多于一个token时有意义
+                        tpot = 0.0
+                        if first_chunk_time is not None and output_tokens > 1:
+                            tpot = (last_chunk_time - first_chunk_time) / (output_tokens - 1)
+                        
+                        # 计算基于token的吞吐量（tokens/秒）
+                        token_throughput = total_tokens / latency if latency > 0 else 0
+                        
+                        # 添加更详细的日志记录
+                        logger.debug(f"测试项 #{index} token计算({token_count_source}): 输入={input_tokens}, 输出={output_tokens}, 总计={total_tokens}")
+                        logger.debug(f"测试项 #{index} latency={latency:.4f}秒, token吞吐量={token_throughput:.4f} tokens/s")
+                        
+                        # 获取格式化的时间字符串
+                        start_time_fmt = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start_timestamp/1000))
+                        start_time_ms = start_timestamp % 1000
+                        start_time_str = f"{start_time_fmt}.{start_time_ms:03d}"
+                        
+                        end_time_fmt = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(end_timestamp/1000))
+                        end_time_ms = end_timestamp % 1000
+                        end_time_str = f"{end_time_fmt}.{end_time_ms:03d}"
+                        
+                        # 构造测试结果
+                        return {
+                            "id": item_id,
+                            "input": input_text,
+                            "output": output_text,
+                            "expected_output": item.get("expected_output", ""),
+                            "latency": latency,  # 完整响应体读取完成的延迟
+                            "ttft": ttft,  # 首token延迟
+                            "tpot": tpot,  # 每输出token耗时
+                            "header_latency": header_latency,  # 收到响应头的延迟
+                            "stream": stream,
+                            "throughput": throughput,  # 保留原有的字符吞吐量
+                            "token_throughput": token_throughput,  # 添加基于token的吞吐量
+                            "input_tokens": input_tokens,
+                            "output_tokens": output_tokens,
+                            "tokens": total_tokens,
+                            "token_count_source": token_count_source,  # token计数来源: server/local
+                            "status": "success",
+                            "timestamp": int(time.time() * 1000),
+                            "start_time": start_timestamp,  # 保留原始时间戳
+                            "end_time": end_timestamp,  # 保留原始时间戳
+                            "start_time_str": start_time_str,  # 添加格式化的开始时间
+                            "end_time_str": end_time_str,  # 添加格式化的结束时间
+                            "connection_reused": not trace_ctx["new_connection"]  # 是否复用了已有连接
+                        }
+                    else:
+                        # API调用失败 - 添加更详细的错误日志
+                        error_text = await response.text()
+                        latency = time.perf_counter() - request_start
+                        end_timestamp = int(time.time() * 1000)
+                        logger.warning(f"测试项 #{index} API调用失败: URL={api_url}, 状态码={response.status}, 错误={error_text}")
+                        # 获取格式化的时间字符串
+                        start_time_fmt = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start_timestamp/1000))
+                        start_time_ms = start_timestamp % 1000
+                        start_time_str = f"{start_time_fmt}.{start_time_ms:03d}"
+                        
+                        current_time = int(time.time() * 1000)
+                        end_time_fmt = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(current_time/1000))
+                        end_time_ms = current_time % 1000
+                        end_time_str = f"{end_time_fmt}.{end_time_ms:03d}"
+                        
+                        return {
+                            "id": item_id,
+                            "input": input_text,
+                            "error": f"API调用失败: 状态码={response.status}, 错误={error_text}",
+                            "latency": latency,
+                            "throughput": 0,
+                            "status": "error",
+                            "http_status": response.status,
+                            "retry_after": parse_retry_after(response.headers.get("Retry-After")),
+                            "timestamp": int(time.time() * 1000),
+                            "start_time": start_timestamp,
+                            "end_time": end_timestamp,
+                            "start_time_str": start_time_str,  # 添加格式化的开始时间
+                            "end_time_str": end_time_str,  # 添加格式化的结束时间
+                            "connection_reused": not trace_ctx["new_connection"]  # 是否复用了已有连接
+                        }
+            except asyncio.CancelledError:
+                if not (cancel_token and cancel_token.cancelled):
+                    raise
+                # 停止测试的宽限期内未完成，记录已收到的部分输出
+                logger.info(f"测试项 #{index} 请求已取消")
+                current_time = int(time.time() * 1000)
+                return {
+                    "id": item_id,
+                    "input": input_text,
+                    "output": "".join(stream_state["parts"]),
+                    "error": "请求已取消",
+                    "latency": time.perf_counter() - request_start,
+                    "throughput": 0,
+                    "status": "cancelled",
+                    "stream": stream,
+                    "timestamp": current_time,
+                    "start_time": start_timestamp,
+                    "end_time": current_time
+                }
+            except asyncio.TimeoutError:
+                # 超时错误 - 添加更详细的错误日志
+                logger.warning(f"测试项 #{index} API调用超时: URL={api_url}, 超时阈值={api_timeout}秒")
+                # 获取格式化的时间字符串
+                start_time_fmt = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start_timestamp/1000))
+                start_time_ms = start_timestamp % 1000
+                start_time_str = f"{start_time_fmt}.{start_time_ms:03d}"
+                
+                current_time = int(time.time() * 1000)
+                end_time_fmt = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(current_time/1000))
+                end_time_ms = current_time % 1000
+                end_time_str = f"{end_time_fmt}.{end_time_ms:03d}"
+                
+                return {
+                    "id": item_id,
+                    "input": input_text,
+                    "error": "API调用超时",
+                    "latency": api_timeout if api_timeout is not None else 30.0,  # 使用从config中获取的超时设置
+                    "throughput": 0,
+                    "status": "timeout",
+                    "timestamp": int(time.time() * 1000),
+                    "start_time": start_timestamp,
+                    "end_time": current_time,
+                    "start_time_str": start_time_str,  # 添加格式化的开始时间
+                    "end_time_str": end_time_str  # 添加格式化的结束时间
+                }
+            except Exception as e:
+                # 其他异常 - 添加更详细的错误日志
+                logger.error(f"测试项 #{index} 请求异常: URL={api_url}, 错误类型={type(e).__name__}, 错误={str(e)}")
+                # 获取格式化的时间字符串
+                start_time_fmt = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start_timestamp/1000))
+                start_time_ms = start_timestamp % 1000
+                start_time_str = f"{start_time_fmt}.{start_time_ms:03d}"
+                
+                current_time = int(time.time() * 1000)
+                end_time_fmt = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(current_time/1000))
+                end_time_ms = current_time % 1000
+                end_time_str = f"{end_time_fmt}.{end_time_ms:03d}"
+                
+                return {
+                    "id": item_id,
+                    "input": input_text,
+                    "error": f"请求异常: {str(e)}",
+                    "latency": time.time() - start_time,
+                    "throughput": 0,
+                    "status": "error",
+                    "timestamp": int(time.time() * 1000),
+                    "start_time": start_timestamp,
+                    "end_time": current_time,
+                    "start_time_str": start_time_str,  # 添加格式化的开始时间
+                    "end_time_str": end_time_str  # 添加格式化的结束时间
+                }
         except Exception as e:
             logger.error(f"处理测试项 #{index} 失败: {e}")
             logger.error(traceback.format_exc())
@@ -396,6 +533,71 @@ async def execute_test(test_data: List[Dict[str, Any]], config: Dict[str, Any])
                 "end_time": 0  # 添加结束时间
             }
 
+    async def process_item(index, item, compiled):
+        """
+        按重试策略执行单个测试项，各次尝试发送同一个已编码的请求体
+
+        latency等字段来自最后一次尝试，total_latency包含全部重试和退避等待，
+        重试次数单独记录在attempts中，不混入单次请求的延迟统计。
+        """
+        first_sent = time.perf_counter()
+        retry_wait = 0.0
+        attempt = 0
+        while True:
+            # 熔断器打开时不发送请求
+            if not circuit_breaker.allow_request():
+                current_time = int(time.time() * 1000)
+                result = {
+                    "id": item.get("id", f"item-{index}") if isinstance(item, dict) else f"item-{index}",
+                    "input": item.get("text", item.get("input", "")) if isinstance(item, dict) else "",
+                    "error": "熔断器已打开，请求被拒绝",
+                    "latency": 0,
+                    "throughput": 0,
+                    "status": "shed",
+                    "timestamp": current_time,
+                    "start_time": current_time,
+                    "end_time": current_time
+                }
+                break
+            attempt += 1
+            try:
+                result = await process_attempt(index, item, compiled)
+            except BaseException:
+                circuit_breaker.release()
+                raise
+            if result is None:
+                circuit_breaker.release()
+                return None
+            status = result.get("status")
+            if status == "success":
+                circuit_breaker.record_success()
+                break
+            if status == "cancelled":
+                circuit_breaker.release()
+                break
+            http_status = result.get("http_status")
+            # 4xx客户端错误说明请求本身有问题，不计入端点健康状况，只归还探测名额
+            if http_status is None or is_endpoint_failure(http_status):
+                circuit_breaker.record_failure()
+            else:
+                circuit_breaker.release()
+            if not is_running() or not retry_policy.should_retry(
+                    attempt, status=http_status, timed_out=status == "timeout"):
+                break
+            # 带抖动的指数退避，服务端返回Retry-After时按其等待
+            delay = retry_policy.backoff(attempt, result.get("retry_after"))
+            logger.info(f"测试项 #{index} 第 {attempt} 次尝试失败({result.get('error')})，{delay:.2f}s 后重试")
+            retry_wait += delay
+            if cancel_token:
+                if await cancel_token.sleep(delay):
+                    break
+            else:
+                await asyncio.sleep(delay)
+        result["attempts"] = attempt
+        result["retry_wait"] = retry_wait
+        result["total_latency"] = time.perf_counter() - first_sent
+        return result
+
     # 采用分批执行的方式，避免一次创建过多协程
     # 使用设置的并发数，但确保不超过测试项总数
     batch_size = min(concurrency, total_items)  
@@ -444,124 +646,70 @@ async def execute_test(test_data: List[Dict[str, Any]], config: Dict[str, Any])
             await asyncio.sleep(interval)
             
             # 如果测试已经完成或已停止，退出循环
-            if not running or results_future.done():
+            if not is_running() or results_future.done():
                 break
                 
-            # 收集当前已完成的结果（不阻塞未完成的任务）
-            partial_results = []
-            for i, task in enumerate(all_tasks):
-                # 确保task是Task对象而不是协程
-                if not isinstance(task, asyncio.Task):
-                    continue
-                    
-                if task.done():
-                    try:
-                        result = task.result()
-                        if result is not None:
-                            partial_results.append(result)
-                    except Exception as e:
-                        logger.error(f"获取任务 {i} 结果时出错: {e}")
-            
-            # 计算进度
-            completed_count = len(partial_results)
+            # 已完成数量和统计量由聚合器在结果完成时累加，这里只读取快照
+            completed_count = aggregator.count
             progress_percent = (completed_count / total_items) * 100
             
             logger.debug(f"进度更新: 已完成 {completed_count}/{total_items} ({progress_percent:.1f}%)")
             
             # 如果有进度回调且有部分结果，更新进度
-            if progress_callback and partial_results:
-                # 计算总字符数：输入字符+输出字符
-                total_input_chars = sum(len(r.get("input", "")) for r in partial_results)
-                total_output_chars = sum(len(r.get("output", "")) for r in partial_results if r.get("status") == "success")
-                total_chars = total_input_chars + total_output_chars
-                
-                # 计算成功率
-                success_count = sum(1 for r in partial_results if r.get("status") == "success")
-                failed_count = sum(1 for r in partial_results if r.get("status") in ["error", "timeout"])  # 显式将timeout计算为失败
-                success_rate = success_count / len(partial_results)
-                
-                # 计算平均值 - 只考虑成功的请求
-                successful_latencies = [r.get("latency", 0) for r in partial_results if r.get("status") == "success"]
-                avg_latency = sum(successful_latencies) / len(successful_latencies) if successful_latencies else 0
-                
-                successful_throughputs = [r.get("throughput", 0) for r in partial_results if r.get("status") == "success"]
-                avg_throughput = sum(successful_throughputs) / len(successful_throughputs) if successful_throughputs else 0
-                
-                successful_token_throughputs = [r.get("token_throughput", 0) for r in partial_results if r.get("status") == "success"]
-                avg_token_throughput = sum(successful_token_throughputs) / len(successful_token_throughputs) if successful_token_throughputs else 0
-                
-                # 计算总tokens - 只考虑成功的请求
-                total_tokens = sum(r.get("tokens", 0) for r in partial_results if r.get("status") == "success")
-                
-                # 计算输入和输出TPS
-                input_tokens = sum(r.get("input_tokens", 0) for r in partial_results if r.get("status") == "success")
-                output_tokens = sum(r.get("output_tokens", 0) for r in partial_results if r.get("status") == "success")
-                
-                # 计算实时TPS
+            if progress_callback and completed_count:
                 elapsed = time.time() - start_time
-                input_tps = input_tokens / elapsed if elapsed > 0 else 0
-                output_tps = output_tokens / elapsed if elapsed > 0 else 0
-                combined_tps = (input_tokens + output_tokens) / elapsed if elapsed > 0 else 0
-                
-                # 记录TPS信息
-                logger.debug(f"实时TPS计算 - 输入Token: {input_tokens}, 输出Token: {output_tokens}, 总Token: {input_tokens + output_tokens}")
-                logger.debug(f"实时TPS计算 - 输入TPS={input_tps:.2f}, 输出TPS={output_tps:.2f}, 综合TPS={combined_tps:.2f}")
+                snapshot = aggregator.snapshot(total_items, elapsed, config.get("concurrency", 1), progress_percent)
                 
-                # 添加详细日志
-                elapsed = time.time() - start_time
-                
-                # 统计状态信息
-                status_counts = {}
-                for r in partial_results:
-                    status = r.get("status", "unknown")
-                    status_counts[status] = status_counts.get(status, 0) + 1
-                
-                # 添加日志
-                logger.debug(f"进度更新详情: 成功率={success_rate*100:.1f}%, 平均延迟={avg_latency:.2f}s, 平均吞吐量={avg_throughput:.2f}字符/s")
-                
-                # 获取并发数
-                current_concurrency = config.get("concurrency", 1)
-                
-                # 更新进度
-                progress_callback({
-                    "progress": progress_percent,
-                    "current_item": completed_count,
-                    "total_items": total_items,
-                    "latency": avg_latency,
-                    "throughput": avg_throughput,
-                    "total_time": elapsed,
-                    "total_tokens": total_tokens,
-                    "total_bytes": total_input_chars + total_output_chars,
-                    "total_chars": total_chars,
-                    "token_throughput": avg_token_throughput,
-                    "input_tps": input_tps,  # 添加输入TPS
-                    "output_tps": output_tps,  # 添加输出TPS
-                    "combined_tps": combined_tps,  # 添加综合TPS
-                    "input_tokens": input_tokens,  # 添加总输入token数
-                    "output_tokens": output_tokens,  # 添加总输出token数
-                    "success_rate": success_rate,
-                    "status_counts": status_counts,  # 添加状态统计信息
-                    "concurrency": current_concurrency  # 添加并发数信息
-                })
+                logger.debug(
+                    f"进度更新详情: 成功率={snapshot['success_rate']*100:.1f}%, 平均延迟={snapshot['latency']:.2f}s, "
+                    f"平均吞吐量={snapshot['throughput']:.2f}字符/s, 综合TPS={snapshot['combined_tps']:.2f}"
+                )
+                progress_callback(snapshot)
 
-    try:
-        # 同时创建所有测试任务 - 不再分批处理
-        logger.info(f"同时创建并启动 {total_items} 个测试任务...")
-        
-        # 创建所有测试任务的协程
-        all_coroutines = [process_item(i, item) for i, item in enumerate(test_items)]
+    # 按索引保存结果以保持原有顺序，同时在完成时累加到聚合器供进度更新使用
+    all_results = [None] * total_items
+    aggregator = ResultAggregator()
+    # 测试项通过迭代器惰性分发，调度开销与并发数而非数据集大小成正比
+    item_iterator = enumerate(test_items)
+
+    async def worker(worker_index):
+        """
+        工作协程，从共享迭代器中逐个取出测试项执行，直到测试项耗尽
         
-        # 将协程转换为任务（这是关键修复 - 确保我们有Task对象而不是coroutine对象）
-        all_tasks = [asyncio.create_task(coro) for coro in all_coroutines]
+        Args:
+            worker_index: 工作协程编号
+        """
+        for index, item in item_iterator:
+            if not is_running():
+                # 停止后剩余测试项不再发送
+                break
+            # 取出测试项时才编码请求体，序列化不计入请求耗时，内存中只保留在途测试项的请求体
+            compiled = compile_item(index, item)
+            # 停止测试后，超过宽限期仍未完成的请求会被取消并记录部分结果
+            with cancel_token.tracking() if cancel_token else nullcontext():
+                result = await process_item(index, item, compiled)
+            if result is not None:
+                all_results[index] = result
+                aggregator.add(result)
+        logger.debug(f"工作协程 #{worker_index} 已结束")
+
+    if cancel_token:
+        cancel_token.bind()
+    workers = []
+    try:
+        # 创建固定数量的工作协程，在途请求数始终不超过并发数
+        worker_count = max(1, min(concurrency, total_items))
+        logger.info(f"启动 {worker_count} 个工作协程处理 {total_items} 个测试项...")
+        workers = [asyncio.create_task(worker(i)) for i in range(worker_count)]
         
-        # 创建一个Future用于存储所有任务的结果
-        all_results_future = asyncio.gather(*all_tasks)
+        # 创建一个Future用于等待所有工作协程结束
+        all_workers_future = asyncio.gather(*workers)
         
         # 启动进度更新协程
-        update_task = asyncio.create_task(progress_updater(all_results_future))
+        update_task = asyncio.create_task(progress_updater(all_workers_future))
         
-        # 等待所有测试任务完成
-        all_results = await all_results_future
+        # 等待所有工作协程完成
+        await all_workers_future
         
         # 过滤掉None结果
         valid_results = [r for r in all_results if r is not None]
@@ -578,99 +726,109 @@ async def execute_test(test_data: List[Dict[str, Any]], config: Dict[str, Any])
     except Exception as e:
         logger.error(f"执行测试任务时发生错误: {e}")
         logger.error(traceback.format_exc())
-        # 即使发生错误，也尝试收集一些结果
-        valid_results = []
-        for task in all_tasks:
-            if isinstance(task, asyncio.Task) and task.done() and not task.cancelled():
-                try:
-                    result = task.result()
-                    if result is not None:
-                        valid_results.append(result)
-                except Exception:
-                    pass
+        # 即使发生错误，也尝试收集已完成的结果
+        for task in workers:
+            if not task.done():
+                task.cancel()
+        valid_results = [r for r in all_results if r is not None]
         
         if not valid_results:
             logger.error("无法收集任何有效结果")
             return []
-        
+    finally:
+        # 关闭共享会话并记录连接复用情况
+        await session.close()
+        logger.info(f"连接统计: {connection_stats.to_dict()}")
+
     # 测试完成后进行最终进度更新
     if progress_callback and valid_results:
-        completed_count = len(valid_results)
-        
-        # 计算总字符数：输入字符+输出字符
-        total_input_chars = sum(len(r.get("input", "")) for r in valid_results)
-        total_output_chars = sum(len(r.get("output", "")) for r in valid_results)
-        total_chars = total_input_chars + total_output_chars
-        
-        # 计算成功率
-        success_count = sum(1 for r in valid_results if r.get("status") == "success")
-        failed_count = sum(1 for r in valid_results if r.get("status") in ["error", "timeout"])  # 显式将timeout计算为失败
-        success_rate = success_count / len(valid_results) if valid_results else 1.0
-        
-        # 计算平均延迟 - 只考虑成功的请求
-        successful_latencies = [r.get("latency", 0) for r in valid_results if r.get("status") == "success"]
-        avg_latency = sum(successful_latencies) / len(successful_latencies) if successful_latencies else 0
-        
-        # 计算平均吞吐量 - 只考虑成功的请求
-        successful_throughputs = [r.get("throughput", 0) for r in valid_results if r.get("status") == "success"]
-        avg_throughput = sum(successful_throughputs) / len(successful_throughputs) if successful_throughputs else 0
-        
-        # 计算基于token的吞吐量 - 只考虑成功的请求
-        token_throughputs = [r.get("token_throughput", 0) for r in valid_results if r.get("status") == "success"]
-        avg_token_throughput = sum(token_throughputs) / len(token_throughputs) if token_throughputs else 0
-        
-        # 计算输入和输出TPS
-        input_tokens = sum(r.get("input_tokens", 0) for r in valid_results if r.get("status") == "success")
-        output_tokens = sum(r.get("output_tokens", 0) for r in valid_results if r.get("status") == "success")
-        
-        # 计算实时TPS
-        total_time = time.time() - start_time
-        input_tps = input_tokens / total_time if total_time > 0 else 0
-        output_tps = output_tokens / total_time if total_time > 0 else 0
-        combined_tps = (input_tokens + output_tokens) / total_time if total_time > 0 else 0
-        
-        # 记录TPS信息
-        logger.debug(f"最终TPS计算 - 输入TPS={input_tps:.2f}, 输出TPS={output_tps:.2f}, 综合TPS={combined_tps:.2f}")
-        
         # 获取并发数
         current_concurrency = config.get("concurrency", 1)
         
         # 计算测试耗时
-        end_time = time.time()
-        total_time = end_time - start_time
+        total_time = time.time() - start_time
         
         # 更新每个结果以包含并发数信息
         for r in valid_results:
             r["concurrency"] = current_concurrency
         
+        final_progress = aggregator.snapshot(total_items, total_time, current_concurrency, progress=100)
+        final_progress["connection_stats"] = connection_stats.to_dict()  # 添加连接复用统计
+        logger.debug(
+            f"最终TPS计算 - 输入TPS={final_progress['input_tps']:.2f}, 输出TPS={final_progress['output_tps']:.2f}, "
+            f"综合TPS={final_progress['combined_tps']:.2f}"
+        )
+        
         # 更新进度
-        progress_callback({
-            "progress": 100,
-            "current_item": completed_count,
-            "total_items": total_items,
-            "latency": avg_latency,
-            "throughput": avg_throughput,
-            "token_throughput": avg_token_throughput,
-            "input_tps": input_tps,  # 添加输入TPS
-            "output_tps": output_tps,  # 添加输出TPS
-            "combined_tps": combined_tps,  # 添加综合TPS
-            "input_tokens": input_tokens,  # 添加总输入token数
-            "output_tokens": output_tokens,  # 添加总输出token数
-            "total_time": total_time,
-            "total_tokens": sum(r.get("tokens", 0) for r in valid_results),
-            "total_bytes": total_chars,
-            "total_chars": total_chars,
-            "success_rate": success_rate,
-            "status_counts": {
-                "success": success_count,
-                "error": sum(1 for r in valid_results if r.get("status") == "error"),
-                "timeout": sum(1 for r in valid_results if r.get("status") == "timeout")
-            },
-            "concurrency": current_concurrency  # 添加并发数信息
-        })
+        progress_callback(final_progress)
+    
+    # 保存输入token数缓存供下次测试复用
+    if dataset_version:
+        token_counter.save_prompt_cache(
+            dataset_version,
+            (item.get("text", item.get("input", "")) for item in test_items if isinstance(item, dict)),
+            cache_model_name
+        )
+    logger.info(f"输入token缓存统计: {token_counter.prompt_cache_info()}")
     
     return valid_results
 
+async def compare_stream_overhead(test_data: List[Dict[str, Any]], config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    使用相同的测试数据分别以非流式和流式模式执行测试，比较两种模式的延迟
+
+    非流式的延迟即用户拿到完整回答的时间；流式模式下用户在首token到达时就能看到输出，
+    但逐块传输和解析也会带来额外开销，两者之差就是流式模式的开销。
+
+    Args:
+        test_data: 测试数据
+        config: 测试配置，与execute_test相同，其中的stream字段会被覆盖
+
+    Returns:
+        Dict[str, Any]: 包含non_stream、stream两种模式的统计以及overhead对比
+    """
+    summaries = {}
+    for mode, stream in (("non_stream", False), ("stream", True)):
+        mode_config = dict(config)
+        mode_config["stream"] = stream
+        mode_config["progress_callback"] = None
+        started = time.time()
+        results = await execute_test(test_data, mode_config)
+        elapsed = time.time() - started
+
+        aggregator = ResultAggregator()
+        for result in results:
+            aggregator.add(result)
+        snapshot = aggregator.snapshot(len(results), elapsed, config.get("concurrency", 1), progress=100)
+        successes = [r for r in results if r.get("status") == "success"]
+        summaries[mode] = {
+            "success_rate": snapshot["success_rate"],
+            "latency": snapshot["latency"],
+            "latency_percentiles": snapshot["latency_percentiles"],
+            "ttft": snapshot["ttft"],
+            "ttft_percentiles": snapshot["ttft_percentiles"],
+            "header_latency": sum(r.get("header_latency", 0) for r in successes) / len(successes) if successes else 0,
+            "output_tps": snapshot["output_tps"],
+            "total_time": elapsed
+        }
+        logger.info(
+            f"{'流式' if stream else '非流式'}模式: 平均延迟={snapshot['latency']:.4f}s, "
+            f"p99延迟={snapshot['latency_percentiles']['p99']:.4f}s, 平均首token延迟={snapshot['ttft']:.4f}s"
+        )
+
+    non_stream, stream_summary = summaries["non_stream"], summaries["stream"]
+    summaries["overhead"] = {
+        # 完整响应的延迟差，正值表示流式传输更慢
+        "latency_delta": stream_summary["latency"] - non_stream["latency"],
+        "latency_ratio": stream_summary["latency"] / non_stream["latency"] if non_stream["latency"] else 0,
+        "p99_latency_delta": (stream_summary["latency_percentiles"]["p99"]
+                              - non_stream["latency_percentiles"]["p99"]),
+        # 用户首次看到输出的时间缩短量
+        "ttft_saving": non_stream["ttft"] - stream_summary["ttft"],
+        "output_tps_delta": stream_summary["output_tps"] - non_stream["output_tps"]
+    }
+    return summaries
+
 def calculate_metrics(test_results: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     计算性能指标
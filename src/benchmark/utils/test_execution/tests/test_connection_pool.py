@@ -0,0 +1,66 @@
+"""
+跑分共享连接池测试
+"""
+import asyncio
+import unittest
+from unittest import mock
+
+from src.benchmark.utils.test_execution.connection_pool import (
+    ConnectionStats, create_session, resolve_connector_config, summarize_connection_results
+)
+from src.utils.config import config
+
+
+def _config_with(connector):
+    """只替换benchmark.connector的全局配置读取"""
+    get = config.get
+    return mock.patch.object(config, "get",
+                             lambda key, default=None: connector if key == "benchmark.connector" else get(key, default))
+
+
+class ResolveConnectorConfigTest(unittest.TestCase):
+
+    def test_limit_follows_concurrency(self):
+        with _config_with({}):
+            self.assertEqual(resolve_connector_config(None, 32)["limit"], 32)
+            self.assertEqual(resolve_connector_config({"limit": None}, 8)["limit"], 8)
+            self.assertEqual(resolve_connector_config(None, 0)["limit"], 1)
+
+    def test_priority(self):
+        with _config_with({"limit": 16, "keepalive_timeout": 60}):
+            resolved = resolve_connector_config({"keepalive_timeout": 5}, 4)
+        # 调用方传入的配置 > 全局配置 > 默认值
+        self.assertEqual((resolved["limit"], resolved["keepalive_timeout"], resolved["ttl_dns_cache"]), (16, 5, 300))
+
+    def test_session_uses_limit(self):
+        async def run():
+            session = create_session(resolve_connector_config({"limit_per_host": 2}, 12), ConnectionStats())
+            try:
+                return session.connector.limit, session.connector.limit_per_host
+            finally:
+                await session.close()
+
+        with _config_with({}):
+            self.assertEqual(asyncio.run(run()), (12, 2))
+
+
+class ConnectionStatsTest(unittest.TestCase):
+
+    def test_reuse_summary(self):
+        stats = ConnectionStats()
+        self.assertEqual(stats.reuse_rate, 0.0)
+        stats.created, stats.reused = 1, 3
+        self.assertEqual(stats.to_dict()["reuse_rate"], 0.75)
+        results = [
+            {"status": "success", "latency": 0.3, "connection_reused": False},
+            {"status": "success", "latency": 0.1, "connection_reused": True},
+            {"status": "success", "latency": 0.2, "connection_reused": True},
+            {"status": "error", "latency": 9.0, "connection_reused": True},
+        ]
+        summary = summarize_connection_results(results)
+        self.assertEqual((summary["cold_requests"], summary["warm_requests"]), (1, 2))
+        self.assertAlmostEqual(summary["warm_avg_latency"], 0.15)
+
+
+if __name__ == "__main__":
+    unittest.main()
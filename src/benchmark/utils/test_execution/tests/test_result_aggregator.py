@@ -0,0 +1,55 @@
+"""
+跑分结果聚合测试
+"""
+import unittest
+
+from src.benchmark.utils.test_execution.aggregator import ResultAggregator
+
+
+def _success(latency, output_tokens=10, attempts=1):
+    return {"status": "success", "latency": latency, "ttft": latency / 2, "input": "ab", "output": "xyz",
+            "input_tokens": 5, "output_tokens": output_tokens, "tokens": 5 + output_tokens,
+            "attempts": attempts, "total_latency": latency * attempts}
+
+
+class ResultAggregatorTest(unittest.TestCase):
+
+    def test_snapshot(self):
+        aggregator = ResultAggregator()
+        aggregator.add(_success(1.0))
+        aggregator.add(_success(3.0, output_tokens=30, attempts=3))
+        aggregator.add({"status": "timeout"})
+        aggregator.add({"status": "shed"})
+        snapshot = aggregator.snapshot(total_items=8, elapsed=2.0, concurrency=4)
+
+        self.assertEqual(snapshot["progress"], 50)
+        self.assertEqual(snapshot["latency"], 2.0)
+        self.assertEqual(snapshot["ttft"], 1.0)
+        self.assertEqual(snapshot["output_tps"], 20)
+        self.assertEqual(snapshot["combined_tps"], 25)
+        self.assertEqual(snapshot["total_chars"], 10)
+        self.assertEqual(snapshot["success_rate"], 0.5)
+        self.assertEqual((snapshot["retried"], snapshot["retry_attempts"]), (1, 2))
+        self.assertEqual(aggregator.failed_count, 2)
+
+    def test_cancelled_excluded_from_success_rate(self):
+        aggregator = ResultAggregator()
+        aggregator.add(_success(1.0))
+        aggregator.add({"status": "error"})
+        for _ in range(3):
+            aggregator.add({"status": "cancelled"})
+        snapshot = aggregator.snapshot(total_items=5, elapsed=1.0, concurrency=1)
+        self.assertEqual(snapshot["success_rate"], 0.5)
+        self.assertEqual(snapshot["status_counts"]["cancelled"], 3)
+        self.assertEqual(aggregator.failed_count, 1)
+
+    def test_empty(self):
+        snapshot = ResultAggregator().snapshot(total_items=0, elapsed=0.0, concurrency=1)
+        self.assertEqual((snapshot["progress"], snapshot["success_rate"], snapshot["output_tps"]), (0, 1.0, 0))
+        only_cancelled = ResultAggregator()
+        only_cancelled.add({"status": "cancelled"})
+        self.assertEqual(only_cancelled.snapshot(1, 1.0, 1)["success_rate"], 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
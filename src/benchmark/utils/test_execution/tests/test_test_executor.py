@@ -0,0 +1,158 @@
+"""
+跑分执行测试，请求发往本机事件循环中的OpenAI兼容服务
+"""
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+from aiohttp import web
+
+from src.benchmark.utils.test_execution.test_executor import compare_stream_overhead, execute_test
+
+# 服务端节奏：流式响应首块前等待FIRST_DELAY，之后每块间隔CHUNK_DELAY；非流式响应等待全部生成完再返回
+FIRST_DELAY = 0.1
+CHUNK_DELAY = 0.02
+CHUNKS = ["a ", "b ", "c"]
+USAGE = {"prompt_tokens": 2, "completion_tokens": len(CHUNKS)}
+
+
+class ChatServer:
+    """最小OpenAI兼容服务，记录收到的原始请求体和最大在途请求数"""
+
+    def __init__(self, on_request=None):
+        self.bodies = []
+        self.inflight = 0
+        self.max_inflight = 0
+        self.on_request = on_request
+        self.url = None
+        self._runner = None
+
+    async def _chat(self, request):
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+        try:
+            raw = await request.read()
+            self.bodies.append(raw)
+            if self.on_request:
+                self.on_request(raw)
+            body = json.loads(raw)
+            if not body.get("stream"):
+                await asyncio.sleep(FIRST_DELAY + CHUNK_DELAY * (len(CHUNKS) - 1))
+                return web.json_response({"choices": [{"message": {"content": "".join(CHUNKS)}}], "usage": USAGE})
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await response.prepare(request)
+            for index, chunk in enumerate(CHUNKS):
+                await asyncio.sleep(FIRST_DELAY if index == 0 else CHUNK_DELAY)
+                event = {"choices": [{"delta": {"content": chunk}}]}
+                await response.write(f"data: {json.dumps(event)}\n\n".encode())
+            await response.write(f"data: {json.dumps({'choices': [], 'usage': USAGE})}\n\n".encode())
+            await response.write(b"data: [DONE]\n\n")
+            return response
+        finally:
+            self.inflight -= 1
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._chat)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/v1"
+
+    async def close(self):
+        await self._runner.cleanup()
+
+
+def _items(count):
+    return [{"id": f"q{index}", "input": f"问题 {index}"} for index in range(count)]
+
+
+def _run(server, runner, items, **config):
+    """启动服务后以runner(items, config)运行跑分"""
+    async def run():
+        await server.start()
+        try:
+            return await runner(items, {"api_url": server.url, "model_config": {"model": "m", "api_key": "k"},
+                                        **config})
+        finally:
+            await server.close()
+    return asyncio.run(run())
+
+
+class StreamModeTest(unittest.TestCase):
+
+    def test_stream_results(self):
+        server = ChatServer()
+        results = _run(server, execute_test, _items(2), concurrency=2, stream=True)
+        self.assertEqual(len(results), 2)
+        for result in results:
+            self.assertEqual(result["status"], "success")
+            self.assertTrue(result["stream"])
+            self.assertEqual(result["output"], "a b c")
+            self.assertEqual((result["output_tokens"], result["token_count_source"]), (3, "server"))
+            # 流式延迟包含完整响应体，首token在第一个内容块到达时记录
+            self.assertGreaterEqual(result["ttft"], FIRST_DELAY * 0.9)
+            self.assertGreater(result["latency"], result["ttft"])
+            self.assertGreater(result["tpot"], 0)
+        body = json.loads(server.bodies[0])
+        self.assertTrue(body["stream"])
+        self.assertEqual(body["stream_options"], {"include_usage": True})
+
+    def test_non_stream_ttft_is_latency(self):
+        results = _run(ChatServer(), execute_test, _items(1), concurrency=1, stream=False)
+        self.assertFalse(results[0]["stream"])
+        self.assertEqual(results[0]["ttft"], results[0]["latency"])
+        self.assertEqual(results[0]["tpot"], 0.0)
+
+    def test_compare_stream_overhead(self):
+        summary = _run(ChatServer(), compare_stream_overhead, _items(3), concurrency=3)
+        self.assertEqual(set(summary), {"non_stream", "stream", "overhead"})
+        self.assertEqual(summary["non_stream"]["success_rate"], 1.0)
+        self.assertEqual(summary["stream"]["success_rate"], 1.0)
+        # 两种模式生成耗时相同，流式模式的首token提前了生成剩余内容块的时间
+        self.assertGreater(summary["overhead"]["ttft_saving"], CHUNK_DELAY)
+        self.assertAlmostEqual(summary["overhead"]["latency_delta"],
+                               summary["stream"]["latency"] - summary["non_stream"]["latency"])
+
+
+class RequestBodyTest(unittest.TestCase):
+
+    def test_bodies_encoded_per_item(self):
+        encoded = []
+        encodings_at_request = []
+        dumps = json.dumps
+
+        def counting_dumps(obj, *args, **kwargs):
+            if isinstance(obj, dict) and "messages" in obj:
+                encoded.append(obj["messages"][0]["content"])
+            return dumps(obj, *args, **kwargs)
+
+        server = ChatServer(on_request=lambda raw: encodings_at_request.append(len(encoded)))
+        items = _items(3)
+        with mock.patch("json.dumps", counting_dumps):
+            results = _run(server, execute_test, items, concurrency=1, stream=False)
+        self.assertEqual([result["status"] for result in results], ["success"] * 3)
+        # 每个测试项在被取出时才编码一次，不在开始前编码整个数据集
+        self.assertEqual(encodings_at_request, [1, 2, 3])
+        self.assertEqual(encoded, [item["input"] for item in items])
+        expected = [dumps({"model": "m", "messages": [{"role": "user", "content": item["input"]}],
+                           "temperature": 0.7}, ensure_ascii=False).encode("utf-8") for item in items]
+        self.assertEqual(server.bodies, expected)
+
+
+class WorkerPoolTest(unittest.TestCase):
+
+    def test_inflight_bounded_by_concurrency(self):
+        server = ChatServer()
+        items = _items(10)
+        # 连接池上限放宽到远大于并发数，在途请求数只受工作协程数量限制
+        results = _run(server, execute_test, items, concurrency=3, stream=False, connector={"limit": 100})
+        self.assertEqual([result["id"] for result in results], [item["id"] for item in items])
+        self.assertEqual(len(server.bodies), 10)
+        self.assertEqual(server.max_inflight, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
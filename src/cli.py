@@ -0,0 +1,474 @@
+"""
+DeepStressModel 命令行入口，不依赖PyQt，用于CI和远程终端运行压力测试
+
+用法:
+    python -m src.cli run --profile profile.json [--output result.json]
+    python -m src.cli benchmark --profile benchmark.json [--stream | --no-stream | --compare-stream]
+
+测试配置文件为JSON，示例:
+    {
+        "name": "2k输入-256输出",
+        "model": {"api_url": "http://127.0.0.1:8000/v1", "api_key": "EMPTY", "model": "qwen2", "max_tokens": 256},
+        "datasets": [
+            {"name": "数学问题", "concurrency": 4},
+            {"name": "长输入", "synthetic": {"input_tokens": {"kind": "fixed", "value": 2048}}, "concurrency": 8},
+            {"name": "线上样本", "file": "prompts.txt", "weight": 2}
+        ],
+        "load_profile": {"duration": 300, "warmup": 30},
+        "config": {"openai_api": {"min_tokens": 256, "ignore_eos": true}}
+    }
+
+- model: 模型配置字典，或已保存的模型配置名称；为列表时进行多模型对比测试
+- datasets: 每项按prompts（内联列表）、file（每行一个prompt的文本文件或JSON列表）、
+  synthetic（合成数据集规格）的顺序取prompt，都未给出时按名称查找已保存的数据集和内置数据集
+- load_profile / workload / schedule / processes / agents / compare_mode: 同测试管理器的对应参数
+- config: 临时覆盖的配置项，只在本次运行中生效
+
+跑分配置文件同样为JSON，按跑分执行器的方式顺序或并发请求一遍数据集，不上传结果:
+    {
+        "model": {"api_url": "http://127.0.0.1:8000/v1", "api_key": "EMPTY", "model": "qwen2", "max_tokens": 256},
+        "dataset": "benchmark.json",
+        "concurrency": 8,
+        "api_timeout": 120,
+        "stream": false
+    }
+
+- dataset: 测试项文件，JSON为测试项列表（含id和text/input字段）或{"data": [...]}，其余按行读取；
+  也可以直接用prompts给出prompt列表
+- stream: 是否使用流式请求，未指定时读取配置benchmark.stream_mode
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Dict, List, Optional
+from src.engine.latency_histogram import METRIC_E2E
+from src.engine.load_profile import LoadProfile
+from src.engine.load_schedule import ConcurrencySchedule
+from src.engine.test_manager import TestManager, TestProgress, TestTask
+from src.engine.workload import WorkloadProfile
+from src.utils.config import config
+from src.utils.logger import setup_logger, set_console_level, set_debug_mode
+
+logger = setup_logger("cli")
+
+# 测试日志目录，与测试管理器一致
+LOG_DIR = os.path.join("data", "logs", "tests")
+
+
+def load_test_profile(path: str) -> Dict:
+    """读取测试配置文件"""
+    with open(path, "r", encoding="utf-8") as f:
+        profile = json.load(f)
+    if not profile.get("model"):
+        raise ValueError("测试配置缺少model")
+    if not profile.get("datasets"):
+        raise ValueError("测试配置缺少datasets")
+    return profile
+
+
+def resolve_model(entry) -> Dict:
+    """将模型配置项解析为模型配置字典，字符串按名称查找已保存的模型配置"""
+    if isinstance(entry, dict):
+        return entry
+    from src.data.db_manager import db_manager
+    model_config = next((m for m in db_manager.get_model_configs() if m["name"] == entry), None)
+    if not model_config:
+        raise ValueError(f"找不到模型配置: {entry}")
+    return model_config
+
+
+def _read_prompt_file(path: str) -> List[str]:
+    """读取prompt文件，.json为字符串列表，其余按行读取"""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".json"):
+            return [str(prompt) for prompt in json.load(f)]
+        return [line.strip() for line in f if line.strip()]
+
+
+def _named_prompts(name: str) -> List[str]:
+    """按名称查找已保存的数据集，找不到时使用内置数据集"""
+    from src.data.db_manager import db_manager
+    dataset = next((d for d in db_manager.get_datasets() if d["name"] == name), None)
+    if dataset:
+        return dataset["prompts"]
+    from src.data.test_datasets import DATASETS
+    if name in DATASETS:
+        return DATASETS[name]
+    raise ValueError(f"找不到数据集: {name}")
+
+
+def build_tasks(profile: Dict, model: str = "") -> List[TestTask]:
+    """
+    按测试配置构造测试任务
+
+    Args:
+        profile: 测试配置
+        model: 模型名称，合成数据集未指定编码器模型时按它选择编码器
+    """
+    tasks = []
+    default_concurrency = profile.get("concurrency", 1)
+    for entry in profile["datasets"]:
+        name = entry["name"]
+        if "prompts" in entry:
+            prompts = list(entry["prompts"])
+        elif "file" in entry:
+            prompts = _read_prompt_file(entry["file"])
+        elif "synthetic" in entry:
+            from src.data.synthetic_dataset import SyntheticSpec, generate_prompts
+            spec = SyntheticSpec.from_dict({"model": model, **entry["synthetic"]})
+            prompts = generate_prompts(spec)
+        else:
+            prompts = _named_prompts(name)
+        if not prompts:
+            raise ValueError(f"数据集 {name} 没有prompt")
+        tasks.append(TestTask(
+            dataset_name=name,
+            prompts=prompts,
+            weight=entry.get("weight", 1),
+            concurrency=entry.get("concurrency", default_concurrency)
+        ))
+    return tasks
+
+
+def summarize_result(progress: TestProgress, test_task_id: str, profile: Dict,
+                     elapsed: float, stopped: bool) -> Dict:
+    """
+    生成机器可读的测试结果
+
+    Args:
+        progress: 测试结束时的进度
+        test_task_id: 测试任务ID
+        profile: 测试配置
+        elapsed: 统计窗口时长（秒），不含预热
+        stopped: 是否被手动停止
+    """
+    total_tokens = sum(stats.get("total_tokens", 0) for stats in progress.dataset_stats.values())
+    return {
+        "test_task_id": test_task_id,
+        "name": profile.get("name", ""),
+        "stopped": stopped,
+        "elapsed": elapsed,
+        "total_tasks": progress.total_tasks,
+        "completed": progress.completed_tasks,
+        "successful": progress.successful_tasks,
+        "failed": progress.failed_tasks,
+        "cancelled": progress.cancelled_tasks,
+        "warmup": progress.warmup_tasks,
+        "retried": progress.retried_tasks,
+        "retry_attempts": progress.retry_attempts,
+        "shed": progress.shed_tasks,
+        "last_error": progress.last_error,
+        "throughput": progress.successful_tasks / elapsed if elapsed > 0 else 0.0,
+        "token_throughput": total_tokens / elapsed if elapsed > 0 else 0.0,
+        "avg_response_time": progress.avg_response_time,
+        "avg_tps": progress.avg_tps,
+        "avg_ttft": progress.avg_ttft,
+        "avg_tpot": progress.avg_tpot,
+        "latency_percentiles": progress.latency_percentiles(),
+        "datasets": {
+            name: dict(stats, latency_percentiles=progress.latency_percentiles(name))
+            for name, stats in progress.dataset_stats.items()
+        },
+        "interval_stats": progress.interval_stats,
+        "step_stats": progress.step_stats,
+        "knee": progress.knee,
+        "replicas": progress.replica_summary() if len(progress.replica_stats) > 1 else {},
+        "comparison": progress.comparison,
+        "log_file": os.path.join(LOG_DIR, f"{test_task_id}.log"),
+        "event_log": os.path.join(LOG_DIR, f"{test_task_id}.jsonl"),
+    }
+
+
+class ProgressPrinter:
+    """按固定间隔向标准错误输出测试进度"""
+
+    def __init__(self, interval: float = 1.0, stream=None):
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.started = time.monotonic()
+        self._last = 0.0
+
+    def __call__(self, progress: TestProgress):
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            return
+        self._last = now
+        self.print(progress)
+
+    def print(self, progress: TestProgress):
+        """输出一行进度"""
+        elapsed = time.monotonic() - self.started
+        e2e = progress.latency_percentiles().get(METRIC_E2E, {})
+        total = f"/{progress.total_tasks}" if progress.total_tasks else ""
+        self.stream.write(
+            f"[{elapsed:7.1f}s] 完成 {progress.completed_tasks}{total}, 成功 {progress.successful_tasks}, "
+            f"失败 {progress.failed_tasks}, p50 {e2e.get('p50', 0.0) * 1000:.0f}ms, "
+            f"p99 {e2e.get('p99', 0.0) * 1000:.0f}ms, TPS {progress.avg_tps:.1f}\n"
+        )
+        self.stream.flush()
+
+
+async def run_profile(profile: Dict, test_task_id: str, printer: Optional[ProgressPrinter] = None) -> Dict:
+    """
+    按测试配置运行一次测试
+
+    Returns:
+        Dict: summarize_result()的结果
+    """
+    models = profile["model"] if isinstance(profile["model"], list) else [profile["model"]]
+    model_configs = [resolve_model(entry) for entry in models]
+    tasks = build_tasks(profile, model_configs[0].get("model", ""))
+    load_profile = LoadProfile.from_dict(profile["load_profile"]) if "load_profile" in profile else None
+    workload = WorkloadProfile.from_dict(profile["workload"]) if "workload" in profile else None
+
+    manager = TestManager()
+    loop = asyncio.get_running_loop()
+
+    def on_interrupt():
+        # 第一次Ctrl+C停止测试并等待在途请求结束，再次按下时直接中断
+        sys.stderr.write("正在停止测试，再次按Ctrl+C强制退出...\n")
+        manager.stop_test()
+        loop.remove_signal_handler(signal.SIGINT)
+
+    try:
+        loop.add_signal_handler(signal.SIGINT, on_interrupt)
+    except (NotImplementedError, RuntimeError):
+        pass  # Windows的事件循环不支持信号处理器
+
+    try:
+        if profile.get("schedule"):
+            await manager.run_schedule(
+                test_task_id, tasks, ConcurrencySchedule.from_dict(profile["schedule"]), printer,
+                model_configs[0]
+            )
+        else:
+            await manager.run_test(
+                test_task_id, tasks, printer,
+                model_configs if len(model_configs) > 1 else model_configs[0],
+                load_profile=load_profile,
+                processes=profile.get("processes"),
+                agents=profile.get("agents"),
+                compare_mode=profile.get("compare_mode"),
+                workload=workload
+            )
+    finally:
+        try:
+            loop.remove_signal_handler(signal.SIGINT)
+        except (NotImplementedError, RuntimeError):
+            pass
+    progress = manager.progress
+    elapsed = time.perf_counter() - progress.measure_start if progress.start_time else 0.0
+    stopped = bool(manager.cancel_token and manager.cancel_token.cancelled)
+    if printer:
+        printer.print(progress)
+    return summarize_result(progress, test_task_id, profile, elapsed, stopped)
+
+
+def run_command(args) -> int:
+    """run子命令"""
+    profile = load_test_profile(args.profile)
+    config.apply_overrides(profile.get("config"))
+    test_task_id = args.test_id or time.strftime("cli_%Y%m%d_%H%M%S")
+    printer = None if args.quiet else ProgressPrinter(args.interval)
+
+    result = asyncio.run(run_profile(profile, test_task_id, printer))
+
+    output = args.output or os.path.join(LOG_DIR, f"{test_task_id}.result.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False, default=str)
+    sys.stderr.write(f"测试结果已写入: {output}\n")
+    sys.stderr.write(
+        f"完成 {result['completed']}, 成功 {result['successful']}, 失败 {result['failed']}, "
+        f"吞吐 {result['throughput']:.2f}请求/秒, {result['token_throughput']:.1f}token/秒\n"
+    )
+    return 130 if result["stopped"] else 0
+
+
+def load_benchmark_items(profile: Dict) -> List[Dict]:
+    """按跑分配置读取测试项"""
+    if "prompts" in profile:
+        prompts = list(profile["prompts"])
+    else:
+        path = profile.get("dataset")
+        if not path:
+            raise ValueError("跑分配置缺少dataset或prompts")
+        if path.endswith(".json"):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            items = data.get("data", []) if isinstance(data, dict) else data
+            prompts = [item if isinstance(item, dict) else str(item) for item in items]
+        else:
+            prompts = _read_prompt_file(path)
+    items = [item if isinstance(item, dict) else {"id": f"item-{index}", "text": item}
+             for index, item in enumerate(prompts)]
+    if not items:
+        raise ValueError("跑分数据集没有测试项")
+    return items
+
+
+class BenchmarkProgressPrinter(ProgressPrinter):
+    """按固定间隔输出跑分执行器回调的进度快照"""
+
+    def __call__(self, snapshot: Dict):
+        now = time.monotonic()
+        if now - self._last < self.interval and snapshot.get("progress", 0) < 100:
+            return
+        self._last = now
+        latency = snapshot.get("latency_percentiles", {})
+        self.stream.write(
+            f"[{time.monotonic() - self.started:7.1f}s] 完成 {snapshot.get('current_item', 0)}/"
+            f"{snapshot.get('total_items', 0)}, 成功率 {snapshot.get('success_rate', 0.0) * 100:.1f}%, "
+            f"p50 {latency.get('p50', 0.0) * 1000:.0f}ms, p99 {latency.get('p99', 0.0) * 1000:.0f}ms, "
+            f"输出TPS {snapshot.get('output_tps', 0.0):.1f}\n"
+        )
+        self.stream.flush()
+
+
+async def run_benchmark(profile: Dict, stream_mode: Optional[str] = None,
+                        printer: Optional[BenchmarkProgressPrinter] = None) -> Dict:
+    """
+    按跑分配置执行一次跑分
+
+    Args:
+        profile: 跑分配置
+        stream_mode: "stream"、"non_stream"或"compare"，为空时按配置文件的stream字段
+        printer: 进度输出
+
+    Returns:
+        Dict: 跑分统计；compare模式下为compare_stream_overhead()的结果
+    """
+    from src.benchmark.utils.test_execution.aggregator import ResultAggregator
+    from src.benchmark.utils.test_execution.test_executor import compare_stream_overhead, execute_test
+    from src.utils.cancel_token import CancelToken
+
+    model_config = resolve_model(profile["model"])
+    items = load_benchmark_items(profile)
+    concurrency = profile.get("concurrency", 1)
+    cancel_token = CancelToken()
+    executor_config = {
+        "model_config": model_config,
+        "api_url": model_config.get("api_url"),
+        "concurrency": concurrency,
+        "api_timeout": profile.get("api_timeout"),
+        "max_attempts": profile.get("max_attempts"),
+        "cancel_token": cancel_token,
+        "progress_callback": printer,
+    }
+    if stream_mode in ("stream", "non_stream"):
+        executor_config["stream"] = stream_mode == "stream"
+    elif "stream" in profile:
+        executor_config["stream"] = bool(profile["stream"])
+
+    loop = asyncio.get_running_loop()
+
+    def on_interrupt():
+        sys.stderr.write("正在停止跑分，再次按Ctrl+C强制退出...\n")
+        cancel_token.cancel()
+        loop.remove_signal_handler(signal.SIGINT)
+
+    try:
+        loop.add_signal_handler(signal.SIGINT, on_interrupt)
+    except (NotImplementedError, RuntimeError):
+        pass  # Windows的事件循环不支持信号处理器
+
+    try:
+        if stream_mode == "compare":
+            result = await compare_stream_overhead(items, executor_config)
+        else:
+            started = time.time()
+            results = await execute_test(items, executor_config)
+            aggregator = ResultAggregator()
+            for item in results:
+                aggregator.add(item)
+            result = aggregator.snapshot(len(items), time.time() - started, concurrency, progress=100)
+    finally:
+        try:
+            loop.remove_signal_handler(signal.SIGINT)
+        except (NotImplementedError, RuntimeError):
+            pass
+    result["stopped"] = cancel_token.cancelled
+    return result
+
+
+def benchmark_command(args) -> int:
+    """benchmark子命令"""
+    with open(args.profile, "r", encoding="utf-8") as f:
+        profile = json.load(f)
+    if not profile.get("model"):
+        raise ValueError("跑分配置缺少model")
+    config.apply_overrides(profile.get("config"))
+    printer = None if args.quiet else BenchmarkProgressPrinter(args.interval)
+
+    result = asyncio.run(run_benchmark(profile, args.stream_mode, printer))
+
+    output = args.output or os.path.join(LOG_DIR, time.strftime("benchmark_%Y%m%d_%H%M%S.result.json"))
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False, default=str)
+    sys.stderr.write(f"跑分结果已写入: {output}\n")
+    if args.stream_mode == "compare":
+        overhead = result["overhead"]
+        sys.stderr.write(
+            f"流式相对非流式: 平均延迟差 {overhead['latency_delta'] * 1000:.1f}ms, "
+            f"p99延迟差 {overhead['p99_latency_delta'] * 1000:.1f}ms, "
+            f"首token提前 {overhead['ttft_saving'] * 1000:.1f}ms\n"
+        )
+    else:
+        sys.stderr.write(
+            f"完成 {result['current_item']}, 成功率 {result['success_rate'] * 100:.1f}%, "
+            f"平均延迟 {result['latency']:.3f}s, 输出 {result['output_tps']:.1f}token/秒\n"
+        )
+    return 130 if result["stopped"] else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口函数"""
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description="DeepStressModel 命令行压力测试")
+    parser.add_argument("--debug", action="store_true", help="启用调试模式，显示详细日志")
+    parser.add_argument("--verbose", action="store_true", help="在终端显示运行日志")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="按测试配置文件运行压力测试")
+    run_parser.add_argument("--profile", required=True, help="测试配置文件（JSON）")
+    run_parser.add_argument("--output", help="结果文件路径，默认写入data/logs/tests/<测试ID>.result.json")
+    run_parser.add_argument("--test-id", help="测试任务ID，默认按时间生成")
+    run_parser.add_argument("--interval", type=float, default=1.0, help="进度输出间隔（秒）")
+    run_parser.add_argument("--quiet", action="store_true", help="不输出进度")
+    run_parser.set_defaults(handler=run_command)
+
+    benchmark_parser = subparsers.add_parser("benchmark", help="按跑分配置文件执行跑分（不上传结果）")
+    benchmark_parser.add_argument("--profile", required=True, help="跑分配置文件（JSON）")
+    benchmark_parser.add_argument("--output", help="结果文件路径，默认写入data/logs/tests下")
+    benchmark_parser.add_argument("--interval", type=float, default=1.0, help="进度输出间隔（秒）")
+    benchmark_parser.add_argument("--quiet", action="store_true", help="不输出进度")
+    mode_group = benchmark_parser.add_mutually_exclusive_group()
+    mode_group.add_argument("--stream", dest="stream_mode", action="store_const", const="stream",
+                            help="使用流式请求")
+    mode_group.add_argument("--no-stream", dest="stream_mode", action="store_const", const="non_stream",
+                            help="使用非流式请求")
+    mode_group.add_argument("--compare-stream", dest="stream_mode", action="store_const", const="compare",
+                            help="依次以非流式和流式模式执行，比较流式模式的延迟开销")
+    benchmark_parser.set_defaults(handler=benchmark_command)
+
+    args = parser.parse_args(argv)
+    if args.debug:
+        set_debug_mode(True)
+    elif not args.verbose:
+        # 终端只保留进度和警告，完整日志仍写入data/logs
+        set_console_level(logging.WARNING)
+
+    try:
+        return args.handler(args)
+    except Exception as e:
+        logger.error(f"测试失败: {e}", exc_info=args.debug)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -110,11 +110,34 @@ class DatabaseManager:
                 self.conn.commit()
                 logger.info("已更新测试记录表结构")
             
-            # 更新数据库版本到 2
-            if current_version != 2:
-                self.cursor.execute("INSERT INTO db_version (version) VALUES (2)")
+            if current_version < 3:
+                logger.info("执行数据库迁移: 版本 2 -> 3")
+                # 测试记录增加延迟百分位（JSON）
+                self.cursor.execute("PRAGMA table_info(test_records)")
+                columns = [row[1] for row in self.cursor.fetchall()]
+                if "latency_percentiles" not in columns:
+                    self.cursor.execute("ALTER TABLE test_records ADD COLUMN latency_percentiles TEXT")
                 self.conn.commit()
-                logger.info("数据库版本已更新到 2")
+                logger.info("测试记录表已增加延迟百分位字段")
+            
+            # 更新数据库版本到 3
+            if current_version < 3:
+                self.cursor.execute("INSERT INTO db_version (version) VALUES (3)")
+                self.conn.commit()
+                logger.info("数据库版本已更新到 3")
+            
+            if current_version < 4:
+                logger.info("执行数据库迁移: 版本 3 -> 4")
+                # 模型配置增加副本地址列表（JSON）和均衡策略，新建的数据库由_init_tables创建完整的表
+                self.cursor.execute("PRAGMA table_info(model_configs)")
+                columns = [row[1] for row in self.cursor.fetchall()]
+                if columns and "api_urls" not in columns:
+                    self.cursor.execute("ALTER TABLE model_configs ADD COLUMN api_urls TEXT")
+                if columns and "balance_strategy" not in columns:
+                    self.cursor.execute("ALTER TABLE model_configs ADD COLUMN balance_strategy TEXT")
+                self.cursor.execute("INSERT INTO db_version (version) VALUES (4)")
+                self.conn.commit()
+                logger.info("数据库版本已更新到 4")
                 
         except Exception as e:
             logger.error(f"数据库迁移失败: {e}", exc_info=True)
@@ -135,6 +158,8 @@ class DatabaseManager:
                     max_tokens INTEGER,
                     temperature REAL,
                     top_p REAL,
+                    api_urls TEXT,
+                    balance_strategy TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
@@ -207,6 +232,7 @@ class DatabaseManager:
                     current_speed REAL NOT NULL,
                     test_time TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
                     log_file TEXT,
+                    latency_percentiles TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
@@ -244,7 +270,12 @@ class DatabaseManager:
         """获取所有模型配置"""
         try:
             self.cursor.execute("SELECT * FROM model_configs ORDER BY created_at DESC")
-            return [dict(row) for row in self.cursor.fetchall()]
+            models = []
+            for row in self.cursor.fetchall():
+                model = dict(row)
+                model["api_urls"] = json.loads(model["api_urls"]) if model.get("api_urls") else []
+                models.append(model)
+            return models
         except Exception as e:
             logger.error(f"获取模型配置失败: {e}")
             return []
@@ -260,8 +291,8 @@ class DatabaseManager:
                 
             self.cursor.execute('''
                 INSERT INTO model_configs 
-                (name, api_url, api_key, model, max_tokens, temperature, top_p)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                (name, api_url, api_key, model, max_tokens, temperature, top_p, api_urls, balance_strategy)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 config_data["name"],
                 config_data["api_url"],
@@ -269,7 +300,9 @@ class DatabaseManager:
                 config_data["model"],
                 config_data.get("max_tokens", 2000),
                 config_data.get("temperature", 0.7),
-                config_data.get("top_p", 0.9)
+                config_data.get("top_p", 0.9),
+                json.dumps(config_data.get("api_urls") or []),
+                config_data.get("balance_strategy")
             ))
             self.conn.commit()
             return True
@@ -282,7 +315,8 @@ class DatabaseManager:
         try:
             self.cursor.execute('''
                 UPDATE model_configs 
-                SET api_url = ?, api_key = ?, model = ?, max_tokens = ?, temperature = ?, top_p = ?
+                SET api_url = ?, api_key = ?, model = ?, max_tokens = ?, temperature = ?, top_p = ?,
+                    api_urls = ?, balance_strategy = ?
                 WHERE name = ?
             ''', (
                 config_data["api_url"],
@@ -291,6 +325,8 @@ class DatabaseManager:
                 config_data.get("max_tokens", 2000),
                 config_data.get("temperature", 0.7),
                 config_data.get("top_p", 0.9),
+                json.dumps(config_data.get("api_urls") or []),
+                config_data.get("balance_strategy"),
                 config_data["name"]
             ))
             self.conn.commit()
@@ -460,7 +496,7 @@ class DatabaseManager:
                     total_tasks, successful_tasks, failed_tasks,
                     avg_response_time, avg_generation_speed, total_chars,
                     total_tokens, avg_tps, total_time, current_speed,
-                    test_time, log_file, created_at
+                    test_time, log_file, latency_percentiles, created_at
                 FROM test_records 
                 ORDER BY created_at DESC
             ''')
@@ -480,6 +516,7 @@ class DatabaseManager:
                 record["current_speed"] = float(record["current_speed"])
                 record["avg_tps"] = float(record["avg_tps"])
                 record["total_time"] = float(record["total_time"])
+                record["latency_percentiles"] = json.loads(record["latency_percentiles"]) if record["latency_percentiles"] else {}
                 records.append(record)
             
             logger.info(f"成功获取 {len(records)} 条测试记录")
@@ -564,8 +601,8 @@ class DatabaseManager:
                     total_tasks, successful_tasks, failed_tasks,
                     avg_response_time, avg_generation_speed, total_chars,
                     total_tokens, avg_tps, total_time, current_speed,
-                    test_time, log_file
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    test_time, log_file, latency_percentiles
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 record["test_task_id"],
                 record["session_name"],
@@ -582,7 +619,8 @@ class DatabaseManager:
                 record["total_time"],
                 record["current_speed"],
                 record.get("test_time", time.strftime('%Y-%m-%d %H:%M:%S')),
-                record.get("log_file")
+                record.get("log_file"),
+                json.dumps(record["latency_percentiles"]) if record.get("latency_percentiles") else None
             ))
             
             self.conn.commit()
@@ -0,0 +1,248 @@
+"""
+合成数据集模块，按指定的输入token长度分布生成prompt，用于测试内置数据集覆盖不到的长输入场景
+"""
+import hashlib
+import json
+import random
+import threading
+from dataclasses import asdict, dataclass, field, fields
+from typing import Dict, List
+from src.utils.config import config, DATA_DIR
+from src.utils.logger import setup_logger
+from src.utils.token_counter import token_counter
+
+logger = setup_logger("synthetic_dataset")
+
+# 合成prompt持久化缓存目录
+SYNTHETIC_CACHE_DIR = DATA_DIR / "cache" / "synthetic"
+
+# 长度分布类型
+DIST_FIXED = "fixed"          # 固定长度
+DIST_UNIFORM = "uniform"      # [low, high]均匀分布
+DIST_NORMAL = "normal"        # 正态分布，截断到[low, high]
+DIST_EMPIRICAL = "empirical"  # 按values和weights给出的经验分布抽样
+DISTRIBUTIONS = (DIST_FIXED, DIST_UNIFORM, DIST_NORMAL, DIST_EMPIRICAL)
+
+# 构造prompt使用的词表，内容无意义。每个词加上前导空格后在常见BPE编码器中是单个token，
+# 且以空格开头的词不会和前一个词合并，拼接n个词即得到恰好n个token的文本
+FILLER_WORDS = (
+    "system", "policy", "context", "history", "answer", "detail", "format", "example", "review", "summary",
+    "request", "section", "account", "service", "product", "support", "refund", "invoice", "shipping", "order",
+    "customer", "language", "tone", "brief", "polite", "clear", "accurate", "source", "document", "reference",
+    "table", "list", "number", "date", "time", "region", "price", "stock", "update", "status",
+    "market", "report", "team", "project", "method", "result", "model", "data", "value", "signal",
+    "water", "light", "music", "paper", "river", "garden", "window", "animal", "city", "school",
+)
+
+# 编码器名称 -> 单token词片列表
+_pieces_cache: Dict[str, List[str]] = {}
+# 缓存键 -> 已生成的prompt列表，同一进程内重复使用同一规格时不再读盘
+_prompts_cache: Dict[str, List[str]] = {}
+_cache_lock = threading.Lock()
+
+
+@dataclass
+class LengthDistribution:
+    """
+    token长度分布数据类
+
+    - fixed: 所有样本都是value
+    - uniform: 在[low, high]内均匀抽样
+    - normal: 按mean和std抽样后取整并截断到[low, high]，high为0表示不设上限
+    - empirical: 按weights从values中抽样，weights为空时等概率，可直接填入线上请求的长度样本
+    """
+    kind: str = DIST_FIXED
+    value: int = 256
+    low: int = 1
+    high: int = 0
+    mean: float = 0.0
+    std: float = 0.0
+    values: List[int] = field(default_factory=list)
+    weights: List[float] = field(default_factory=list)
+
+    def __post_init__(self):
+        if self.kind not in DISTRIBUTIONS:
+            raise ValueError(f"未知的长度分布: {self.kind}，可选值: {', '.join(DISTRIBUTIONS)}")
+        if self.kind == DIST_FIXED and self.value < 1:
+            raise ValueError("固定长度必须大于0")
+        if self.low < 1:
+            raise ValueError("最小长度必须大于0")
+        if self.kind == DIST_UNIFORM and self.high < self.low:
+            raise ValueError("均匀分布的最大长度不能小于最小长度")
+        if self.kind == DIST_NORMAL and (self.mean < 1 or self.std < 0):
+            raise ValueError("正态分布的均值必须大于0，标准差不能为负数")
+        if self.kind == DIST_EMPIRICAL:
+            if not self.values or any(v < 1 for v in self.values):
+                raise ValueError("经验分布的长度样本不能为空且必须大于0")
+            if self.weights and len(self.weights) != len(self.values):
+                raise ValueError("经验分布的权重个数必须与长度样本个数一致")
+
+    def sample(self, rng: random.Random) -> int:
+        """抽取一个长度"""
+        if self.kind == DIST_FIXED:
+            return self.value
+        if self.kind == DIST_UNIFORM:
+            return rng.randint(self.low, self.high)
+        if self.kind == DIST_NORMAL:
+            length = max(self.low, round(rng.gauss(self.mean, self.std)))
+            return min(length, self.high) if self.high else length
+        return rng.choices(self.values, weights=self.weights or None)[0]
+
+    def describe(self) -> str:
+        """分布的简短描述，用于日志和数据集名称"""
+        if self.kind == DIST_FIXED:
+            return f"fixed({self.value})"
+        if self.kind == DIST_UNIFORM:
+            return f"uniform({self.low}-{self.high})"
+        if self.kind == DIST_NORMAL:
+            return f"normal({self.mean:g}±{self.std:g})"
+        return f"empirical({len(self.values)})"
+
+    @classmethod
+    def from_dict(cls, data) -> "LengthDistribution":
+        """从字典创建长度分布，整数视为固定长度，忽略未知字段"""
+        if isinstance(data, int):
+            return cls(value=data)
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in (data or {}).items() if k in names})
+
+
+@dataclass
+class SyntheticSpec:
+    """
+    合成数据集规格数据类
+
+    生成num_prompts条互不相同的prompt，每条的输入token数从input_tokens分布中抽取。
+    长度按model对应的编码器计算，只包含用户消息本身，不含服务端对话模板添加的token。
+    固定时长模式下prompt循环使用，百万级请求也只需生成一次prompt池。
+    """
+    input_tokens: LengthDistribution = field(default_factory=LengthDistribution)
+    num_prompts: int = 1000
+    seed: int = 0
+    model: str = ""  # 用于选择编码器的模型名称，为空时使用默认编码器
+
+    def __post_init__(self):
+        if isinstance(self.input_tokens, (dict, int)):
+            self.input_tokens = LengthDistribution.from_dict(self.input_tokens)
+        if self.num_prompts < 1:
+            raise ValueError("prompt条数必须大于0")
+
+    def default_name(self) -> str:
+        """默认数据集名称，如"synthetic_fixed(2048)_1000" """
+        return f"synthetic_{self.input_tokens.describe()}_{self.num_prompts}"
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SyntheticSpec":
+        """从字典创建合成数据集规格，忽略未知字段"""
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in (data or {}).items() if k in names})
+
+    @classmethod
+    def from_config(cls) -> "SyntheticSpec":
+        """从全局配置test.synthetic创建合成数据集规格"""
+        return cls.from_dict(config.get("test.synthetic", {}))
+
+
+def _token_pieces(encoder) -> List[str]:
+    """获取编码器下恰好为单个token的词片，结果按编码器缓存"""
+    pieces = _pieces_cache.get(encoder.name)
+    if pieces is None:
+        pieces = sorted({f" {word}" for word in FILLER_WORDS if len(encoder.encode(f" {word}")) == 1})
+        _pieces_cache[encoder.name] = pieces
+    return pieces
+
+
+def exact_text(rng: random.Random, tokens: int, model: str = "", encoder=None) -> str:
+    """
+    生成恰好tokens个token的无意义文本
+
+    Args:
+        rng: 随机数生成器，决定文本内容
+        tokens: 目标token数
+        model: 模型名称，用于选择编码器
+        encoder: 编码器，为空时按model获取
+    """
+    if tokens <= 0:
+        return ""
+    encoder = encoder or token_counter.get_encoder(model)
+    pieces = _token_pieces(encoder)
+    if pieces:
+        text = "".join(rng.choices(pieces, k=tokens))
+        if len(encoder.encode(text)) == tokens:
+            return text
+    # 编码器不满足单token词片的假设时，截取token序列解码后逐步修正
+    words = [rng.choice(FILLER_WORDS) for _ in range(tokens)]
+    text = encoder.decode(encoder.encode(" ".join(words))[:tokens])
+    count = len(encoder.encode(text))
+    for _ in range(8):
+        if count == tokens:
+            return text
+        if count > tokens:
+            text = encoder.decode(encoder.encode(text)[:tokens - (count - tokens)])
+        else:
+            text += " " + " ".join(rng.choice(FILLER_WORDS) for _ in range(tokens - count))
+        count = len(encoder.encode(text))
+    if count != tokens:
+        logger.warning(f"合成文本长度未能精确到 {tokens} token，实际 {count} token")
+    return text
+
+
+def _cache_key(spec: SyntheticSpec, encoder_name: str) -> str:
+    """按规格和编码器计算缓存键"""
+    data = json.dumps({"spec": asdict(spec), "encoder": encoder_name}, sort_keys=True)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:16]
+
+
+def generate_prompts(spec: SyntheticSpec, encoder=None) -> List[str]:
+    """
+    按规格生成合成prompt
+
+    相同规格和编码器的结果只生成一次，缓存在内存和data/cache/synthetic下，之后的测试直接读取。
+    生成的prompt及其token数同时写入token计数缓存，测试时不再重复编码。
+
+    Args:
+        spec: 合成数据集规格
+        encoder: 编码器，为空时按spec.model获取
+
+    Returns:
+        List[str]: num_prompts条prompt，内容由seed决定
+    """
+    encoder = encoder or token_counter.get_encoder(spec.model)
+    key = _cache_key(spec, encoder.name)
+    with _cache_lock:
+        prompts = _prompts_cache.get(key)
+        if prompts is not None:
+            return prompts
+
+        cache_file = SYNTHETIC_CACHE_DIR / f"{key}.json"
+        lengths = None
+        if cache_file.exists():
+            try:
+                with open(cache_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                prompts, lengths = data["prompts"], data["lengths"]
+                logger.info(f"已加载合成数据集缓存 {spec.default_name()}: {len(prompts)} 条")
+            except Exception as e:
+                logger.error(f"加载合成数据集缓存失败: {e}")
+                prompts = None
+
+        if prompts is None:
+            rng = random.Random(spec.seed)
+            lengths = [spec.input_tokens.sample(rng) for _ in range(spec.num_prompts)]
+            prompts = [exact_text(rng, length, encoder=encoder) for length in lengths]
+            logger.info(
+                f"已生成合成数据集 {spec.default_name()}: {len(prompts)} 条, "
+                f"平均 {sum(lengths) / len(lengths):.0f} token"
+            )
+            try:
+                SYNTHETIC_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                with open(cache_file, "w", encoding="utf-8") as f:
+                    json.dump({"spec": asdict(spec), "prompts": prompts, "lengths": lengths}, f, ensure_ascii=False)
+            except Exception as e:
+                logger.error(f"保存合成数据集缓存失败: {e}")
+
+        for prompt, length in zip(prompts, lengths):
+            token_counter.store_encoder_tokens(prompt, encoder.name, length)
+        _prompts_cache[key] = prompts
+        return prompts
+
@@ -0,0 +1,87 @@
+"""
+合成数据集测试
+"""
+import random
+import re
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src.data import synthetic_dataset
+from src.data.synthetic_dataset import LengthDistribution, SyntheticSpec, exact_text, generate_prompts
+
+
+class WordEncoder:
+    """以空格开头的单词为一个token的编码器"""
+    name = "word_test"
+
+    def __init__(self):
+        self.vocab = {}
+
+    def encode(self, text):
+        ids = []
+        for piece in re.findall(r" ?[^ ]+| ", text):
+            ids.append(self.vocab.setdefault(piece, len(self.vocab)))
+        return ids
+
+    def decode(self, ids):
+        pieces = {v: k for k, v in self.vocab.items()}
+        return "".join(pieces[i] for i in ids)
+
+
+class ByteEncoder:
+    """按字节编码，单词不是单个token，走截取修正的路径"""
+    name = "byte_test"
+
+    def encode(self, text):
+        return list(text.encode("utf-8"))
+
+    def decode(self, ids):
+        return bytes(ids).decode("utf-8", errors="ignore")
+
+
+class LengthDistributionTest(unittest.TestCase):
+
+    def test_sample_ranges(self):
+        rng = random.Random(0)
+        uniform = LengthDistribution(kind="uniform", low=10, high=20)
+        self.assertTrue(all(10 <= uniform.sample(rng) <= 20 for _ in range(100)))
+        normal = LengthDistribution(kind="normal", mean=100, std=50, low=80, high=120)
+        self.assertTrue(all(80 <= normal.sample(rng) <= 120 for _ in range(100)))
+        empirical = LengthDistribution(kind="empirical", values=[5, 7], weights=[0, 1])
+        self.assertEqual({empirical.sample(rng) for _ in range(20)}, {7})
+        self.assertEqual(LengthDistribution.from_dict(64).sample(rng), 64)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            LengthDistribution(kind="zipf")
+        with self.assertRaises(ValueError):
+            LengthDistribution(kind="uniform", low=10, high=5)
+        with self.assertRaises(ValueError):
+            LengthDistribution(kind="empirical", values=[1, 2], weights=[1])
+
+
+class ExactTextTest(unittest.TestCase):
+
+    def test_exact_lengths(self):
+        for encoder in (WordEncoder(), ByteEncoder()):
+            rng = random.Random(1)
+            for tokens in (1, 17, 300):
+                self.assertEqual(len(encoder.encode(exact_text(rng, tokens, encoder=encoder))), tokens)
+
+    def test_generate_prompts_cached(self):
+        encoder = WordEncoder()
+        spec = SyntheticSpec.from_dict({"input_tokens": {"kind": "uniform", "low": 50, "high": 60}, "num_prompts": 20})
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch.object(synthetic_dataset, "SYNTHETIC_CACHE_DIR", Path(cache_dir)):
+            prompts = generate_prompts(spec, encoder)
+            self.assertEqual(len(set(prompts)), 20)
+            self.assertTrue(all(50 <= len(encoder.encode(p)) <= 60 for p in prompts))
+            self.assertEqual(len(list(Path(cache_dir).iterdir())), 1)
+            synthetic_dataset._prompts_cache.clear()
+            self.assertEqual(generate_prompts(spec, encoder), prompts)
+
+
+if __name__ == "__main__":
+    unittest.main()
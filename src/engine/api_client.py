@@ -5,36 +5,76 @@ import time
 import json
 import asyncio
 import aiohttp
-from typing import Dict, Any, Optional, AsyncGenerator
+from typing import Dict, Any, Iterable, Iterator, List, Optional, AsyncGenerator, Union
+from src.engine.load_balancer import EndpointBalancer, STRATEGY_ROUND_ROBIN
+from src.engine.sse_parser import SSEParser, decode_event, drain_stream, extract_delta
+from src.engine.workload import prompt_text
+from src.utils.cancel_token import CancelToken
+from src.utils.retry_policy import RetryPolicy, get_circuit_breaker, is_endpoint_failure, parse_retry_after
 from src.utils.logger import setup_logger
-from src.utils.token_counter import token_counter  # 导入token计数器
+from src.utils.token_counter import async_token_counter  # 导入异步token计数服务
 from src.utils.config import config
 
 logger = setup_logger("api_client")
 
+# token计数来源
+TOKEN_SOURCE_SERVER = "server"  # 服务端返回的usage字段
+TOKEN_SOURCE_LOCAL = "local"    # 本地tiktoken估算
+
 class StreamStats:
-    """流式输出统计"""
+    """流式输出统计
+    
+    所有时间差均基于time.perf_counter()这一单调高精度时钟计算，
+    不受系统时间调整影响。
+    """
     def __init__(self, model_name: str = None):
         self.total_chars = 0
-        self.total_tokens = 0
+        self.total_tokens = 0  # 流式过程中以内容块数近似，结束后由finalize_tokens校正
+        self.chunk_count = 0
         self.total_time = 0.0
-        self.last_update_time = time.time()
+        self.request_start_time = time.perf_counter()
+        self.last_update_time = self.request_start_time
+        self.first_token_time: Optional[float] = None
+        self.last_token_time: Optional[float] = None
         self.current_char_speed = 0.0
         self.current_token_speed = 0.0
         self.char_speeds = []
         self.token_speeds = []
+        self.chunk_intervals = []  # 相邻内容块之间的间隔（秒）
         self.model_name = model_name
     
+    def start(self):
+        """标记请求发出时间，在每次（重试）发送请求前调用"""
+        self.request_start_time = time.perf_counter()
+        self.last_update_time = self.request_start_time
+        self.first_token_time = None
+        self.last_token_time = None
+        self.chunk_intervals = []
+        self.total_chars = 0
+        self.total_tokens = 0
+        self.chunk_count = 0
+        self.total_time = 0.0
+    
     def update(self, new_text: str):
         """更新统计信息"""
-        current_time = time.time()
+        current_time = time.perf_counter()
         time_diff = current_time - self.last_update_time
         
+        # 记录首个内容块到达时间及块间隔
+        if new_text:
+            if self.first_token_time is None:
+                self.first_token_time = current_time
+            else:
+                self.chunk_intervals.append(current_time - self.last_token_time)
+            self.last_token_time = current_time
+        
         if time_diff > 0:
             # 计算新增字符数
             new_chars = len(new_text)
-            # 使用tiktoken计算token数
-            new_tokens = token_counter.count_tokens(new_text, self.model_name)
+            # 流式服务端通常每个内容块对应一个token，这里不在事件循环中逐块分词，
+            # 准确的token总数在请求结束后通过finalize_tokens校正
+            new_tokens = 1 if new_text else 0
+            self.chunk_count += new_tokens
             
             # 计算字符速度
             self.current_char_speed = new_chars / time_diff
@@ -51,6 +91,10 @@ class StreamStats:
         
         self.last_update_time = current_time
     
+    def finalize_tokens(self, total_tokens: int):
+        """用服务端usage或本地计数校正输出token总数"""
+        self.total_tokens = total_tokens
+    
     @property
     def avg_char_speed(self) -> float:
         """平均字符生成速度（字符/秒）"""
@@ -64,6 +108,32 @@ class StreamStats:
         if self.total_time > 0:
             return self.total_tokens / self.total_time
         return 0.0
+    
+    @property
+    def ttft(self) -> float:
+        """首token延迟（秒）：从发出请求到收到首个内容块"""
+        if self.first_token_time is None:
+            return 0.0
+        return self.first_token_time - self.request_start_time
+    
+    @property
+    def tpot(self) -> float:
+        """每个输出token的平均耗时（秒），不含首token"""
+        if self.first_token_time is None or self.total_tokens <= 1:
+            return 0.0
+        return (self.last_token_time - self.first_token_time) / (self.total_tokens - 1)
+    
+    @property
+    def itl(self) -> float:
+        """平均内容块间延迟（秒）"""
+        if not self.chunk_intervals:
+            return 0.0
+        return sum(self.chunk_intervals) / len(self.chunk_intervals)
+    
+    @property
+    def max_itl(self) -> float:
+        """最大内容块间延迟（秒），用于发现解码阶段的停顿"""
+        return max(self.chunk_intervals) if self.chunk_intervals else 0.0
 
 class APIResponse:
     """API响应数据类"""
@@ -77,7 +147,22 @@ class APIResponse:
         start_time: float = 0.0,
         end_time: float = 0.0,
         model_name: str = "",
-        stream_stats: Optional[StreamStats] = None
+        stream_stats: Optional[StreamStats] = None,
+        ttft: float = 0.0,
+        tpot: float = 0.0,
+        itl: float = 0.0,
+        e2e_latency: float = 0.0,
+        prompt_tokens: int = 0,
+        token_count_source: str = TOKEN_SOURCE_LOCAL,
+        cancelled: bool = False,
+        attempts: int = 1,
+        retry_wait: float = 0.0,
+        total_latency: float = 0.0,
+        shed: bool = False,
+        intended_send_time: float = 0.0,
+        send_time: float = 0.0,
+        corrected_latency: float = 0.0,
+        endpoint: str = ""
     ):
         self.success = success
         self.response_text = response_text
@@ -88,6 +173,21 @@ class APIResponse:
         self.end_time = end_time
         self.model_name = model_name
         self.stream_stats = stream_stats
+        self.ttft = ttft  # 首token延迟（秒）
+        self.tpot = tpot  # 每输出token耗时（秒）
+        self.itl = itl  # 平均token间延迟（秒）
+        self.e2e_latency = e2e_latency  # 端到端延迟（秒，单调时钟）
+        self.prompt_tokens = prompt_tokens  # 输入token数
+        self.token_count_source = token_count_source  # token计数来源: server/local
+        self.cancelled = cancelled  # 是否因停止测试被取消，取消时response_text为已收到的部分内容
+        self.attempts = attempts  # 实际发送次数，大于1表示经过重试
+        self.retry_wait = retry_wait  # 重试前退避等待的总时长（秒）
+        self.total_latency = total_latency  # 从首次发送到最终结果的总耗时（秒），包含所有重试和退避
+        self.shed = shed  # 是否被熔断器拒绝而未发送
+        self.intended_send_time = intended_send_time  # 计划发送时刻（秒，相对测试开始）
+        self.send_time = send_time  # 实际发送时刻（秒，相对测试开始）
+        self.corrected_latency = corrected_latency  # 从计划发送时刻到完成的延迟（秒），0表示没有发送计划
+        self.endpoint = endpoint  # 最后一次尝试发往的端点，被熔断器拒绝时为空
     
     @property
     def generation_speed(self) -> float:
@@ -110,6 +210,55 @@ class APIResponse:
         """获取总token数"""
         return self.tokens_generated
 
+    def to_dict(self) -> Dict[str, Any]:
+        """序列化为可JSON编码的字典，流式统计只保留计算平均速度所需的累计值"""
+        data = {
+            "success": self.success,
+            "response_text": self.response_text,
+            "error_msg": self.error_msg,
+            "tokens_generated": self.tokens_generated,
+            "duration": self.duration,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "model_name": self.model_name,
+            "ttft": self.ttft,
+            "tpot": self.tpot,
+            "itl": self.itl,
+            "e2e_latency": self.e2e_latency,
+            "prompt_tokens": self.prompt_tokens,
+            "token_count_source": self.token_count_source,
+            "cancelled": self.cancelled,
+            "attempts": self.attempts,
+            "retry_wait": self.retry_wait,
+            "total_latency": self.total_latency,
+            "shed": self.shed,
+            "intended_send_time": self.intended_send_time,
+            "send_time": self.send_time,
+            "corrected_latency": self.corrected_latency,
+            "endpoint": self.endpoint,
+            "stream_stats": None
+        }
+        if self.stream_stats:
+            data["stream_stats"] = {
+                "total_chars": self.stream_stats.total_chars,
+                "total_tokens": self.stream_stats.total_tokens,
+                "chunk_count": self.stream_stats.chunk_count,
+                "total_time": self.stream_stats.total_time
+            }
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "APIResponse":
+        """从to_dict的结果恢复响应对象"""
+        data = dict(data)
+        stream_data = data.pop("stream_stats", None)
+        stream_stats = None
+        if stream_data:
+            stream_stats = StreamStats(data.get("model_name"))
+            for key, value in stream_data.items():
+                setattr(stream_stats, key, value)
+        return cls(stream_stats=stream_stats, **data)
+
 class APIClient:
     """API客户端类"""
     def __init__(
@@ -121,18 +270,32 @@ class APIClient:
         temperature: float = 0.7,
         top_p: float = 0.9,
         timeout: int = 10,  # 添加超时参数
-        retry_count: int = 1  # 添加重试次数参数
+        retry_count: int = 1,  # 添加重试次数参数
+        api_urls: Optional[List[str]] = None,
+        balance_strategy: str = STRATEGY_ROUND_ROBIN
     ):
+        """
+        Args:
+            api_urls: 同一模型的其他副本地址，与api_url一起组成端点池
+            balance_strategy: 多个端点之间的均衡策略，见load_balancer.BALANCE_STRATEGIES
+        """
         # 确保 API URL 格式正确
-        self.api_url = api_url.rstrip("/")
-        if not self.api_url.endswith("/v1"):
-            self.api_url += "/v1"
+        self.endpoints = []
+        for url in [api_url] + list(api_urls or []):
+            url = self._normalize_url(url)
+            if url not in self.endpoints:
+                self.endpoints.append(url)
+        self.api_url = self.endpoints[0]
+        self.balancer = EndpointBalancer(self.endpoints, balance_strategy)
         self.api_key = api_key
         self.model = model
         
-        # 使用传入的超时和重试设置
+        # 使用传入的超时和重试设置，retry_count为总尝试次数
         self.connect_timeout = timeout
-        self.max_retries = retry_count
+        self.max_retries = max(1, retry_count)
+        self.retry_policy = RetryPolicy.from_config("test.retry", max_attempts=self.max_retries)
+        # 同一端点的所有客户端共享熔断器
+        self.circuit_breakers = [get_circuit_breaker(url) for url in self.endpoints]
         
         # 其他参数
         self.max_tokens = max_tokens
@@ -145,12 +308,44 @@ class APIClient:
             "temperature": temperature,
             "top_p": top_p
         }
+        # 输出长度控制的扩展参数，未配置时不发送，避免不支持的服务端报错
+        min_tokens = config.get('openai_api.min_tokens', 0)
+        if min_tokens:
+            self.model_params["min_tokens"] = min(min_tokens, max_tokens) if max_tokens else min_tokens
+        if config.get('openai_api.ignore_eos', False):
+            self.model_params["ignore_eos"] = True
+        
+        # 根据配置决定是否使用流式输出，整个测试期间保持不变，与预编码的请求体一致
+        self.use_stream = config.get('openai_api.stream_mode', True)
         
-        # 创建异步HTTP会话
+        # prompt -> 预先编码的请求体字节，模型和参数在测试期间固定，每个prompt只序列化一次
+        self._compiled: Dict[str, bytes] = {}
+        
+        # 停止测试时的取消令牌，由测试管理器设置
+        self.cancel_token: Optional[CancelToken] = None
+        
+        # 创建异步HTTP会话，请求头固定，发送时不再逐个构造
         self.session = aiohttp.ClientSession(
-            headers={"Authorization": f"Bearer {api_key}"}
+            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
         )
-        logger.info(f"初始化 API 客户端: URL={api_url}, model={model}, connect_timeout={self.connect_timeout}, max_retries={self.max_retries}")
+        logger.info(f"初始化 API 客户端: URL={', '.join(self.endpoints)}, strategy={balance_strategy}, model={model}, connect_timeout={self.connect_timeout}, max_retries={self.max_retries}")
+    
+    @staticmethod
+    def _normalize_url(url: str) -> str:
+        """去掉末尾的斜杠并补全/v1"""
+        url = url.strip().rstrip("/")
+        if not url.endswith("/v1"):
+            url += "/v1"
+        return url
+    
+    def _select_endpoint(self) -> Optional[int]:
+        """按均衡策略选择端点，跳过熔断器拒绝的端点，全部拒绝时返回None"""
+        rejected = []
+        while True:
+            index = self.balancer.choose(rejected)
+            if index is None or self.circuit_breakers[index].allow_request():
+                return index
+            rejected.append(index)
     
     async def close(self):
         """关闭客户端会话"""
@@ -158,64 +353,166 @@ class APIClient:
             await self.session.close()
             logger.info("API客户端会话已关闭")
     
-    def _prepare_request(self, prompt: str) -> dict:
-        """准备请求数据"""
-        # 根据配置决定是否使用流式输出
-        use_stream = config.get('openai_api.stream_mode', True)
+    def _prepare_request(self, prompt: Union[str, List[Dict[str, str]]]) -> dict:
+        """准备请求数据，prompt为字符串时作为单条用户消息发送，为列表时作为完整的消息列表发送"""
+        use_stream = self.use_stream
         
-        return {
+        request_data = {
             "model": self.model,
-            "messages": [
+            "messages": prompt if isinstance(prompt, list) else [
                 {"role": "user", "content": prompt}
             ],
             "stream": use_stream,  # 根据配置决定是否启用流式输出
             **self.model_params  # 只包含支持的参数
         }
+        
+        # 流式模式下请求服务端在最后一个数据块中返回usage统计
+        if use_stream and config.get('openai_api.include_usage', True):
+            request_data["stream_options"] = {"include_usage": True}
+        
+        return request_data
+    
+    def compile_request(self, prompt: Union[str, List[Dict[str, str]]]) -> bytes:
+        """
+        获取prompt对应的请求体字节，首次调用时编码并缓存
+        
+        多轮会话和带前缀的消息列表内容随请求变化，每次直接编码，不进入缓存
+        
+        Returns:
+            bytes: UTF-8编码的JSON请求体
+        """
+        if not isinstance(prompt, str):
+            return json.dumps(self._prepare_request(prompt), ensure_ascii=False).encode("utf-8")
+        body = self._compiled.get(prompt)
+        if body is None:
+            body = json.dumps(self._prepare_request(prompt), ensure_ascii=False).encode("utf-8")
+            self._compiled[prompt] = body
+        return body
+    
+    def precompile(self, prompts: Iterable[str]) -> int:
+        """
+        在测试开始前预先编码请求体，把序列化移出计时路径
+        
+        Args:
+            prompts: 测试中会发送的prompt，重复的只编码一次
+        
+        Returns:
+            int: 已缓存的请求体数量
+        """
+        for prompt in prompts:
+            self.compile_request(prompt)
+        logger.info(f"已预编码 {len(self._compiled)} 个请求体")
+        return len(self._compiled)
+    
+    async def _resolve_completion_tokens(self, usage: Optional[dict], response_text: str,
+                                         prompt: Union[str, List[Dict[str, str]]]):
+        """
+        确定输出token数及其来源
+        
+        优先使用服务端返回的usage，缺失时才回退到本地tiktoken计数，
+        本地计数交由异步计数服务在线程池中完成，输入token数优先命中LRU缓存
+        
+        Returns:
+            Tuple[int, int, str]: (输出token数, 输入token数, 计数来源)
+        """
+        if usage and usage.get("completion_tokens") is not None:
+            return usage["completion_tokens"], usage.get("prompt_tokens") or 0, TOKEN_SOURCE_SERVER
+        completion_tokens, prompt_tokens = await asyncio.gather(
+            async_token_counter.count_tokens(response_text, self.model),
+            async_token_counter.count_prompt_tokens(prompt_text(prompt), self.model)
+        )
+        return completion_tokens, prompt_tokens, TOKEN_SOURCE_LOCAL
     
     async def _process_stream(
         self,
-        response: aiohttp.ClientResponse
+        response: aiohttp.ClientResponse,
+        usage: Optional[dict] = None
     ) -> AsyncGenerator[str, None]:
-        """处理流式响应"""
+        """处理流式响应
+        
+        Args:
+            response: 流式HTTP响应
+            usage: 可选的字典，若服务端在流中返回usage统计，将写入该字典
+        """
         try:
-            async for line in response.content:
-                line = line.decode('utf-8').strip()
-                if line.startswith('data: '):
-                    try:
-                        data = json.loads(line[6:])
-                        if data.get('choices'):
-                            # 支持两种格式：delta 和 text
-                            content = (
-                                data['choices'][0].get('delta', {}).get('content', '') or
-                                data['choices'][0].get('text', '')
-                            )
-                            if content:
-                                yield content
-                    except json.JSONDecodeError:
-                        continue
+            # 按网络到达的原始字节块增量解析，不再逐行解码和strip
+            # 收到[DONE]即停止读取，剩余的响应体在记录延迟后由drain_stream读完
+            parser = SSEParser()
+            async for chunk in response.content.iter_any():
+                for content in self._consume_events(parser.feed(chunk), usage):
+                    yield content
+                if parser.done:
+                    return
+            for content in self._consume_events(parser.flush(), usage):
+                yield content
         except Exception as e:
             logger.error(f"流式输出处理异常: {e}")
             raise  # 向上传递异常，让generate方法处理
     
-    async def generate(self, prompt: str) -> APIResponse:
-        """生成响应"""
+    @staticmethod
+    def _consume_events(events: List[bytes], usage: Optional[dict]) -> Iterator[str]:
+        """解析事件数据，记录usage并逐个返回非空的增量文本"""
+        for data in events:
+            for event in decode_event(data):
+                content, event_usage = extract_delta(event)
+                if usage is not None and event_usage:
+                    usage.update(event_usage)
+                if content:
+                    yield content
+    
+    def _finish(self, response: APIResponse, attempts: int, retry_wait: float, first_sent: float,
+                endpoint: str) -> APIResponse:
+        """补充重试和端点信息，e2e_latency仍为最后一次尝试的延迟"""
+        response.endpoint = endpoint
+        response.attempts = attempts
+        response.retry_wait = retry_wait
+        response.total_latency = time.perf_counter() - first_sent
+        if attempts > 1:
+            logger.info(f"请求经过 {attempts} 次尝试结束: success={response.success}, 退避等待 {retry_wait:.2f}s")
+        return response
+    
+    async def generate(self, prompt: Union[str, List[Dict[str, str]]]) -> APIResponse:
+        """
+        生成响应，失败时按重试策略退避重试
+        
+        Args:
+            prompt: 单条用户消息，或包含系统提示和会话历史的完整消息列表
+        """
         start_time = time.time()
+        first_sent = time.perf_counter()
         stream_stats = StreamStats(self.model)  # 传入模型名称
         full_response = []
+        policy = self.retry_policy
+        retry_wait = 0.0
+        use_stream = self.use_stream
+        # 预编码的请求体，precompile未覆盖的prompt在这里编码一次
+        body = self.compile_request(prompt)
         
-        # 根据配置决定是否使用流式输出
-        use_stream = config.get('openai_api.stream_mode', True)
-        
-        for attempt in range(self.max_retries):
+        attempt = 0
+        while True:
+            # 每次尝试重新选择端点，所有端点的熔断器都打开时不发送请求，直接记为被拒绝
+            index = self._select_endpoint()
+            if index is None:
+                return self._finish(APIResponse(
+                    success=False,
+                    error_msg="熔断器已打开，请求被拒绝",
+                    duration=time.time() - start_time,
+                    start_time=start_time,
+                    end_time=time.time(),
+                    model_name=self.model,
+                    shed=True
+                ), attempt, retry_wait, first_sent, "")
+            
+            endpoint = self.endpoints[index]
+            breaker = self.circuit_breakers[index]
+            attempt += 1
+            stream_stats.start()
+            retry_after = None
+            self.balancer.acquire(index)
             try:
                 async with self.session.post(
-                    f"{self.api_url}/chat/completions",  # 修改 URL 路径
-                    json={
-                        "model": self.model,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "stream": use_stream,  # 根据配置决定是否启用流式输出
-                        **self.model_params  # 使用model_params代替直接指定参数
-                    },
+                    f"{endpoint}/chat/completions",  # 修改 URL 路径
+                    data=body,
                     timeout=aiohttp.ClientTimeout(
                         connect=self.connect_timeout,
                         sock_connect=self.connect_timeout,
@@ -228,34 +525,54 @@ class APIClient:
                             # 根据配置决定处理方式
                             if use_stream:
                                 # 流式输出处理
-                                async for chunk in self._process_stream(response):
+                                usage = {}
+                                async for chunk in self._process_stream(response, usage):
                                     full_response.append(chunk)
                                     stream_stats.update(chunk)
                                 
+                                e2e_latency = time.perf_counter() - stream_stats.request_start_time
                                 end_time = time.time()
-                                return APIResponse(
+                                await drain_stream(response)
+                                breaker.record_success()
+                                response_text = "".join(full_response)
+                                completion_tokens, prompt_tokens, token_source = \
+                                    await self._resolve_completion_tokens(usage, response_text, prompt)
+                                stream_stats.finalize_tokens(completion_tokens)
+                                return self._finish(APIResponse(
                                     success=True,
-                                    response_text="".join(full_response),
-                                    tokens_generated=stream_stats.total_tokens,
+                                    response_text=response_text,
+                                    tokens_generated=completion_tokens,
                                     duration=end_time - start_time,
                                     start_time=start_time,
                                     end_time=end_time,
                                     model_name=self.model,
-                                    stream_stats=stream_stats
-                                )
+                                    stream_stats=stream_stats,
+                                    ttft=stream_stats.ttft,
+                                    tpot=stream_stats.tpot,
+                                    itl=stream_stats.itl,
+                                    e2e_latency=e2e_latency,
+                                    prompt_tokens=prompt_tokens,
+                                    token_count_source=token_source
+                                ), attempt, retry_wait, first_sent, endpoint)
                             else:
                                 # 非流式输出处理
                                 data = await response.json()
+                                # 非流式响应一次性返回全部内容，首token延迟即端到端延迟；
+                                # 在本地计数token之前取时间，延迟不包含客户端分词耗时
+                                e2e_latency = time.perf_counter() - stream_stats.request_start_time
+                                end_time = time.time()
+                                breaker.record_success()
                                 response_text = data.get("choices", [{}])[0].get("message", {}).get("content", "")
                                 
-                                # 估算token数量
-                                tokens_generated = token_counter.count_tokens(response_text, self.model)
-                                
                                 # 更新流统计（虽然不是流式但仍需要计算速度）
                                 stream_stats.update(response_text)
                                 
-                                end_time = time.time()
-                                return APIResponse(
+                                # 优先使用服务端返回的usage，缺失时再本地估算token数量
+                                tokens_generated, prompt_tokens, token_source = \
+                                    await self._resolve_completion_tokens(data.get("usage"), response_text, prompt)
+                                stream_stats.finalize_tokens(tokens_generated)
+                                
+                                return self._finish(APIResponse(
                                     success=True,
                                     response_text=response_text,
                                     tokens_generated=tokens_generated,
@@ -263,14 +580,19 @@ class APIClient:
                                     start_time=start_time,
                                     end_time=end_time,
                                     model_name=self.model,
-                                    stream_stats=stream_stats
-                                )
+                                    stream_stats=stream_stats,
+                                    ttft=e2e_latency,
+                                    e2e_latency=e2e_latency,
+                                    prompt_tokens=prompt_tokens,
+                                    token_count_source=token_source
+                                ), attempt, retry_wait, first_sent, endpoint)
                         except Exception as e:
                             logger.error(f"流式输出中断: {e}")
-                            # 返回已生成的部分内容，但标记为失败
+                            breaker.record_failure()
+                            # 返回已生成的部分内容，但标记为失败；已输出部分内容的请求不再重试
                             end_time = time.time()
                             response_text = ''.join(full_response)
-                            return APIResponse(
+                            return self._finish(APIResponse(
                                 success=False,
                                 response_text=response_text,
                                 error_msg=f"流式输出中断: {str(e)}",
@@ -279,51 +601,87 @@ class APIClient:
                                 start_time=start_time,
                                 end_time=end_time,
                                 model_name=self.model,
-                                stream_stats=stream_stats
-                            )
+                                stream_stats=stream_stats,
+                                ttft=stream_stats.ttft,
+                                e2e_latency=time.perf_counter() - stream_stats.request_start_time
+                            ), attempt, retry_wait, first_sent, endpoint)
                     else:
                         error_text = await response.text()
-                        logger.error(f"API请求失败 (尝试 {attempt + 1}/{self.max_retries}): {response.status} - {error_text}")
-                        if attempt == self.max_retries - 1:
-                            return APIResponse(
-                                success=False,
-                                error_msg=f"HTTP {response.status}: {error_text}",
-                                duration=time.time() - start_time,
-                                start_time=start_time,
-                                end_time=time.time()
-                            )
-            
+                        status = response.status
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        logger.error(f"API请求失败 (尝试 {attempt}/{policy.max_attempts}): {status} - {error_text}")
+                        # 4xx客户端错误说明请求本身有问题，不计入端点健康状况
+                        if is_endpoint_failure(status):
+                            breaker.record_failure()
+                        else:
+                            breaker.release()
+                        failure = APIResponse(
+                            success=False,
+                            error_msg=f"HTTP {status}: {error_text}",
+                            duration=time.time() - start_time,
+                            start_time=start_time,
+                            end_time=time.time()
+                        )
+                        can_retry = policy.should_retry(attempt, status=status)
+
+            except asyncio.CancelledError:
+                # 取消不反映端点健康状况，归还半开状态的探测名额
+                breaker.release()
+                if not (self.cancel_token and self.cancel_token.cancelled):
+                    raise
+                # 停止测试的宽限期内未完成，保留已收到的部分内容
+                end_time = time.time()
+                return self._finish(APIResponse(
+                    success=False,
+                    response_text="".join(full_response),
+                    error_msg="请求已取消",
+                    tokens_generated=stream_stats.total_tokens,
+                    duration=end_time - start_time,
+                    start_time=start_time,
+                    end_time=end_time,
+                    model_name=self.model,
+                    stream_stats=stream_stats,
+                    ttft=stream_stats.ttft,
+                    e2e_latency=time.perf_counter() - stream_stats.request_start_time,
+                    cancelled=True
+                ), attempt, retry_wait, first_sent, endpoint)
             except asyncio.TimeoutError as e:
                 error_msg = "连接超时" if "connect" in str(e) else "请求超时"
-                logger.error(f"API{error_msg} (尝试 {attempt + 1}/{self.max_retries})")
-                if attempt == self.max_retries - 1:
-                    return APIResponse(
-                        success=False,
-                        error_msg=error_msg,
-                        duration=time.time() - start_time,
-                        start_time=start_time,
-                        end_time=time.time()
-                    )
+                logger.error(f"API{error_msg} (尝试 {attempt}/{policy.max_attempts})")
+                breaker.record_failure()
+                failure = APIResponse(
+                    success=False,
+                    error_msg=error_msg,
+                    duration=time.time() - start_time,
+                    start_time=start_time,
+                    end_time=time.time()
+                )
+                can_retry = policy.should_retry(attempt, timed_out=True)
             
             except Exception as e:
-                logger.error(f"API请求异常 (尝试 {attempt + 1}/{self.max_retries}): {e}")
-                if attempt == self.max_retries - 1:
-                    return APIResponse(
-                        success=False,
-                        error_msg=str(e),
-                        duration=time.time() - start_time,
-                        start_time=start_time,
-                        end_time=time.time()
-                    )
+                logger.error(f"API请求异常 (尝试 {attempt}/{policy.max_attempts}): {e}")
+                breaker.record_failure()
+                failure = APIResponse(
+                    success=False,
+                    error_msg=str(e),
+                    duration=time.time() - start_time,
+                    start_time=start_time,
+                    end_time=time.time()
+                )
+                can_retry = policy.should_retry(attempt)
+            finally:
+                self.balancer.release(index)
             
-            # 重试前等待
-            if attempt < self.max_retries - 1:
-                await asyncio.sleep(1 * (attempt + 1))
-        
-        return APIResponse(
-            success=False,
-            error_msg="未知错误",
-            duration=time.time() - start_time,
-            start_time=start_time,
-            end_time=time.time()
-        )
+            # 不可重试、次数用尽或已停止测试时返回最后一次失败
+            if not can_retry or (self.cancel_token and self.cancel_token.cancelled):
+                return self._finish(failure, attempt, retry_wait, first_sent, endpoint)
+            
+            # 带抖动的指数退避，服务端返回Retry-After时按其等待
+            delay = policy.backoff(attempt, retry_after)
+            logger.info(f"{delay:.2f}s 后进行第 {attempt + 1} 次尝试")
+            retry_wait += delay
+            if self.cancel_token:
+                if await self.cancel_token.sleep(delay):
+                    return self._finish(failure, attempt, retry_wait, first_sent, endpoint)
+            else:
+                await asyncio.sleep(delay)
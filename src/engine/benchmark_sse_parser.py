@@ -0,0 +1,110 @@
+"""
+SSE解析微基准：比较逐行解码解析与字节增量解析的单核吞吐（事件块/秒）
+
+用法: python -m src.engine.benchmark_sse_parser --events 200000 --read-size 1024
+"""
+import argparse
+import json
+import time
+
+from src.engine import sse_parser
+from src.engine.sse_parser import SSEParser, decode_event, extract_delta
+
+
+def build_stream(events: int) -> bytes:
+    """构造OpenAI兼容的流式响应体，每个事件携带一个token"""
+    lines = []
+    for i in range(events):
+        payload = {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "created": 1700000000,
+            "model": "bench",
+            "choices": [{"index": 0, "delta": {"content": f"tok{i % 100} "}, "finish_reason": None}]
+        }
+        lines.append(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+    lines.append(b"data: [DONE]\n\n")
+    return b"".join(lines)
+
+
+def split_chunks(stream: bytes, read_size: int):
+    """按固定大小切分，模拟网络读取的任意边界"""
+    return [stream[i:i + read_size] for i in range(0, len(stream), read_size)]
+
+
+def parse_by_line(stream: bytes) -> int:
+    """原实现：逐行解码为str，strip后对每行完整json.loads"""
+    count = 0
+    for line in stream.splitlines(keepends=True):
+        line = line.decode('utf-8').strip()
+        if line.startswith('data: '):
+            try:
+                data = json.loads(line[6:])
+                if data.get('choices'):
+                    content = (
+                        data['choices'][0].get('delta', {}).get('content', '') or
+                        data['choices'][0].get('text', '')
+                    )
+                    if content:
+                        count += 1
+            except json.JSONDecodeError:
+                continue
+    return count
+
+
+def parse_incremental(chunks) -> int:
+    """新实现：字节块增量解析"""
+    count = 0
+    parser = SSEParser()
+    for chunk in chunks:
+        for data in parser.feed(chunk):
+            for event in decode_event(data):
+                if extract_delta(event)[0]:
+                    count += 1
+    return count
+
+
+def run(cases, events: int, repeat: int):
+    """
+    交替执行各实现，每个实现取最快一次
+
+    各实现轮流执行而不是依次跑完，机器负载波动对各实现的影响相近，结果可以直接比较。
+
+    Args:
+        cases: (名称, 函数, 参数, JSON解析函数)列表，JSON解析函数为None时不替换
+    """
+    best = {name: float("inf") for name, _, _, _ in cases}
+    for _ in range(repeat):
+        for name, func, arg, loads in cases:
+            if loads is not None:
+                sse_parser._loads = loads
+            start = time.perf_counter()
+            parsed = func(arg)
+            best[name] = min(best[name], time.perf_counter() - start)
+            assert parsed == events, f"{name}: 解析出 {parsed} 个事件，期望 {events}"
+    for name, elapsed in best.items():
+        print(f"{name:<28} {events / elapsed:>12,.0f} 块/秒  ({elapsed * 1000:.1f}ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSE解析微基准")
+    parser.add_argument("--events", type=int, default=200000, help="事件数量")
+    parser.add_argument("--read-size", type=int, default=1024, help="模拟的单次网络读取字节数")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数，取最快一次")
+    args = parser.parse_args()
+
+    stream = build_stream(args.events)
+    chunks = split_chunks(stream, args.read_size)
+    print(f"事件数: {args.events}, 响应体: {len(stream) / 1024 / 1024:.1f}MB, "
+          f"读取块: {len(chunks)}, JSON后端: {sse_parser.JSON_BACKEND}")
+
+    # 原实现由aiohttp按行切分，这里只计入解码和解析本身
+    cases = [("逐行解码 + json.loads", parse_by_line, stream, None)]
+    if sse_parser.JSON_BACKEND != "json":
+        cases.append((f"字节增量解析 ({sse_parser.JSON_BACKEND})", parse_incremental, chunks, sse_parser._loads))
+    cases.append(("字节增量解析 (json)", parse_incremental, chunks, sse_parser._json_loads))
+    run(cases, args.events, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+"""
+分布式负载生成模块，协调端将请求分片分配给多台机器上的代理，并汇总各代理的进度
+
+协调端与代理之间使用TCP上的换行分隔JSON消息：
+- 连接建立后代理发送challenge（随机数），协调端回复hello（共享令牌对随机数的HMAC），校验失败时代理断开连接
+- 协调端 -> 代理: ping / run / stop
+- 代理 -> 协调端: pong / report / done / error
+
+代理会向协调端指定的任意地址施压，必须设置共享令牌才能启动，默认只监听127.0.0.1。
+消息未加密，run消息中包含模型的api_key，跨机器使用时应通过SSH隧道转发，例如在协调端执行
+ssh -N -L 9100:127.0.0.1:9100 user@agent-host，再把代理地址配置为127.0.0.1:9100；
+或者放在TLS终结代理（如stunnel）之后。不要把代理端口直接暴露在不可信网络上。
+
+代理启动方式: DEEPSTRESS_AGENT_TOKEN=<令牌> python -m src.engine.distributed --port 9100
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from src.engine.api_client import APIResponse
+from src.engine.load_profile import LoadProfile
+from src.engine.workload import WorkloadProfile
+from src.engine.multiprocess_runner import shard_tasks
+from src.engine.test_manager import TestManager, TestTask
+from src.utils.config import config
+from src.utils.logger import setup_logger
+
+logger = setup_logger("distributed")
+
+# 消息类型
+MSG_CHALLENGE = "challenge"
+MSG_HELLO = "hello"
+MSG_PING = "ping"
+MSG_PONG = "pong"
+MSG_RUN = "run"
+MSG_STOP = "stop"
+MSG_REPORT = "report"
+MSG_DONE = "done"
+MSG_ERROR = "error"
+
+DEFAULT_AGENT_PORT = 9100
+# 单条消息上限，进度快照包含直方图和一批结果，远大于asyncio默认的64KB
+STREAM_LIMIT = 16 * 1024 * 1024
+# 时钟偏移探测次数，取往返时延最小的一次
+CLOCK_SYNC_SAMPLES = 8
+# 统一开始时间相对下发任务的提前量（秒），需覆盖各代理创建会话的耗时
+START_DELAY = 1.0
+# 共享令牌的环境变量，优先于配置test.distributed.token
+TOKEN_ENV = "DEEPSTRESS_AGENT_TOKEN"
+# 握手超时（秒）
+HANDSHAKE_TIMEOUT = 5.0
+
+
+async def send_message(writer: asyncio.StreamWriter, message: Dict):
+    """发送一条消息"""
+    writer.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+    await writer.drain()
+
+
+async def read_message(reader: asyncio.StreamReader) -> Optional[Dict]:
+    """读取一条消息，连接关闭时返回None"""
+    line = await reader.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def resolve_token(token: Optional[str] = None) -> str:
+    """获取共享令牌：参数 > 环境变量DEEPSTRESS_AGENT_TOKEN > 配置test.distributed.token"""
+    return token or os.environ.get(TOKEN_ENV) or config.get("test.distributed.token", "") or ""
+
+
+def sign_challenge(token: str, nonce: str) -> str:
+    """用共享令牌对随机数计算HMAC，令牌本身不在网络上传输"""
+    return hmac.new(token.encode("utf-8"), nonce.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """解析"host:port"形式的代理地址，缺省端口为DEFAULT_AGENT_PORT"""
+    host, _, port = address.rpartition(":")
+    if not host:
+        return address, DEFAULT_AGENT_PORT
+    return host, int(port)
+
+
+class DistributedAgent:
+    """
+    负载生成代理
+
+    每个连接同一时间只运行一个分片，分片在本机的TestManager中执行，
+    按固定间隔将累计快照和新完成的结果上报给协调端。
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = DEFAULT_AGENT_PORT,
+                 processes: Optional[int] = None, token: Optional[str] = None):
+        """
+        Args:
+            host: 监听地址，默认只接受本机连接，远程协调端通过SSH隧道连接
+            port: 监听端口，0表示由系统分配
+            processes: 本机负载生成进程数，未指定时读取本机配置test.processes
+            token: 共享令牌，未指定时见resolve_token()
+        """
+        self.host = host
+        self.port = port
+        self.processes = processes
+        self.token = resolve_token(token)
+        if not self.token:
+            raise ValueError(f"负载生成代理必须设置共享令牌（--token或环境变量{TOKEN_ENV}）")
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        """开始监听，返回后self.port为实际监听端口"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                                  limit=STREAM_LIMIT)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"负载生成代理已启动: {self.host}:{self.port}")
+
+    async def serve_forever(self):
+        """启动并持续提供服务"""
+        if not self._server:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """停止监听"""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info("peername")
+        if not await self._authenticate(reader, writer):
+            logger.warning(f"拒绝未通过认证的连接: {peer}")
+            writer.close()
+            return
+        logger.info(f"协调端已连接: {peer}")
+        manager = TestManager()
+        run_task: Optional[asyncio.Task] = None
+        try:
+            while True:
+                message = await read_message(reader)
+                if message is None:
+                    break
+                kind = message.get("type")
+                if kind == MSG_PING:
+                    await send_message(writer, {"type": MSG_PONG, "t0": message["t0"], "t1": time.time()})
+                elif kind == MSG_RUN:
+                    if run_task and not run_task.done():
+                        await send_message(writer, {"type": MSG_ERROR, "error": "代理正在运行其他分片"})
+                        continue
+                    run_task = asyncio.create_task(self._run_shard(manager, message, writer))
+                elif kind == MSG_STOP:
+                    manager.stop_test()
+        except Exception as e:
+            logger.error(f"处理协调端消息失败: {e}", exc_info=True)
+        finally:
+            # 协调端断开后不再继续施压
+            manager.stop_test()
+            if run_task:
+                await asyncio.gather(run_task, return_exceptions=True)
+            writer.close()
+            logger.info(f"协调端已断开: {peer}")
+
+    async def _authenticate(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        """挑战-应答认证，协调端需用相同的共享令牌签名随机数"""
+        nonce = secrets.token_hex(16)
+        try:
+            await send_message(writer, {"type": MSG_CHALLENGE, "nonce": nonce})
+            message = await asyncio.wait_for(read_message(reader), HANDSHAKE_TIMEOUT)
+        except Exception:
+            return False
+        if not message or message.get("type") != MSG_HELLO:
+            return False
+        if not hmac.compare_digest(str(message.get("mac", "")), sign_challenge(self.token, nonce)):
+            await send_message(writer, {"type": MSG_ERROR, "error": "认证失败"})
+            return False
+        return True
+
+    async def _run_shard(self, manager: TestManager, message: Dict, writer: asyncio.StreamWriter):
+        """等待到统一开始时间后运行分片"""
+        shard_id = message["shard_id"]
+        report_interval = message.get("report_interval", 0.2)
+        pending: List[Dict] = []
+        last_report = 0.0
+
+        def on_result(dataset_name: str, response: APIResponse):
+            pending.append({"dataset_name": dataset_name, "response": response.to_dict()})
+
+        def report(progress):
+            nonlocal last_report
+            now = time.monotonic()
+            if now - last_report < report_interval:
+                return
+            last_report = now
+            flush(MSG_REPORT, progress)
+
+        def flush(kind: str, progress):
+            writer.write(json.dumps({
+                "type": kind,
+                "snapshot": progress.to_snapshot(),
+                "results": list(pending)
+            }, ensure_ascii=False).encode("utf-8") + b"\n")
+            pending.clear()
+
+        manager.result_received.connect(on_result)
+        try:
+            tasks = [TestTask(**task) for task in message["tasks"]]
+            load_profile = LoadProfile.from_dict(message["load_profile"])
+            # start_at已由协调端换算为本机时钟
+            delay = message["start_at"] - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            logger.info(f"开始运行分片 {shard_id}, 启动偏差 {-delay * 1000:.1f}ms")
+            await manager.run_test(shard_id, tasks, report, message.get("model_config"),
+                                   load_profile, processes=self.processes, agents=[],
+                                   workload=WorkloadProfile.from_dict(message.get("workload")))
+            flush(MSG_DONE, manager.progress)
+            await writer.drain()
+        except Exception as e:
+            logger.error(f"分片 {shard_id} 运行失败: {e}", exc_info=True)
+            await send_message(writer, {"type": MSG_ERROR, "error": str(e)})
+        finally:
+            manager.result_received.disconnect(on_result)
+
+
+@dataclass
+class AgentConnection:
+    """协调端到单个代理的连接"""
+    address: str
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    clock_offset: float = 0.0  # 代理时钟 - 协调端时钟（秒）
+    rtt: float = 0.0           # 估计偏移时的往返时延（秒）
+
+    @classmethod
+    async def connect(cls, address: str, timeout: float = 5.0,
+                      token: Optional[str] = None) -> "AgentConnection":
+        """连接代理并完成认证，token未指定时见resolve_token()"""
+        host, port = parse_address(address)
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, limit=STREAM_LIMIT), timeout)
+        token = resolve_token(token)
+        if not token:
+            writer.close()
+            raise ValueError(f"连接代理需要共享令牌（配置test.distributed.token或环境变量{TOKEN_ENV}）")
+        challenge = await asyncio.wait_for(read_message(reader), timeout)
+        if not challenge or challenge.get("type") != MSG_CHALLENGE:
+            writer.close()
+            raise ConnectionError(f"代理 {address} 握手失败")
+        await send_message(writer, {"type": MSG_HELLO, "mac": sign_challenge(token, challenge["nonce"])})
+        return cls(address, reader, writer)
+
+    async def sync_clock(self, samples: int = CLOCK_SYNC_SAMPLES):
+        """
+        估计代理与协调端的时钟偏移
+
+        与NTP相同，假设请求和响应的单程时延相等：offset = t1 - (t0 + t2) / 2，
+        取往返时延最小的样本，排队和调度带来的误差最小。
+        """
+        best = None
+        for _ in range(samples):
+            t0 = time.time()
+            await send_message(self.writer, {"type": MSG_PING, "t0": t0})
+            message = await read_message(self.reader)
+            t2 = time.time()
+            if not message or message.get("type") != MSG_PONG:
+                raise ConnectionError(f"代理 {self.address} 时钟同步失败")
+            rtt = t2 - t0
+            if best is None or rtt < best[0]:
+                best = (rtt, message["t1"] - (t0 + t2) / 2)
+        self.rtt, self.clock_offset = best
+
+    def to_local_time(self, agent_time: float) -> float:
+        """将代理时间换算为协调端时间"""
+        return agent_time - self.clock_offset if agent_time else agent_time
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except Exception:
+            pass
+
+
+async def run_distributed(manager: TestManager, test_task_id: str, tasks: List[TestTask],
+                          load_profile: LoadProfile, agents: List[str],
+                          progress_callback=None, model_config: Optional[dict] = None,
+                          report_interval: float = 0.2):
+    """
+    以分布式方式运行测试，并将各代理的计数和直方图实时合并到manager.progress
+
+    Args:
+        manager: 协调端的测试管理器，进度和结果信号由它发出
+        test_task_id: 测试任务ID，各代理使用"{test_task_id}_n{序号}"作为自己的任务ID
+        tasks: 测试任务列表
+        load_profile: 负载配置
+        agents: 代理地址列表，形如"host:port"，不能重复
+        progress_callback: 进度回调函数
+        model_config: 模型配置
+        report_interval: 代理上报间隔（秒）
+
+    Raises:
+        ValueError: 代理地址重复
+    """
+    # 各代理的快照和完成状态按地址记录，同一地址出现两次时会一直等待不存在的第二个完成消息
+    seen = set()
+    for address in agents:
+        key = parse_address(address)
+        if key in seen:
+            raise ValueError(f"代理地址重复: {address}")
+        seen.add(key)
+
+    connections: List[AgentConnection] = []
+    try:
+        for address in agents:
+            connection = await AgentConnection.connect(address)
+            connections.append(connection)
+            await connection.sync_clock()
+            logger.info(f"代理 {address}: 时钟偏移 {connection.clock_offset * 1000:.2f}ms, "
+                        f"往返时延 {connection.rtt * 1000:.2f}ms")
+
+        shards = shard_tasks(tasks, load_profile, len(connections))
+        if not shards:
+            logger.warning("没有可分配给代理的请求")
+            return
+        for connection in connections[len(shards):]:
+            await connection.close()
+        connections = connections[:len(shards)]
+        start_at = time.time() + START_DELAY + max(conn.rtt for conn in connections)
+        for index, (connection, (shard, profile)) in enumerate(zip(connections, shards)):
+            await send_message(connection.writer, {
+                "type": MSG_RUN,
+                "shard_id": f"{test_task_id}_n{index}",
+                "tasks": [vars(task) for task in shard],
+                "load_profile": vars(profile),
+                "workload": vars(manager.workload),
+                "model_config": model_config,
+                "start_at": start_at + connection.clock_offset,
+                "report_interval": report_interval
+            })
+        logger.info(f"已向 {len(connections)} 个代理下发分片")
+
+        # 持续时长和预热窗口从统一开始时间算起
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+        manager.progress.start_time = time.perf_counter()
+
+        messages: asyncio.Queue = asyncio.Queue()
+
+        async def receive(connection: AgentConnection):
+            try:
+                while True:
+                    message = await read_message(connection.reader)
+                    await messages.put((connection, message))
+                    if message is None or message.get("type") in (MSG_DONE, MSG_ERROR):
+                        return
+            except Exception as e:
+                await messages.put((connection, {"type": MSG_ERROR, "error": str(e)}))
+
+        receivers = [asyncio.create_task(receive(connection)) for connection in connections]
+        snapshots: Dict[str, Dict] = {}
+        finished = set()
+        stop_sent = False
+        try:
+            while len(finished) < len(connections):
+                if not manager.running and not stop_sent:
+                    stop_sent = True
+                    for connection in connections:
+                        if connection.address not in finished:
+                            await send_message(connection.writer, {"type": MSG_STOP})
+
+                try:
+                    connection, message = await asyncio.wait_for(messages.get(), 0.2)
+                except asyncio.TimeoutError:
+                    continue
+
+                if message is None:
+                    logger.error(f"代理 {connection.address} 连接中断")
+                    finished.add(connection.address)
+                    continue
+                if message["type"] == MSG_ERROR:
+                    logger.error(f"代理 {connection.address} 执行失败: {message['error']}")
+                    manager.progress.last_error = message["error"]
+                    finished.add(connection.address)
+                    continue
+
+                snapshots[connection.address] = message["snapshot"]
+                if message["type"] == MSG_DONE:
+                    finished.add(connection.address)
+
+                manager.progress.merge_snapshots(list(snapshots.values()))
+                for result in message["results"]:
+                    response = APIResponse.from_dict(result["response"])
+                    response.start_time = connection.to_local_time(response.start_time)
+                    response.end_time = connection.to_local_time(response.end_time)
+                    manager.result_received.emit(result["dataset_name"], response)
+                if progress_callback:
+                    progress_callback(manager.progress)
+        finally:
+            for receiver in receivers:
+                receiver.cancel()
+    finally:
+        for connection in connections:
+            await connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DeepStressModel 负载生成代理")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="监听地址，默认只接受本机连接，远程协调端请通过SSH隧道连接")
+    parser.add_argument("--port", type=int, default=DEFAULT_AGENT_PORT, help="监听端口")
+    parser.add_argument("--processes", type=int, default=None, help="本机负载生成进程数")
+    parser.add_argument("--token", default=None,
+                        help=f"共享令牌，未指定时读取环境变量{TOKEN_ENV}或配置test.distributed.token")
+    args = parser.parse_args()
+    asyncio.run(DistributedAgent(args.host, args.port, args.processes, args.token).serve_forever())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+延迟直方图模块，提供固定内存、可合并的对数分桶直方图
+"""
+import math
+from array import array
+from typing import Dict, Iterable, Optional
+
+# 默认查询的百分位
+DEFAULT_PERCENTILES = (50, 90, 95, 99, 99.9)
+
+# 直方图记录的延迟指标
+METRIC_E2E = "e2e"    # 端到端延迟
+METRIC_TTFT = "ttft"  # 首token延迟
+METRIC_TPOT = "tpot"  # 每输出token耗时
+METRIC_E2E_CORRECTED = "e2e_corrected"  # 经协调遗漏校正的端到端延迟
+LATENCY_METRICS = (METRIC_E2E, METRIC_TTFT, METRIC_TPOT, METRIC_E2E_CORRECTED)
+
+
+def percentile_key(pct: float) -> str:
+    """百分位对应的字典键，例如50 -> p50, 99.9 -> p999"""
+    return "p" + f"{pct:g}".replace(".", "")
+
+
+class LatencyHistogram:
+    """
+    对数分桶延迟直方图
+
+    桶边界按固定比例增长，记录值的相对误差不超过precision，内存大小只由
+    取值范围和精度决定，与记录次数无关。相同参数的直方图可以直接合并。
+    """
+
+    def __init__(self, min_value: float = 1e-5, max_value: float = 3600.0,
+                 precision: float = 0.01):
+        """
+        初始化直方图
+
+        Args:
+            min_value: 可分辨的最小值（秒），更小的值计入第一个桶
+            max_value: 可分辨的最大值（秒），更大的值计入最后一个桶
+            precision: 相对误差上限
+        """
+        if min_value <= 0 or max_value <= min_value:
+            raise ValueError("直方图取值范围无效")
+        if not 0 < precision < 1:
+            raise ValueError("直方图精度必须在0和1之间")
+
+        self.min_value = min_value
+        self.max_value = max_value
+        self.precision = precision
+        # 以桶的几何中点作为代表值时，桶宽比例为(1+p)/(1-p)可保证相对误差不超过p
+        self._log_ratio = math.log((1 + precision) / (1 - precision))
+        self._bucket_count = int(math.log(max_value / min_value) / self._log_ratio) + 1
+        self._counts = array("Q", bytes(8 * self._bucket_count))
+        self.count = 0
+        self.total = 0.0
+        self.min = 0.0
+        self.max = 0.0
+
+    def _bucket_index(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        index = int(math.log(value / self.min_value) / self._log_ratio)
+        return min(index, self._bucket_count - 1)
+
+    def _bucket_value(self, index: int) -> float:
+        # 桶几何中点
+        return self.min_value * math.exp((index + 0.5) * self._log_ratio)
+
+    def record(self, value: float, count: int = 1):
+        """记录一个值"""
+        if value < 0:
+            return
+        self._counts[self._bucket_index(value)] += count
+        if self.count == 0:
+            self.min = self.max = value
+        else:
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+        self.count += count
+        self.total += value * count
+
+    @property
+    def mean(self) -> float:
+        """平均值"""
+        return self.total / self.count if self.count else 0.0
+
+    def record_corrected(self, value: float, expected_interval: float, count: int = 1):
+        """
+        记录一个值，并按期望发送间隔补齐因等待该请求而未能发出的请求
+
+        闭环压测中一个慢请求会推迟后续请求的发送，慢请求期间本应发出的请求
+        没有被测量（协调遗漏）。与HdrHistogram的recordValueWithExpectedInterval相同，
+        值超过expected_interval时依次补记value - k * expected_interval。
+
+        Args:
+            value: 实测值（秒）
+            expected_interval: 期望的请求发送间隔（秒），不大于0时不校正
+            count: 记录次数
+        """
+        self.record(value, count)
+        if expected_interval <= 0:
+            return
+        for k in range(1, int(value / expected_interval)):
+            self.record(value - k * expected_interval, count)
+
+    def corrected_copy(self, expected_interval: float) -> "LatencyHistogram":
+        """
+        返回按期望发送间隔校正协调遗漏后的副本，与HdrHistogram的copyCorrectedForCoordinatedOmission相同
+
+        各桶以代表值参与校正，误差不超过直方图精度。
+        """
+        copy = LatencyHistogram(self.min_value, self.max_value, self.precision)
+        if expected_interval <= 0:
+            copy.merge(self)
+            return copy
+        for index, bucket_count in enumerate(self._counts):
+            if bucket_count:
+                value = min(max(self._bucket_value(index), self.min), self.max)
+                copy.record_corrected(value, expected_interval, bucket_count)
+        return copy
+
+    def percentile(self, pct: float) -> float:
+        """查询单个百分位"""
+        return self.percentiles((pct,))[percentile_key(pct)]
+
+    def percentiles(self, pcts: Iterable[float] = DEFAULT_PERCENTILES) -> Dict[str, float]:
+        """
+        一次遍历查询多个百分位
+
+        Args:
+            pcts: 百分位列表，例如(50, 99, 99.9)
+
+        Returns:
+            Dict[str, float]: 如{"p50": 0.12, "p99": 0.5, "p999": 0.8}，无数据时为0
+        """
+        pcts = sorted(pcts)
+        result = {percentile_key(p): 0.0 for p in pcts}
+        if self.count == 0:
+            return result
+
+        targets = [(percentile_key(p), max(1, math.ceil(p / 100 * self.count))) for p in pcts]
+        cumulative = 0
+        target_index = 0
+        for index, bucket_count in enumerate(self._counts):
+            if not bucket_count:
+                continue
+            cumulative += bucket_count
+            while target_index < len(targets) and cumulative >= targets[target_index][1]:
+                # 代表值限制在实际观测到的最小/最大值之间
+                value = min(max(self._bucket_value(index), self.min), self.max)
+                result[targets[target_index][0]] = value
+                target_index += 1
+            if target_index == len(targets):
+                break
+        return result
+
+    def summary(self, pcts: Iterable[float] = DEFAULT_PERCENTILES) -> Dict[str, float]:
+        """获取计数、均值、最值和百分位"""
+        result = {"count": self.count, "mean": self.mean, "min": self.min, "max": self.max}
+        result.update(self.percentiles(pcts))
+        return result
+
+    def _check_compatible(self, other: "LatencyHistogram"):
+        if (other.min_value, other.max_value, other.precision) != (self.min_value, self.max_value, self.precision):
+            raise ValueError("只能合并取值范围和精度相同的直方图")
+
+    def merge(self, other: "LatencyHistogram"):
+        """将另一个直方图合并到当前直方图"""
+        self._check_compatible(other)
+        if other.count == 0:
+            return
+        for index, bucket_count in enumerate(other._counts):
+            if bucket_count:
+                self._counts[index] += bucket_count
+        if self.count == 0:
+            self.min, self.max = other.min, other.max
+        else:
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    def snapshot(self) -> "LatencyHistogram":
+        """获取当前直方图的副本"""
+        copy = LatencyHistogram(self.min_value, self.max_value, self.precision)
+        copy.merge(self)
+        return copy
+
+    def clear(self):
+        """清空直方图"""
+        self._counts = array("Q", bytes(8 * self._bucket_count))
+        self.count = 0
+        self.total = 0.0
+        self.min = 0.0
+        self.max = 0.0
+
+    def to_dict(self) -> Dict:
+        """序列化为字典，只保存非空桶"""
+        return {
+            "min_value": self.min_value,
+            "max_value": self.max_value,
+            "precision": self.precision,
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+            "buckets": {str(i): c for i, c in enumerate(self._counts) if c}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "LatencyHistogram":
+        """从to_dict的结果恢复直方图"""
+        histogram = cls(data["min_value"], data["max_value"], data["precision"])
+        for index, bucket_count in data.get("buckets", {}).items():
+            histogram._counts[int(index)] = bucket_count
+        histogram.count = data.get("count", 0)
+        histogram.total = data.get("total", 0.0)
+        histogram.min = data.get("min", 0.0)
+        histogram.max = data.get("max", 0.0)
+        return histogram
+
+
+class LatencyHistogramSet:
+    """
+    端到端延迟、TTFT、TPOT以及校正后端到端延迟直方图的组合
+
+    已知计划发送时间（开环）时，校正后的延迟为完成时刻减计划发送时刻，直接记录；
+    闭环没有计划发送时间，查询时按期望发送间隔从原始e2e直方图推算。
+    """
+
+    def __init__(self):
+        self.histograms = {metric: LatencyHistogram() for metric in LATENCY_METRICS}
+
+    def record(self, e2e: float, ttft: float = 0.0, tpot: float = 0.0, corrected: float = 0.0):
+        """记录一次成功请求的延迟指标，TTFT/TPOT/校正延迟为0时视为不可用"""
+        self.histograms[METRIC_E2E].record(e2e)
+        if ttft > 0:
+            self.histograms[METRIC_TTFT].record(ttft)
+        if tpot > 0:
+            self.histograms[METRIC_TPOT].record(tpot)
+        if corrected > 0:
+            self.histograms[METRIC_E2E_CORRECTED].record(corrected)
+
+    def corrected_e2e(self, expected_interval: float = 0.0) -> LatencyHistogram:
+        """
+        获取校正协调遗漏后的端到端延迟直方图
+
+        Args:
+            expected_interval: 闭环时的期望发送间隔（秒），不大于0时取原始e2e的中位数，
+                即服务端未停顿时的典型耗时
+        """
+        corrected = self.histograms[METRIC_E2E_CORRECTED]
+        raw = self.histograms[METRIC_E2E]
+        if corrected.count or not raw.count:
+            return corrected
+        if expected_interval <= 0:
+            expected_interval = raw.percentile(50)
+        return raw.corrected_copy(expected_interval)
+
+    def __getitem__(self, metric: str) -> LatencyHistogram:
+        return self.histograms[metric]
+
+    def merge(self, other: "LatencyHistogramSet"):
+        """合并另一组直方图"""
+        for metric, histogram in other.histograms.items():
+            self.histograms[metric].merge(histogram)
+
+    def percentiles(self, pcts: Iterable[float] = DEFAULT_PERCENTILES,
+                    expected_interval: float = 0.0) -> Dict[str, Dict[str, float]]:
+        """
+        获取各指标的百分位，如{"e2e": {"p50": ..., "p99": ...}, ..., "e2e_corrected": {...}}
+
+        Args:
+            expected_interval: 闭环推算校正延迟时的期望发送间隔（秒），见corrected_e2e
+        """
+        result = {metric: histogram.percentiles(pcts) for metric, histogram in self.histograms.items()}
+        result[METRIC_E2E_CORRECTED] = self.corrected_e2e(expected_interval).percentiles(pcts)
+        return result
+
+    def to_dict(self) -> Dict:
+        """序列化为字典"""
+        return {metric: histogram.to_dict() for metric, histogram in self.histograms.items()}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> "LatencyHistogramSet":
+        """从to_dict的结果恢复"""
+        histogram_set = cls()
+        for metric, histogram in (data or {}).items():
+            if metric in histogram_set.histograms:
+                histogram_set.histograms[metric] = LatencyHistogram.from_dict(histogram)
+        return histogram_set
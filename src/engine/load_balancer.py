@@ -0,0 +1,110 @@
+"""
+多副本负载均衡模块，在客户端将请求分配到同一模型的多个服务端点
+"""
+import json
+import random
+from typing import Dict, List, Optional, Sequence
+from src.utils.logger import setup_logger
+
+logger = setup_logger("load_balancer")
+
+# 均衡策略
+STRATEGY_ROUND_ROBIN = "round_robin"              # 轮询
+STRATEGY_LEAST_OUTSTANDING = "least_outstanding"  # 在途请求最少
+STRATEGY_P2C = "p2c"                              # 随机取两个，选在途请求较少的一个
+BALANCE_STRATEGIES = (STRATEGY_ROUND_ROBIN, STRATEGY_LEAST_OUTSTANDING, STRATEGY_P2C)
+
+
+def resolve_endpoints(model_config: Dict) -> List[str]:
+    """
+    获取模型配置中的全部端点
+
+    api_urls可以是列表、JSON数组字符串或按换行/逗号分隔的字符串，未配置时只使用api_url。
+
+    Args:
+        model_config: 模型配置
+
+    Returns:
+        List[str]: 去重后的端点列表，api_url排在第一位
+    """
+    urls = model_config.get("api_urls") or []
+    if isinstance(urls, str):
+        text = urls.strip()
+        if text.startswith("["):
+            urls = json.loads(text)
+        else:
+            urls = text.replace(",", "\n").splitlines()
+    endpoints = []
+    for url in [model_config.get("api_url", "")] + list(urls):
+        url = (url or "").strip()
+        if url and url not in endpoints:
+            endpoints.append(url)
+    return endpoints
+
+
+class EndpointBalancer:
+    """
+    端点均衡器
+
+    acquire()选出端点并将其在途请求数加一，请求结束后必须调用release()。
+    只在单个事件循环中使用，不需要加锁。
+    """
+
+    def __init__(self, endpoints: Sequence[str], strategy: str = STRATEGY_ROUND_ROBIN,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            endpoints: 端点列表
+            strategy: 均衡策略，见BALANCE_STRATEGIES
+            seed: p2c策略的随机种子
+        """
+        if not endpoints:
+            raise ValueError("端点列表不能为空")
+        if strategy not in BALANCE_STRATEGIES:
+            raise ValueError(f"不支持的均衡策略: {strategy}")
+        self.endpoints = list(endpoints)
+        self.strategy = strategy
+        self.outstanding = [0] * len(self.endpoints)
+        self._next = 0
+        self._rng = random.Random(seed)
+
+    def choose(self, exclude: Sequence[int] = ()) -> Optional[int]:
+        """
+        按策略选出一个端点，不改变在途请求数
+
+        Args:
+            exclude: 不参与选择的端点下标，例如熔断器已打开的端点
+
+        Returns:
+            Optional[int]: 端点下标，全部被排除时返回None
+        """
+        candidates = [i for i in range(len(self.endpoints)) if i not in exclude]
+        if not candidates:
+            return None
+        if self.strategy == STRATEGY_ROUND_ROBIN:
+            # 从上次位置开始找第一个未被排除的端点
+            count = len(self.endpoints)
+            for offset in range(count):
+                index = (self._next + offset) % count
+                if index not in exclude:
+                    self._next = (index + 1) % count
+                    return index
+        if self.strategy == STRATEGY_LEAST_OUTSTANDING:
+            # 在途请求数相同时轮流选择，避免总是落到第一个端点
+            fewest = min(self.outstanding[i] for i in candidates)
+            tied = [i for i in candidates if self.outstanding[i] == fewest]
+            index = tied[self._next % len(tied)]
+            self._next += 1
+            return index
+        if len(candidates) == 1:
+            return candidates[0]
+        first, second = self._rng.sample(candidates, 2)
+        return first if self.outstanding[first] <= self.outstanding[second] else second
+
+    def acquire(self, index: int):
+        """登记一个发往index的在途请求"""
+        self.outstanding[index] += 1
+
+    def release(self, index: int):
+        """请求结束，释放在途计数"""
+        self.outstanding[index] -= 1
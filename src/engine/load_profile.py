@@ -0,0 +1,127 @@
+"""
+负载模式模块，定义测试的请求发送方式
+"""
+import random
+from dataclasses import dataclass, fields
+from typing import Iterator, Optional, Sequence, Tuple
+from src.utils.config import config
+
+# 负载模式
+LOAD_MODE_CLOSED = "closed"  # 闭环：固定数量的工作协程，完成一个再发下一个
+LOAD_MODE_OPEN = "open"      # 开环：按目标速率发送请求，与响应完成无关
+
+# 开环模式下的到达过程
+ARRIVAL_CONSTANT = "constant"  # 恒定间隔
+ARRIVAL_POISSON = "poisson"    # 泊松过程（指数分布间隔）
+
+# 持续时长模式下的prompt取用顺序
+PROMPT_ORDER_CYCLE = "cycle"    # 按顺序循环使用
+PROMPT_ORDER_RANDOM = "random"  # 每轮随机重新抽样
+
+
+@dataclass
+class LoadProfile:
+    """负载配置数据类"""
+    mode: str = LOAD_MODE_CLOSED
+    arrival: str = ARRIVAL_CONSTANT
+    rate: float = 1.0  # 开环模式目标请求速率（请求/秒）
+    seed: Optional[int] = None  # 随机种子，便于复现泊松到达序列和prompt抽样
+    duration: float = 0.0  # 持续时长（秒），0表示每个数据集按并发数执行一轮后结束
+    warmup: float = 0.0  # 预热时长（秒），预热期间发出的请求不计入统计
+    bucket_interval: float = 10.0  # 按时间分段统计的区间长度（秒）
+    prompt_order: str = PROMPT_ORDER_CYCLE  # 持续时长模式下的prompt取用顺序
+
+    def __post_init__(self):
+        if self.mode not in (LOAD_MODE_CLOSED, LOAD_MODE_OPEN):
+            raise ValueError(f"不支持的负载模式: {self.mode}")
+        if self.arrival not in (ARRIVAL_CONSTANT, ARRIVAL_POISSON):
+            raise ValueError(f"不支持的到达过程: {self.arrival}")
+        if self.mode == LOAD_MODE_OPEN and self.rate <= 0:
+            raise ValueError("开环模式的目标速率必须大于0")
+        if self.prompt_order not in (PROMPT_ORDER_CYCLE, PROMPT_ORDER_RANDOM):
+            raise ValueError(f"不支持的prompt取用顺序: {self.prompt_order}")
+        if self.duration < 0 or self.warmup < 0:
+            raise ValueError("持续时长和预热时长不能为负数")
+        if self.duration > 0 and self.warmup >= self.duration:
+            raise ValueError("预热时长必须小于持续时长")
+        if self.bucket_interval <= 0:
+            raise ValueError("分段统计区间长度必须大于0")
+
+    @property
+    def is_open_loop(self) -> bool:
+        """是否为开环模式"""
+        return self.mode == LOAD_MODE_OPEN
+
+    @property
+    def is_duration_based(self) -> bool:
+        """是否为持续时长模式"""
+        return self.duration > 0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LoadProfile":
+        """从字典创建负载配置，忽略未知字段"""
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in (data or {}).items() if k in names})
+
+    @classmethod
+    def from_config(cls) -> "LoadProfile":
+        """从全局配置test.load_profile创建负载配置"""
+        return cls.from_dict(config.get("test.load_profile", {}))
+
+
+def arrival_intervals(profile: LoadProfile) -> Iterator[float]:
+    """
+    生成开环模式下相邻请求的计划发送间隔（秒）
+
+    Args:
+        profile: 负载配置
+
+    Yields:
+        float: 与上一个请求的间隔
+    """
+    rng = random.Random(profile.seed)
+    mean_interval = 1.0 / profile.rate
+    while True:
+        if profile.arrival == ARRIVAL_POISSON:
+            yield rng.expovariate(profile.rate)
+        else:
+            yield mean_interval
+
+
+def prompt_stream(tasks: Sequence, profile: LoadProfile) -> Iterator[Tuple[str, str]]:
+    """
+    生成待发送的(数据集名称, prompt)序列
+
+    每一轮为每个数据集取并发数个prompt。非持续时长模式只生成一轮，
+    即每个数据集无放回随机抽样；持续时长模式无限生成，按prompt_order
+    循环使用或每轮重新抽样，由调用方在截止时间到达后停止取用。
+
+    Args:
+        tasks: 测试任务列表，需包含dataset_name、prompts和concurrency属性
+        profile: 负载配置
+
+    Yields:
+        Tuple[str, str]: (数据集名称, prompt)
+    """
+    rng = random.Random(profile.seed)
+    tasks = [task for task in tasks if task.prompts]
+    positions = {task.dataset_name: 0 for task in tasks}
+
+    while tasks:
+        for task in tasks:
+            count = task.concurrency
+            if not profile.is_duration_based:
+                count = min(count, len(task.prompts))
+                selected = rng.sample(task.prompts, count)
+            elif profile.prompt_order == PROMPT_ORDER_RANDOM:
+                selected = [rng.choice(task.prompts) for _ in range(count)]
+            else:
+                start = positions[task.dataset_name]
+                selected = [task.prompts[(start + i) % len(task.prompts)] for i in range(count)]
+                positions[task.dataset_name] = (start + count) % len(task.prompts)
+
+            for prompt in selected:
+                yield task.dataset_name, prompt
+
+        if not profile.is_duration_based:
+            return
@@ -0,0 +1,134 @@
+"""
+并发阶梯调度模块，定义逐级提升并发的测试计划及饱和拐点检测
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from src.utils.config import config
+
+
+@dataclass
+class ConcurrencyStep:
+    """单个并发阶梯"""
+    concurrency: int
+    hold: float  # 保持时长（秒）
+
+    def __post_init__(self):
+        if self.concurrency < 1:
+            raise ValueError("阶梯并发数必须大于0")
+        if self.hold <= 0:
+            raise ValueError("阶梯保持时长必须大于0")
+
+
+@dataclass
+class ConcurrencySchedule:
+    """并发阶梯调度数据类"""
+    steps: List[ConcurrencyStep] = field(default_factory=list)
+    # 吞吐扩展效率阈值：相对上一阶梯的吞吐增幅 / 并发增幅低于该值时认为吞吐已趋平
+    gain_threshold: float = 0.1
+    # p99延迟阈值（秒），0表示不按延迟判定
+    p99_threshold: float = 0.0
+
+    def __post_init__(self):
+        if not self.steps:
+            raise ValueError("并发阶梯调度至少需要一个阶梯")
+
+    @property
+    def total_duration(self) -> float:
+        """所有阶梯的总保持时长（秒）"""
+        return sum(step.hold for step in self.steps)
+
+    @classmethod
+    def linear(cls, start: int, stop: int, step: int, hold: float, **kwargs) -> "ConcurrencySchedule":
+        """创建线性递增的并发阶梯"""
+        if step < 1:
+            raise ValueError("线性阶梯的步长必须大于0")
+        levels = list(range(start, stop + 1, step))
+        return cls(steps=[ConcurrencyStep(level, hold) for level in levels], **kwargs)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ConcurrencySchedule":
+        """
+        从字典创建并发阶梯调度
+
+        支持两种形式：
+        - {"ramp": {"start": 1, "stop": 16, "step": 1}, "hold": 30}
+        - {"steps": [1, 2, 4, {"concurrency": 8, "hold": 60}], "hold": 30}
+        """
+        hold = data.get("hold", 30)
+        kwargs = {
+            "gain_threshold": data.get("gain_threshold", 0.1),
+            "p99_threshold": data.get("p99_threshold", 0.0)
+        }
+        ramp = data.get("ramp")
+        if ramp:
+            return cls.linear(ramp["start"], ramp["stop"], ramp.get("step", 1), hold, **kwargs)
+
+        steps = []
+        for item in data.get("steps", []):
+            if isinstance(item, dict):
+                steps.append(ConcurrencyStep(item["concurrency"], item.get("hold", hold)))
+            else:
+                steps.append(ConcurrencyStep(int(item), hold))
+        return cls(steps=steps, **kwargs)
+
+    @classmethod
+    def from_config(cls) -> Optional["ConcurrencySchedule"]:
+        """从全局配置test.schedule创建并发阶梯调度，未配置时返回None"""
+        data = config.get("test.schedule", {}) or {}
+        if not data.get("ramp") and not data.get("steps"):
+            return None
+        return cls.from_dict(data)
+
+
+def detect_knee(step_stats: List[Dict], gain_threshold: float,
+                p99_threshold: float = 0.0) -> Optional[Dict]:
+    """
+    检测吞吐饱和拐点
+
+    依次比较相邻阶梯，满足以下任一条件即认为到达拐点：
+    - 吞吐扩展效率（吞吐相对增幅 / 并发相对增幅）低于gain_threshold
+    - p99延迟超过p99_threshold
+
+    Args:
+        step_stats: 各阶梯统计，需包含concurrency、throughput和p99_latency
+        gain_threshold: 吞吐扩展效率阈值
+        p99_threshold: p99延迟阈值（秒），0表示不按延迟判定
+
+    Returns:
+        Optional[Dict]: 拐点信息，concurrency为仍然有效扩展的最后一个并发数；第一个阶梯就超过
+        p99阈值时没有更低的有效并发数，concurrency为第一个阶梯的并发数且saturated_at_first_step为True，
+        表示饱和点不高于该并发数，应从更低的并发数重新测试。未检测到拐点时返回None
+    """
+    for index, stats in enumerate(step_stats):
+        if p99_threshold > 0 and stats["p99_latency"] > p99_threshold:
+            detail = f"并发 {stats['concurrency']} 时p99延迟 {stats['p99_latency']:.3f}s 超过阈值 {p99_threshold}s"
+            if index == 0:
+                detail += "，第一个阶梯已饱和"
+            return {
+                "concurrency": step_stats[max(index - 1, 0)]["concurrency"],
+                "step_index": index,
+                "reason": "p99_latency",
+                "saturated_at_first_step": index == 0,
+                "detail": detail
+            }
+
+        if index == 0:
+            continue
+        previous = step_stats[index - 1]
+        if previous["throughput"] <= 0 or stats["concurrency"] <= previous["concurrency"]:
+            continue
+        throughput_gain = stats["throughput"] / previous["throughput"] - 1
+        concurrency_gain = stats["concurrency"] / previous["concurrency"] - 1
+        efficiency = throughput_gain / concurrency_gain
+        if efficiency < gain_threshold:
+            return {
+                "concurrency": previous["concurrency"],
+                "step_index": index,
+                "reason": "throughput_flat",
+                "saturated_at_first_step": False,
+                "detail": (
+                    f"并发 {previous['concurrency']} -> {stats['concurrency']} 时吞吐仅增长 "
+                    f"{throughput_gain * 100:.1f}%（扩展效率 {efficiency:.2f}）"
+                )
+            }
+    return None
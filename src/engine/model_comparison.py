@@ -0,0 +1,179 @@
+"""
+多模型对比测试模块，同一次运行中以相同的prompt序列驱动多个模型配置并比较结果
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from src.engine.latency_histogram import METRIC_E2E, METRIC_TPOT, METRIC_TTFT
+from src.utils.logger import setup_logger
+
+logger = setup_logger("model_comparison")
+
+# 对比方式
+COMPARE_PARALLEL = "parallel"        # 每个prompt同时发给所有模型，各模型各自占用完整的并发数/速率
+COMPARE_INTERLEAVED = "interleaved"  # 各模型的请求交错进入同一个发送序列，共享并发数/速率
+COMPARE_MODES = (COMPARE_PARALLEL, COMPARE_INTERLEAVED)
+
+# 对比指标及其方向，True表示越大越好
+COMPARISON_METRICS = (
+    ("success_rate", True),
+    ("throughput", True),
+    ("token_throughput", True),
+    ("avg_latency", False),
+    ("p50_latency", False),
+    ("p90_latency", False),
+    ("p99_latency", False),
+    ("p50_ttft", False),
+    ("p99_ttft", False),
+    ("p50_tpot", False),
+)
+
+
+def model_labels(model_configs: Sequence[Dict]) -> List[str]:
+    """
+    为每个模型配置生成唯一标签
+
+    优先使用配置名称，其次是模型名称，重复时追加序号，如"llama3"和"llama3#2"。
+    """
+    labels = []
+    for index, model_config in enumerate(model_configs):
+        base = model_config.get("name") or model_config.get("model") or f"model{index + 1}"
+        label = base
+        suffix = 2
+        while label in labels:
+            label = f"{base}#{suffix}"
+            suffix += 1
+        labels.append(label)
+    return labels
+
+
+def interleave_prompts(prompts: Iterable[Tuple[str, str]], count: int) -> Iterator[Tuple[str, str, int]]:
+    """
+    交错模式的发送序列：每个prompt依次为各模型生成一项(数据集名称, prompt, 模型下标)
+
+    每轮轮换起始模型，避免某个模型总是先于其他模型发送。
+    """
+    for round_index, (dataset_name, prompt) in enumerate(prompts):
+        for offset in range(count):
+            yield dataset_name, prompt, (round_index + offset) % count
+
+
+def summarize_progress(progress, elapsed: float) -> Dict[str, float]:
+    """
+    汇总单个模型的吞吐和延迟指标
+
+    Args:
+        progress: 该模型的TestProgress
+        elapsed: 统计窗口时长（秒），各模型使用同一个窗口，吞吐才能直接比较
+
+    Returns:
+        Dict[str, float]: COMPARISON_METRICS中的各项指标，延迟单位为秒
+    """
+    total_tokens = sum(stats["total_tokens"] for stats in progress.dataset_stats.values())
+    percentiles = progress.latency.percentiles((50, 90, 99))
+    return {
+        "total": progress.completed_tasks,
+        "successful": progress.successful_tasks,
+        "failed": progress.failed_tasks,
+        "success_rate": progress.successful_tasks / progress.completed_tasks if progress.completed_tasks else 0.0,
+        "throughput": progress.successful_tasks / elapsed if elapsed > 0 else 0.0,
+        "token_throughput": total_tokens / elapsed if elapsed > 0 else 0.0,
+        "avg_latency": progress.avg_e2e_latency,
+        "p50_latency": percentiles[METRIC_E2E]["p50"],
+        "p90_latency": percentiles[METRIC_E2E]["p90"],
+        "p99_latency": percentiles[METRIC_E2E]["p99"],
+        "p50_ttft": percentiles[METRIC_TTFT]["p50"],
+        "p99_ttft": percentiles[METRIC_TTFT]["p99"],
+        "p50_tpot": percentiles[METRIC_TPOT]["p50"],
+    }
+
+
+def comparison_deltas(summaries: Dict[str, Dict[str, float]],
+                      baseline: Optional[str] = None) -> List[Dict]:
+    """
+    计算各模型相对基准模型的差值
+
+    Args:
+        summaries: 模型标签 -> summarize_progress()的结果，按配置顺序排列
+        baseline: 基准模型标签，默认为第一个模型
+
+    Returns:
+        List[Dict]: 每个指标、每个非基准模型一行，包含基准值、对比值、差值、相对变化和是否更优
+    """
+    if not summaries:
+        return []
+    baseline = baseline or next(iter(summaries))
+    base = summaries[baseline]
+    rows = []
+    for metric, higher_is_better in COMPARISON_METRICS:
+        for label, summary in summaries.items():
+            if label == baseline:
+                continue
+            delta = summary[metric] - base[metric]
+            rows.append({
+                "metric": metric,
+                "model": label,
+                "baseline": baseline,
+                "baseline_value": base[metric],
+                "value": summary[metric],
+                "delta": delta,
+                "delta_pct": delta / base[metric] * 100 if base[metric] else 0.0,
+                "better": delta > 0 if higher_is_better else delta < 0,
+            })
+    return rows
+
+
+def build_comparison(model_progress: Dict, mode: str, elapsed: float) -> Dict:
+    """
+    生成对比结果
+
+    Args:
+        model_progress: 模型标签 -> TestProgress，第一个模型作为基准
+        mode: 对比方式
+        elapsed: 统计窗口时长（秒）
+
+    Returns:
+        Dict: {"mode", "baseline", "models": 各模型汇总, "deltas": 相对基准的差值}
+    """
+    summaries = {label: summarize_progress(progress, elapsed) for label, progress in model_progress.items()}
+    return {
+        "mode": mode,
+        "baseline": next(iter(summaries), ""),
+        "models": summaries,
+        "deltas": comparison_deltas(summaries)
+    }
+
+
+def format_comparison_table(comparison: Dict) -> str:
+    """
+    将对比结果格式化为文本表格，用于测试日志
+
+    Args:
+        comparison: {"mode": ..., "baseline": ..., "models": 各模型汇总, "deltas": comparison_deltas()}
+    """
+    labels = list(comparison["models"])
+    width = max([12] + [len(label) for label in labels])
+    lines = ["指标".ljust(16) + "".join(label.rjust(width + 2) for label in labels)]
+    for metric, _ in COMPARISON_METRICS:
+        cells = []
+        for label in labels:
+            value = comparison["models"][label][metric]
+            cells.append(_format_value(metric, value).rjust(width + 2))
+        lines.append(metric.ljust(16) + "".join(cells))
+    lines.append("")
+    lines.append(f"相对 {comparison['baseline']} 的变化:")
+    for row in comparison["deltas"]:
+        lines.append(
+            f"- {row['model']} {row['metric']}: {_format_value(row['metric'], row['value'])} "
+            f"({row['delta_pct']:+.1f}%, {'更优' if row['better'] else '更差' if row['delta'] else '持平'})"
+        )
+    return "\n".join(lines)
+
+
+def _format_value(metric: str, value: float) -> str:
+    """按指标类型格式化数值，延迟以毫秒显示"""
+    if metric == "success_rate":
+        return f"{value * 100:.1f}%"
+    if metric == "throughput":
+        return f"{value:.2f}/s"
+    if metric == "token_throughput":
+        return f"{value:.1f}tok/s"
+    return f"{value * 1000:.1f}ms"
@@ -0,0 +1,233 @@
+"""
+多进程负载生成模块，将请求分片到多个进程，每个进程拥有独立的事件循环和会话
+"""
+import asyncio
+import dataclasses
+import multiprocessing
+import queue
+import time
+import traceback
+from typing import Dict, List, Optional, Tuple
+from src.engine.load_profile import LoadProfile, prompt_stream
+from src.engine.test_manager import TestManager, TestTask
+from src.engine.workload import WorkloadProfile
+from src.utils.cancel_token import CancelToken
+from src.utils.config import config
+from src.utils.logger import get_console_level, set_console_level, setup_logger
+
+logger = setup_logger("multiprocess_runner")
+
+# 子进程消息类型
+MSG_READY = "ready"    # 子进程初始化完成，等待统一开始
+MSG_REPORT = "report"  # 周期性上报累计快照和新完成的结果
+MSG_DONE = "done"      # 子进程正常结束
+MSG_ERROR = "error"    # 子进程异常结束
+
+
+def shard_tasks(tasks: List[TestTask], load_profile: LoadProfile,
+                processes: int) -> List[Tuple[List[TestTask], LoadProfile]]:
+    """
+    将测试任务分片到多个进程
+
+    - 固定任务数模式：先按单进程的方式选出全部prompt，再轮流分配给各进程
+    - 持续时长闭环模式：各数据集的并发数均分到各进程，prompt按下标交错分配
+    - 开环模式：每个进程的目标速率为总速率的1/N，N个泊松过程叠加后仍是总速率的泊松过程
+
+    Args:
+        tasks: 测试任务列表
+        load_profile: 负载配置
+        processes: 进程数
+
+    Returns:
+        List[Tuple[List[TestTask], LoadProfile]]: 每个进程的任务列表和负载配置，空分片会被丢弃
+    """
+    shards = []
+    # 固定任务数模式只抽样一次，未指定种子时各分片分别抽样会重复或遗漏prompt
+    selected_all = [] if load_profile.is_duration_based else list(prompt_stream(tasks, load_profile))
+    for index in range(processes):
+        changes = {}
+        if load_profile.is_open_loop:
+            changes["rate"] = load_profile.rate / processes
+        if load_profile.seed is not None:
+            changes["seed"] = load_profile.seed + index
+        profile = dataclasses.replace(load_profile, **changes)
+
+        shard = []
+        if not load_profile.is_duration_based:
+            selected = selected_all[index::processes]
+            for task in tasks:
+                prompts = [prompt for name, prompt in selected if name == task.dataset_name]
+                if prompts:
+                    shard.append(TestTask(task.dataset_name, prompts, task.weight, len(prompts)))
+        else:
+            for task in tasks:
+                if load_profile.is_open_loop:
+                    # 开环模式下并发数只决定各数据集的混合比例
+                    concurrency = task.concurrency
+                else:
+                    concurrency = task.concurrency // processes + (1 if index < task.concurrency % processes else 0)
+                prompts = task.prompts[index::processes] if len(task.prompts) >= processes else task.prompts
+                if concurrency > 0 and prompts:
+                    shard.append(TestTask(task.dataset_name, prompts, task.weight, concurrency))
+
+        if shard:
+            shards.append((shard, profile))
+    return shards
+
+
+def _shard_main(shard_id: str, tasks: List[TestTask], load_profile: LoadProfile,
+                model_config: dict, message_queue, start_event, stop_event,
+                report_interval: float, workload: Optional[WorkloadProfile] = None,
+                config_overrides: Optional[dict] = None, console_level: Optional[int] = None):
+    """子进程入口"""
+    try:
+        # spawn启动的子进程重新读取配置文件、重新创建日志记录器，父进程的临时覆盖和控制台日志级别需要重新应用
+        if console_level is not None:
+            set_console_level(console_level)
+        config.apply_overrides(config_overrides)
+        asyncio.run(_run_shard(shard_id, tasks, load_profile, model_config,
+                               message_queue, start_event, stop_event, report_interval, workload))
+    except Exception as e:
+        message_queue.put((MSG_ERROR, shard_id, f"{e}\n{traceback.format_exc()}"))
+
+
+async def _run_shard(shard_id: str, tasks: List[TestTask], load_profile: LoadProfile,
+                     model_config: dict, message_queue, start_event, stop_event,
+                     report_interval: float, workload: Optional[WorkloadProfile] = None):
+    """在子进程中运行一个分片，并按固定间隔上报进度"""
+    manager = TestManager()
+    pending: List[Tuple[str, object]] = []
+    manager.result_received.connect(lambda dataset_name, response: pending.append((dataset_name, response)))
+    last_report = 0.0
+
+    def report(progress):
+        nonlocal last_report
+        now = time.monotonic()
+        if now - last_report < report_interval:
+            return
+        last_report = now
+        message_queue.put((MSG_REPORT, shard_id, progress.to_snapshot(), list(pending)))
+        pending.clear()
+
+    # 停止事件可能在run_test标记运行状态之前到达，此时stop_test()会被随后的运行状态覆盖，
+    # 因此停止请求通过传给run_test的取消令牌传递
+    cancel_token = CancelToken()
+
+    async def watch_stop():
+        # 长请求期间可能没有进度回调，单独轮询停止事件
+        while not stop_event.is_set():
+            await asyncio.sleep(0.1)
+        cancel_token.cancel()
+        manager.stop_test()
+
+    message_queue.put((MSG_READY, shard_id))
+    while not start_event.wait(0.1):
+        if stop_event.is_set():
+            return
+    if stop_event.is_set():
+        # 父进程在统一开始的同时请求停止
+        cancel_token.cancel()
+
+    watcher = asyncio.create_task(watch_stop())
+    try:
+        await manager.run_test(shard_id, tasks, report, model_config, load_profile, processes=1,
+                               workload=workload, cancel_token=cancel_token)
+    finally:
+        watcher.cancel()
+    message_queue.put((MSG_DONE, shard_id, manager.progress.to_snapshot(), list(pending)))
+
+
+async def run_multiprocess(manager: TestManager, test_task_id: str, tasks: List[TestTask],
+                           load_profile: LoadProfile, processes: int,
+                           progress_callback=None, model_config: Optional[dict] = None,
+                           report_interval: float = 0.2):
+    """
+    以多进程方式运行测试，并将各进程的计数和直方图实时合并到manager.progress
+
+    Args:
+        manager: 父进程的测试管理器，进度和结果信号由它发出
+        test_task_id: 测试任务ID，各子进程使用"{test_task_id}_p{序号}"作为自己的任务ID
+        tasks: 测试任务列表
+        load_profile: 负载配置
+        processes: 进程数
+        progress_callback: 进度回调函数
+        model_config: 模型配置
+        report_interval: 子进程上报间隔（秒）
+    """
+    # 父进程可能运行在带有Qt线程的环境中，使用spawn避免fork带来的锁状态问题
+    context = multiprocessing.get_context("spawn")
+    message_queue = context.Queue()
+    start_event = context.Event()
+    stop_event = context.Event()
+
+    shards = shard_tasks(tasks, load_profile, processes)
+    workers = {}
+    for index, (shard, profile) in enumerate(shards):
+        shard_id = f"{test_task_id}_p{index}"
+        process = context.Process(
+            target=_shard_main,
+            args=(shard_id, shard, profile, model_config, message_queue,
+                  start_event, stop_event, report_interval, manager.workload, config.overrides,
+                  get_console_level()),
+            name=f"load-shard-{index}",
+            daemon=True
+        )
+        process.start()
+        workers[shard_id] = process
+    logger.info(f"启动 {len(workers)} 个负载生成进程")
+
+    loop = asyncio.get_running_loop()
+    snapshots: Dict[str, Dict] = {}
+    ready = set()
+    finished = set()
+
+    def next_message():
+        try:
+            return message_queue.get(timeout=0.2)
+        except queue.Empty:
+            return None
+
+    try:
+        while len(finished) < len(workers):
+            if not manager.running:
+                stop_event.set()
+
+            message = await loop.run_in_executor(None, next_message)
+            if message is None:
+                # 子进程异常退出且没有发出结束消息
+                for shard_id, process in workers.items():
+                    if shard_id not in finished and not process.is_alive():
+                        logger.error(f"负载生成进程 {shard_id} 异常退出, exitcode={process.exitcode}")
+                        finished.add(shard_id)
+                continue
+
+            kind, shard_id = message[0], message[1]
+            if kind == MSG_READY:
+                ready.add(shard_id)
+                if len(ready) == len(workers):
+                    # 所有进程就绪后统一开始，持续时长和预热窗口在各进程间对齐
+                    manager.progress.start_time = time.perf_counter()
+                    start_event.set()
+                continue
+            if kind == MSG_ERROR:
+                logger.error(f"负载生成进程 {shard_id} 执行失败: {message[2]}")
+                manager.progress.last_error = message[2].splitlines()[0]
+                finished.add(shard_id)
+                continue
+
+            snapshot, results = message[2], message[3]
+            snapshots[shard_id] = snapshot
+            if kind == MSG_DONE:
+                finished.add(shard_id)
+
+            manager.progress.merge_snapshots(list(snapshots.values()))
+            for dataset_name, response in results:
+                manager.result_received.emit(dataset_name, response)
+            if progress_callback:
+                progress_callback(manager.progress)
+    finally:
+        stop_event.set()
+        for process in workers.values():
+            await loop.run_in_executor(None, process.join, 5)
+            if process.is_alive():
+                process.terminate()
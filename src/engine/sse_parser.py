@@ -0,0 +1,184 @@
+"""
+SSE流式响应解析模块，直接在字节上增量解析，避免逐行解码字符串
+
+JSON解析优先使用orjson（可选依赖，pip install orjson），直接解析字节，单核吞吐约为逐行解析的1.7倍；
+未安装时回退到标准库json，直接调用json的C扫描器，省去json.loads的编码检测和包装开销，
+python -m src.engine.benchmark_sse_parser中比逐行解析快约一到两成。
+"""
+import asyncio
+import json
+import json.scanner
+from typing import Any, Dict, List, Optional, Tuple
+
+# json.loads最终调用的C扫描器，返回(对象, 结束位置)，起始位置不是JSON值时抛出StopIteration
+_scan_once = json.scanner.make_scanner(json.JSONDecoder())
+
+
+def _json_loads(data: bytes) -> Any:
+    """
+    标准库json的解析函数
+
+    json.loads(bytes)每次调用都要检测编码，并经过decode、raw_decode两层包装，
+    事件数据总是UTF-8，这里解码后直接调用扫描器，再检查JSON之后没有多余内容。
+    """
+    text = data.decode("utf-8")
+    try:
+        obj, end = _scan_once(text, 0)
+    except StopIteration:
+        # 带前导空白等少见情况交给json.loads处理，解析失败时由它抛出异常
+        return json.loads(text)
+    if end != len(text) and text[end:].strip():
+        raise ValueError(f"JSON之后有多余数据: 位置 {end}")
+    return obj
+
+
+try:
+    import orjson
+    _loads = orjson.loads
+    JSON_BACKEND = "orjson"
+    _JSON_ERRORS = (orjson.JSONDecodeError, ValueError)
+except ImportError:
+    _loads = _json_loads
+    JSON_BACKEND = "json"
+    _JSON_ERRORS = (ValueError,)
+
+DONE_PAYLOAD = b"[DONE]"
+
+# 收到[DONE]后读取剩余响应体的最长等待时间（秒）
+DRAIN_TIMEOUT = 1.0
+
+
+class SSEParser:
+    """
+    增量SSE解析器
+
+    按任意边界切分的字节块都可以直接喂入，返回已完整接收的事件数据。
+    同一事件的多行data以换行拼接，注释行和data以外的字段被忽略。
+    data行为[DONE]时立即结束，不要求其后有空行，之前尚未结束的事件先行返回。
+    收到[DONE]后done为True，调用方应停止读取，之后喂入的数据被忽略。
+    """
+
+    def __init__(self):
+        self._remainder = b""
+        self._data_lines: List[bytes] = []
+        self.done = False  # 是否已收到[DONE]
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """
+        喂入一个字节块
+
+        Args:
+            chunk: 从响应体读到的原始字节
+
+        Returns:
+            List[bytes]: 本次完整接收的事件数据，不含[DONE]
+        """
+        if self.done:
+            return []
+        if self._remainder:
+            chunk = self._remainder + chunk
+        # 按行切分在C层完成，最后一段可能是不完整的行，留到下次
+        lines = chunk.split(b"\n")
+        self._remainder = lines.pop()
+        events = []
+        for line in lines:
+            self._handle_line(line, events)
+        return events
+
+    def flush(self) -> List[bytes]:
+        """流结束时调用，返回缓冲区中尚未以空行结束的事件"""
+        events = []
+        if self.done:
+            return events
+        if self._remainder:
+            self._handle_line(self._remainder, events)
+            self._remainder = b""
+        self._dispatch(events)
+        return events
+
+    def _handle_line(self, line: bytes, events: List[bytes]):
+        if line[-1:] == b"\r":
+            line = line[:-1]
+        if not line:
+            if self._data_lines:
+                self._dispatch(events)
+        elif line[:5] == b"data:":
+            data = line[6:] if line[5:6] == b" " else line[5:]
+            if data == DONE_PAYLOAD:
+                # 部分服务端在[DONE]之前不输出空行，逐行识别结束标记
+                self._dispatch(events)
+                self.done = True
+            else:
+                self._data_lines.append(data)
+        # 其余为注释行(":"开头)或event/id/retry字段，压测只关心data
+
+    def _dispatch(self, events: List[bytes]):
+        data_lines = self._data_lines
+        if not data_lines:
+            return
+        data = data_lines[0] if len(data_lines) == 1 else b"\n".join(data_lines)
+        self._data_lines = []
+        events.append(data)
+
+
+def decode_event(data: bytes) -> List[Dict[str, Any]]:
+    """
+    解析一个事件的JSON数据
+
+    部分服务端在相邻data行之间不输出空行，多行数据整体解析失败时再逐行解析。
+
+    Args:
+        data: SSEParser返回的事件数据
+
+    Returns:
+        List[Dict[str, Any]]: 解析出的JSON对象，无法解析的部分被跳过
+    """
+    try:
+        return [_loads(data)]
+    except _JSON_ERRORS:
+        if b"\n" not in data:
+            return []
+    decoded = []
+    for line in data.split(b"\n"):
+        if not line or line == DONE_PAYLOAD:
+            continue
+        try:
+            decoded.append(_loads(line))
+        except _JSON_ERRORS:
+            continue
+    return decoded
+
+
+def extract_delta(event: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    从OpenAI兼容的流式事件中取出增量文本和usage
+
+    Returns:
+        Tuple[str, Optional[Dict[str, Any]]]: (增量文本, usage)，支持delta和text两种格式
+    """
+    choices = event.get("choices")
+    content = ""
+    if choices:
+        choice = choices[0]
+        delta = choice.get("delta")
+        content = (delta.get("content") if delta else None) or choice.get("text") or ""
+    return content, event.get("usage")
+
+
+async def drain_stream(response, timeout: float = DRAIN_TIMEOUT):
+    """
+    收到[DONE]后丢弃剩余的响应体
+
+    响应体没有读完时aiohttp会关闭连接而不是放回连接池。[DONE]之后通常只剩分块编码的结束标记，
+    在记录完延迟之后读完即可复用连接；服务端迟迟不结束响应时直接关闭连接。
+
+    Args:
+        response: aiohttp响应
+        timeout: 最长等待时间（秒）
+    """
+    if response.content.at_eof():
+        return
+    try:
+        await asyncio.wait_for(response.content.read(), timeout)
+    except Exception:
+        response.close()
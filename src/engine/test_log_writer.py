@@ -0,0 +1,131 @@
+"""
+测试日志写入模块，在后台线程中批量写入结构化JSONL日志
+"""
+import json
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from src.utils.config import config
+from src.utils.logger import setup_logger
+
+logger = setup_logger("test_log_writer")
+
+# 日志详细程度，数值越大记录的事件越多
+LOG_LEVEL_QUIET = 0    # 只记录测试开始/结束和错误
+LOG_LEVEL_NORMAL = 1   # 额外记录每个请求的结果
+LOG_LEVEL_VERBOSE = 2  # 额外记录请求开始、工作协程状态和进度更新
+
+LOG_LEVELS = {
+    "quiet": LOG_LEVEL_QUIET,
+    "normal": LOG_LEVEL_NORMAL,
+    "verbose": LOG_LEVEL_VERBOSE,
+}
+
+# 停止信号
+_STOP = object()
+
+
+class TestLogWriter:
+    """
+    测试日志写入器
+
+    调用方每条日志只做一次队列写入，后台线程按批次或时间间隔合并写入文件，
+    文件在整个测试期间只打开一次。
+    """
+
+    def __init__(self, log_file: str, verbosity: Optional[str] = None,
+                 flush_interval: Optional[float] = None, batch_size: Optional[int] = None):
+        """
+        初始化日志写入器并启动后台线程
+
+        Args:
+            log_file: JSONL日志文件路径
+            verbosity: 详细程度 quiet/normal/verbose，默认读取test.log.verbosity
+            flush_interval: 最长刷新间隔（秒），默认读取test.log.flush_interval
+            batch_size: 单次最多合并写入的条数，默认读取test.log.batch_size
+        """
+        verbosity = verbosity or config.get("test.log.verbosity", "normal")
+        if verbosity not in LOG_LEVELS:
+            raise ValueError(f"不支持的日志详细程度: {verbosity}")
+
+        self.log_file = log_file
+        self.level = LOG_LEVELS[verbosity]
+        self.flush_interval = flush_interval or config.get("test.log.flush_interval", 0.5)
+        self.batch_size = batch_size or config.get("test.log.batch_size", 512)
+        self.dropped = 0
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="test-log-writer", daemon=True)
+        self._thread.start()
+
+    def enabled(self, level: int) -> bool:
+        """判断指定级别的日志是否会被记录，便于调用方跳过昂贵的字段构造"""
+        return level <= self.level
+
+    def log(self, event: str, level: int = LOG_LEVEL_NORMAL, **fields: Any):
+        """
+        记录一条日志
+
+        Args:
+            event: 事件名称
+            level: 事件级别，高于当前详细程度时直接丢弃
+            **fields: 事件字段，需可JSON序列化
+        """
+        if level > self.level:
+            return
+        if self._closed:
+            self.dropped += 1
+            return
+        self._queue.put({"ts": time.time(), "event": event, **fields})
+
+    def _run(self):
+        """后台写入线程"""
+        try:
+            with open(self.log_file, 'w', encoding='utf-8') as f:
+                while True:
+                    batch = self._next_batch()
+                    stop = batch and batch[-1] is _STOP
+                    if stop:
+                        batch.pop()
+                    if batch:
+                        f.write("".join(self._encode(record) for record in batch))
+                        f.flush()
+                    if stop:
+                        break
+        except Exception as e:
+            logger.error(f"测试日志写入失败: {e}", exc_info=True)
+
+    def _next_batch(self) -> List[Any]:
+        """阻塞等待第一条日志，然后在刷新间隔内尽量凑满一批"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while batch[-1] is not _STOP and len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _encode(record: Dict[str, Any]) -> str:
+        return json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+    def close(self, timeout: float = 5.0):
+        """写入剩余日志并停止后台线程"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"测试日志写入线程未在 {timeout}s 内结束: {self.log_file}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
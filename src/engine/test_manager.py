@@ -2,17 +2,31 @@
 测试管理器模块，负责管理并发测试任务
 """
 import asyncio
-import time
+import dataclasses
 import random
+import time
 import uuid
 import os
 import traceback
-from typing import Dict, List, Tuple, Optional, Callable
+from typing import Dict, List, Tuple, Optional, Callable, Iterable, Union
 from dataclasses import dataclass
-from PyQt6.QtCore import QObject, pyqtSignal
 from src.utils.logger import setup_logger
 from src.engine.api_client import APIClient, APIResponse
+from src.engine.load_balancer import STRATEGY_ROUND_ROBIN, resolve_endpoints
+from src.engine.load_profile import LoadProfile, arrival_intervals, prompt_stream
+from src.engine.load_schedule import ConcurrencySchedule, detect_knee
+from src.engine.model_comparison import (
+    COMPARE_INTERLEAVED, COMPARE_MODES, COMPARE_PARALLEL, build_comparison, format_comparison_table,
+    interleave_prompts, model_labels
+)
+from src.engine.latency_histogram import LatencyHistogram, LatencyHistogramSet, METRIC_E2E, METRIC_E2E_CORRECTED
+from src.engine.workload import ConversationSession, WorkloadProfile, apply_workload, prompt_text
+from src.engine.test_log_writer import TestLogWriter, LOG_LEVEL_QUIET, LOG_LEVEL_NORMAL, LOG_LEVEL_VERBOSE
+from src.utils.cancel_token import CancelToken
 from src.utils.config import config
+from src.utils.event_signal import Signal
+from src.utils.retry_policy import reset_circuit_breakers
+from src.utils.token_counter import token_counter
 
 logger = setup_logger("test_manager")
 
@@ -38,10 +52,172 @@ class TestProgress:
     last_error: str = ""
     dataset_stats: Dict[str, Dict] = None
     current_speed: float = 0.0  # 添加当前速度属性
+    avg_ttft: float = 0.0  # 平均首token延迟（秒）
+    avg_tpot: float = 0.0  # 平均每输出token耗时（秒）
+    avg_e2e_latency: float = 0.0  # 平均端到端延迟（秒）
+    load_mode: str = "closed"  # 负载模式: closed/open
+    target_rate: float = 0.0  # 开环模式目标请求速率（请求/秒）
+    dispatched_tasks: int = 0  # 开环模式已发送请求数
+    total_dispatch_lag: float = 0.0  # 实际发送相对计划发送的累计滞后（秒）
+    max_dispatch_lag: float = 0.0  # 最大发送滞后（秒）
+    actual_rate: float = 0.0  # 开环模式实际发送速率（请求/秒）
+    duration: float = 0.0  # 持续时长（秒），0表示按固定任务数执行
+    warmup: float = 0.0  # 预热时长（秒）
+    warmup_tasks: int = 0  # 预热期间完成、未计入统计的请求数
+    cancelled_tasks: int = 0  # 停止测试时被取消的在途请求数，同时计入失败数
+    retried_tasks: int = 0  # 经过重试的请求数
+    retry_attempts: int = 0  # 重试发送的总次数（不含首次）
+    total_retry_wait: float = 0.0  # 重试前退避等待的累计时长（秒）
+    shed_tasks: int = 0  # 被熔断器拒绝、未发送的请求数，同时计入失败数
+    start_time: float = 0.0  # 测试开始时刻（time.perf_counter）
+    bucket_interval: float = 0.0  # 分段统计区间长度（秒），0表示不分段
+    interval_stats: List[Dict] = None  # 按时间分段的吞吐和延迟统计
+    step_stats: List[Dict] = None  # 并发阶梯调度下各阶梯的吞吐和延迟统计
+    knee: Optional[Dict] = None  # 并发阶梯调度检测到的饱和拐点
+    latency: LatencyHistogramSet = None  # 总体延迟直方图（e2e/TTFT/TPOT/校正后e2e）
+    dataset_latency: Dict[str, LatencyHistogramSet] = None  # 各数据集的延迟直方图
+    retry_latency: LatencyHistogram = None  # 经过重试且最终成功的请求的总耗时（含退避），与单次尝试延迟分开统计
+    expected_interval: Optional[float] = None  # 闭环校正协调遗漏的期望发送间隔（秒），0表示取e2e中位数
+    replica_stats: Dict[str, Dict] = None  # 多副本时各端点的计数和累加值
+    replica_latency: Dict[str, LatencyHistogram] = None  # 各端点成功请求的e2e延迟直方图
+    comparison: Optional[Dict] = None  # 多模型对比测试中各模型的汇总和相对基准模型的差值
     
     def __post_init__(self):
         if self.dataset_stats is None:
             self.dataset_stats = {}
+        if self.interval_stats is None:
+            self.interval_stats = []
+        if self.step_stats is None:
+            self.step_stats = []
+        if self.latency is None:
+            self.latency = LatencyHistogramSet()
+        if self.dataset_latency is None:
+            self.dataset_latency = {}
+        if self.retry_latency is None:
+            self.retry_latency = LatencyHistogram()
+        if self.expected_interval is None:
+            self.expected_interval = config.get("test.coordinated_omission.expected_interval", 0.0)
+        if self.replica_stats is None:
+            self.replica_stats = {}
+        if self.replica_latency is None:
+            self.replica_latency = {}
+    
+    def latency_percentiles(self, dataset_name: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """
+        获取延迟百分位
+        
+        Args:
+            dataset_name: 数据集名称，未指定时返回总体百分位
+        
+        Returns:
+            Dict[str, Dict[str, float]]: 如{"e2e": {"p50": ..., "p999": ...}, "ttft": {...}, "tpot": {...},
+                "e2e_corrected": {...}}，e2e为原始延迟，e2e_corrected为校正协调遗漏后的延迟
+        """
+        histograms = self.latency if dataset_name is None else self.dataset_latency.get(dataset_name)
+        if histograms is None:
+            histograms = LatencyHistogramSet()
+        return histograms.percentiles(expected_interval=self.expected_interval)
+    
+    def _get_replica_stats(self, endpoint: str) -> Dict:
+        """获取端点统计，不存在时初始化"""
+        if endpoint not in self.replica_stats:
+            self.replica_stats[endpoint] = {
+                "total": 0,
+                "successful": 0,
+                "failed": 0,
+                "total_tokens": 0,
+                "total_e2e_latency": 0.0
+            }
+            self.replica_latency[endpoint] = LatencyHistogram()
+        return self.replica_stats[endpoint]
+    
+    def replica_summary(self) -> Dict[str, Dict]:
+        """
+        各端点的延迟和吞吐，慢副本不会被总体平均值掩盖
+        
+        Returns:
+            Dict[str, Dict]: 端点 -> 请求数、成功率、平均/p50/p99延迟（秒）、吞吐（请求/秒、token/秒）
+        """
+        elapsed = time.perf_counter() - self.measure_start if self.start_time else 0.0
+        summary = {}
+        for endpoint, stats in self.replica_stats.items():
+            successful = stats["successful"]
+            percentiles = self.replica_latency[endpoint].percentiles((50, 99))
+            summary[endpoint] = {
+                "total": stats["total"],
+                "successful": successful,
+                "failed": stats["failed"],
+                "success_rate": successful / stats["total"] if stats["total"] else 0.0,
+                "avg_latency": stats["total_e2e_latency"] / successful if successful else 0.0,
+                "p50": percentiles["p50"],
+                "p99": percentiles["p99"],
+                "throughput": successful / elapsed if elapsed > 0 else 0.0,
+                "token_throughput": stats["total_tokens"] / elapsed if elapsed > 0 else 0.0
+            }
+        return summary
+    
+    def correction_description(self) -> str:
+        """说明e2e_corrected的校正方式"""
+        if self.latency[METRIC_E2E_CORRECTED].count:
+            return "按计划发送时刻校正"
+        interval = self.expected_interval or self.latency[METRIC_E2E].percentile(50)
+        return f"按期望发送间隔 {interval * 1000:.1f}ms 校正"
+    
+    @property
+    def measure_start(self) -> float:
+        """统计窗口开始时刻（预热结束时刻）"""
+        return self.start_time + self.warmup
+    
+    def is_warmup(self, sent_at: float) -> bool:
+        """判断在sent_at时刻发出的请求是否属于预热期"""
+        return self.warmup > 0 and sent_at < self.measure_start
+    
+    def record_interval(self, completed_at: float, response: APIResponse):
+        """按完成时刻将请求计入对应的时间分段"""
+        if self.bucket_interval <= 0:
+            return
+        
+        index = max(0, int((completed_at - self.measure_start) / self.bucket_interval))
+        while len(self.interval_stats) <= index:
+            bucket_start = len(self.interval_stats) * self.bucket_interval
+            self.interval_stats.append({
+                "start": bucket_start,
+                "end": bucket_start + self.bucket_interval,
+                "total": 0,
+                "successful": 0,
+                "failed": 0,
+                "total_tokens": 0,
+                "total_time": 0.0,
+                "throughput": 0.0,
+                "token_throughput": 0.0,
+                "avg_response_time": 0.0
+            })
+        
+        bucket = self.interval_stats[index]
+        bucket["total"] += 1
+        if response.success:
+            bucket["successful"] += 1
+            bucket["total_tokens"] += response.total_tokens
+            bucket["total_time"] += response.duration
+            bucket["avg_response_time"] = bucket["total_time"] / bucket["successful"]
+        else:
+            bucket["failed"] += 1
+        # 吞吐按区间长度计算，便于各分段直接比较
+        bucket["throughput"] = bucket["successful"] / self.bucket_interval
+        bucket["token_throughput"] = bucket["total_tokens"] / self.bucket_interval
+    
+    @property
+    def avg_dispatch_lag(self) -> float:
+        """平均发送滞后（秒）"""
+        if self.dispatched_tasks == 0:
+            return 0.0
+        return self.total_dispatch_lag / self.dispatched_tasks
+    
+    def record_dispatch(self, lag: float):
+        """记录一次开环发送相对计划时间的滞后"""
+        self.dispatched_tasks += 1
+        self.total_dispatch_lag += lag
+        self.max_dispatch_lag = max(self.max_dispatch_lag, lag)
     
     @property
     def avg_speed(self) -> float:
@@ -50,16 +226,16 @@ class TestProgress:
     
     @property
     def progress_percentage(self) -> float:
-        """计算进度百分比"""
+        """计算进度百分比，持续时长模式按已运行时间计算"""
+        if self.duration > 0:
+            elapsed = time.perf_counter() - self.start_time
+            return min(100.0, elapsed / self.duration * 100)
         if self.total_tasks == 0:
             return 0.0
         return (self.completed_tasks / self.total_tasks) * 100
     
-    def update(self, dataset_name: str, response: APIResponse):
-        """更新进度"""
-        self.completed_tasks += 1
-        
-        # 确保数据集统计信息存在
+    def _get_dataset_stats(self, dataset_name: str) -> Dict:
+        """获取数据集统计信息，不存在时初始化"""
         if dataset_name not in self.dataset_stats:
             self.dataset_stats[dataset_name] = {
                 "total": 0,
@@ -69,53 +245,226 @@ class TestProgress:
                 "total_tokens": 0,
                 "total_chars": 0,
                 "current_speed": 0.0,
-                "error_count": 0  # 添加错误计数
+                "error_count": 0,  # 添加错误计数
+                "total_ttft": 0.0,
+                "total_tpot": 0.0,
+                "tpot_count": 0,
+                "total_e2e_latency": 0.0
             }
+        return self.dataset_stats[dataset_name]
+    
+    @staticmethod
+    def _refresh_dataset_averages(stats: Dict):
+        """根据累加值重新计算数据集平均值"""
+        if stats["successful"] > 0:
+            stats["avg_response_time"] = stats["total_time"] / stats["successful"]
+            stats["avg_generation_speed"] = stats["total_chars"] / stats["total_time"] if stats["total_time"] > 0 else 0
+            stats["avg_tps"] = stats["total_tokens"] / stats["total_time"] if stats["total_time"] > 0 else 0
+            stats["avg_ttft"] = stats["total_ttft"] / stats["successful"]
+            stats["avg_tpot"] = stats["total_tpot"] / stats["tpot_count"] if stats["tpot_count"] > 0 else 0
+            stats["avg_e2e_latency"] = stats["total_e2e_latency"] / stats["successful"]
+    
+    def _refresh_overall_averages(self):
+        """根据各数据集累加值重新计算总体平均值"""
+        if self.successful_tasks == 0:
+            return
         
-        stats = self.dataset_stats[dataset_name]
+        total_time = sum(s["total_time"] for s in self.dataset_stats.values() if s["successful"] > 0)
+        total_chars = sum(s["total_chars"] for s in self.dataset_stats.values())
+        total_tokens = sum(s["total_tokens"] for s in self.dataset_stats.values())
+        total_ttft = sum(s["total_ttft"] for s in self.dataset_stats.values())
+        total_tpot = sum(s["total_tpot"] for s in self.dataset_stats.values())
+        tpot_count = sum(s["tpot_count"] for s in self.dataset_stats.values())
+        total_e2e_latency = sum(s["total_e2e_latency"] for s in self.dataset_stats.values())
+        
+        self.avg_ttft = total_ttft / self.successful_tasks
+        self.avg_tpot = total_tpot / tpot_count if tpot_count > 0 else 0.0
+        self.avg_e2e_latency = total_e2e_latency / self.successful_tasks
+        
+        if total_time > 0:
+            self.avg_response_time = total_time / self.successful_tasks
+            self.avg_generation_speed = total_chars / total_time
+            self.avg_tps = total_tokens / total_time
+    
+    def update(self, dataset_name: str, response: APIResponse):
+        """更新进度"""
+        self.completed_tasks += 1
+        if self.duration > 0:
+            # 持续时长模式没有预先确定的任务数，总任务数随完成数增长
+            self.total_tasks = self.completed_tasks
+        
+        stats = self._get_dataset_stats(dataset_name)
         stats["total"] += 1
         
+        # 按端点统计，被熔断器拒绝的请求没有端点
+        if response.endpoint:
+            replica = self._get_replica_stats(response.endpoint)
+            replica["total"] += 1
+            if response.success:
+                replica["successful"] += 1
+                replica["total_tokens"] += response.total_tokens
+                replica["total_e2e_latency"] += response.e2e_latency
+                self.replica_latency[response.endpoint].record(response.e2e_latency)
+            else:
+                replica["failed"] += 1
+        
+        # 重试单独计数，延迟直方图只记录最后一次尝试，重试的总耗时另行记录
+        if response.attempts > 1:
+            self.retried_tasks += 1
+            self.retry_attempts += response.attempts - 1
+            self.total_retry_wait += response.retry_wait
+            if response.success:
+                self.retry_latency.record(response.total_latency)
+        
         if response.success:
             self.successful_tasks += 1
             stats["successful"] += 1
             stats["total_time"] += response.duration
             stats["total_tokens"] += response.total_tokens
             stats["total_chars"] += response.total_chars
+            stats["total_ttft"] += response.ttft
+            stats["total_e2e_latency"] += response.e2e_latency
+            # 只有输出多于一个token时TPOT才有意义
+            if response.tpot > 0:
+                stats["total_tpot"] += response.tpot
+                stats["tpot_count"] += 1
+            
+            # 记录延迟分布，均值之外还需要尾延迟；开环请求同时记录从计划发送时刻起算的延迟
+            self.latency.record(response.e2e_latency, response.ttft, response.tpot, response.corrected_latency)
+            if dataset_name not in self.dataset_latency:
+                self.dataset_latency[dataset_name] = LatencyHistogramSet()
+            self.dataset_latency[dataset_name].record(response.e2e_latency, response.ttft, response.tpot,
+                                                      response.corrected_latency)
             
             # 更新数据集平均值
-            if stats["successful"] > 0:
-                stats["avg_response_time"] = stats["total_time"] / stats["successful"]
-                stats["avg_generation_speed"] = stats["total_chars"] / stats["total_time"] if stats["total_time"] > 0 else 0
-                stats["avg_tps"] = stats["total_tokens"] / stats["total_time"] if stats["total_time"] > 0 else 0
-                stats["current_speed"] = response.generation_speed
-                self.current_speed = response.generation_speed  # 更新当前速度
+            self._refresh_dataset_averages(stats)
+            stats["current_speed"] = response.generation_speed
+            self.current_speed = response.generation_speed  # 更新当前速度
             
             # 更新总体平均值
-            total_time = sum(s["total_time"] for s in self.dataset_stats.values() if s["successful"] > 0)
-            total_chars = sum(s["total_chars"] for s in self.dataset_stats.values())
-            total_tokens = sum(s["total_tokens"] for s in self.dataset_stats.values())
-            
-            if total_time > 0:
-                self.avg_response_time = total_time / self.successful_tasks
-                self.avg_generation_speed = total_chars / total_time
-                self.avg_tps = total_tokens / total_time
+            self._refresh_overall_averages()
         else:
             self.failed_tasks += 1
             stats["failed"] += 1
             stats["error_count"] += 1  # 增加错误计数
             self.last_error = response.error_msg
+            if response.cancelled:
+                self.cancelled_tasks += 1
+            if response.shed:
+                self.shed_tasks += 1
+    
+    def to_snapshot(self) -> Dict:
+        """
+        导出可跨进程传递的累计统计快照
+        
+        Returns:
+            Dict: 计数、各数据集累加值、延迟直方图、开环发送和分段统计
+        """
+        return {
+            "completed_tasks": self.completed_tasks,
+            "successful_tasks": self.successful_tasks,
+            "failed_tasks": self.failed_tasks,
+            "warmup_tasks": self.warmup_tasks,
+            "cancelled_tasks": self.cancelled_tasks,
+            "retried_tasks": self.retried_tasks,
+            "retry_attempts": self.retry_attempts,
+            "total_retry_wait": self.total_retry_wait,
+            "shed_tasks": self.shed_tasks,
+            "retry_latency": self.retry_latency.to_dict(),
+            "replica_stats": {endpoint: dict(stats) for endpoint, stats in self.replica_stats.items()},
+            "replica_latency": {endpoint: hist.to_dict() for endpoint, hist in self.replica_latency.items()},
+            "last_error": self.last_error,
+            "current_speed": self.current_speed,
+            "dataset_stats": {name: dict(stats) for name, stats in self.dataset_stats.items()},
+            "latency": self.latency.to_dict(),
+            "dataset_latency": {name: hist.to_dict() for name, hist in self.dataset_latency.items()},
+            "dispatched_tasks": self.dispatched_tasks,
+            "total_dispatch_lag": self.total_dispatch_lag,
+            "max_dispatch_lag": self.max_dispatch_lag,
+            "actual_rate": self.actual_rate,
+            "interval_stats": [dict(bucket) for bucket in self.interval_stats]
+        }
+    
+    def merge_snapshots(self, snapshots: List[Dict]):
+        """
+        用多个快照的合计值覆盖当前统计，用于汇总多个进程的进度
+        
+        Args:
+            snapshots: 各进程最新的to_snapshot()结果
+        """
+        summed_keys = ("total", "successful", "failed", "total_time", "total_tokens", "total_chars",
+                       "error_count", "total_ttft", "total_tpot", "tpot_count", "total_e2e_latency")
+        self.completed_tasks = sum(snap["completed_tasks"] for snap in snapshots)
+        self.successful_tasks = sum(snap["successful_tasks"] for snap in snapshots)
+        self.failed_tasks = sum(snap["failed_tasks"] for snap in snapshots)
+        self.warmup_tasks = sum(snap["warmup_tasks"] for snap in snapshots)
+        self.cancelled_tasks = sum(snap.get("cancelled_tasks", 0) for snap in snapshots)
+        self.retried_tasks = sum(snap.get("retried_tasks", 0) for snap in snapshots)
+        self.retry_attempts = sum(snap.get("retry_attempts", 0) for snap in snapshots)
+        self.total_retry_wait = sum(snap.get("total_retry_wait", 0.0) for snap in snapshots)
+        self.shed_tasks = sum(snap.get("shed_tasks", 0) for snap in snapshots)
+        self.dispatched_tasks = sum(snap["dispatched_tasks"] for snap in snapshots)
+        self.total_dispatch_lag = sum(snap["total_dispatch_lag"] for snap in snapshots)
+        self.max_dispatch_lag = max((snap["max_dispatch_lag"] for snap in snapshots), default=0.0)
+        self.actual_rate = sum(snap["actual_rate"] for snap in snapshots)
+        self.last_error = next((snap["last_error"] for snap in snapshots if snap["last_error"]), self.last_error)
+        self.current_speed = sum(snap["current_speed"] for snap in snapshots) / len(snapshots) if snapshots else 0.0
+        if self.duration > 0:
+            self.total_tasks = self.completed_tasks
+        
+        self.dataset_stats = {}
+        self.latency = LatencyHistogramSet()
+        self.dataset_latency = {}
+        self.retry_latency = LatencyHistogram()
+        self.replica_stats = {}
+        self.replica_latency = {}
+        interval_stats = []
+        for snap in snapshots:
+            for name, child_stats in snap["dataset_stats"].items():
+                stats = self._get_dataset_stats(name)
+                for key in summed_keys:
+                    stats[key] += child_stats.get(key, 0)
+            self.latency.merge(LatencyHistogramSet.from_dict(snap["latency"]))
+            if snap.get("retry_latency"):
+                self.retry_latency.merge(LatencyHistogram.from_dict(snap["retry_latency"]))
+            for endpoint, child_stats in snap.get("replica_stats", {}).items():
+                replica = self._get_replica_stats(endpoint)
+                for key, value in child_stats.items():
+                    replica[key] += value
+                self.replica_latency[endpoint].merge(LatencyHistogram.from_dict(snap["replica_latency"][endpoint]))
+            for name, hist in snap["dataset_latency"].items():
+                self.dataset_latency.setdefault(name, LatencyHistogramSet()).merge(LatencyHistogramSet.from_dict(hist))
+            for index, child_bucket in enumerate(snap["interval_stats"]):
+                if index == len(interval_stats):
+                    interval_stats.append(dict(child_bucket))
+                    continue
+                bucket = interval_stats[index]
+                for key in ("total", "successful", "failed", "total_tokens", "total_time", "throughput", "token_throughput"):
+                    bucket[key] += child_bucket[key]
+                bucket["avg_response_time"] = bucket["total_time"] / bucket["successful"] if bucket["successful"] else 0.0
+        self.interval_stats = interval_stats
+        
+        for stats in self.dataset_stats.values():
+            self._refresh_dataset_averages(stats)
+        self._refresh_overall_averages()
 
-class TestManager(QObject):
-    """测试管理器类"""
-    # 定义信号
-    progress_updated = pyqtSignal(TestProgress)
-    result_received = pyqtSignal(str, APIResponse)
+class TestManager:
+    """
+    测试管理器类
+    
+    不依赖Qt，进度和结果通过回调信号发出：progress_updated(TestProgress)、result_received(str, APIResponse)。
+    图形界面由TestThread转发为Qt信号，命令行见src/cli.py。
+    """
     
     def __init__(self):
-        super().__init__()
+        self.progress_updated = Signal()
+        self.result_received = Signal()
         self.running = False
         self.test_task_id = None
         self.progress = None
+        self.model_progress: Dict[str, TestProgress] = {}  # 多模型对比测试中各模型的进度
+        self.workload = WorkloadProfile()  # 本次测试的请求形态
+        self.cancel_token: Optional[CancelToken] = None
     
     def _create_api_client(self, model_config: dict) -> APIClient:
         """创建API客户端"""
@@ -123,7 +472,11 @@ class TestManager(QObject):
         timeout = config.get("test.timeout", 10)
         retry_count = config.get("test.retry_count", 1)
         
-        return APIClient(
+        # 模型配置了多个副本时，请求按均衡策略分配到各端点
+        endpoints = resolve_endpoints(model_config)
+        balance_strategy = model_config.get("balance_strategy") or config.get("test.balance_strategy", STRATEGY_ROUND_ROBIN)
+        
+        api_client = APIClient(
             api_url=model_config["api_url"],
             api_key=model_config["api_key"],
             model=model_config["model"],
@@ -131,66 +484,32 @@ class TestManager(QObject):
             temperature=model_config.get("temperature", 0.7),
             top_p=model_config.get("top_p", 0.9),
             timeout=timeout,
-            retry_count=retry_count
+            retry_count=retry_count,
+            api_urls=endpoints[1:],
+            balance_strategy=balance_strategy
         )
+        api_client.cancel_token = self.cancel_token
+        return api_client
+    
+    def _start_running(self, cancel_token: Optional[CancelToken] = None):
+        """
+        标记测试开始，并将取消令牌绑定到当前事件循环
+        
+        未传入令牌时为本次测试新建；传入的令牌可能在测试开始前就已取消，此时测试不会发出请求。
+        """
+        # 熔断器按端点全局共享，每次测试重新按当前配置创建，不继承上一次测试的打开状态
+        reset_circuit_breakers()
+        self.cancel_token = cancel_token or CancelToken()
+        self.cancel_token.bind()
+        self.running = not self.cancel_token.cancelled
     
     def _update_progress(self, dataset_name: str, response: APIResponse, error_msg: str = ""):
         """更新测试进度"""
         try:
             logger.debug(f"[DEBUG] 开始更新测试进度: dataset={dataset_name}, success={response.success}")
-            self.progress.completed_tasks += 1
-            
-            # 确保数据集统计信息存在
-            if dataset_name not in self.progress.dataset_stats:
-                logger.debug(f"[DEBUG] 初始化数据集 {dataset_name} 的统计信息")
-                self.progress.dataset_stats[dataset_name] = {
-                    "total": 0,
-                    "successful": 0,
-                    "failed": 0,
-                    "total_time": 0.0,
-                    "total_tokens": 0,
-                    "total_chars": 0,
-                    "avg_response_time": 0.0,
-                    "avg_generation_speed": 0.0,
-                    "start_time": time.time()
-                }
-            
-            stats = self.progress.dataset_stats[dataset_name]
-            stats["total"] += 1
-            
-            if response.success:
-                logger.debug(f"[DEBUG] 成功任务: dataset={dataset_name}, duration={response.duration:.2f}s")
-                self.progress.successful_tasks += 1
-                stats["successful"] += 1
-                stats["total_time"] += response.duration
-                stats["total_tokens"] += response.total_tokens
-                stats["total_chars"] += response.total_chars
-                
-                # 更新数据集平均值
-                if stats["successful"] > 0:
-                    stats["avg_response_time"] = stats["total_time"] / stats["successful"]
-                    stats["avg_generation_speed"] = stats["total_chars"] / stats["total_time"] if stats["total_time"] > 0 else 0
-                    stats["avg_tps"] = stats["total_tokens"] / stats["total_time"] if stats["total_time"] > 0 else 0
-                    logger.debug(f"[DEBUG] 数据集 {dataset_name} 统计更新: avg_time={stats['avg_response_time']:.2f}s, speed={stats['avg_generation_speed']:.1f}字符/秒")
-                
-                # 更新总体平均值
-                n = self.progress.successful_tasks
-                if n > 0:
-                    self.progress.avg_response_time = (
-                        (self.progress.avg_response_time * (n - 1) + response.duration) / n
-                    )
-                    self.progress.avg_generation_speed = (
-                        (self.progress.avg_generation_speed * (n - 1) + response.generation_speed) / n
-                    )
-                    self.progress.avg_tps = (
-                        (self.progress.avg_tps * (n - 1) + response.total_tokens / response.duration) / n
-                    )
-                logger.debug(f"[DEBUG] 总体统计更新: avg_time={self.progress.avg_response_time:.2f}s, speed={self.progress.avg_generation_speed:.1f}字符/秒")
-            else:
-                logger.debug(f"[DEBUG] 失败任务: dataset={dataset_name}, error={error_msg or response.error_msg}")
-                self.progress.failed_tasks += 1
-                stats["failed"] += 1
-                self.progress.last_error = error_msg or response.error_msg
+            self.progress.update(dataset_name, response)
+            if not response.success and error_msg:
+                self.progress.last_error = error_msg
             
             # 发送进度更新信号
             progress_percent = self.progress.progress_percentage
@@ -206,90 +525,256 @@ class TestManager(QObject):
             logger.error(f"[ERROR] 更新进度时发生错误: {e}", exc_info=True)
             raise
     
+    async def _execute_task(self, worker_id: str, dataset_name: str, prompt: Union[str, List[Dict[str, str]]],
+                            result_queue: asyncio.Queue, api_client: APIClient,
+                            log_writer: TestLogWriter, intended_at: Optional[float] = None) -> APIResponse:
+        """
+        执行单个请求并将结果放入结果队列
+        
+        Args:
+            prompt: 单条用户消息或完整的消息列表
+            intended_at: 计划发送时刻（perf_counter），开环模式由发送计划给出；
+                闭环模式没有独立的计划，视为与实际发送时刻相同
+        
+        Returns:
+            APIResponse: 放入结果队列的响应
+        """
+        sent_at = time.perf_counter()
+        scheduled = intended_at is not None
+        if not scheduled:
+            intended_at = sent_at
+        try:
+            # 记录开始处理任务日志
+            if log_writer.enabled(LOG_LEVEL_VERBOSE):
+                log_writer.log("request_start", LOG_LEVEL_VERBOSE,
+                               worker=worker_id, dataset=dataset_name, prompt=prompt_text(prompt)[:100])
+            
+            # 停止测试后，超过宽限期仍未完成的请求会被取消并返回部分结果
+            with self.cancel_token.tracking():
+                response = await api_client.generate(prompt)
+            self._stamp_send_times(response, intended_at, sent_at, scheduled)
+            
+            # 记录任务完成日志
+            if response.success:
+                log_writer.log(
+                    "request_end", LOG_LEVEL_NORMAL,
+                    worker=worker_id, dataset=dataset_name, success=True,
+                    duration=response.duration, ttft=response.ttft, tpot=response.tpot,
+                    chars=response.total_chars, tokens=response.total_tokens, attempts=response.attempts
+                )
+            else:
+                log_writer.log("request_end", LOG_LEVEL_QUIET, worker=worker_id, dataset=dataset_name,
+                               success=False, error=response.error_msg, attempts=response.attempts,
+                               shed=response.shed)
+            
+            await result_queue.put((dataset_name, response, sent_at))
+        except asyncio.CancelledError:
+            if not self.cancel_token.cancelled:
+                raise
+            log_writer.log("request_cancelled", LOG_LEVEL_NORMAL, worker=worker_id, dataset=dataset_name)
+            response = APIResponse(success=False, error_msg="请求已取消", cancelled=True)
+            self._stamp_send_times(response, intended_at, sent_at, scheduled)
+            await result_queue.put((dataset_name, response, sent_at))
+        except Exception as e:
+            logger.error(f"任务处理失败: {e}", exc_info=True)
+            # 记录任务失败日志
+            log_writer.log("request_error", LOG_LEVEL_QUIET, worker=worker_id, dataset=dataset_name, error=str(e))
+            response = APIResponse(success=False, error_msg=str(e))
+            self._stamp_send_times(response, intended_at, sent_at, scheduled)
+            await result_queue.put((dataset_name, response, sent_at))
+        return response
+    
+    async def _execute_session(self, worker_id: str, dataset_name: str, session: ConversationSession,
+                               result_queue: asyncio.Queue, api_client: APIClient,
+                               log_writer: TestLogWriter, intended_at: Optional[float] = None,
+                               model_progress: Optional[TestProgress] = None):
+        """
+        逐轮执行多轮会话，每轮携带之前各轮的问题和模型的实际回答，每轮作为一个请求计入统计
+        
+        某一轮失败后会话历史不再完整，放弃剩余轮次，总任务数中扣除剩余轮次；多模型对比时
+        model_progress为执行该会话的模型的进度，同样扣除。开环模式只有第一轮有计划发送时刻，
+        后续各轮在收到回答并等待think_time后发送。
+        """
+        history: List[Dict[str, str]] = []
+        for turn in range(len(session.user_turns)):
+            if turn > 0 and self.workload.think_time > 0 and await self.cancel_token.sleep(self.workload.think_time):
+                break
+            if not self.running:
+                break
+            response = await self._execute_task(worker_id, dataset_name, session.messages(turn, history),
+                                                result_queue, api_client, log_writer,
+                                                intended_at if turn == 0 else None)
+            if not response.success:
+                skipped = len(session.user_turns) - turn - 1
+                if skipped and not self.progress.duration:
+                    self.progress.total_tasks -= skipped
+                    if model_progress is not None:
+                        model_progress.total_tasks -= skipped
+                log_writer.log("session_aborted", LOG_LEVEL_NORMAL, worker=worker_id, dataset=dataset_name,
+                               turn=turn, skipped=skipped)
+                break
+            session.add_reply(history, turn, response.response_text)
+    
+    def _stamp_send_times(self, response: APIResponse, intended_at: float, sent_at: float, scheduled: bool):
+        """
+        记录相对测试开始的计划/实际发送时刻
+        
+        有发送计划的请求以完成时刻减计划发送时刻作为校正后的延迟，发送滞后也计入用户感知的延迟；
+        闭环请求的校正延迟由直方图按期望发送间隔推算。
+        """
+        start = self.progress.start_time
+        response.intended_send_time = intended_at - start
+        response.send_time = sent_at - start
+        if scheduled and response.success:
+            latency = response.total_latency or response.e2e_latency
+            response.corrected_latency = latency + max(0.0, sent_at - intended_at)
+    
+    def _task_executor(self, result_queue: asyncio.Queue, api_client: APIClient,
+                       log_writer: TestLogWriter, model_progress: Optional[TestProgress] = None) -> Callable:
+        """创建执行函数，将(数据集名称, prompt)发往单个API客户端，model_progress为多模型对比时该模型的进度"""
+        async def execute(worker_id: str, item: Tuple[str, object], intended_at: Optional[float] = None):
+            dataset_name, prompt = item
+            if isinstance(prompt, ConversationSession):
+                await self._execute_session(worker_id, dataset_name, prompt, result_queue, api_client,
+                                            log_writer, intended_at, model_progress)
+            else:
+                await self._execute_task(worker_id, dataset_name, prompt, result_queue, api_client,
+                                         log_writer, intended_at)
+        return execute
+    
+    def _routing_executor(self, executors: List[Callable]) -> Callable:
+        """创建交错对比模式的执行函数，序列项为(数据集名称, prompt, 模型下标)，只发给对应的模型"""
+        async def execute(worker_id: str, item: Tuple[str, str, int], intended_at: Optional[float] = None):
+            dataset_name, prompt, index = item
+            await executors[index](worker_id, (dataset_name, prompt), intended_at)
+        return execute
+    
     async def _worker(self, worker_id: str, task_queue: asyncio.Queue,
-                     result_queue: asyncio.Queue, api_client: APIClient,
-                     log_file: str):
-        """工作协程"""
+                     execute: Callable, log_writer: TestLogWriter):
+        """工作协程，execute由_task_executor或_comparison_executor创建"""
         try:
             while True:
                 task = await task_queue.get()
                 if task is None:
                     logger.info(f"工作协程 {worker_id} 收到停止信号")
-                    # 记录工作协程停止日志
-                    with open(log_file, 'a', encoding='utf-8') as f:
-                        f.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {worker_id} 收到停止信号\n")
+                    log_writer.log("worker_stop", LOG_LEVEL_VERBOSE, worker=worker_id)
                     task_queue.task_done()
                     break
                 
-                dataset_name, prompt = task
+                if not self.running:
+                    # 已停止测试，直接丢弃排队中的任务
+                    task_queue.task_done()
+                    continue
                 try:
-                    # 记录开始处理任务日志
-                    with open(log_file, 'a', encoding='utf-8') as f:
-                        f.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {worker_id} 开始处理任务:\n")
-                        f.write(f"- 数据集: {dataset_name}\n")
-                        f.write(f"- Prompt: {prompt[:100]}...\n")
-                        # 获取并记录API调用方式
-                        is_stream_mode = config.get('openai_api.stream_mode', True)
-                        f.write(f"- API调用方式: {'流式输出' if is_stream_mode else '直接输出'}\n")
-                    
-                    response = await api_client.generate(prompt)
-                    
-                    # 记录任务完成日志
-                    with open(log_file, 'a', encoding='utf-8') as f:
-                        f.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {worker_id} 完成任务:\n")
-                        f.write(f"- 成功: {response.success}\n")
-                        if response.success:
-                            f.write(f"- 响应时间: {response.duration:.2f}s\n")
-                            f.write(f"- 生成字符数: {response.total_chars}\n")
-                            f.write(f"- 生成Token数: {response.total_tokens}\n")
-                            # 记录API调用方式
-                            is_stream_mode = config.get('openai_api.stream_mode', True)
-                            f.write(f"- API调用方式: {'流式输出' if is_stream_mode else '直接输出'}\n")
-                        else:
-                            f.write(f"- 错误: {response.error_msg}\n")
-                        f.write("\n")
-                    
-                    await result_queue.put((dataset_name, response))
-                except Exception as e:
-                    logger.error(f"任务处理失败: {e}", exc_info=True)
-                    # 记录任务失败日志
-                    with open(log_file, 'a', encoding='utf-8') as f:
-                        f.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {worker_id} 任务处理失败: {e}\n\n")
-                    await result_queue.put((dataset_name, APIResponse(success=False, error_msg=str(e))))
+                    await execute(worker_id, task)
                 finally:
                     task_queue.task_done()
                     
         except Exception as e:
             logger.error(f"工作协程 {worker_id} 异常退出: {e}", exc_info=True)
-            # 记录工作协程异常退出日志
-            with open(log_file, 'a', encoding='utf-8') as f:
-                f.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 工作协程 {worker_id} 异常退出: {e}\n")
-                f.write(traceback.format_exc() + "\n")
+            log_writer.log("worker_error", LOG_LEVEL_QUIET, worker=worker_id, error=str(e),
+                           traceback=traceback.format_exc())
         finally:
             logger.info(f"工作协程 {worker_id} 结束")
-            # 记录工作协程结束日志
-            with open(log_file, 'a', encoding='utf-8') as f:
-                f.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 工作协程 {worker_id} 结束\n")
+            log_writer.log("worker_end", LOG_LEVEL_VERBOSE, worker=worker_id)
+    
+    async def _duration_worker(self, worker_id: str, prompts: Iterable[Tuple],
+                               deadline: float, execute: Callable, log_writer: TestLogWriter):
+        """持续时长模式的工作协程，循环取用prompt直到截止时间"""
+        try:
+            for item in prompts:
+                if not self.running or time.perf_counter() >= deadline:
+                    break
+                await execute(worker_id, item)
+        except Exception as e:
+            logger.error(f"工作协程 {worker_id} 异常退出: {e}", exc_info=True)
+            log_writer.log("worker_error", LOG_LEVEL_QUIET, worker=worker_id, error=str(e),
+                           traceback=traceback.format_exc())
+        finally:
+            logger.info(f"工作协程 {worker_id} 结束")
+            log_writer.log("worker_end", LOG_LEVEL_VERBOSE, worker=worker_id)
+    
+    async def _open_loop_dispatcher(self, prompts: Iterable[Tuple], execute: Callable,
+                                    load_profile: LoadProfile, deadline: Optional[float] = None,
+                                    progress: Optional[TestProgress] = None):
+        """
+        开环发送协程
+        
+        按目标速率和到达过程计算每个请求的计划发送时间，到点即发送，
+        不等待之前的请求完成，并记录实际发送相对计划时间的滞后。
+        指定deadline时，计划发送时间超过截止时间后停止发送。
+        发送滞后和实际速率记录到progress，未指定时记录到总体进度。
+        """
+        progress = progress or self.progress
+        intervals = arrival_intervals(load_profile)
+        in_flight = set()
+        start = time.perf_counter()
+        scheduled = start
+        sent = 0
+        
+        for index, item in enumerate(prompts):
+            if index > 0:
+                scheduled += next(intervals)
+            if not self.running or (deadline is not None and scheduled >= deadline):
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0 and await self.cancel_token.sleep(delay):
+                break
+            
+            # 事件循环繁忙或sleep精度不足时，实际发送会晚于计划时间
+            progress.record_dispatch(max(0.0, time.perf_counter() - scheduled))
+            
+            request = asyncio.create_task(execute(f"request_{index}", item, intended_at=scheduled))
+            in_flight.add(request)
+            request.add_done_callback(in_flight.discard)
+            sent += 1
+        
+        elapsed = time.perf_counter() - start
+        if elapsed > 0 and sent > 1:
+            # 最后一个请求发出时刻对应sent-1个间隔
+            progress.actual_rate = (sent - 1) / elapsed
+        logger.info(
+            f"开环发送完成: 共 {sent} 个请求, 目标速率 {load_profile.rate:.2f}/s, "
+            f"实际速率 {progress.actual_rate:.2f}/s, 平均滞后 {progress.avg_dispatch_lag * 1000:.2f}ms, "
+            f"最大滞后 {progress.max_dispatch_lag * 1000:.2f}ms"
+        )
+        
+        # 等待所有在途请求完成
+        if in_flight:
+            await asyncio.gather(*in_flight)
     
     async def _result_handler(self, result_queue: asyncio.Queue,
                             progress: TestProgress,
                             progress_callback=None,
-                            log_file: str = None):
-        """结果处理协程"""
+                            log_writer: Optional[TestLogWriter] = None,
+                            result_listener: Optional[Callable[[str, APIResponse], None]] = None):
+        """结果处理协程
+        
+        Args:
+            result_listener: 可选回调，每个计入统计的结果都会传给它
+        """
         try:
             while True:
                 result = await result_queue.get()
                 if result is None:
                     logger.info("[DEBUG] 结果处理协程收到停止信号")
                     # 记录结果处理协程停止日志
-                    if log_file:
-                        with open(log_file, 'a', encoding='utf-8') as f:
-                            f.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 结果处理协程收到停止信号\n")
+                    if log_writer:
+                        log_writer.log("result_handler_stop", LOG_LEVEL_VERBOSE)
                     result_queue.task_done()
                     break
                 
-                dataset_name, response = result
+                dataset_name, response, sent_at = result
+                if progress.is_warmup(sent_at):
+                    # 预热期间发出的请求不计入统计
+                    progress.warmup_tasks += 1
+                    result_queue.task_done()
+                    continue
+                
                 progress.update(dataset_name, response)
+                progress.record_interval(time.perf_counter(), response)
+                if result_listener:
+                    result_listener(dataset_name, response)
                 
                 # 发送结果接收信号
                 self.result_received.emit(dataset_name, response)
@@ -299,71 +784,392 @@ class TestManager(QObject):
                     progress_callback(progress)
                 
                 # 记录进度更新日志
-                if log_file:
-                    with open(log_file, 'a', encoding='utf-8') as f:
-                        f.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 进度更新:\n")
-                        f.write(f"- 数据集: {dataset_name}\n")
-                        f.write(f"- 完成进度: {progress.progress_percentage:.1f}%\n")
-                        f.write(f"- 平均响应时间: {progress.avg_response_time:.2f}s\n")
-                        f.write(f"- 平均生成速度: {progress.avg_generation_speed:.2f}字/秒\n\n")
+                if log_writer and log_writer.enabled(LOG_LEVEL_VERBOSE):
+                    log_writer.log(
+                        "progress", LOG_LEVEL_VERBOSE,
+                        dataset=dataset_name,
+                        completed=progress.completed_tasks,
+                        percentage=progress.progress_percentage,
+                        avg_response_time=progress.avg_response_time,
+                        avg_generation_speed=progress.avg_generation_speed
+                    )
                 
                 result_queue.task_done()
                 
         except Exception as e:
             logger.error(f"结果处理协程异常退出: {e}", exc_info=True)
             # 记录结果处理协程异常日志
-            if log_file:
-                with open(log_file, 'a', encoding='utf-8') as f:
-                    f.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 结果处理协程异常退出: {e}\n")
-                    f.write(traceback.format_exc() + "\n")
+            if log_writer:
+                log_writer.log("result_handler_error", LOG_LEVEL_QUIET, error=str(e),
+                               traceback=traceback.format_exc())
         finally:
             logger.info("[DEBUG] 结果处理协程结束")
             # 记录结果处理协程结束日志
-            if log_file:
-                with open(log_file, 'a', encoding='utf-8') as f:
-                    f.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 结果处理协程结束\n")
+            if log_writer:
+                log_writer.log("result_handler_end", LOG_LEVEL_VERBOSE)
     
-    async def run_test(self, test_task_id: str, tasks: List[TestTask], progress_callback=None, model_config: dict = None):
-        """运行测试任务"""
+    async def _run_local(self, tasks: List[TestTask], load_profile: LoadProfile,
+                         total_concurrency: int, progress_callback, model_config: Optional[dict],
+                         log_writer: TestLogWriter):
+        """在当前事件循环中发送全部请求"""
+        # 创建API客户端
+        api_client = self._create_api_client(model_config or {})
+        
+        # 加载各数据集的输入token数缓存，服务端未返回usage时可直接命中
+        for task in tasks:
+            token_counter.load_prompt_cache(task.dataset_name)
+        
+        result_queue = asyncio.Queue()
+        
+        # 添加任务 - 固定任务数模式每个数据集随机选择并发数个prompt，
+        # 持续时长模式循环或重新抽样直到截止时间
+        prompts = apply_workload(prompt_stream(tasks, load_profile), self.workload, api_client.model)
+        if not load_profile.is_duration_based:
+            prompts = list(prompts)
+        if self.workload.is_default:
+            api_client.precompile(prompt for task in tasks for prompt in task.prompts)
+        
+        for task in tasks:
+            # 记录任务添加日志
+            log_writer.log(
+                "dataset_added", LOG_LEVEL_NORMAL,
+                dataset=task.dataset_name,
+                prompt_count=len(task.prompts) if load_profile.is_duration_based
+                else min(task.concurrency, len(task.prompts)),
+                weight=task.weight,
+                concurrency=task.concurrency
+            )
+        
+        # 创建结果处理协程
+        result_handler = asyncio.create_task(
+            self._result_handler(
+                result_queue,
+                self.progress,
+                progress_callback,
+                log_writer
+            )
+        )
+        
+        self.progress.start_time = time.perf_counter()
+        await self._dispatch(prompts, load_profile, total_concurrency,
+                             self._task_executor(result_queue, api_client, log_writer), log_writer)
+        
+        # 停止结果处理协程
+        await result_queue.put(None)  # 发送停止信号
+        await result_handler
+        
+        # 关闭API客户端
+        await api_client.close()
+        
+        # 保存输入token数缓存供后续测试复用
+        for task in tasks:
+            token_counter.save_prompt_cache(task.dataset_name, task.prompts, api_client.model)
+        logger.info(f"输入token缓存统计: {token_counter.prompt_cache_info()}")
+    
+    async def _dispatch(self, prompts: Iterable[Tuple], load_profile: LoadProfile,
+                        total_concurrency: int, execute: Callable, log_writer: TestLogWriter,
+                        progress: Optional[TestProgress] = None):
+        """
+        按负载模式将prompt序列交给execute发送，返回时所有请求都已完成
+        
+        开环模式的发送统计记录到progress，未指定时记录到总体进度。
+        """
+        deadline = None
+        if load_profile.is_duration_based:
+            deadline = self.progress.start_time + load_profile.duration
+        
+        if load_profile.is_open_loop:
+            # 开环模式：按计划时间发送，在途请求数不受并发数限制
+            await self._open_loop_dispatcher(
+                prompts,
+                execute,
+                load_profile,
+                deadline,
+                progress
+            )
+        elif load_profile.is_duration_based:
+            # 持续时长模式：固定数量的工作协程循环发送直到截止时间
+            workers = [
+                asyncio.create_task(
+                    self._duration_worker(
+                        f"worker_{i}",
+                        prompts,
+                        deadline,
+                        execute,
+                        log_writer
+                    )
+                )
+                for i in range(total_concurrency)
+            ]
+            await asyncio.gather(*workers)
+        else:
+            # 闭环模式：固定数量的工作协程从任务队列取任务
+            task_queue = asyncio.Queue()
+            for item in prompts:
+                await task_queue.put(item)
+            
+            # 创建工作协程
+            workers = []
+            for i in range(total_concurrency):
+                worker = asyncio.create_task(
+                    self._worker(
+                        f"worker_{i}",
+                        task_queue,
+                        execute,
+                        log_writer
+                    )
+                )
+                workers.append(worker)
+                logger.info(f"工作协程 worker_{i} 启动")
+                
+                # 记录工作协程启动日志
+                log_writer.log("worker_start", LOG_LEVEL_VERBOSE, worker=f"worker_{i}")
+            
+            # 等待所有任务完成
+            await task_queue.join()
+            
+            # 停止工作协程
+            for worker in workers:
+                await task_queue.put(None)  # 发送停止信号
+            await asyncio.gather(*workers)
+    
+    def _new_model_progress(self, label: str, total_tasks: int) -> TestProgress:
+        """为对比测试中的单个模型创建进度对象，负载相关设置与总体进度一致"""
+        return TestProgress(
+            test_task_id=f"{self.progress.test_task_id}:{label}",
+            total_tasks=total_tasks,
+            completed_tasks=0,
+            successful_tasks=0,
+            failed_tasks=0,
+            avg_response_time=0.0,
+            avg_generation_speed=0.0,
+            load_mode=self.progress.load_mode,
+            target_rate=self.progress.target_rate,
+            duration=self.progress.duration,
+            warmup=self.progress.warmup,
+            bucket_interval=self.progress.bucket_interval
+        )
+    
+    async def _run_comparison(self, tasks: List[TestTask], load_profile: LoadProfile,
+                              total_concurrency: int, progress_callback, model_configs: List[dict],
+                              compare_mode: str, log_writer: TestLogWriter):
+        """
+        在当前事件循环中以相同的prompt序列同时驱动多个模型
+        
+        - 并行模式：每个模型有独立的工作协程（或开环发送协程），各自使用完整的并发数/速率，
+          按同一个prompt序列发送，模型之间互不等待
+        - 交错模式：各模型的请求交错进入同一个发送序列，共享并发数/速率，每轮轮换先发送的模型
+        
+        self.progress汇总所有模型的请求，各模型的统计保存在self.model_progress中，
+        结束时在self.progress.comparison中给出各模型指标和相对第一个模型的差值。
+        """
+        labels = model_labels(model_configs)
+        api_clients = [self._create_api_client(model_config) for model_config in model_configs]
+        for task in tasks:
+            token_counter.load_prompt_cache(task.dataset_name)
+        
+        # 未指定随机种子时固定一个，并行模式下各模型各自生成的prompt序列和到达间隔完全相同
+        if load_profile.seed is None:
+            load_profile = dataclasses.replace(load_profile, seed=random.randrange(2 ** 32))
+        workload = self.workload
+        if workload.seed is None:
+            workload = dataclasses.replace(workload, seed=random.randrange(2 ** 32))
+        
+        def model_prompts():
+            return apply_workload(prompt_stream(tasks, load_profile), workload, api_clients[0].model)
+        
+        prompts = model_prompts()
+        if not load_profile.is_duration_based:
+            prompts = list(prompts)
+        if self.workload.is_default:
+            for api_client in api_clients:
+                api_client.precompile(prompt for task in tasks for prompt in task.prompts)
+        
+        per_model_tasks = self.progress.total_tasks // len(labels)
+        self.model_progress = {label: self._new_model_progress(label, per_model_tasks) for label in labels}
+        last_refresh = 0.0
+        
+        def on_result(dataset_name: str, response: APIResponse):
+            # 各模型的结果同时计入总体进度，界面按总体进度刷新，对比结果每秒更新一次
+            nonlocal last_refresh
+            now = time.perf_counter()
+            self.progress.update(dataset_name, response)
+            self.progress.record_interval(now, response)
+            if now - last_refresh >= 1.0:
+                last_refresh = now
+                self.progress.comparison = build_comparison(
+                    self.model_progress, compare_mode, now - self.progress.measure_start)
+            if progress_callback:
+                progress_callback(self.progress)
+        
+        result_queues = [asyncio.Queue() for _ in labels]
+        result_handlers = [
+            asyncio.create_task(
+                self._result_handler(result_queue, self.model_progress[label], None, log_writer, on_result)
+            )
+            for label, result_queue in zip(labels, result_queues)
+        ]
+        executors = [
+            self._task_executor(result_queue, api_client, log_writer, self.model_progress[label])
+            for label, result_queue, api_client in zip(labels, result_queues, api_clients)
+        ]
+        
+        self.progress.start_time = time.perf_counter()
+        for progress in self.model_progress.values():
+            progress.start_time = self.progress.start_time
+        
+        if compare_mode == COMPARE_INTERLEAVED:
+            await self._dispatch(interleave_prompts(prompts, len(labels)), load_profile, total_concurrency,
+                                 self._routing_executor(executors), log_writer)
+        else:
+            # 持续时长模式的prompt序列无限长，各模型按相同种子各自生成，较快的模型领先时不需要缓存差额部分
+            if load_profile.is_duration_based:
+                streams = [prompts] + [model_prompts() for _ in labels[1:]]
+            else:
+                streams = [prompts] * len(labels)
+            # 各模型的发送统计分别记录，结束后汇总到总体进度，实际速率为各模型之和
+            await asyncio.gather(*(
+                self._dispatch(stream, load_profile, total_concurrency, execute, log_writer,
+                               self.model_progress[label])
+                for label, stream, execute in zip(labels, streams, executors)
+            ))
+            model_progress = list(self.model_progress.values())
+            self.progress.dispatched_tasks = sum(progress.dispatched_tasks for progress in model_progress)
+            self.progress.total_dispatch_lag = sum(progress.total_dispatch_lag for progress in model_progress)
+            self.progress.max_dispatch_lag = max(progress.max_dispatch_lag for progress in model_progress)
+            self.progress.actual_rate = sum(progress.actual_rate for progress in model_progress)
+        
+        for result_queue, result_handler in zip(result_queues, result_handlers):
+            await result_queue.put(None)
+            await result_handler
+        for api_client in api_clients:
+            await api_client.close()
+        
+        for task in tasks:
+            token_counter.save_prompt_cache(task.dataset_name, task.prompts, api_clients[0].model)
+        
+        self.progress.warmup_tasks = sum(progress.warmup_tasks for progress in self.model_progress.values())
+        self.progress.comparison = build_comparison(
+            self.model_progress, compare_mode, time.perf_counter() - self.progress.measure_start)
+        if progress_callback:
+            progress_callback(self.progress)
+    
+    async def run_test(self, test_task_id: str, tasks: List[TestTask], progress_callback=None,
+                       model_config: Union[dict, List[dict]] = None, load_profile: Optional[LoadProfile] = None,
+                       processes: Optional[int] = None, agents: Optional[List[str]] = None,
+                       compare_mode: Optional[str] = None, workload: Optional[WorkloadProfile] = None,
+                       cancel_token: Optional[CancelToken] = None):
+        """运行测试任务
+        
+        Args:
+            test_task_id: 测试任务ID
+            tasks: 测试任务列表
+            progress_callback: 进度回调函数
+            model_config: 模型配置，传入多个模型配置的列表时以相同的prompt序列对比测试这些模型，
+                第一个模型作为基准
+            load_profile: 负载配置，未指定时读取全局配置test.load_profile
+            processes: 负载生成进程数，未指定时读取全局配置test.processes，大于1时启用多进程模式
+            agents: 分布式代理地址列表（host:port），未指定时读取全局配置test.distributed.agents，
+                非空时启用分布式模式，优先于多进程模式
+            compare_mode: 多模型对比方式，parallel或interleaved，未指定时读取全局配置test.compare_mode
+            workload: 请求形态（共享前缀、多轮会话、缓存击穿），未指定时读取全局配置test.workload
+            cancel_token: 取消令牌，未指定时新建。stop_test()只能停止已经开始的测试，
+                在run_test开始前就可能收到停止请求的调用方（如多进程子进程）应传入令牌并直接取消它
+        """
+        # 创建日志文件，参数校验失败时也能把错误写入日志
+        log_dir = os.path.join("data", "logs", "tests")
+        os.makedirs(log_dir, exist_ok=True)
+        log_file = os.path.join(log_dir, f"{test_task_id}.log")
+        logger.debug(f"生成日志文件路径: {log_file}")
+        # 每个请求的事件写入结构化日志，由后台线程批量写入
+        event_log_file = os.path.join(log_dir, f"{test_task_id}.jsonl")
+        log_writer = None
         try:
             logger.info(f"[DEBUG] 开始运行测试 (ID: {test_task_id})...")
+            load_profile = load_profile or LoadProfile.from_config()
+            self.workload = workload or WorkloadProfile.from_config()
+            processes = max(1, int(processes or config.get("test.processes", 1)))
+            if agents is None:
+                agents = config.get("test.distributed.agents", []) or []
+            
+            # 多个模型配置时进行对比测试
+            model_configs = model_config if isinstance(model_config, list) else [model_config or {}]
+            model_config = model_configs[0]
+            self.model_progress = {}
+            if len(model_configs) > 1:
+                compare_mode = compare_mode or config.get("test.compare_mode", COMPARE_PARALLEL)
+                if compare_mode not in COMPARE_MODES:
+                    raise ValueError(f"不支持的对比方式: {compare_mode}")
+                if agents or processes > 1:
+                    logger.warning("多模型对比测试只在当前进程中运行，忽略多进程和分布式设置")
+                    agents, processes = [], 1
+            else:
+                compare_mode = None
             
             # 计算总权重和总并发数
             total_weight = sum(task.weight for task in tasks)
             total_concurrency = sum(task.concurrency for task in tasks)
             logger.info(f"[DEBUG] 总权重: {total_weight}, 总并发数: {total_concurrency}")
             
-            # 创建日志文件
-            log_dir = os.path.join("data", "logs", "tests")
-            os.makedirs(log_dir, exist_ok=True)
-            logger.debug(f"创建日志目录: {log_dir}")
-            log_file = os.path.join(log_dir, f"{test_task_id}.log")
-            logger.debug(f"生成日志文件路径: {log_file}")
-            
             # 写入测试开始信息
             with open(log_file, 'w', encoding='utf-8') as f:
                 f.write(f"测试开始时间: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
                 f.write(f"测试ID: {test_task_id}\n")
                 f.write(f"总权重: {total_weight}\n")
                 f.write(f"总并发数: {total_concurrency}\n")
-                if model_config:
-                    f.write(f"模型: {model_config.get('name', 'unknown')}\n")
-                    f.write(f"API URL: {model_config.get('api_url', 'unknown')}\n")
-                    f.write(f"模型名称: {model_config.get('model', 'unknown')}\n")
+                f.write(f"负载模式: {load_profile.mode}\n")
+                if agents:
+                    f.write(f"分布式代理: {', '.join(agents)}\n")
+                elif processes > 1:
+                    f.write(f"负载生成进程数: {processes}\n")
+                if load_profile.is_open_loop:
+                    f.write(f"目标速率: {load_profile.rate}/s ({load_profile.arrival})\n")
+                if load_profile.is_duration_based:
+                    f.write(f"持续时长: {load_profile.duration}s, 预热: {load_profile.warmup}s, "
+                            f"prompt顺序: {load_profile.prompt_order}\n")
+                if not self.workload.is_default:
+                    f.write(f"请求形态: 前缀 {self.workload.prefix_tokens} token, "
+                            f"共享比例 {self.workload.share_ratio:.0%}, 共享前缀 {self.workload.prefix_count} 个, "
+                            f"会话轮数 {self.workload.turns}, 缓存击穿 {'开启' if self.workload.cache_bust else '关闭'}\n")
+                if compare_mode:
+                    f.write(f"对比方式: {compare_mode}\n")
+                for item in model_configs:
+                    if item:
+                        f.write(f"模型: {item.get('name', 'unknown')}\n")
+                        f.write(f"API URL: {item.get('api_url', 'unknown')}\n")
+                        f.write(f"模型名称: {item.get('model', 'unknown')}\n")
+                f.write(f"结构化日志: {event_log_file}\n")
                 f.write("-" * 50 + "\n\n")
             
+            log_writer = TestLogWriter(event_log_file)
+            log_writer.log(
+                "test_start", LOG_LEVEL_QUIET,
+                test_task_id=test_task_id,
+                total_concurrency=total_concurrency,
+                processes=processes,
+                agents=agents,
+                load_profile=vars(load_profile),
+                workload=vars(self.workload),
+                model=model_config.get('model'),
+                api_url=model_config.get('api_url'),
+                compare_models=[item.get('model') for item in model_configs] if compare_mode else None,
+                compare_mode=compare_mode,
+                stream_mode=config.get('openai_api.stream_mode', True)
+            )
+            
             # 创建进度对象
             # 计算实际任务数量 - 根据并发数限制每个数据集的任务数
             total_prompts = 0
-            for task in tasks:
-                # 每个并发处理一个任务，所以任务数 = 并发数
-                task_count = task.concurrency
-                total_prompts += task_count
-                logger.info(f"数据集 {task.dataset_name} 实际执行任务数: {task_count}")
+            if not load_profile.is_duration_based:
+                for task in tasks:
+                    # 每个并发处理一个任务，所以任务数 = 并发数
+                    task_count = task.concurrency
+                    total_prompts += task_count
+                    logger.info(f"数据集 {task.dataset_name} 实际执行任务数: {task_count}")
             
             self.progress = TestProgress(
                 test_task_id=test_task_id,
-                total_tasks=total_prompts,
+                total_tasks=total_prompts * len(model_configs),
                 completed_tasks=0,
                 successful_tasks=0,
                 failed_tasks=0,
@@ -371,100 +1177,304 @@ class TestManager(QObject):
                 avg_generation_speed=0.0,
                 avg_tps=0.0,
                 last_error="",
-                dataset_stats={}
+                dataset_stats={},
+                load_mode=load_profile.mode,
+                target_rate=load_profile.rate if load_profile.is_open_loop else 0.0,
+                duration=load_profile.duration,
+                warmup=load_profile.warmup,
+                bucket_interval=load_profile.bucket_interval if load_profile.is_duration_based else 0.0
             )
+            self._start_running(cancel_token)
             
-            # 创建API客户端
-            api_client = self._create_api_client(model_config or {})
-            
-            # 创建任务队列
-            task_queue = asyncio.Queue()
-            result_queue = asyncio.Queue()
+            if compare_mode:
+                await self._run_comparison(tasks, load_profile, total_concurrency, progress_callback,
+                                           model_configs, compare_mode, log_writer)
+            elif agents:
+                # 分布式模式：请求分片到多个代理，计数和直方图实时合并到当前进度
+                from src.engine.distributed import run_distributed
+                await run_distributed(self, test_task_id, tasks, load_profile, agents,
+                                      progress_callback, model_config)
+            elif processes > 1:
+                # 多进程模式：请求分片到多个进程，计数和直方图实时合并到当前进度
+                from src.engine.multiprocess_runner import run_multiprocess
+                await run_multiprocess(self, test_task_id, tasks, load_profile, processes,
+                                       progress_callback, model_config)
+            else:
+                await self._run_local(tasks, load_profile, total_concurrency,
+                                      progress_callback, model_config, log_writer)
             
-            # 添加任务到队列 - 根据并发数限制每个数据集的任务数
-            for task in tasks:
-                # 从prompts中随机选择任务数量的prompt
-                selected_prompts = random.sample(
-                    task.prompts, 
-                    min(task.concurrency, len(task.prompts))
-                )
-                
-                for prompt in selected_prompts:
-                    await task_queue.put((task.dataset_name, prompt))
-                    
-                # 记录任务添加日志
+            # 记录分段统计，便于观察长时间运行中的吞吐衰减
+            if self.progress.interval_stats:
                 with open(log_file, 'a', encoding='utf-8') as f:
-                    f.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 添加数据集任务: {task.dataset_name}\n")
-                    f.write(f"- 选择Prompts数量: {len(selected_prompts)}\n")
-                    f.write(f"- 权重: {task.weight}\n")
-                    f.write(f"- 并发数: {task.concurrency}\n\n")
+                    f.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 分段统计 (预热请求数: {self.progress.warmup_tasks}):\n")
+                    for bucket in self.progress.interval_stats:
+                        f.write(
+                            f"- {bucket['start']:.0f}s~{bucket['end']:.0f}s: 完成 {bucket['total']}, "
+                            f"失败 {bucket['failed']}, 吞吐 {bucket['throughput']:.2f}请求/秒, "
+                            f"{bucket['token_throughput']:.1f}token/秒, 平均响应时间 {bucket['avg_response_time']:.2f}s\n"
+                        )
+                    f.write("\n")
             
-            # 创建工作协程
-            workers = []
-            for i in range(total_concurrency):
-                worker = asyncio.create_task(
-                    self._worker(
-                        f"worker_{i}",
-                        task_queue,
-                        result_queue,
-                        api_client,
-                        log_file
-                    )
-                )
-                workers.append(worker)
-                logger.info(f"工作协程 worker_{i} 启动")
-                
-                # 记录工作协程启动日志
-                with open(log_file, 'a', encoding='utf-8') as f:
-                    f.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 工作协程 worker_{i} 启动\n")
+            # 写入测试结束信息
+            with open(log_file, 'a', encoding='utf-8') as f:
+                f.write(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S')}] 测试完成\n")
+                f.write("-" * 50 + "\n")
+                f.write(f"总任务数: {self.progress.total_tasks}\n")
+                f.write(f"完成任务数: {self.progress.completed_tasks}\n")
+                f.write(f"成功任务数: {self.progress.successful_tasks}\n")
+                f.write(f"失败任务数: {self.progress.failed_tasks}\n")
+                if self.cancel_token.cancelled:
+                    f.write(f"测试被手动停止，取消的在途请求数: {self.progress.cancelled_tasks}\n")
+                if self.progress.retried_tasks or self.progress.shed_tasks:
+                    f.write(f"重试请求数: {self.progress.retried_tasks}, 重试次数: {self.progress.retry_attempts}, "
+                            f"退避等待: {self.progress.total_retry_wait:.2f}s, 熔断拒绝数: {self.progress.shed_tasks}\n")
+                    if self.progress.retry_latency.count:
+                        f.write("重试请求总耗时百分位: " + ", ".join(
+                            f"{key} {value * 1000:.1f}ms"
+                            for key, value in self.progress.retry_latency.percentiles().items()) + "\n")
+                f.write(f"平均响应时间: {self.progress.avg_response_time:.2f}s\n")
+                f.write(f"平均生成速度: {self.progress.avg_generation_speed:.2f}字/秒\n")
+                f.write(f"平均TPS: {self.progress.avg_tps:.2f}\n")
+                f.write(f"平均首token延迟: {self.progress.avg_ttft * 1000:.1f}ms\n")
+                f.write(f"平均每token耗时: {self.progress.avg_tpot * 1000:.1f}ms\n")
+                for metric, values in self.progress.latency_percentiles().items():
+                    f.write(f"{metric}延迟百分位: " + ", ".join(
+                        f"{key} {value * 1000:.1f}ms" for key, value in values.items()) + "\n")
+                f.write(f"协调遗漏校正: {self.progress.correction_description()}\n")
+                if len(self.progress.replica_stats) > 1:
+                    f.write("各副本统计:\n")
+                    for endpoint, replica in self.progress.replica_summary().items():
+                        f.write(
+                            f"- {endpoint}: 完成 {replica['total']}, 失败 {replica['failed']}, "
+                            f"平均延迟 {replica['avg_latency'] * 1000:.1f}ms, p50 {replica['p50'] * 1000:.1f}ms, "
+                            f"p99 {replica['p99'] * 1000:.1f}ms, 吞吐 {replica['throughput']:.2f}请求/秒, "
+                            f"{replica['token_throughput']:.1f}token/秒\n"
+                        )
+                if self.progress.comparison:
+                    f.write(f"\n模型对比 ({self.progress.comparison['mode']}):\n")
+                    f.write(format_comparison_table(self.progress.comparison) + "\n")
+            
+            log_writer.log(
+                "test_end", LOG_LEVEL_QUIET,
+                completed=self.progress.completed_tasks,
+                successful=self.progress.successful_tasks,
+                failed=self.progress.failed_tasks,
+                cancelled=self.progress.cancelled_tasks,
+                stopped=self.cancel_token.cancelled,
+                retried=self.progress.retried_tasks,
+                retry_attempts=self.progress.retry_attempts,
+                retry_wait=self.progress.total_retry_wait,
+                shed=self.progress.shed_tasks,
+                retry_latency_percentiles=self.progress.retry_latency.percentiles(),
+                replicas=self.progress.replica_summary(),
+                comparison=self.progress.comparison,
+                warmup=self.progress.warmup_tasks,
+                avg_response_time=self.progress.avg_response_time,
+                avg_tps=self.progress.avg_tps,
+                latency_percentiles=self.progress.latency_percentiles(),
+                interval_stats=self.progress.interval_stats
+            )
+            logger.info("[DEBUG] 测试完成")
+            
+        except Exception as e:
+            logger.error(f"[ERROR] 测试执行失败: {e}", exc_info=True)
+            # 记录错误信息到日志文件
+            with open(log_file, 'a', encoding='utf-8') as f:
+                f.write(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S')}] 测试执行失败: {e}\n")
+                f.write(traceback.format_exc())
+            raise
+        finally:
+            # 写入剩余的结构化日志
+            if log_writer:
+                log_writer.close()
+    
+    async def run_schedule(self, test_task_id: str, tasks: List[TestTask],
+                           schedule: ConcurrencySchedule, progress_callback=None,
+                           model_config: dict = None):
+        """
+        按并发阶梯调度运行测试
+        
+        在同一个会话中依次以各阶梯的并发数运行指定时长，记录每个阶梯的吞吐和
+        延迟百分位，最后检测吞吐趋平或p99延迟超过阈值时的并发数。
+        
+        Args:
+            test_task_id: 测试任务ID
+            tasks: 测试任务列表，各数据集的并发数仅用作prompt混合比例
+            schedule: 并发阶梯调度
+            progress_callback: 进度回调函数
+            model_config: 模型配置
+        """
+        log_dir = os.path.join("data", "logs", "tests")
+        os.makedirs(log_dir, exist_ok=True)
+        log_file = os.path.join(log_dir, f"{test_task_id}.log")
+        event_log_file = os.path.join(log_dir, f"{test_task_id}.jsonl")
+        log_writer = None
+        
+        try:
+            logger.info(f"开始运行并发阶梯测试 (ID: {test_task_id}), 共 {len(schedule.steps)} 个阶梯")
+            with open(log_file, 'w', encoding='utf-8') as f:
+                f.write(f"测试开始时间: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+                f.write(f"测试ID: {test_task_id}\n")
+                f.write("负载模式: 并发阶梯\n")
+                f.write(f"阶梯: {', '.join(f'{s.concurrency}x{s.hold:g}s' for s in schedule.steps)}\n")
+                if model_config:
+                    f.write(f"模型: {model_config.get('name', 'unknown')}\n")
+                    f.write(f"API URL: {model_config.get('api_url', 'unknown')}\n")
+                    f.write(f"模型名称: {model_config.get('model', 'unknown')}\n")
+                f.write(f"结构化日志: {event_log_file}\n")
+                f.write("-" * 50 + "\n\n")
+            
+            log_writer = TestLogWriter(event_log_file)
+            log_writer.log(
+                "test_start", LOG_LEVEL_QUIET,
+                test_task_id=test_task_id,
+                schedule=[vars(step) for step in schedule.steps],
+                model=(model_config or {}).get('model'),
+                api_url=(model_config or {}).get('api_url')
+            )
+            
+            self.progress = TestProgress(
+                test_task_id=test_task_id,
+                total_tasks=0,
+                completed_tasks=0,
+                successful_tasks=0,
+                failed_tasks=0,
+                avg_response_time=0.0,
+                avg_generation_speed=0.0,
+                duration=schedule.total_duration
+            )
+            self._start_running()
+            
+            api_client = self._create_api_client(model_config or {})
+            for task in tasks:
+                token_counter.load_prompt_cache(task.dataset_name)
             
-            # 创建结果处理协程
+            # 所有阶梯共用一个循环prompt序列，请求体在开始前统一编码
+            self.workload = WorkloadProfile.from_config()
+            prompts = apply_workload(prompt_stream(tasks, LoadProfile(duration=schedule.total_duration)),
+                                     self.workload, api_client.model)
+            if self.workload.is_default:
+                api_client.precompile(prompt for task in tasks for prompt in task.prompts)
+            step_responses: List[APIResponse] = []
+            result_queue = asyncio.Queue()
+            execute = self._task_executor(result_queue, api_client, log_writer)
             result_handler = asyncio.create_task(
                 self._result_handler(
                     result_queue,
                     self.progress,
                     progress_callback,
-                    log_file
+                    log_writer,
+                    lambda dataset_name, response: step_responses.append(response)
                 )
             )
             
-            # 等待所有任务完成
-            await task_queue.join()
-            
-            # 停止工作协程
-            for worker in workers:
-                await task_queue.put(None)  # 发送停止信号
-            await asyncio.gather(*workers)
+            self.progress.start_time = time.perf_counter()
+            for index, step in enumerate(schedule.steps):
+                if not self.running:
+                    break
+                
+                step_responses.clear()
+                step_start = time.perf_counter()
+                deadline = step_start + step.hold
+                workers = [
+                    asyncio.create_task(
+                        self._duration_worker(
+                            f"step{index}_worker_{i}",
+                            prompts,
+                            deadline,
+                            execute,
+                            log_writer
+                        )
+                    )
+                    for i in range(step.concurrency)
+                ]
+                await asyncio.gather(*workers)
+                # 等待本阶梯的结果全部处理完，再开始下一阶梯
+                await result_queue.join()
+                
+                step_elapsed = time.perf_counter() - step_start
+                step_latency = LatencyHistogram()
+                total_tokens = 0
+                for response in step_responses:
+                    if response.success:
+                        step_latency.record(response.e2e_latency)
+                        total_tokens += response.total_tokens
+                successful = step_latency.count
+                latency_percentiles = step_latency.percentiles((50, 90, 99))
+                stats = {
+                    "concurrency": step.concurrency,
+                    "hold": step.hold,
+                    "elapsed": step_elapsed,
+                    "total": len(step_responses),
+                    "successful": successful,
+                    "failed": len(step_responses) - successful,
+                    "throughput": successful / step_elapsed if step_elapsed > 0 else 0.0,
+                    "token_throughput": total_tokens / step_elapsed if step_elapsed > 0 else 0.0,
+                    "avg_latency": step_latency.mean,
+                    "p50_latency": latency_percentiles["p50"],
+                    "p90_latency": latency_percentiles["p90"],
+                    "p99_latency": latency_percentiles["p99"]
+                }
+                self.progress.step_stats.append(stats)
+                log_writer.log("step_end", LOG_LEVEL_QUIET, step=index, **stats)
+                logger.info(
+                    f"阶梯 {index + 1}/{len(schedule.steps)} 完成: 并发 {step.concurrency}, "
+                    f"吞吐 {stats['throughput']:.2f}请求/秒, p99 {stats['p99_latency']:.3f}s"
+                )
+                with open(log_file, 'a', encoding='utf-8') as f:
+                    f.write(
+                        f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 阶梯 {index + 1} 完成: 并发 {step.concurrency}, "
+                        f"完成 {stats['total']}, 失败 {stats['failed']}, 吞吐 {stats['throughput']:.2f}请求/秒, "
+                        f"{stats['token_throughput']:.1f}token/秒, p50 {stats['p50_latency']:.3f}s, "
+                        f"p90 {stats['p90_latency']:.3f}s, p99 {stats['p99_latency']:.3f}s\n"
+                    )
             
-            # 停止结果处理协程
-            await result_queue.put(None)  # 发送停止信号
+            await result_queue.put(None)
             await result_handler
-            
-            # 关闭API客户端
             await api_client.close()
             
-            # 写入测试结束信息
+            for task in tasks:
+                token_counter.save_prompt_cache(task.dataset_name, task.prompts, api_client.model)
+            
+            self.progress.knee = detect_knee(
+                self.progress.step_stats,
+                schedule.gain_threshold,
+                schedule.p99_threshold
+            )
             with open(log_file, 'a', encoding='utf-8') as f:
-                f.write(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S')}] 测试完成\n")
+                f.write(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S')}] 并发阶梯测试完成\n")
                 f.write("-" * 50 + "\n")
-                f.write(f"总任务数: {self.progress.total_tasks}\n")
                 f.write(f"完成任务数: {self.progress.completed_tasks}\n")
                 f.write(f"成功任务数: {self.progress.successful_tasks}\n")
                 f.write(f"失败任务数: {self.progress.failed_tasks}\n")
-                f.write(f"平均响应时间: {self.progress.avg_response_time:.2f}s\n")
-                f.write(f"平均生成速度: {self.progress.avg_generation_speed:.2f}字/秒\n")
-                f.write(f"平均TPS: {self.progress.avg_tps:.2f}\n")
+                if self.progress.knee:
+                    prefix = "饱和拐点并发数不高于" if self.progress.knee["saturated_at_first_step"] else "饱和拐点并发数"
+                    f.write(f"{prefix}: {self.progress.knee['concurrency']} ({self.progress.knee['detail']})\n")
+                else:
+                    f.write("未检测到饱和拐点\n")
             
-            logger.info("[DEBUG] 测试完成")
+            log_writer.log("test_end", LOG_LEVEL_QUIET,
+                           completed=self.progress.completed_tasks,
+                           successful=self.progress.successful_tasks,
+                           failed=self.progress.failed_tasks,
+                           knee=self.progress.knee)
+            
+            if progress_callback:
+                progress_callback(self.progress)
+            logger.info(f"并发阶梯测试完成, 拐点: {self.progress.knee}")
             
         except Exception as e:
-            logger.error(f"[ERROR] 测试执行失败: {e}", exc_info=True)
-            # 记录错误信息到日志文件
+            logger.error(f"[ERROR] 并发阶梯测试执行失败: {e}", exc_info=True)
             with open(log_file, 'a', encoding='utf-8') as f:
                 f.write(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S')}] 测试执行失败: {e}\n")
                 f.write(traceback.format_exc())
             raise
+        finally:
+            if log_writer:
+                log_writer.close()
     
     def stop_test(self):
-        """停止测试"""
+        """停止测试，可以在其他线程调用"""
         self.running = False
+        if self.cancel_token:
+            self.cancel_token.cancel()
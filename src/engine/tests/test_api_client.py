@@ -0,0 +1,170 @@
+"""
+API客户端测试，请求发往本机事件循环中的OpenAI兼容服务，响应内容和发送节奏由测试控制
+"""
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+from aiohttp import web
+
+from src.engine import api_client as client_module
+from src.engine.api_client import APIClient, TOKEN_SOURCE_LOCAL, TOKEN_SOURCE_SERVER
+from src.utils.retry_policy import reset_circuit_breakers
+from src.utils.token_counter import async_token_counter, token_counter
+
+# 流式响应的节奏：首个内容块之前等待FIRST_DELAY，之后每块间隔CHUNK_DELAY
+FIRST_DELAY = 0.1
+CHUNK_DELAY = 0.05
+
+
+class ChatServer:
+    """最小OpenAI兼容服务，记录收到的原始请求体"""
+
+    def __init__(self, chunks=("a ", "b ", "c"), usage=None):
+        self.chunks = list(chunks)
+        self.usage = usage
+        self.bodies = []
+        self._runner = None
+        self.url = None
+
+    async def _chat(self, request):
+        raw = await request.read()
+        self.bodies.append(raw)
+        body = json.loads(raw)
+        if not body.get("stream"):
+            data = {"choices": [{"message": {"content": "".join(self.chunks)}}]}
+            if self.usage:
+                data["usage"] = self.usage
+            return web.json_response(data)
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for index, chunk in enumerate(self.chunks):
+            await asyncio.sleep(FIRST_DELAY if index == 0 else CHUNK_DELAY)
+            event = {"choices": [{"delta": {"content": chunk}}]}
+            await response.write(f"data: {json.dumps(event)}\n\n".encode())
+        if self.usage:
+            await response.write(f"data: {json.dumps({'choices': [], 'usage': self.usage})}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._chat)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/v1"
+
+    async def close(self):
+        await self._runner.cleanup()
+
+
+async def _generate(server, prompt="x y", stream=True, prepare=None):
+    """启动服务，用新建的客户端发送一次请求，返回响应"""
+    await server.start()
+    client = APIClient(server.url, "k", "m")
+    client.use_stream = stream
+    try:
+        if prepare:
+            prepare(client)
+        return await client.generate(prompt)
+    finally:
+        await client.close()
+        await server.close()
+
+
+class APIClientTest(unittest.TestCase):
+
+    def setUp(self):
+        reset_circuit_breakers()
+
+    def test_stream_latency_capture(self):
+        server = ChatServer(usage={"prompt_tokens": 2, "completion_tokens": 3})
+        response = asyncio.run(_generate(server))
+        self.assertTrue(response.success, response.error_msg)
+        self.assertEqual(response.response_text, "a b c")
+        # 首token延迟包含服务端首块前的等待，块间延迟和每token耗时约为块间隔
+        self.assertGreaterEqual(response.ttft, FIRST_DELAY * 0.9)
+        self.assertLess(response.ttft, FIRST_DELAY + 0.5)
+        self.assertGreaterEqual(response.itl, CHUNK_DELAY * 0.8)
+        self.assertLess(response.itl, CHUNK_DELAY + 0.5)
+        self.assertEqual(len(response.stream_stats.chunk_intervals), 2)
+        self.assertAlmostEqual(response.tpot, response.itl, delta=0.01)
+        self.assertGreaterEqual(response.e2e_latency, response.ttft + 2 * CHUNK_DELAY * 0.8)
+
+    def test_non_stream_ttft_equals_e2e(self):
+        server = ChatServer(usage={"prompt_tokens": 2, "completion_tokens": 3})
+        response = asyncio.run(_generate(server, stream=False))
+        self.assertTrue(response.success, response.error_msg)
+        self.assertEqual(response.ttft, response.e2e_latency)
+        self.assertEqual(response.itl, 0.0)
+
+
+class PrecompiledBodyTest(unittest.TestCase):
+
+    def setUp(self):
+        reset_circuit_breakers()
+
+    def test_precompiled_body_sent(self):
+        compiled = {}
+
+        def prepare(client):
+            self.assertEqual(client.precompile(["x y", "x y", "z"]), 2)
+            compiled["body"] = client.compile_request("x y")
+            # 预编码过的prompt发送时不再序列化
+            patcher = mock.patch.object(client_module.json, "dumps", side_effect=AssertionError("不应重新编码"))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        server = ChatServer(usage={"prompt_tokens": 2, "completion_tokens": 3})
+        response = asyncio.run(_generate(server, prompt="x y", stream=False, prepare=prepare))
+        self.assertTrue(response.success, response.error_msg)
+        self.assertEqual(server.bodies, [compiled["body"]])
+        body = json.loads(compiled["body"])
+        self.assertEqual((body["model"], body["messages"], body["stream"]),
+                         ("m", [{"role": "user", "content": "x y"}], False))
+
+
+class SpaceEncoder:
+    """按空格切分计数的编码器，代替需要下载词表的tiktoken编码器"""
+    name = "space_test"
+
+    def encode_ordinary(self, text):
+        return text.split()
+
+    def encode_ordinary_batch(self, texts):
+        return [text.split() for text in texts]
+
+
+class TokenCountSourceTest(unittest.TestCase):
+
+    def setUp(self):
+        reset_circuit_breakers()
+
+    def test_server_usage_preferred(self):
+        usage = {"prompt_tokens": 11, "completion_tokens": 7}
+        for stream in (True, False):
+            server = ChatServer(usage=usage)
+            with mock.patch.object(async_token_counter, "submit", side_effect=AssertionError("不应本地计数")):
+                response = asyncio.run(_generate(server, stream=stream))
+            self.assertTrue(response.success, response.error_msg)
+            self.assertEqual((response.tokens_generated, response.prompt_tokens, response.token_count_source),
+                             (7, 11, TOKEN_SOURCE_SERVER))
+            if stream:
+                # 流式请求需要显式请求服务端在最后一个数据块中返回usage
+                self.assertEqual(json.loads(server.bodies[0])["stream_options"], {"include_usage": True})
+
+    def test_local_count_without_usage(self):
+        for stream in (True, False):
+            server = ChatServer()
+            with mock.patch.object(token_counter, "get_encoder", lambda model_name=None: SpaceEncoder()):
+                response = asyncio.run(_generate(server, prompt="p q r s", stream=stream))
+            self.assertTrue(response.success, response.error_msg)
+            self.assertEqual((response.tokens_generated, response.prompt_tokens, response.token_count_source),
+                             (3, 4, TOKEN_SOURCE_LOCAL))
+
+
+if __name__ == "__main__":
+    unittest.main()
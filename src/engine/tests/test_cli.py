@@ -0,0 +1,82 @@
+"""
+命令行入口测试
+"""
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src.cli import build_tasks, load_benchmark_items
+from src.utils import config as config_module
+from src.utils.event_signal import Signal
+
+
+class BuildTasksTest(unittest.TestCase):
+
+    def test_inline_and_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "prompts.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("q1\n\nq2\n")
+            profile = {"concurrency": 3, "datasets": [
+                {"name": "inline", "prompts": ["a"], "weight": 2},
+                {"name": "file", "file": path, "concurrency": 5},
+            ]}
+            tasks = build_tasks(profile)
+        self.assertEqual([(t.dataset_name, t.prompts, t.weight, t.concurrency) for t in tasks],
+                         [("inline", ["a"], 2, 3), ("file", ["q1", "q2"], 1, 5)])
+
+    def test_empty_dataset(self):
+        with self.assertRaises(ValueError):
+            build_tasks({"datasets": [{"name": "empty", "prompts": []}]})
+
+
+class BenchmarkItemsTest(unittest.TestCase):
+
+    def test_json_and_prompts(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "benchmark.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"data": [{"id": "a", "text": "q1"}, "q2"]}, f)
+            items = load_benchmark_items({"dataset": path})
+        self.assertEqual(items, [{"id": "a", "text": "q1"}, {"id": "item-1", "text": "q2"}])
+        self.assertEqual(load_benchmark_items({"prompts": ["x"]}), [{"id": "item-0", "text": "x"}])
+        with self.assertRaises(ValueError):
+            load_benchmark_items({"prompts": []})
+
+
+class ConfigOverridesTest(unittest.TestCase):
+
+    def test_overrides_not_saved(self):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(config_module, "DATA_DIR", Path(tmp)):
+            cfg = config_module.Config()
+            cfg.apply_overrides({"test": {"timeout": 7}})
+            cfg.set("test.default_concurrency", 3)
+            self.assertEqual(cfg.get("test.timeout"), 7)
+            self.assertEqual(cfg.get("test.default_concurrency"), 3)
+            with open(Path(tmp) / "config.json", "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        self.assertEqual(saved["test"]["timeout"], config_module.DEFAULT_CONFIG["test"]["timeout"])
+        self.assertEqual(saved["test"]["default_concurrency"], 3)
+
+
+class SignalTest(unittest.TestCase):
+
+    def test_connect_emit_disconnect(self):
+        signal = Signal()
+        received = []
+        slot = received.append
+        signal.connect(slot)
+        signal.connect(lambda value: 1 / 0)  # 出错的回调不影响其他回调
+        signal.emit(1)
+        signal.disconnect(slot)
+        signal.emit(2)
+        self.assertEqual(received, [1])
+        with self.assertRaises(TypeError):
+            signal.disconnect(slot)
+
+
+if __name__ == "__main__":
+    unittest.main()
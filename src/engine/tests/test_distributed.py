@@ -0,0 +1,140 @@
+"""
+分布式代理与协调端测试，代理在本机监听，分片执行替换为不发送请求的假实现
+"""
+import asyncio
+import os
+import time
+import unittest
+from unittest import mock
+
+from src.engine import distributed
+from src.engine.api_client import APIResponse
+from src.engine.distributed import AgentConnection, DistributedAgent, TOKEN_ENV, run_distributed
+from src.engine.latency_histogram import METRIC_E2E
+from src.engine.load_profile import LoadProfile
+from src.engine.test_manager import TestManager as Manager, TestProgress as Progress  # 别名避免被pytest当作测试类收集
+from src.engine.test_manager import TestTask as Task
+
+TOKEN = "secret"
+
+
+async def fake_run_test(self, test_task_id, tasks, progress_callback, *args, **kwargs):
+    """代理端的分片执行：每个prompt记一次成功结果，延迟等于prompt序号（秒）"""
+    self.running = True
+    self.progress = Progress(test_task_id, sum(len(task.prompts) for task in tasks), 0, 0, 0, 0.0, 0.0)
+    for task in tasks:
+        for prompt in task.prompts:
+            now = time.time()
+            response = APIResponse(True, response_text=prompt, tokens_generated=2, duration=1.0,
+                                   start_time=now, end_time=now)
+            response.e2e_latency = float(prompt[1:])
+            self.progress.update(task.dataset_name, response)
+            self.result_received.emit(task.dataset_name, response)
+            progress_callback(self.progress)
+    self.running = False
+
+
+class DistributedTest(unittest.TestCase):
+
+    def setUp(self):
+        patchers = [
+            mock.patch.dict(os.environ, {TOKEN_ENV: TOKEN}),
+            mock.patch.object(distributed, "START_DELAY", 0.0),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def _start_agents(self, count):
+        agents = [DistributedAgent(port=0, token=TOKEN) for _ in range(count)]
+        for agent in agents:
+            await agent.start()
+        return agents, [f"127.0.0.1:{agent.port}" for agent in agents]
+
+    async def _stop_agents(self, agents):
+        # 等待代理处理完协调端断开，避免事件循环关闭时连接处理协程仍在运行
+        await asyncio.sleep(0.05)
+        for agent in agents:
+            await agent.close()
+
+    def test_wrong_token_rejected(self):
+        async def run():
+            agents, addresses = await self._start_agents(1)
+            try:
+                connection = await AgentConnection.connect(addresses[0], token="wrong")
+                try:
+                    with self.assertRaises(ConnectionError):
+                        await connection.sync_clock(samples=1)
+                finally:
+                    await connection.close()
+                # 令牌正确时可以正常通信
+                connection = await AgentConnection.connect(addresses[0])
+                await connection.sync_clock(samples=2)
+                await connection.close()
+            finally:
+                await self._stop_agents(agents)
+
+        asyncio.run(run())
+
+    def test_clock_offset_uses_min_rtt_sample(self):
+        # (t0, 代理时刻t1, t2)：往返时延分别为0.4、0.1、0.3，应取第二个样本的偏移 11.0 - (1.0 + 1.1) / 2
+        samples = [(0.0, 10.3, 0.4), (1.0, 11.0, 1.1), (2.0, 12.2, 2.3)]
+        clock = [t for t0, _, t2 in samples for t in (t0, t2)]
+        pongs = [{"type": distributed.MSG_PONG, "t0": t0, "t1": t1} for t0, t1, _ in samples]
+        connection = AgentConnection("fake", reader=None, writer=None)
+        with mock.patch.object(distributed, "send_message", mock.AsyncMock()), \
+                mock.patch.object(distributed, "read_message", mock.AsyncMock(side_effect=pongs)), \
+                mock.patch.object(distributed.time, "time", side_effect=clock):
+            asyncio.run(connection.sync_clock(samples=len(samples)))
+        self.assertAlmostEqual(connection.rtt, 0.1)
+        self.assertAlmostEqual(connection.clock_offset, 9.95)
+        self.assertAlmostEqual(connection.to_local_time(20.0), 10.05)
+
+    def test_snapshots_merged(self):
+        manager = Manager()
+        manager.running = True
+        manager.progress = Progress("t", 6, 0, 0, 0, 0.0, 0.0)
+        results = []
+        manager.result_received.connect(lambda dataset_name, response: results.append(response.response_text))
+        tasks = [Task("a", [f"a{i}" for i in range(1, 5)], 1, 4), Task("b", ["b5", "b6"], 1, 2)]
+
+        async def run():
+            agents, addresses = await self._start_agents(2)
+            try:
+                await run_distributed(manager, "t", tasks, LoadProfile(seed=1), addresses, report_interval=0.01)
+            finally:
+                await self._stop_agents(agents)
+
+        with mock.patch.object(Manager, "run_test", fake_run_test):
+            asyncio.run(run())
+        progress = manager.progress
+        self.assertEqual((progress.completed_tasks, progress.successful_tasks), (6, 6))
+        self.assertEqual(sorted(results), ["a1", "a2", "a3", "a4", "b5", "b6"])
+        self.assertEqual({name: stats["total"] for name, stats in progress.dataset_stats.items()}, {"a": 4, "b": 2})
+        e2e = progress.latency.histograms[METRIC_E2E]
+        self.assertEqual(e2e.count, 6)
+        self.assertAlmostEqual(e2e.max, 6.0, delta=0.1)
+
+    def test_duplicate_agents_rejected(self):
+        manager = Manager()
+        with self.assertRaises(ValueError):
+            asyncio.run(run_distributed(manager, "t", [], LoadProfile(), ["127.0.0.1:9100", "127.0.0.1"]))
+
+    def test_no_shards(self):
+        manager = Manager()
+        manager.running = True
+        manager.progress = Progress("t", 0, 0, 0, 0, 0.0, 0.0)
+
+        async def run():
+            agents, addresses = await self._start_agents(1)
+            try:
+                await run_distributed(manager, "t", [], LoadProfile(), addresses)
+            finally:
+                await self._stop_agents(agents)
+
+        asyncio.run(run())
+        self.assertEqual(manager.progress.completed_tasks, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+延迟直方图模块的测试脚本
+"""
+import random
+import unittest
+
+from src.engine.latency_histogram import LatencyHistogram, LatencyHistogramSet
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    """延迟直方图的测试类"""
+    
+    def setUp(self):
+        """测试前的设置"""
+        rng = random.Random(42)
+        self.values = [rng.lognormvariate(-2, 1) for _ in range(20000)]
+        self.histogram = LatencyHistogram()
+        for value in self.values:
+            self.histogram.record(value)
+    
+    def test_percentiles_within_precision(self):
+        """测试百分位的相对误差在精度范围内"""
+        ordered = sorted(self.values)
+        result = self.histogram.percentiles((50, 90, 99, 99.9))
+        for pct, key in ((50, "p50"), (90, "p90"), (99, "p99"), (99.9, "p999")):
+            exact = ordered[int(pct / 100 * len(ordered)) - 1]
+            self.assertAlmostEqual(result[key] / exact, 1.0, delta=0.02)
+    
+    def test_extremes(self):
+        """测试空直方图和最值"""
+        self.assertEqual(LatencyHistogram().percentile(99), 0.0)
+        self.assertEqual(self.histogram.count, len(self.values))
+        self.assertEqual(self.histogram.max, max(self.values))
+        self.assertLessEqual(self.histogram.percentile(100), self.histogram.max)
+    
+    def test_merge_equals_single_histogram(self):
+        """测试合并多个直方图与直接记录结果一致"""
+        merged = LatencyHistogram()
+        for start in range(0, len(self.values), 5000):
+            part = LatencyHistogram()
+            for value in self.values[start:start + 5000]:
+                part.record(value)
+            merged.merge(part)
+        self.assertEqual(merged.percentiles(), self.histogram.percentiles())
+        self.assertEqual(merged.count, self.histogram.count)
+        self.assertAlmostEqual(merged.mean, self.histogram.mean)
+    
+    def test_merge_incompatible(self):
+        """测试合并参数不同的直方图"""
+        with self.assertRaises(ValueError):
+            self.histogram.merge(LatencyHistogram(precision=0.05))
+    
+    def test_serialization(self):
+        """测试序列化和恢复"""
+        restored = LatencyHistogram.from_dict(self.histogram.to_dict())
+        self.assertEqual(restored.percentiles(), self.histogram.percentiles())
+        
+        histogram_set = LatencyHistogramSet()
+        histogram_set.record(0.5, 0.1, 0.01)
+        histogram_set.record(0.8, 0.2, 0.0)
+        restored_set = LatencyHistogramSet.from_dict(histogram_set.to_dict())
+        self.assertEqual(restored_set.percentiles(), histogram_set.percentiles())
+        self.assertEqual(restored_set["tpot"].count, 1)
+    
+    def test_coordinated_omission_correction(self):
+        """测试按期望间隔补齐被遗漏的请求"""
+        histogram = LatencyHistogram()
+        histogram.record_corrected(1.05, 0.1)
+        # 1.05, 0.95, ..., 0.15 共10个值
+        self.assertEqual(histogram.count, 10)
+        self.assertAlmostEqual(histogram.min, 0.15, delta=0.002)
+        
+        raw = LatencyHistogram()
+        for _ in range(99):
+            raw.record(0.1)
+        raw.record(1.05)
+        corrected = raw.corrected_copy(0.1)
+        self.assertEqual(corrected.count, 109)
+        self.assertGreater(corrected.percentile(95), raw.percentile(95))
+        self.assertEqual(raw.corrected_copy(0).percentiles(), raw.percentiles())
+    
+    def test_corrected_e2e(self):
+        """测试有计划发送时刻时直接使用记录值，否则从原始延迟推算"""
+        histogram_set = LatencyHistogramSet()
+        histogram_set.record(0.1)
+        histogram_set.record(1.05)
+        self.assertEqual(histogram_set.corrected_e2e(0.1).count, 11)
+        
+        scheduled = LatencyHistogramSet()
+        scheduled.record(0.1, corrected=0.3)
+        self.assertEqual(scheduled.corrected_e2e(0.1).count, 1)
+        self.assertAlmostEqual(scheduled.percentiles()["e2e_corrected"]["p50"], 0.3, delta=0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+"""
+多副本负载均衡测试
+"""
+import unittest
+
+from src.engine.load_balancer import (
+    STRATEGY_LEAST_OUTSTANDING, STRATEGY_P2C, STRATEGY_ROUND_ROBIN, EndpointBalancer, resolve_endpoints
+)
+
+
+class ResolveEndpointsTest(unittest.TestCase):
+
+    def test_formats(self):
+        base = {"api_url": "http://a/v1"}
+        self.assertEqual(resolve_endpoints(base), ["http://a/v1"])
+        self.assertEqual(resolve_endpoints({**base, "api_urls": ["http://b/v1", "http://a/v1"]}),
+                         ["http://a/v1", "http://b/v1"])
+        self.assertEqual(resolve_endpoints({**base, "api_urls": '["http://b/v1"]'}), ["http://a/v1", "http://b/v1"])
+        self.assertEqual(resolve_endpoints({**base, "api_urls": "http://b/v1,\nhttp://c/v1"}),
+                         ["http://a/v1", "http://b/v1", "http://c/v1"])
+
+
+class EndpointBalancerTest(unittest.TestCase):
+
+    def test_round_robin_skips_excluded(self):
+        balancer = EndpointBalancer(["a", "b", "c"], STRATEGY_ROUND_ROBIN)
+        self.assertEqual([balancer.choose() for _ in range(4)], [0, 1, 2, 0])
+        self.assertEqual(balancer.choose(exclude=[1]), 2)
+        self.assertIsNone(balancer.choose(exclude=[0, 1, 2]))
+
+    def test_least_outstanding(self):
+        balancer = EndpointBalancer(["a", "b", "c"], STRATEGY_LEAST_OUTSTANDING)
+        for index in (0, 0, 1):
+            balancer.acquire(index)
+        self.assertEqual(balancer.choose(), 2)
+        balancer.acquire(2)
+        balancer.release(0)
+        balancer.release(0)
+        self.assertEqual(balancer.choose(), 0)
+
+    def test_p2c_prefers_less_loaded(self):
+        balancer = EndpointBalancer(["a", "b"], STRATEGY_P2C, seed=1)
+        for _ in range(5):
+            balancer.acquire(0)
+        self.assertTrue(all(balancer.choose() == 1 for _ in range(20)))
+        self.assertEqual(balancer.choose(exclude=[1]), 0)
+
+    def test_invalid_strategy(self):
+        with self.assertRaises(ValueError):
+            EndpointBalancer(["a"], "random")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+负载配置测试
+"""
+import itertools
+import unittest
+from types import SimpleNamespace
+
+from src.engine.load_profile import LoadProfile, arrival_intervals, prompt_stream
+
+
+def _task(name, prompts, concurrency):
+    return SimpleNamespace(dataset_name=name, prompts=prompts, concurrency=concurrency)
+
+
+class LoadProfileTest(unittest.TestCase):
+
+    def test_from_dict(self):
+        profile = LoadProfile.from_dict({"mode": "open", "rate": 5, "duration": 60, "unknown": 1})
+        self.assertTrue(profile.is_open_loop)
+        self.assertTrue(profile.is_duration_based)
+        self.assertFalse(LoadProfile.from_dict(None).is_duration_based)
+
+    def test_invalid(self):
+        invalid = [
+            {"mode": "burst"},
+            {"arrival": "gamma"},
+            {"mode": "open", "rate": 0},
+            {"prompt_order": "reverse"},
+            {"duration": -1},
+            {"duration": 10, "warmup": 10},
+            {"bucket_interval": 0},
+        ]
+        for data in invalid:
+            with self.assertRaises(ValueError, msg=str(data)):
+                LoadProfile.from_dict(data)
+
+    def test_arrival_intervals(self):
+        constant = list(itertools.islice(arrival_intervals(LoadProfile(mode="open", rate=4)), 3))
+        self.assertEqual(constant, [0.25, 0.25, 0.25])
+        poisson = LoadProfile(mode="open", arrival="poisson", rate=100, seed=1)
+        samples = list(itertools.islice(arrival_intervals(poisson), 2000))
+        self.assertEqual(samples[:10], list(itertools.islice(arrival_intervals(poisson), 10)))
+        self.assertAlmostEqual(sum(samples) / len(samples), 0.01, delta=0.002)
+
+
+class PromptStreamTest(unittest.TestCase):
+
+    def test_single_round(self):
+        tasks = [_task("a", ["a1", "a2", "a3"], 2), _task("b", ["b1"], 3), _task("empty", [], 2)]
+        items = list(prompt_stream(tasks, LoadProfile(seed=0)))
+        self.assertEqual([name for name, _ in items], ["a", "a", "b"])
+        self.assertEqual(len({prompt for _, prompt in items}), 3)
+        self.assertEqual(items, list(prompt_stream(tasks, LoadProfile(seed=0))))
+
+    def test_duration_cycle(self):
+        tasks = [_task("a", ["a1", "a2", "a3"], 2)]
+        items = list(itertools.islice(prompt_stream(tasks, LoadProfile(duration=10)), 5))
+        self.assertEqual([prompt for _, prompt in items], ["a1", "a2", "a3", "a1", "a2"])
+
+    def test_duration_random(self):
+        tasks = [_task("a", ["a1", "a2"], 1)]
+        profile = LoadProfile(duration=10, prompt_order="random", seed=3)
+        items = list(itertools.islice(prompt_stream(tasks, profile), 50))
+        self.assertEqual({prompt for _, prompt in items}, {"a1", "a2"})
+        self.assertEqual(items, list(itertools.islice(prompt_stream(tasks, profile), 50)))
+
+    def test_no_prompts(self):
+        self.assertEqual(list(prompt_stream([_task("a", [], 1)], LoadProfile(duration=10))), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
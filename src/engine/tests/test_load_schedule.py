@@ -0,0 +1,66 @@
+"""
+并发阶梯调度测试
+"""
+import unittest
+
+from src.engine.load_schedule import ConcurrencySchedule, ConcurrencyStep, detect_knee
+
+
+def _step(concurrency, throughput, p99=0.1):
+    return {"concurrency": concurrency, "throughput": throughput, "p99_latency": p99}
+
+
+class ConcurrencyScheduleTest(unittest.TestCase):
+
+    def test_from_dict(self):
+        ramp = ConcurrencySchedule.from_dict({"ramp": {"start": 2, "stop": 8, "step": 3}, "hold": 5})
+        self.assertEqual([(s.concurrency, s.hold) for s in ramp.steps], [(2, 5), (5, 5), (8, 5)])
+        self.assertEqual(ramp.total_duration, 15)
+        steps = ConcurrencySchedule.from_dict({"steps": [1, {"concurrency": 4, "hold": 60}], "hold": 30,
+                                               "p99_threshold": 2.0})
+        self.assertEqual([(s.concurrency, s.hold) for s in steps.steps], [(1, 30), (4, 60)])
+        self.assertEqual(steps.p99_threshold, 2.0)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            ConcurrencySchedule(steps=[])
+        with self.assertRaises(ValueError):
+            ConcurrencyStep(0, 10)
+        with self.assertRaises(ValueError):
+            ConcurrencyStep(1, 0)
+        with self.assertRaises(ValueError):
+            ConcurrencySchedule.linear(1, 8, 0, 10)
+        with self.assertRaises(ValueError):
+            ConcurrencySchedule.from_dict({"ramp": {"start": 8, "stop": 1}})
+
+
+class DetectKneeTest(unittest.TestCase):
+
+    def test_throughput_flat(self):
+        stats = [_step(1, 10), _step(2, 19), _step(4, 36), _step(8, 37)]
+        knee = detect_knee(stats, gain_threshold=0.1)
+        self.assertEqual((knee["concurrency"], knee["step_index"], knee["reason"]), (4, 3, "throughput_flat"))
+        self.assertFalse(knee["saturated_at_first_step"])
+
+    def test_p99_threshold(self):
+        stats = [_step(1, 10, 0.5), _step(2, 20, 0.8), _step(4, 40, 3.0)]
+        knee = detect_knee(stats, gain_threshold=0.1, p99_threshold=2.0)
+        self.assertEqual((knee["concurrency"], knee["reason"]), (2, "p99_latency"))
+        self.assertFalse(knee["saturated_at_first_step"])
+
+    def test_saturated_at_first_step(self):
+        # 第一个阶梯就超过阈值时报告该阶梯的并发数，并明确标记已在第一个阶梯饱和
+        stats = [_step(4, 40, 3.0), _step(8, 80, 5.0)]
+        knee = detect_knee(stats, gain_threshold=0.1, p99_threshold=2.0)
+        self.assertEqual((knee["concurrency"], knee["step_index"], knee["reason"]), (4, 0, "p99_latency"))
+        self.assertTrue(knee["saturated_at_first_step"])
+
+    def test_no_knee(self):
+        # 上一阶梯吞吐为0或并发没有增加时跳过比较
+        stats = [_step(1, 0), _step(2, 20), _step(2, 30), _step(4, 60)]
+        self.assertIsNone(detect_knee(stats, gain_threshold=0.1))
+        self.assertIsNone(detect_knee([], gain_threshold=0.1))
+
+
+if __name__ == "__main__":
+    unittest.main()
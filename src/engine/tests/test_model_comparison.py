@@ -0,0 +1,35 @@
+"""
+多模型对比测试辅助函数测试
+"""
+import unittest
+
+from src.engine.model_comparison import comparison_deltas, interleave_prompts, model_labels
+
+
+class ModelComparisonTest(unittest.TestCase):
+
+    def test_model_labels_unique(self):
+        configs = [{"name": "fp16", "model": "llama3"}, {"model": "llama3"}, {"model": "llama3"}, {}]
+        self.assertEqual(model_labels(configs), ["fp16", "llama3", "llama3#2", "model4"])
+
+    def test_interleave_rotates_first_model(self):
+        items = list(interleave_prompts([("ds", "a"), ("ds", "b")], 2))
+        self.assertEqual(items, [("ds", "a", 0), ("ds", "a", 1), ("ds", "b", 1), ("ds", "b", 0)])
+
+    def test_deltas_direction(self):
+        metrics = {"success_rate": 1.0, "throughput": 10.0, "token_throughput": 100.0, "avg_latency": 1.0,
+                   "p50_latency": 1.0, "p90_latency": 1.0, "p99_latency": 2.0, "p50_ttft": 0.1,
+                   "p99_ttft": 0.2, "p50_tpot": 0.01}
+        faster = dict(metrics, throughput=15.0, p99_latency=1.0)
+        rows = {row["metric"]: row for row in comparison_deltas({"a": metrics, "b": faster})}
+        self.assertEqual(len(rows), len(metrics))
+        self.assertAlmostEqual(rows["throughput"]["delta_pct"], 50.0)
+        self.assertTrue(rows["throughput"]["better"])
+        self.assertAlmostEqual(rows["p99_latency"]["delta_pct"], -50.0)
+        self.assertTrue(rows["p99_latency"]["better"])
+        self.assertFalse(rows["avg_latency"]["better"])
+        self.assertEqual(rows["throughput"]["baseline"], "a")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+"""
+多进程任务分片和子进程运行测试
+"""
+import asyncio
+import multiprocessing
+import os
+import pathlib
+import tempfile
+import threading
+import unittest
+
+from aiohttp import web
+
+from src.engine import multiprocess_runner
+from src.engine.load_profile import LoadProfile
+from src.engine.multiprocess_runner import MSG_DONE, MSG_READY, shard_tasks
+from src.engine.test_manager import TestTask as Task  # 别名避免被pytest当作测试类收集
+
+
+def _prompts(shards, dataset_name):
+    return [prompt for shard, _ in shards for task in shard if task.dataset_name == dataset_name
+            for prompt in task.prompts]
+
+
+class ShardTasksTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tasks = [
+            Task("a", [f"a{i}" for i in range(10)], 1, 5),
+            Task("b", ["b0", "b1"], 2, 3),
+        ]
+
+    def test_fixed_count_splits_one_selection(self):
+        # 未指定种子时也不能重复或遗漏prompt
+        shards = shard_tasks(self.tasks, LoadProfile(), 3)
+        self.assertEqual(len(shards), 3)
+        a_prompts = _prompts(shards, "a")
+        self.assertEqual(len(a_prompts), 5)
+        self.assertEqual(len(set(a_prompts)), 5)
+        self.assertEqual(sorted(_prompts(shards, "b")), ["b0", "b1"])
+        for shard, _ in shards:
+            for task in shard:
+                self.assertEqual(task.concurrency, len(task.prompts))
+                self.assertEqual(task.weight, 1 if task.dataset_name == "a" else 2)
+
+    def test_duration_closed_loop(self):
+        shards = shard_tasks(self.tasks, LoadProfile(duration=60, seed=7), 4)
+        concurrency = {name: sum(task.concurrency for shard, _ in shards for task in shard if task.dataset_name == name)
+                       for name in ("a", "b")}
+        self.assertEqual(concurrency, {"a": 5, "b": 3})
+        self.assertEqual(sorted(_prompts(shards, "a")), sorted(self.tasks[0].prompts))
+        self.assertEqual([profile.seed for _, profile in shards], [7, 8, 9, 10])
+        # 数据集prompt少于进程数时各进程使用完整列表
+        self.assertTrue(all(task.prompts == ["b0", "b1"] for shard, _ in shards for task in shard
+                            if task.dataset_name == "b"))
+
+    def test_open_loop_splits_rate(self):
+        shards = shard_tasks(self.tasks, LoadProfile(mode="open", rate=12, duration=60), 3)
+        self.assertEqual([profile.rate for _, profile in shards], [4, 4, 4])
+        self.assertTrue(all(profile.seed is None for _, profile in shards))
+        # 开环模式下并发数只决定混合比例，不均分
+        self.assertEqual({task.concurrency for shard, _ in shards for task in shard if task.dataset_name == "a"}, {5})
+
+    def test_empty_shards_dropped(self):
+        shards = shard_tasks([Task("a", ["a0", "a1"], 1, 2)], LoadProfile(), 4)
+        self.assertEqual(len(shards), 2)
+
+
+class SpaceEncoder:
+    """按空格切分计数的编码器，子进程中代替需要下载词表的tiktoken编码器"""
+    name = "space_test"
+
+    def encode_ordinary(self, text):
+        return text.split()
+
+    def encode_ordinary_batch(self, texts):
+        return [text.split() for text in texts]
+
+
+def _shard_entry(workdir, *args):
+    """子进程入口：日志和token缓存写入临时目录，编码器替换为SpaceEncoder后运行分片"""
+    from src.utils import token_counter as token_counter_module
+    os.chdir(workdir)
+    token_counter_module.PROMPT_CACHE_DIR = pathlib.Path(workdir) / "token_counts"
+    token_counter_module.token_counter.get_encoder = lambda model_name=None: SpaceEncoder()
+    multiprocess_runner._shard_main(*args)
+
+
+class ChatServer:
+    """在后台线程中运行的最小OpenAI兼容服务，返回固定回答和usage"""
+
+    def __init__(self):
+        self.requests = 0
+        self.port = None
+        self._loop = asyncio.new_event_loop()
+        self._runner = None
+        ready = threading.Event()
+        threading.Thread(target=self._serve, args=(ready,), daemon=True).start()
+        ready.wait(10)
+
+    async def _chat(self, request):
+        self.requests += 1
+        await request.json()
+        return web.json_response({"choices": [{"message": {"content": "ok"}}],
+                                  "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}})
+
+    def _serve(self, ready):
+        asyncio.set_event_loop(self._loop)
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._chat)
+        self._runner = web.AppRunner(app)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        self._loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        ready.set()
+        self._loop.run_forever()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+class ShardProcessTest(unittest.TestCase):
+    """以spawn方式启动真实的子进程运行分片"""
+
+    def setUp(self):
+        self.server = ChatServer()
+        self.addCleanup(self.server.close)
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.workdir = workdir.name
+        self.context = multiprocessing.get_context("spawn")
+        self.message_queue = self.context.Queue()
+        self.start_event = self.context.Event()
+        self.stop_event = self.context.Event()
+
+    def _start_shard(self, tasks):
+        model_config = {"api_url": f"http://127.0.0.1:{self.server.port}/v1", "api_key": "k", "model": "m"}
+        process = self.context.Process(
+            target=_shard_entry,
+            args=(self.workdir, "shard_p0", tasks, LoadProfile(), model_config, self.message_queue,
+                  self.start_event, self.stop_event, 0.05, None, {"openai_api": {"stream_mode": False}}),
+            daemon=True
+        )
+        process.start()
+        self.addCleanup(process.join, 10)
+        self.assertEqual(self.message_queue.get(timeout=60), (MSG_READY, "shard_p0"))
+        return process
+
+    def _wait_done(self):
+        results = []
+        while True:
+            message = self.message_queue.get(timeout=60)
+            self.assertNotEqual(message[0], multiprocess_runner.MSG_ERROR, message)
+            results.extend(message[3])
+            if message[0] == MSG_DONE:
+                return message[2], results
+
+    def test_run_shard(self):
+        self._start_shard([Task("a", ["p1", "p2", "p3"], 1, 3)])
+        self.start_event.set()
+        snapshot, results = self._wait_done()
+        self.assertEqual((snapshot["completed_tasks"], snapshot["successful_tasks"]), (3, 3))
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(response.success for _, response in results))
+        self.assertEqual(self.server.requests, 3)
+
+    def test_stop_before_running(self):
+        # 停止请求与统一开始同时到达，子进程不能在run_test标记运行后继续发送请求
+        self._start_shard([Task("a", ["p1", "p2", "p3"], 1, 3)])
+        self.stop_event.set()
+        self.start_event.set()
+        snapshot, results = self._wait_done()
+        self.assertEqual(snapshot["completed_tasks"], 0)
+        self.assertEqual(self.server.requests, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+SSE解析器测试
+"""
+import asyncio
+import json
+import unittest
+
+from src.engine import sse_parser
+from src.engine.sse_parser import SSEParser, decode_event, drain_stream, extract_delta
+
+
+def _event(content: str) -> bytes:
+    payload = {"choices": [{"delta": {"content": content}}]}
+    return b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n"
+
+
+class SSEParserTest(unittest.TestCase):
+
+    def _contents(self, events):
+        return [extract_delta(event)[0] for data in events for event in decode_event(data)]
+
+    def test_split_at_any_boundary(self):
+        stream = b"".join(_event(text) for text in ["你好", "，", "世界"]) + b"data: [DONE]\n\n"
+        for size in (1, 3, 7, len(stream)):
+            parser = SSEParser()
+            events = []
+            for i in range(0, len(stream), size):
+                events.extend(parser.feed(stream[i:i + size]))
+            events.extend(parser.flush())
+            self.assertEqual(self._contents(events), ["你好", "，", "世界"])
+            self.assertTrue(parser.done)
+
+    def test_crlf_comments_and_multiline_data(self):
+        parser = SSEParser()
+        events = parser.feed(b": keep-alive\r\nevent: message\r\ndata: {\"choices\":\r\ndata: [{\"text\": \"a\"}]}\r\n\r\n")
+        self.assertEqual(self._contents(events), ["a"])
+
+    def test_missing_blank_lines(self):
+        # 部分服务端相邻data行之间没有空行
+        parser = SSEParser()
+        stream = _event("a").replace(b"\n\n", b"\n") + _event("b").replace(b"\n\n", b"\n")
+        events = parser.feed(stream) + parser.flush()
+        self.assertEqual(self._contents(events), ["a", "b"])
+
+    def test_done_without_blank_line(self):
+        parser = SSEParser()
+        events = parser.feed(b'data:{"choices": [{"text": "a"}]}\ndata:[DONE]\n')
+        self.assertTrue(parser.done)
+        self.assertEqual(self._contents(events), ["a"])
+        self.assertEqual(parser.flush(), [])
+
+    def test_ignore_after_done(self):
+        parser = SSEParser()
+        parser.feed(b"data: [DONE]\n\n")
+        self.assertEqual(parser.feed(_event("late")), [])
+        self.assertEqual(parser.flush(), [])
+
+    def test_drain_stream(self):
+        class Content:
+            def __init__(self, delay):
+                self.delay = delay
+                self.read_called = False
+
+            def at_eof(self):
+                return False
+
+            async def read(self):
+                self.read_called = True
+                await asyncio.sleep(self.delay)
+                return b"\r\n"
+
+        class Response:
+            def __init__(self, delay):
+                self.content = Content(delay)
+                self.closed = False
+
+            def close(self):
+                self.closed = True
+
+        finished, stalled = Response(0), Response(5)
+        asyncio.run(drain_stream(finished))
+        asyncio.run(drain_stream(stalled, timeout=0.01))
+        self.assertTrue(finished.content.read_called)
+        self.assertFalse(finished.closed)
+        self.assertTrue(stalled.closed)
+
+    def test_stdlib_json_fallback(self):
+        loads = sse_parser._json_loads
+        self.assertEqual(loads(b'{"a": "\xe4\xbd\xa0"}\r\n'), {"a": "你"})
+        self.assertEqual(loads(b' {"a": 1}'), {"a": 1})
+        with self.assertRaises(ValueError):
+            loads(b'{"a": 1}\n{"a": 2}')
+        with self.assertRaises(ValueError):
+            loads(b"not json")
+
+    def test_usage_and_invalid_json(self):
+        self.assertEqual(decode_event(b"not json"), [])
+        content, usage = extract_delta({"choices": [], "usage": {"completion_tokens": 3}})
+        self.assertEqual(content, "")
+        self.assertEqual(usage, {"completion_tokens": 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
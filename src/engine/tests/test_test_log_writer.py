@@ -0,0 +1,85 @@
+"""
+测试日志写入器测试
+"""
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from src.engine.test_log_writer import (
+    LOG_LEVEL_NORMAL, LOG_LEVEL_QUIET, LOG_LEVEL_VERBOSE, TestLogWriter as LogWriter  # 别名避免被pytest当作测试类收集
+)
+
+
+class RecordingWriter(LogWriter):
+    """记录后台线程每批取出的条数（含停止信号）"""
+
+    def __init__(self, *args, **kwargs):
+        self.batches = []
+        super().__init__(*args, **kwargs)
+
+    def _next_batch(self):
+        batch = super()._next_batch()
+        self.batches.append(len(batch))
+        return batch
+
+
+class TestLogWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.log_file = os.path.join(workdir.name, "events.jsonl")
+
+    def _events(self):
+        with open(self.log_file, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_batching_and_flush_on_close(self):
+        # 刷新间隔很长，只有凑满一批或关闭时才写入
+        writer = RecordingWriter(self.log_file, verbosity="normal", flush_interval=5.0, batch_size=3)
+        for index in range(7):
+            writer.log("request", LOG_LEVEL_NORMAL, index=index)
+        started = time.monotonic()
+        writer.close()
+        self.assertLess(time.monotonic() - started, 2.0)
+        self.assertEqual(writer.batches, [3, 3, 2])
+        self.assertEqual([event["index"] for event in self._events()], list(range(7)))
+        # 关闭后写入的日志被丢弃并计数
+        writer.log("late", LOG_LEVEL_QUIET)
+        self.assertEqual(writer.dropped, 1)
+
+    def test_flush_interval(self):
+        writer = LogWriter(self.log_file, verbosity="normal", flush_interval=0.05, batch_size=100)
+        try:
+            writer.log("request", LOG_LEVEL_NORMAL, index=0)
+            deadline = time.monotonic() + 2.0
+            # 未凑满一批，刷新间隔到达后写入
+            while time.monotonic() < deadline:
+                if os.path.exists(self.log_file) and os.path.getsize(self.log_file):
+                    break
+                time.sleep(0.01)
+            self.assertEqual(len(self._events()), 1)
+        finally:
+            writer.close()
+
+    def test_levels(self):
+        expected = {
+            "quiet": ["test_start"],
+            "normal": ["test_start", "request"],
+            "verbose": ["test_start", "request", "worker"],
+        }
+        for verbosity, events in expected.items():
+            with LogWriter(self.log_file, verbosity=verbosity) as writer:
+                writer.log("test_start", LOG_LEVEL_QUIET)
+                writer.log("request", LOG_LEVEL_NORMAL)
+                writer.log("worker", LOG_LEVEL_VERBOSE)
+                self.assertEqual(writer.enabled(LOG_LEVEL_VERBOSE), verbosity == "verbose")
+            self.assertEqual([event["event"] for event in self._events()], events, verbosity)
+        with self.assertRaises(ValueError):
+            LogWriter(self.log_file, verbosity="debug")
+
+
+if __name__ == "__main__":
+    unittest.main()
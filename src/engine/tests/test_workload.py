@@ -0,0 +1,64 @@
+"""
+请求形态测试
+"""
+import asyncio
+import unittest
+from unittest import mock
+
+from src.engine.api_client import APIResponse
+from src.engine.test_manager import TestManager as Manager, TestProgress as Progress  # 别名避免被pytest当作测试类收集
+from src.engine.workload import ConversationSession, WorkloadProfile, apply_workload, prompt_text
+
+
+class WorkloadTest(unittest.TestCase):
+
+    def test_default_passthrough(self):
+        prompts = [("ds", "a"), ("ds", "b")]
+        self.assertEqual(list(apply_workload(prompts, WorkloadProfile())), prompts)
+
+    def test_sessions_group_by_dataset(self):
+        prompts = [("a", "a1"), ("b", "b1"), ("a", "a2"), ("a", "a3"), ("b", "b2")]
+        items = list(apply_workload(prompts, WorkloadProfile(turns=2)))
+        self.assertEqual([(name, session.user_turns) for name, session in items],
+                         [("a", ["a1", "a2"]), ("b", ["b1", "b2"]), ("a", ["a3"])])
+
+    def test_session_history(self):
+        session = ConversationSession(["q1", "q2"], system_prompt="sys")
+        history = []
+        self.assertEqual(session.messages(0, history),
+                         [{"role": "system", "content": "sys"}, {"role": "user", "content": "q1"}])
+        session.add_reply(history, 0, "r1")
+        self.assertEqual([m["content"] for m in session.messages(1, history)], ["sys", "q1", "r1", "q2"])
+
+    def test_cache_bust_unique(self):
+        items = list(apply_workload([("ds", "a"), ("ds", "a")], WorkloadProfile(cache_bust=True)))
+        first, second = (messages for _, messages in items)
+        self.assertEqual(first[-1], {"role": "user", "content": "a"})
+        self.assertNotEqual(first[0]["content"], second[0]["content"])
+        self.assertTrue(prompt_text(first).endswith("\na"))
+
+    def test_invalid_profile(self):
+        with self.assertRaises(ValueError):
+            WorkloadProfile(share_ratio=1.5)
+        with self.assertRaises(ValueError):
+            WorkloadProfile(turns=0)
+
+
+class SessionAbortTest(unittest.TestCase):
+
+    def test_skipped_turns_removed_from_model_progress(self):
+        manager = Manager()
+        manager.running = True
+        manager.progress = Progress("t", 6, 0, 0, 0, 0.0, 0.0)
+        model_progress = Progress("t:a", 3, 0, 0, 0, 0.0, 0.0)
+        replies = [APIResponse(True, response_text="r1"), APIResponse(False, error_msg="boom")]
+        session = ConversationSession(["q1", "q2", "q3"])
+        with mock.patch.object(manager, "_execute_task", side_effect=replies):
+            asyncio.run(manager._execute_session("w", "ds", session, None, None, mock.Mock(),
+                                                 model_progress=model_progress))
+        # 第二轮失败，放弃第三轮，总体和执行该会话的模型都扣除一个任务
+        self.assertEqual((manager.progress.total_tasks, model_progress.total_tasks), (5, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
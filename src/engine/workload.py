@@ -0,0 +1,182 @@
+"""
+请求负载形态模块，在数据集prompt之上构造共享前缀、多轮会话和缓存击穿等请求形态
+"""
+import random
+import uuid
+from dataclasses import dataclass, fields
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from src.data.synthetic_dataset import exact_text
+from src.utils.config import config
+from src.utils.logger import setup_logger
+
+logger = setup_logger("workload")
+
+
+@dataclass
+class WorkloadProfile:
+    """
+    请求形态配置数据类
+
+    - prefix_tokens > 0 时每个请求带一段prefix_tokens个token的系统提示前缀，share_ratio比例的请求
+      从prefix_count个共享前缀中选取，其余请求使用等长的唯一前缀，请求长度不因是否共享而变化
+    - turns > 1 时将连续的turns个prompt组成一个会话，逐轮发送并携带之前各轮的问题和模型的实际回答
+    - cache_bust为True时在每个请求最前面加入唯一标记，服务端前缀缓存无法命中，其余内容与关闭时完全相同，
+      开关前后各跑一次即可测出前缀缓存带来的收益
+    """
+    prefix_tokens: int = 0  # 系统提示前缀长度（token），0表示不加前缀
+    share_ratio: float = 1.0  # 使用共享前缀的请求比例
+    prefix_count: int = 1  # 共享前缀的个数，模拟多个应用各自的系统提示
+    turns: int = 1  # 每个会话的轮数，1表示单轮请求
+    think_time: float = 0.0  # 多轮会话中收到回答后到发送下一轮的间隔（秒）
+    cache_bust: bool = False  # 是否在每个请求前加入唯一标记
+    seed: Optional[int] = None  # 随机种子，便于复现前缀选择
+
+    def __post_init__(self):
+        if self.prefix_tokens < 0:
+            raise ValueError("前缀长度不能为负数")
+        if not 0.0 <= self.share_ratio <= 1.0:
+            raise ValueError("共享前缀比例必须在0到1之间")
+        if self.prefix_count < 1:
+            raise ValueError("共享前缀个数必须大于0")
+        if self.turns < 1:
+            raise ValueError("会话轮数必须大于0")
+        if self.think_time < 0:
+            raise ValueError("会话间隔不能为负数")
+
+    @property
+    def is_default(self) -> bool:
+        """是否为默认形态，即每个prompt作为单独的用户消息发送"""
+        return self.prefix_tokens == 0 and self.turns == 1 and not self.cache_bust
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "WorkloadProfile":
+        """从字典创建请求形态配置，忽略未知字段"""
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in (data or {}).items() if k in names})
+
+    @classmethod
+    def from_config(cls) -> "WorkloadProfile":
+        """从全局配置test.workload创建请求形态配置"""
+        return cls.from_dict(config.get("test.workload", {}))
+
+
+@dataclass
+class ConversationSession:
+    """
+    多轮会话，每轮请求包含系统提示、之前各轮的问题和回答以及本轮问题
+
+    会话内的各轮必须按顺序发送，由同一个工作协程逐轮执行。会话本身不保存模型的回答，
+    由执行方维护历史，对比测试中多个模型可以共用同一个会话对象。
+    """
+    user_turns: List[str]
+    system_prompt: str = ""
+    cache_bust: bool = False
+
+    def messages(self, turn: int, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        第turn轮（从0开始）的完整消息列表
+
+        Args:
+            turn: 轮次
+            history: 之前各轮的问题和回答，见add_reply()
+        """
+        messages = []
+        system_prompt = self.system_prompt
+        if self.cache_bust:
+            system_prompt = _cache_buster() + system_prompt
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.extend(history)
+        messages.append({"role": "user", "content": self.user_turns[turn]})
+        return messages
+
+    def add_reply(self, history: List[Dict[str, str]], turn: int, reply: str):
+        """将第turn轮的问题和模型回答追加到history，作为后续各轮的历史"""
+        history.append({"role": "user", "content": self.user_turns[turn]})
+        history.append({"role": "assistant", "content": reply})
+
+
+def prompt_text(prompt: Union[str, List[Dict[str, str]]]) -> str:
+    """获取prompt的文本内容，消息列表按顺序拼接，用于本地计数输入token和日志"""
+    if isinstance(prompt, str):
+        return prompt
+    return "\n".join(message.get("content", "") for message in prompt)
+
+
+def filler_text(rng: random.Random, tokens: int, model: str = "") -> str:
+    """
+    生成恰好tokens个token的无意义文本，见synthetic_dataset.exact_text()
+
+    Args:
+        rng: 随机数生成器，决定文本内容
+        tokens: 目标token数
+        model: 模型名称，用于选择编码器
+    """
+    return exact_text(rng, tokens, model)
+
+
+def _cache_buster() -> str:
+    """唯一标记，放在请求最前面使服务端前缀缓存失效"""
+    return f"[{uuid.uuid4().hex}]\n"
+
+
+def apply_workload(prompts: Iterable[Tuple[str, str]], workload: WorkloadProfile,
+                   model: str = "") -> Iterator[Tuple[str, object]]:
+    """
+    按请求形态转换prompt序列
+
+    Args:
+        prompts: (数据集名称, prompt)序列
+        workload: 请求形态配置
+        model: 模型名称，用于按token数构造前缀
+
+    Returns:
+        Iterator[Tuple[str, object]]: 默认形态原样返回；多轮会话返回(数据集名称, ConversationSession)，
+            同一会话的各轮来自同一数据集中连续的prompt；其余返回(数据集名称, 消息列表)
+    """
+    if workload.is_default:
+        yield from prompts
+        return
+
+    rng = random.Random(workload.seed)
+    # 共享前缀的内容只由序号决定，多进程和分布式代理各自生成的共享前缀完全相同
+    shared_prefixes = [
+        filler_text(random.Random(f"shared_prefix_{index}"), workload.prefix_tokens, model)
+        for index in range(workload.prefix_count)
+    ]
+    if workload.prefix_tokens:
+        logger.info(
+            f"请求形态: 前缀 {workload.prefix_tokens} token, 共享比例 {workload.share_ratio:.0%}, "
+            f"共享前缀 {workload.prefix_count} 个, 会话轮数 {workload.turns}, 缓存击穿 {workload.cache_bust}"
+        )
+
+    def system_prompt() -> str:
+        if not workload.prefix_tokens:
+            return ""
+        if rng.random() < workload.share_ratio:
+            return rng.choice(shared_prefixes)
+        return filler_text(rng, workload.prefix_tokens, model)
+
+    if workload.turns == 1:
+        for dataset_name, prompt in prompts:
+            messages = []
+            prefix = system_prompt()
+            if workload.cache_bust:
+                prefix = _cache_buster() + prefix
+            if prefix:
+                messages.append({"role": "system", "content": prefix})
+            messages.append({"role": "user", "content": prompt})
+            yield dataset_name, messages
+        return
+
+    # 按数据集分别收集连续的prompt组成会话，避免一个会话混入不同数据集的问题
+    pending: Dict[str, List[str]] = {}
+    for dataset_name, prompt in prompts:
+        turns = pending.setdefault(dataset_name, [])
+        turns.append(prompt)
+        if len(turns) == workload.turns:
+            yield dataset_name, ConversationSession(turns, system_prompt(), workload.cache_bust)
+            del pending[dataset_name]
+    # 固定任务数模式下剩余不足一个完整会话的prompt组成较短的会话
+    for dataset_name, turns in pending.items():
+        yield dataset_name, ConversationSession(turns, system_prompt(), workload.cache_bust)
@@ -132,6 +132,9 @@ TRANSLATIONS = {
         'current_speed': 'Current Speed',
         'total_chars': 'Total Characters',
         'avg_tps': 'Avg TPS',
+        'avg_ttft': 'Avg TTFT',
+        'avg_tpot': 'Avg TPOT',
+        'latency_percentiles': 'Latency percentiles',
         'model_config': 'Model Configuration',
         'common_config': 'Common Configuration',
         'request_timeout': 'Request Timeout (seconds):',
@@ -171,10 +174,22 @@ TRANSLATIONS = {
         'disk_io_latency': 'Disk I/O Latency',
         'session_name': 'Session Name',
         'operations': 'Operations',
+        'p99_latency': 'p99 Latency',
+        'p99_latency_corrected': 'p99 Latency (CO-corrected)',
         'total_time': 'Total Time',
         'model_name': 'Model Name',
         'concurrency': 'Concurrency',
         'api_url': 'API URL',
+        'replica_urls': 'Replica URLs',
+        'replica_urls_placeholder': 'Other replicas of the same model, one URL per line',
+        'balance_strategy': 'Balancing',
+        'balance_round_robin': 'Round robin',
+        'balance_least_outstanding': 'Least outstanding requests',
+        'balance_p2c': 'Power of two choices',
+        'replica_stats': 'Replica',
+        'no_comparison': 'No comparison',
+        'compare_model': 'Model',
+        'compare_model_tip': 'Optionally pick a second model to drive with the same prompts in this run',
         'api_key': 'API Key',
         'max_tokens': 'Max Tokens',
         'top_p': 'Top P',
@@ -205,6 +220,24 @@ TRANSLATIONS = {
         'import_builtin': 'Import from Built-in Datasets',
         'import_file': 'Import from File',
         'select_builtin_dataset': 'Select Built-in Dataset',
+        'import_synthetic': 'Generate Synthetic Dataset',
+        'synthetic_dataset': 'Synthetic Dataset',
+        'length_distribution': 'Input Length Distribution',
+        'dist_fixed': 'Fixed',
+        'dist_uniform': 'Uniform',
+        'dist_normal': 'Normal',
+        'dist_empirical': 'Empirical',
+        'input_tokens': 'Input Tokens',
+        'min_length': 'Min Length',
+        'max_length': 'Max Length',
+        'mean_length': 'Mean Length',
+        'std_length': 'Std Deviation',
+        'length_samples': 'Length Samples',
+        'length_samples_placeholder': 'One length per line, optionally followed by a weight, e.g. "2048 3"',
+        'prompt_number': 'Number of Prompts',
+        'random_seed': 'Random Seed',
+        'encoder_model': 'Tokenizer Model',
+        'encoder_model_placeholder': 'Leave empty to use the default tokenizer',
         'select_dataset_file': 'Select Dataset File',
         'text_file': 'Text File',
         'all_files': 'All Files',
@@ -370,6 +403,9 @@ TRANSLATIONS = {
         'current_speed': '当前速度',
         'total_chars': '总字符数',
         'avg_tps': '平均TPS',
+        'avg_ttft': '平均首token延迟',
+        'avg_tpot': '平均每token耗时',
+        'latency_percentiles': '延迟百分位',
         'model_config': '模型配置',
         'common_config': '通用配置',
         'request_timeout': '请求超时时间(秒):',
@@ -409,10 +445,22 @@ TRANSLATIONS = {
         'disk_io_latency': '磁盘IO延迟',
         'session_name': '会话名称',
         'operations': '操作',
+        'p99_latency': 'p99延迟',
+        'p99_latency_corrected': 'p99延迟(校正)',
         'total_time': '总耗时',
         'model_name': '模型名称',
         'concurrency': '并发数',
         'api_url': 'API地址',
+        'replica_urls': '副本地址',
+        'replica_urls_placeholder': '同一模型的其他副本地址，每行一个',
+        'balance_strategy': '均衡策略',
+        'balance_round_robin': '轮询',
+        'balance_least_outstanding': '最少在途请求',
+        'balance_p2c': '随机二选一',
+        'replica_stats': '副本',
+        'no_comparison': '不对比',
+        'compare_model': '模型',
+        'compare_model_tip': '可选，选择另一个模型在本次测试中以相同的prompt同时测试并对比',
         'api_key': 'API密钥',
         'max_tokens': '最大Token数',
         'top_p': 'Top P值',
@@ -443,6 +491,24 @@ TRANSLATIONS = {
         'import_builtin': '从内置数据集导入',
         'import_file': '从文件导入',
         'select_builtin_dataset': '选择内置数据集',
+        'import_synthetic': '生成合成数据集',
+        'synthetic_dataset': '合成数据集',
+        'length_distribution': '输入长度分布',
+        'dist_fixed': '固定长度',
+        'dist_uniform': '均匀分布',
+        'dist_normal': '正态分布',
+        'dist_empirical': '经验分布',
+        'input_tokens': '输入token数',
+        'min_length': '最小长度',
+        'max_length': '最大长度',
+        'mean_length': '平均长度',
+        'std_length': '标准差',
+        'length_samples': '长度样本',
+        'length_samples_placeholder': '每行一个长度，可在后面加权重，如"2048 3"',
+        'prompt_number': 'prompt条数',
+        'random_seed': '随机种子',
+        'encoder_model': '编码器模型',
+        'encoder_model_placeholder': '留空使用默认编码器',
         'select_dataset_file': '选择数据集文件',
         'text_file': '文本文件',
         'all_files': '所有文件',
@@ -608,6 +674,9 @@ TRANSLATIONS = {
         'current_speed': 'Vitesse actuelle',
         'total_chars': 'Caractères totaux',
         'avg_tps': 'TPS moyen',
+        'avg_ttft': 'TTFT moyen',
+        'avg_tpot': 'TPOT moyen',
+        'latency_percentiles': 'Percentiles de latence',
         'name': 'Nom',
         'test_connection_success': 'Test de connexion réussi ! Informations GPU récupérées.',
         'test_connection_no_gpu': 'Connexion réussie mais impossible d\'obtenir les informations GPU. Veuillez vérifier si les pilotes NVIDIA sont installés.',
@@ -12,6 +12,7 @@ from src.utils.logger import setup_logger
 from src.data.db_manager import db_manager
 from src.engine.api_client import APIResponse
 from src.engine.test_manager import TestProgress
+from src.engine.model_comparison import format_comparison_table
 from src.gui.i18n.language_manager import LanguageManager
 import time
 import os
@@ -52,7 +53,7 @@ class ResultsTab(QWidget):
         
         # 创建结果表格
         self.result_table = QTableWidget()
-        self.result_table.setColumnCount(12)
+        self.result_table.setColumnCount(14)
         self.result_table.setHorizontalHeaderLabels([
             "会话名称",
             "完成/总数",
@@ -65,6 +66,8 @@ class ResultsTab(QWidget):
             "总耗时",
             "模型名称",
             "并发数",
+            "p99延迟",
+            "p99延迟(校正)",
             "操作"
         ])
         
@@ -86,7 +89,9 @@ class ResultsTab(QWidget):
             8: 100,  # 总耗时
             9: 150,  # 模型名称
             10: 80,  # 并发数
-            11: 80   # 操作
+            11: 100, # p99延迟
+            12: 120, # 校正协调遗漏后的p99延迟
+            13: 80   # 操作
         }
         
         # 应用最小宽度
@@ -180,6 +185,11 @@ class ResultsTab(QWidget):
             # 设置并发数
             self.result_table.setItem(row, 10, QTableWidgetItem(str(record['concurrency'])))
             
+            # 设置原始和校正协调遗漏后的p99延迟，旧记录没有百分位时留空
+            raw_p99, corrected_p99 = self._p99_latencies(record)
+            self.result_table.setItem(row, 11, QTableWidgetItem(f"{raw_p99 * 1000:.0f}ms" if raw_p99 else "-"))
+            self.result_table.setItem(row, 12, QTableWidgetItem(f"{corrected_p99 * 1000:.0f}ms" if corrected_p99 else "-"))
+            
             # 创建操作按钮容器
             button_widget = QWidget()
             button_layout = QHBoxLayout()
@@ -199,13 +209,22 @@ class ResultsTab(QWidget):
             button_layout.addWidget(delete_btn)
             
             button_widget.setLayout(button_layout)
-            self.result_table.setCellWidget(row, 11, button_widget)
+            self.result_table.setCellWidget(row, 13, button_widget)
             
             logger.debug(f"记录已添加到表格第 {row} 行")
             
         except Exception as e:
             logger.error(f"添加记录到表格失败: {e}", exc_info=True)
     
+    @staticmethod
+    def _p99_latencies(record: dict):
+        """获取记录的原始和校正后e2e延迟p99（秒），缺失时为0"""
+        percentiles = record.get('latency_percentiles') or {}
+        return (
+            percentiles.get('e2e', {}).get('p99', 0.0),
+            percentiles.get('e2e_corrected', {}).get('p99', 0.0)
+        )
+    
     def _view_log(self, log_file: str, session_name: str):
         """查看日志文件"""
         logger.debug(f"尝试查看日志文件，会话: {session_name}, 日志文件路径: {log_file}")
@@ -304,11 +323,15 @@ class ResultsTab(QWidget):
                     "测试时间", "模型名称", "并发数", "总任务数",
                     "成功任务数", "失败任务数", "平均响应时间(ms)",
                     "平均生成速度(字符/秒)", "总Token数",
-                    "平均TPS", "总耗时(ms)"
+                    "平均TPS", "总耗时(ms)",
+                    "p50延迟(ms)", "p99延迟(ms)", "p50延迟-校正(ms)", "p99延迟-校正(ms)"
                 ])
                 
-                # 写入数据
+                # 写入数据，延迟百分位同时导出原始值和校正协调遗漏后的值
                 for record in records:
+                    percentiles = record.get("latency_percentiles") or {}
+                    raw = percentiles.get("e2e", {})
+                    corrected = percentiles.get("e2e_corrected", {})
                     writer.writerow([
                         record["test_time"],
                         record["model_name"],
@@ -320,7 +343,11 @@ class ResultsTab(QWidget):
                         record["avg_generation_speed"],
                         record["total_tokens"],
                         record["avg_tps"],
-                        record["total_time"]
+                        record["total_time"],
+                        raw.get("p50", 0) * 1000,
+                        raw.get("p99", 0) * 1000,
+                        corrected.get("p50", 0) * 1000,
+                        corrected.get("p99", 0) * 1000
                     ])
             
             QMessageBox.information(self, self.tr('success'), self.tr('export_success'))
@@ -419,6 +446,25 @@ class ResultsTab(QWidget):
                     f.write(f"  平均响应时间: {stats.get('avg_response_time', 0):.2f}秒\n")
                     f.write(f"  平均生成速度: {stats.get('avg_generation_speed', 0):.1f}字/秒\n")
                     f.write(f"  总字符数: {stats.get('total_chars', 0)}\n")
+                    for metric, values in stats.get('latency_percentiles', {}).items():
+                        f.write(f"  {metric}延迟百分位: " + ", ".join(
+                            f"{key} {value * 1000:.1f}ms" for key, value in values.items()) + "\n")
+                
+                # 写入各副本统计（多副本时）
+                if self.current_records.get('replicas'):
+                    f.write("\n副本统计信息:\n")
+                    for endpoint, replica in self.current_records['replicas'].items():
+                        f.write(f"\n{endpoint}:\n")
+                        f.write(f"  完成数: {replica['total']}\n")
+                        f.write(f"  失败数: {replica['failed']}\n")
+                        f.write(f"  平均延迟: {replica['avg_latency']:.2f}秒\n")
+                        f.write(f"  p50/p99延迟: {replica['p50'] * 1000:.1f}ms / {replica['p99'] * 1000:.1f}ms\n")
+                        f.write(f"  吞吐: {replica['throughput']:.2f}请求/秒, {replica['token_throughput']:.1f}token/秒\n")
+                
+                # 写入多模型对比结果（如果有）
+                if self.current_records.get('comparison'):
+                    f.write(f"\n模型对比 ({self.current_records['comparison']['mode']}):\n")
+                    f.write(format_comparison_table(self.current_records['comparison']) + "\n")
                 
                 # 写入错误信息（如果有）
                 if 'error_message' in self.current_records:
@@ -444,7 +490,8 @@ class ResultsTab(QWidget):
                 "total_time": total_time,
                 "current_speed": current_speed,
                 "test_time": time.strftime('%Y-%m-%d %H:%M:%S'),
-                "log_file": log_file
+                "log_file": log_file,
+                "latency_percentiles": self.current_records.get('latency_percentiles', {})
             }
             
             success = db_manager.save_test_record(db_record)
@@ -517,6 +564,8 @@ class ResultsTab(QWidget):
             self.tr('total_time'),
             self.tr('model_name'),
             self.tr('concurrency'),
+            self.tr('p99_latency'),
+            self.tr('p99_latency_corrected'),
             self.tr('operations')
         ])
         
@@ -5,13 +5,18 @@ from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QGroupBox,
     QLabel, QLineEdit, QSpinBox, QPushButton,
     QListWidget, QMessageBox, QFormLayout,
-    QDialog, QTextEdit, QFileDialog, QComboBox
+    QDialog, QTextEdit, QFileDialog, QComboBox, QDoubleSpinBox
 )
 from PyQt6.QtCore import Qt, pyqtSignal
 from src.utils.logger import setup_logger
 from src.data.db_manager import db_manager
 from src.data.test_datasets import DATASETS  # 导入内置数据集
+from src.data.synthetic_dataset import (
+    DISTRIBUTIONS, DIST_EMPIRICAL, DIST_FIXED, DIST_NORMAL, DIST_UNIFORM,
+    LengthDistribution, SyntheticSpec, generate_prompts
+)
 from src.gui.i18n.language_manager import LanguageManager
+from src.utils.token_counter import token_counter
 
 logger = setup_logger("dataset_settings")
 
@@ -88,6 +93,139 @@ class DatasetEditDialog(QDialog):
         """翻译文本"""
         return self.language_manager.get_text(key)
 
+class SyntheticDatasetDialog(QDialog):
+    """合成数据集对话框，按输入长度分布生成prompt"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.language_manager = LanguageManager()
+        self.init_ui()
+        self.load_spec(SyntheticSpec.from_config())
+    
+    def init_ui(self):
+        """初始化UI"""
+        self.setWindowTitle(self.tr('import_synthetic'))
+        layout = QVBoxLayout()
+        form_layout = QFormLayout()
+        
+        self.name_edit = QLineEdit()
+        form_layout.addRow(self.tr('dataset_name'), self.name_edit)
+        
+        # 长度分布
+        self.kind_combo = QComboBox()
+        for kind in DISTRIBUTIONS:
+            self.kind_combo.addItem(self.tr(f'dist_{kind}'), kind)
+        self.kind_combo.currentIndexChanged.connect(self.on_kind_changed)
+        form_layout.addRow(self.tr('length_distribution') + ":", self.kind_combo)
+        
+        self.value_spin = self._length_spin()
+        form_layout.addRow(self.tr('input_tokens') + ":", self.value_spin)
+        self.low_spin = self._length_spin()
+        form_layout.addRow(self.tr('min_length') + ":", self.low_spin)
+        self.high_spin = self._length_spin(minimum=0)
+        form_layout.addRow(self.tr('max_length') + ":", self.high_spin)
+        self.mean_spin = QDoubleSpinBox()
+        self.mean_spin.setRange(1, 1000000)
+        self.mean_spin.setDecimals(0)
+        form_layout.addRow(self.tr('mean_length') + ":", self.mean_spin)
+        self.std_spin = QDoubleSpinBox()
+        self.std_spin.setRange(0, 1000000)
+        self.std_spin.setDecimals(0)
+        form_layout.addRow(self.tr('std_length') + ":", self.std_spin)
+        self.samples_edit = QTextEdit()
+        self.samples_edit.setPlaceholderText(self.tr('length_samples_placeholder'))
+        form_layout.addRow(self.tr('length_samples') + ":", self.samples_edit)
+        self.form_layout = form_layout
+        
+        self.count_spin = self._length_spin()
+        form_layout.addRow(self.tr('prompt_number') + ":", self.count_spin)
+        self.seed_spin = self._length_spin(minimum=0)
+        form_layout.addRow(self.tr('random_seed') + ":", self.seed_spin)
+        self.model_edit = QLineEdit()
+        self.model_edit.setPlaceholderText(self.tr('encoder_model_placeholder'))
+        form_layout.addRow(self.tr('encoder_model') + ":", self.model_edit)
+        
+        layout.addLayout(form_layout)
+        
+        button_layout = QHBoxLayout()
+        ok_button = QPushButton(self.tr('confirm'))
+        ok_button.clicked.connect(self.accept)
+        cancel_button = QPushButton(self.tr('cancel'))
+        cancel_button.clicked.connect(self.reject)
+        button_layout.addWidget(ok_button)
+        button_layout.addWidget(cancel_button)
+        layout.addLayout(button_layout)
+        
+        self.setLayout(layout)
+    
+    @staticmethod
+    def _length_spin(minimum: int = 1) -> QSpinBox:
+        """创建长度输入框"""
+        spin = QSpinBox()
+        spin.setRange(minimum, 1000000)
+        return spin
+    
+    def on_kind_changed(self):
+        """只显示当前分布用到的参数"""
+        kind = self.kind_combo.currentData()
+        visible = {
+            self.value_spin: kind == DIST_FIXED,
+            self.low_spin: kind in (DIST_UNIFORM, DIST_NORMAL),
+            self.high_spin: kind in (DIST_UNIFORM, DIST_NORMAL),
+            self.mean_spin: kind == DIST_NORMAL,
+            self.std_spin: kind == DIST_NORMAL,
+            self.samples_edit: kind == DIST_EMPIRICAL,
+        }
+        for widget, show in visible.items():
+            widget.setVisible(show)
+            self.form_layout.labelForField(widget).setVisible(show)
+    
+    def load_spec(self, spec: SyntheticSpec):
+        """用合成数据集规格填充表单"""
+        dist = spec.input_tokens
+        self.kind_combo.setCurrentIndex(max(0, self.kind_combo.findData(dist.kind)))
+        self.value_spin.setValue(dist.value)
+        self.low_spin.setValue(dist.low)
+        self.high_spin.setValue(dist.high)
+        self.mean_spin.setValue(dist.mean or dist.value)
+        self.std_spin.setValue(dist.std)
+        self.samples_edit.setPlainText("\n".join(
+            f"{value} {weight:g}" if dist.weights else str(value)
+            for value, weight in zip(dist.values, dist.weights or [1] * len(dist.values))
+        ))
+        self.count_spin.setValue(spec.num_prompts)
+        self.seed_spin.setValue(spec.seed)
+        self.model_edit.setText(spec.model)
+        self.on_kind_changed()
+    
+    def get_spec(self) -> SyntheticSpec:
+        """获取合成数据集规格，参数不合法时抛出ValueError"""
+        values, weights = [], []
+        for line in self.samples_edit.toPlainText().splitlines():
+            parts = line.split()
+            if parts:
+                values.append(int(parts[0]))
+                weights.append(float(parts[1]) if len(parts) > 1 else 1.0)
+        dist = LengthDistribution(
+            kind=self.kind_combo.currentData(),
+            value=self.value_spin.value(),
+            low=self.low_spin.value(),
+            high=self.high_spin.value(),
+            mean=self.mean_spin.value(),
+            std=self.std_spin.value(),
+            values=values,
+            weights=weights
+        )
+        return SyntheticSpec(
+            input_tokens=dist,
+            num_prompts=self.count_spin.value(),
+            seed=self.seed_spin.value(),
+            model=self.model_edit.text().strip()
+        )
+    
+    def tr(self, key):
+        """翻译文本"""
+        return self.language_manager.get_text(key)
+
 class DatasetSettingsWidget(QWidget):
     """数据集设置组件"""
     dataset_updated = pyqtSignal()  # 数据集更新信号
@@ -287,7 +425,8 @@ class DatasetSettingsWidget(QWidget):
             combo = QComboBox()
             combo.addItems([
                 self.tr('import_builtin'),
-                self.tr('import_file')
+                self.tr('import_file'),
+                self.tr('import_synthetic')
             ])
             layout.addWidget(combo)
             
@@ -307,9 +446,12 @@ class DatasetSettingsWidget(QWidget):
                 if combo.currentIndex() == 0:
                     # 从内置数据集导入
                     self._import_builtin_dataset()
-                else:
+                elif combo.currentIndex() == 1:
                     # 从文件导入
                     self._import_from_file()
+                else:
+                    # 按长度分布生成
+                    self._import_synthetic_dataset()
         except Exception as e:
             logger.error(f"导入数据集失败: {e}")
             QMessageBox.critical(self, self.tr('error'), f"{self.tr('error')}: {e}")
@@ -384,6 +526,28 @@ class DatasetSettingsWidget(QWidget):
             logger.error(f"从文件导入数据集失败: {e}")
             QMessageBox.critical(self, self.tr('error'), f"{self.tr('error')}: {e}")
     
+    def _import_synthetic_dataset(self):
+        """按输入长度分布生成合成数据集"""
+        try:
+            dialog = SyntheticDatasetDialog(self)
+            if dialog.exec():
+                spec = dialog.get_spec()
+                dataset_name = dialog.name_edit.text().strip() or spec.default_name()
+                prompts = generate_prompts(spec)
+                dataset_data = {
+                    "name": dataset_name,
+                    "prompts": prompts
+                }
+                if db_manager.add_dataset(dataset_data):
+                    # 测试时按数据集名称加载token计数缓存，生成时已知的长度直接写入，开始测试时无需重新编码
+                    token_counter.save_prompt_cache(dataset_name, prompts, spec.model or None)
+                    self.load_datasets()
+                    self.dataset_updated.emit()
+                    logger.info(f"生成合成数据集成功: {dataset_name}, {len(prompts)} 条")
+        except Exception as e:
+            logger.error(f"生成合成数据集失败: {e}")
+            QMessageBox.critical(self, self.tr('error'), f"{self.tr('error')}: {e}")
+    
     def export_dataset(self):
         """导出数据集"""
         current_row = self.dataset_list.currentRow()
@@ -10,6 +10,7 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, pyqtSignal
 from src.utils.logger import setup_logger
 from src.data.db_manager import db_manager
+from src.engine.load_balancer import BALANCE_STRATEGIES
 from src.gui.i18n.language_manager import LanguageManager
 
 logger = setup_logger("model_settings")
@@ -38,6 +39,19 @@ class ModelEditDialog(QDialog):
         self.api_url_input = QLineEdit()
         layout.addRow(self.tr('api_url') + ":", self.api_url_input)
         
+        # 其他副本地址输入，每行一个
+        self.api_urls_input = QTextEdit()
+        self.api_urls_input.setAcceptRichText(False)
+        self.api_urls_input.setMaximumHeight(80)
+        self.api_urls_input.setPlaceholderText(self.tr('replica_urls_placeholder'))
+        layout.addRow(self.tr('replica_urls') + ":", self.api_urls_input)
+        
+        # 副本均衡策略
+        self.balance_strategy_input = QComboBox()
+        for strategy in BALANCE_STRATEGIES:
+            self.balance_strategy_input.addItem(self.tr(f'balance_{strategy}'), strategy)
+        layout.addRow(self.tr('balance_strategy') + ":", self.balance_strategy_input)
+        
         # API密钥输入
         self.api_key_input = QLineEdit()
         self.api_key_input.setEchoMode(QLineEdit.EchoMode.Password)
@@ -83,6 +97,10 @@ class ModelEditDialog(QDialog):
         """加载模型数据"""
         self.name_input.setText(self.model_data.get("name", ""))
         self.api_url_input.setText(self.model_data.get("api_url", ""))
+        self.api_urls_input.setPlainText("\n".join(self.model_data.get("api_urls") or []))
+        index = self.balance_strategy_input.findData(self.model_data.get("balance_strategy"))
+        if index >= 0:
+            self.balance_strategy_input.setCurrentIndex(index)
         self.api_key_input.setText(self.model_data.get("api_key", ""))
         self.model_input.setText(self.model_data.get("model", ""))
         self.max_tokens_input.setValue(self.model_data.get("max_tokens", 2048))
@@ -94,6 +112,8 @@ class ModelEditDialog(QDialog):
         return {
             "name": self.name_input.text().strip(),
             "api_url": self.api_url_input.text().strip(),
+            "api_urls": [url.strip() for url in self.api_urls_input.toPlainText().splitlines() if url.strip()],
+            "balance_strategy": self.balance_strategy_input.currentData(),
             "api_key": self.api_key_input.text().strip(),
             "model": self.model_input.text().strip(),
             "max_tokens": self.max_tokens_input.value(),
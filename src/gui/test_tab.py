@@ -82,6 +82,10 @@ class TestTab(QWidget):
         self.model_config = None
         self.selected_datasets = {}
         self.test_manager = TestManager()  # 添加test_manager实例
+        # 延迟百分位需要遍历直方图，界面线程中每完成10个任务计算一次，详细信息复用最近一次的结果
+        self._last_progress = None
+        self._latency_percentiles = {}
+        self._percentiles_completed = -1  # 上次计算百分位时的完成数
         
         # 初始化界面
         self.init_ui()
@@ -218,6 +222,9 @@ class TestTab(QWidget):
             
             # 清理测试记录
             self.records_manager.clear_test_state()
+            self._last_progress = None
+            self._latency_percentiles = {}
+            self._percentiles_completed = -1
             
             logger.debug("测试状态已清除")
             
@@ -256,6 +263,11 @@ class TestTab(QWidget):
         self.model_combo = QComboBox()
         model_layout.addWidget(self.model_combo)
         
+        # 对比模型下拉框，选择后以相同的prompt序列同时测试两个模型
+        self.compare_combo = QComboBox()
+        self.compare_combo.setToolTip(self.tr('compare_model_tip'))
+        model_layout.addWidget(self.compare_combo)
+        
         # 添加刷新按钮
         self.refresh_btn = QPushButton()
         self.refresh_btn.setText(self.tr('refresh_model'))
@@ -446,12 +458,15 @@ class TestTab(QWidget):
         try:
             # 清空当前列表
             self.model_combo.clear()
+            self.compare_combo.clear()
+            self.compare_combo.addItem(self.tr('no_comparison'), None)
             
             # 从数据库获取模型配置
             models = db_manager.get_model_configs()
             if models:
                 for model in models:
                     self.model_combo.addItem(model["name"])
+                    self.compare_combo.addItem(model["name"], model["name"])
                 logger.info(f"已加载 {len(models)} 个模型配置")
             else:
                 logger.warning("未找到模型配置")
@@ -468,6 +483,10 @@ class TestTab(QWidget):
         models = db_manager.get_model_configs()
         return next((m for m in models if m["name"] == model_name), None)
     
+    def get_compare_model_name(self) -> str:
+        """获取选中的对比模型名称，未选择时返回None"""
+        return self.compare_combo.currentData()
+    
     def get_selected_datasets(self) -> dict:
         """获取选中的数据集及其权重"""
         logger.info("开始获取选中的数据集...")
@@ -531,6 +550,11 @@ class TestTab(QWidget):
                 QMessageBox.warning(self, "警告", "请选择模型")
                 return
             
+            compare_model_name = self.get_compare_model_name()
+            if compare_model_name == model_config["name"]:
+                QMessageBox.warning(self, "警告", "对比模型不能与测试模型相同")
+                return
+            
             # 获取选中的数据集
             selected_datasets = self.get_selected_datasets()
             if not selected_datasets:
@@ -591,7 +615,8 @@ class TestTab(QWidget):
             success = self.test_executor.start_test(
                 model_config["name"],
                 tasks,
-                test_task_id
+                test_task_id,
+                compare_model_names=[compare_model_name] if compare_model_name else None
             )
             
             if not success:
@@ -634,21 +659,35 @@ class TestTab(QWidget):
             total = progress.total_tasks
             completed = progress.successful_tasks + progress.failed_tasks
             if total > 0:
-                percentage = int((completed / total) * 100)
+                # 持续时长模式按已运行时间计算进度
+                percentage = int(progress.progress_percentage)
                 self.progress_widget.progress_bar.setValue(percentage)
             
             # 更新状态标签
             status_text = self.tr('completed') + ": " + str(completed) + "/" + str(total)
             self.progress_widget.status_label.setText(status_text)
             
+            # 每完成10个任务计算一次延迟百分位，同一完成数的重复通知不再重算；
+            # 持续时长模式下total_tasks随完成数增长，不能用completed >= total判断最后一个任务，
+            # 最终结果由_on_test_finished同步
+            self._last_progress = progress
+            refresh_percentiles = completed % 10 == 0 and completed != self._percentiles_completed
+            if refresh_percentiles:
+                self._percentiles_completed = completed
+                self._latency_percentiles = progress.latency_percentiles()
+            
             # 更新统计信息
             current_records = self.records_manager.current_test_records
             if current_records:
                 current_records["successful_tasks"] = progress.successful_tasks
                 current_records["failed_tasks"] = progress.failed_tasks
+                if progress.duration > 0:
+                    current_records["total_tasks"] = progress.total_tasks
+                    current_records["interval_stats"] = progress.interval_stats
                 
-                # 只在每10个任务完成时同步一次记录
-                if completed % 10 == 0:
+                # 只在重新计算百分位时同步一次记录
+                if refresh_percentiles:
+                    self._update_record_percentiles(progress, current_records)
                     self._sync_test_records()
                 
                 # 每次进度更新时，实时更新数据集信息显示
@@ -679,6 +718,29 @@ class TestTab(QWidget):
             
             # 添加平均TPS
             detail_text += self.tr('avg_tps') + f": {progress.avg_tps:.1f}\n"
+
+            # 添加首token延迟与每token耗时
+            detail_text += self.tr('avg_ttft') + f": {progress.avg_ttft * 1000:.0f}ms\n"
+            detail_text += self.tr('avg_tpot') + f": {progress.avg_tpot * 1000:.1f}ms\n"
+            
+            # 添加延迟百分位
+            for metric, values in self._latency_percentiles.items():
+                detail_text += self.tr('latency_percentiles') + f" ({metric}): " + " / ".join(
+                    f"{key} {value * 1000:.0f}ms" for key, value in values.items()) + "\n"
+            
+            # 多副本时逐个显示端点的延迟和吞吐，慢副本不会被平均值掩盖
+            if len(progress.replica_stats) > 1:
+                for endpoint, replica in progress.replica_summary().items():
+                    detail_text += self.tr('replica_stats') + f" {endpoint}: {replica['total']} / " + \
+                        f"p50 {replica['p50'] * 1000:.0f}ms / p99 {replica['p99'] * 1000:.0f}ms / " + \
+                        f"{replica['throughput']:.2f} req/s / {replica['token_throughput']:.1f} token/s\n"
+            
+            # 对比测试时逐个显示模型的吞吐和延迟
+            if progress.comparison:
+                for label, summary in progress.comparison["models"].items():
+                    detail_text += self.tr('compare_model') + f" {label}: {summary['total']} / " + \
+                        f"{summary['throughput']:.2f} req/s / p50 {summary['p50_latency'] * 1000:.0f}ms / " + \
+                        f"p99 {summary['p99_latency'] * 1000:.0f}ms / TTFT p50 {summary['p50_ttft'] * 1000:.0f}ms\n"
             
             # 添加最后一次错误信息
             if progress.last_error:
@@ -689,6 +751,16 @@ class TestTab(QWidget):
         except Exception as e:
             logger.error(f"更新进度时出错: {e}", exc_info=True)
 
+    def _update_record_percentiles(self, progress: TestProgress, current_records: dict):
+        """将最近一次计算的延迟百分位及各数据集、副本、对比统计写入测试记录"""
+        current_records["latency_percentiles"] = self._latency_percentiles
+        if len(progress.replica_stats) > 1:
+            current_records["replicas"] = progress.replica_summary()
+        if progress.comparison:
+            current_records["comparison"] = progress.comparison
+        for dataset_name, dataset_record in current_records["datasets"].items():
+            dataset_record["latency_percentiles"] = progress.latency_percentiles(dataset_name)
+    
     def _on_test_finished(self):
         """测试完成处理"""
         try:
@@ -697,6 +769,11 @@ class TestTab(QWidget):
             if not current_records:
                 return
             
+            # 测试结束时按最终进度计算一次延迟百分位
+            if self._last_progress is not None:
+                self._latency_percentiles = self._last_progress.latency_percentiles()
+                self._update_record_percentiles(self._last_progress, current_records)
+            
             # 更新测试状态
             current_records["status"] = "completed"
             
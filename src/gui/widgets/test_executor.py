@@ -3,8 +3,8 @@
 """
 import time
 import logging
-from typing import Dict, List, Callable
-from PyQt6.QtCore import QObject, pyqtSignal
+from typing import Dict, List, Callable, Optional
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
 from src.engine.test_manager import TestTask, TestProgress
 from src.engine.api_client import APIResponse
 from src.gui.widgets.test_thread import TestThread
@@ -37,7 +37,8 @@ class TestExecutor(QObject):
             on_progress_updated: Callable = None,
             on_result_received: Callable = None,
             on_test_finished: Callable = None,
-            on_test_error: Callable = None):
+            on_test_error: Callable = None,
+            compare_model_names: Optional[List[str]] = None):
         """开始测试
         
         Args:
@@ -48,6 +49,7 @@ class TestExecutor(QObject):
             on_result_received: 结果接收回调
             on_test_finished: 测试完成回调
             on_test_error: 测试错误回调
+            compare_model_names: 对比模型名称列表，以相同的prompt序列与主模型同时测试
         """
         try:
             # 检查是否已经在运行
@@ -59,7 +61,8 @@ class TestExecutor(QObject):
             self.test_thread = TestThread(
                 model_name,
                 tasks,
-                test_task_id
+                test_task_id,
+                compare_model_names
             )
             
             # 连接信号
@@ -103,18 +106,29 @@ class TestExecutor(QObject):
             return False
         
         try:
-            # 停止测试线程
-            if self.test_thread.isRunning():
-                self.test_thread.terminate()  # 强制终止线程
-                self.test_thread.wait(1000)  # 等待最多1秒
+            # 请求测试管理器协作停止：排队任务立即放弃，在途请求在宽限期后取消，
+            # 测试线程随后正常结束并发出完成信号，已完成和部分完成的结果都会被记录
+            test_manager = self.test_thread.test_manager
+            test_manager.stop_test()
             
-            self.is_running = False
-            logger.info("测试已停止")
+            # 线程在宽限期后仍未结束时才强制终止
+            grace_period = test_manager.cancel_token.grace_period if test_manager.cancel_token else 0
+            thread = self.test_thread
+            QTimer.singleShot(int((grace_period + 5) * 1000), lambda: self._terminate_if_running(thread))
+            logger.info("已请求停止测试")
             return True
         except Exception as e:
             logger.error(f"停止测试失败: {e}", exc_info=True)
             return False
     
+    def _terminate_if_running(self, thread: TestThread):
+        """停止请求超时后强制终止测试线程"""
+        if thread is self.test_thread and thread.isRunning():
+            logger.warning("测试线程未在宽限期内结束，强制终止")
+            thread.terminate()
+            thread.wait(1000)
+            self.is_running = False
+    
     def _on_test_finished(self):
         """测试完成处理"""
         self.is_running = False
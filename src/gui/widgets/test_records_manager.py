@@ -147,6 +147,7 @@ class TestRecordsManager:
                         "avg_generation_speed",
                         "current_speed",
                         "avg_tps",
+                        "latency_percentiles",
                         "start_time",
                             "end_time"]:
                         if key in self.current_test_records:
@@ -2,10 +2,11 @@
 测试线程模块
 """
 import asyncio
-from typing import List
+from typing import List, Optional
 from PyQt6.QtCore import QThread, pyqtSignal
 from src.engine.test_manager import TestManager, TestTask, TestProgress
 from src.engine.api_client import APIResponse
+from src.engine.load_schedule import ConcurrencySchedule
 from src.data.db_manager import db_manager
 from src.utils.logger import setup_logger
 
@@ -24,15 +25,22 @@ class TestThread(QThread):
             self,
             model_name: str,
             tasks: List[TestTask],
-            test_task_id: str):
+            test_task_id: str,
+            compare_model_names: Optional[List[str]] = None):
         super().__init__()
-        # 在主线程中获取模型配置
+        # 在主线程中获取模型配置，对比模型与主模型一起以列表形式传给测试管理器
+        self.compare_configs = []
         try:
             models = db_manager.get_model_configs()
             self.model_config = next(
                 (m for m in models if m["name"] == model_name), None)
             if not self.model_config:
                 raise ValueError(f"找不到模型配置: {model_name}")
+            for name in compare_model_names or []:
+                compare_config = next((m for m in models if m["name"] == name), None)
+                if not compare_config:
+                    raise ValueError(f"找不到模型配置: {name}")
+                self.compare_configs.append(compare_config)
         except Exception as e:
             logger.error(f"获取模型配置失败: {e}")
             self.model_config = None
@@ -40,8 +48,8 @@ class TestThread(QThread):
         self.tasks = tasks
         self.test_task_id = test_task_id
         self.test_manager = TestManager()
-        # 连接信号
-        self.test_manager.result_received.connect(self.result_received)
+        # 测试管理器在本线程中回调，经Qt信号排队转发到界面线程
+        self.test_manager.result_received.connect(self.result_received.emit)
     
     def run(self):
         """运行测试线程"""
@@ -55,15 +63,30 @@ class TestThread(QThread):
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
             
-            # 运行测试
-            loop.run_until_complete(
-                self.test_manager.run_test(
-                    self.test_task_id,
-                    self.tasks,
-                    self._progress_callback,
-                    self.model_config
+            # 运行测试，配置了并发阶梯调度时按阶梯运行
+            schedule = ConcurrencySchedule.from_config()
+            if schedule and self.compare_configs:
+                logger.warning("对比测试不支持并发阶梯调度，按普通测试运行")
+                schedule = None
+            if schedule:
+                loop.run_until_complete(
+                    self.test_manager.run_schedule(
+                        self.test_task_id,
+                        self.tasks,
+                        schedule,
+                        self._progress_callback,
+                        self.model_config
+                    )
+                )
+            else:
+                loop.run_until_complete(
+                    self.test_manager.run_test(
+                        self.test_task_id,
+                        self.tasks,
+                        self._progress_callback,
+                        [self.model_config] + self.compare_configs if self.compare_configs else self.model_config
+                    )
                 )
-            )
             
             # 关闭事件循环
             logger.info("正在关闭事件循环...")
@@ -0,0 +1,106 @@
+"""
+取消令牌模块，用于在GUI线程与测试事件循环之间传递停止请求
+"""
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Set
+from src.utils.config import config
+from src.utils.logger import setup_logger
+
+logger = setup_logger("cancel_token")
+
+
+class CancelToken:
+    """
+    协作式取消令牌
+
+    cancel()可以在任意线程调用：排队中的工作在下一次检查cancelled时立即放弃；
+    通过tracking()登记的在途请求先获得grace_period秒的宽限期自行结束，
+    超时后所在的任务被取消，由请求方捕获CancelledError并记录部分结果。
+    """
+
+    def __init__(self, grace_period: Optional[float] = None):
+        """
+        Args:
+            grace_period: 在途请求的宽限期（秒），默认读取test.cancel_grace_period
+        """
+        if grace_period is None:
+            grace_period = config.get("test.cancel_grace_period", 5.0)
+        self.grace_period = grace_period
+        self.cancelled_at: Optional[float] = None
+        self._event = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_event: Optional[asyncio.Event] = None
+        self._tracked: Set[asyncio.Task] = set()
+
+    @property
+    def cancelled(self) -> bool:
+        """是否已请求取消"""
+        return self._event.is_set()
+
+    def bind(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """绑定到运行测试的事件循环，必须在该循环中调用"""
+        self._loop = loop or asyncio.get_running_loop()
+        self._async_event = asyncio.Event()
+        if self.cancelled:
+            self._on_cancel()
+
+    def cancel(self):
+        """请求取消，线程安全，重复调用无副作用"""
+        if self._event.is_set():
+            return
+        self.cancelled_at = time.monotonic()
+        self._event.set()
+        loop = self._loop
+        if loop and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self._on_cancel)
+            except RuntimeError:
+                # 事件循环已经停止
+                pass
+
+    def _on_cancel(self):
+        """在事件循环线程中执行"""
+        self._async_event.set()
+        if self._tracked:
+            logger.info(f"已请求取消，{len(self._tracked)} 个在途请求将在 {self.grace_period}s 后被强制取消")
+            self._loop.call_later(self.grace_period, self._force_cancel)
+
+    def _force_cancel(self):
+        for task in list(self._tracked):
+            task.cancel()
+
+    @contextmanager
+    def tracking(self):
+        """
+        将当前任务登记为在途请求，宽限期结束后该任务会被取消
+
+        只应包住请求本身，退出后任务不再受取消影响。
+        """
+        task = asyncio.current_task()
+        self._tracked.add(task)
+        try:
+            yield
+        finally:
+            self._tracked.discard(task)
+
+    async def wait(self):
+        """等待直到被取消"""
+        await self._async_event.wait()
+
+    async def sleep(self, delay: float) -> bool:
+        """
+        可被取消打断的sleep
+
+        Returns:
+            bool: 是否因取消而提前返回
+        """
+        if self.cancelled:
+            return True
+        try:
+            await asyncio.wait_for(self._async_event.wait(), delay)
+            return True
+        except asyncio.TimeoutError:
+            return False
@@ -1,6 +1,7 @@
 """
 配置管理模块，负责加载和管理应用程序配置
 """
+import copy
 import os
 from pathlib import Path
 from typing import Dict, Any
@@ -34,6 +35,9 @@ DEFAULT_CONFIG = {
     },
     "openai_api": {
         "stream_mode": True,  # 默认启用流式输出
+        "include_usage": True,  # 流式模式下请求服务端返回usage统计（stream_options.include_usage）
+        "min_tokens": 0,  # 最少输出token数（vLLM等服务端的扩展参数），0表示不发送
+        "ignore_eos": False,  # 忽略结束符一直生成到max_tokens（扩展参数），与min_tokens配合固定输出长度
     },
     "gpu": {
         "poll_interval": 0.5,  # GPU监控轮询间隔，单位秒
@@ -49,7 +53,22 @@ DEFAULT_CONFIG = {
         "server_url": "https://tops.ginease.cn:4433",  # 跑分服务器地址
         "connect_timeout": 10,                                  # 连接超时时间（秒）
         "max_retries": 3,                                       # 最大重试次数
+        "retry": {
+            "max_attempts": 1,                                  # 跑分请求的总尝试次数，1表示不重试
+            "base_delay": 0.5,                                  # 指数退避基数（秒）
+            "max_delay": 30.0,                                  # 单次退避上限（秒）
+            "circuit_breaker": {
+                "enabled": False                                # 是否启用按端点的熔断器
+            }
+        },
         "enabled": True,                                        # 是否启用跑分功能
+        "stream_mode": False,                                   # 跑分请求是否使用流式输出，流式时额外记录首token延迟；默认非流式，与原有跑分结果可比
+        "connector": {
+            "limit": None,                                      # 连接池总上限，None表示跟随并发数
+            "limit_per_host": 0,                                # 单主机连接上限，0表示不限制
+            "keepalive_timeout": 30,                            # 空闲连接保活时间（秒）
+            "ttl_dns_cache": 300                                # DNS缓存时间（秒）
+        },
         "result_exporter": {
             "auto_export": False,                               # 是否自动导出结果
             "default_format": "json"                            # 默认导出格式
@@ -59,7 +78,79 @@ DEFAULT_CONFIG = {
         "default_concurrency": 1,
         "max_concurrency": 9999,
         "timeout": 60,           # API请求超时时间（秒）
-        "retry_count": 1,        # 失败重试次数
+        "retry_count": 1,        # 每个请求的总尝试次数（含首次）
+        "retry": {
+            # 总尝试次数由retry_count决定，以下为退避和熔断参数
+            "base_delay": 0.5,       # 指数退避基数（秒），实际等待在[0, base_delay*2^n]内随机
+            "max_delay": 30.0,       # 单次退避上限（秒）
+            "retry_statuses": [429, 500, 502, 503, 504],  # 可重试的HTTP状态码
+            "retry_on_timeout": True,  # 超时是否重试
+            "respect_retry_after": True,  # 429/503返回Retry-After时按其等待
+            "max_retry_after": 60.0,  # Retry-After等待上限（秒）
+            "circuit_breaker": {
+                "enabled": False,    # 是否启用按端点的熔断器，启用后过载端点的请求会被直接拒绝
+                "window": 50,        # 统计最近多少个请求
+                "min_requests": 20,  # 窗口内至少多少个请求才判断失败率
+                "error_threshold": 0.5,  # 失败率达到该值时打开
+                "open_duration": 10.0,   # 打开后拒绝请求的时长（秒）
+                "half_open_requests": 3, # 半开状态下放行的探测请求数
+            },
+        },
+        "coordinated_omission": {
+            # 闭环模式下推算校正延迟的期望发送间隔（秒），0表示取原始e2e延迟的中位数；
+            # 开环模式直接以计划发送时刻计算，不使用该值
+            "expected_interval": 0.0,
+        },
+        "cancel_grace_period": 5.0,  # 停止测试后在途请求的宽限期（秒），超时后取消并记录部分结果
+        "processes": 1,          # 负载生成进程数，大于1时将请求分片到多个进程
+        "balance_strategy": "round_robin",  # 模型配置多个副本地址时的均衡策略: round_robin / least_outstanding / p2c
+        "compare_mode": "parallel",  # 多模型对比方式: parallel（各模型独立并发，同时发送）/ interleaved（交错共享并发）
+        "workload": {
+            "prefix_tokens": 0,      # 系统提示前缀长度（token），0表示不加前缀
+            "share_ratio": 1.0,      # 使用共享前缀的请求比例，其余请求使用等长的唯一前缀
+            "prefix_count": 1,       # 共享前缀的个数
+            "turns": 1,              # 多轮会话的轮数，1表示单轮请求
+            "think_time": 0.0,       # 多轮会话中收到回答后到发送下一轮的间隔（秒）
+            "cache_bust": False      # 在每个请求前加入唯一标记，使服务端前缀缓存失效
+        },
+        "synthetic": {
+            "input_tokens": {        # 输入长度分布: fixed(value) / uniform(low-high) / normal(mean,std,截断到low-high) / empirical(values,weights)
+                "kind": "fixed",
+                "value": 2048,
+            },
+            "num_prompts": 1000,     # 生成的prompt条数，固定时长模式下循环使用
+            "seed": 0,               # 随机种子，相同规格和种子生成的prompt相同并直接读取缓存
+        },
+        "load_profile": {
+            "mode": "closed",        # 负载模式: closed(闭环,按并发数) / open(开环,按速率)
+            "arrival": "constant",   # 开环到达过程: constant(恒定间隔) / poisson(泊松)
+            "rate": 1.0,             # 开环目标速率（请求/秒）
+        },
+        "schedule": {
+            # 并发阶梯调度，配置ramp或steps后测试页按阶梯运行，例如:
+            # "ramp": {"start": 1, "stop": 16, "step": 1} 或 "steps": [1, 2, 4, 8]
+            "hold": 30,              # 每个阶梯的保持时长（秒）
+            "gain_threshold": 0.1,   # 吞吐扩展效率低于该值时判定为拐点
+            "p99_threshold": 0.0,    # p99延迟阈值（秒），0表示不启用
+        },
+        "distributed": {
+            # 分布式代理地址列表，例如 ["10.0.0.2:9100", "10.0.0.3:9100"]，非空时测试分片到各代理运行
+            # 代理启动方式: DEEPSTRESS_AGENT_TOKEN=<令牌> python -m src.engine.distributed --port 9100
+            # 代理默认只监听127.0.0.1，跨机器时通过SSH隧道转发端口（消息未加密且包含api_key）
+            "agents": [],
+            "token": "",  # 与代理共享的认证令牌，也可通过环境变量DEEPSTRESS_AGENT_TOKEN设置
+        },
+        "log": {
+            "verbosity": "normal",   # 结构化日志详细程度: quiet / normal / verbose
+            "flush_interval": 0.5,   # 后台写入的最长刷新间隔（秒）
+            "batch_size": 512,       # 单次最多合并写入的日志条数
+        },
+    },
+    "tokenizer": {
+        "worker_threads": 2,     # 异步token计数线程池大小
+        "batch_size": 64,        # 单批最大文本数
+        "batch_delay": 0.005,    # 攒批最长等待时间（秒）
+        "prompt_cache_size": 100000  # 输入token数LRU缓存容量
     },
     "models": {}  # 移除默认模型配置
 }
@@ -68,9 +159,11 @@ class Config:
     """配置管理类"""
     
     def __init__(self):
-        self._config = DEFAULT_CONFIG.copy()
+        self._saved = copy.deepcopy(DEFAULT_CONFIG)  # 默认配置、配置文件和set()的结果，写入配置文件
         self._config_file = DATA_DIR / "config.json"
+        self.overrides = {}  # 本进程内的临时配置覆盖，见apply_overrides()，不写入配置文件
         self._load_config()
+        self._config = copy.deepcopy(self._saved)  # 叠加临时覆盖后实际生效的配置
         self.save_config()  # 确保配置文件存在
     
     def _load_config(self):
@@ -80,8 +173,8 @@ class Config:
                 with open(self._config_file, "r", encoding="utf-8") as f:
                     loaded_config = json.load(f)
                     # 递归更新配置
-                    self._update_dict(self._config, loaded_config)
-                    print(f"配置加载成功: {self._config}")
+                    self._update_dict(self._saved, loaded_config)
+                    print(f"配置加载成功: {self._saved}")
             else:
                 print("配置文件不存在，将使用默认配置")
         except Exception as e:
@@ -100,7 +193,7 @@ class Config:
         """保存配置到文件"""
         try:
             with open(self._config_file, "w", encoding="utf-8") as f:
-                json.dump(self._config, f, indent=4, ensure_ascii=False)
+                json.dump(self._saved, f, indent=4, ensure_ascii=False)
             print("配置保存成功")
         except Exception as e:
             print(f"保存配置文件失败: {e}")
@@ -116,15 +209,28 @@ class Config:
         except (KeyError, TypeError):
             return default
     
+    def apply_overrides(self, overrides: dict):
+        """
+        临时覆盖配置项，只在当前进程内生效，不写入配置文件
+        
+        Args:
+            overrides: 与配置结构相同的嵌套字典，如{"test": {"timeout": 120}}
+        """
+        if not overrides:
+            return
+        self._update_dict(self._config, copy.deepcopy(overrides))
+        self._update_dict(self.overrides, copy.deepcopy(overrides))
+    
     def set(self, key: str, value: Any):
-        """设置配置项"""
+        """设置配置项，同时写入生效配置和配置文件"""
         keys = key.split(".")
-        config = self._config
-        for k in keys[:-1]:
-            if k not in config:
-                config[k] = {}
-            config = config[k]
-        config[keys[-1]] = value
+        for layer in (self._saved, self._config):
+            config = layer
+            for k in keys[:-1]:
+                if k not in config:
+                    config[k] = {}
+                config = config[k]
+            config[keys[-1]] = copy.deepcopy(value)
         self.save_config()
 
 # 全局配置实例
@@ -0,0 +1,44 @@
+"""
+回调信号模块，提供与pyqtSignal相同的connect/disconnect/emit接口，测试引擎不依赖Qt
+"""
+import threading
+from typing import Callable, List
+from src.utils.logger import setup_logger
+
+logger = setup_logger("event_signal")
+
+
+class Signal:
+    """
+    回调信号
+
+    emit()在调用方线程中依次同步调用已连接的回调。引擎在工作线程中发出信号，
+    界面需要经过自己的Qt信号转发到主线程（见TestThread），命令行直接在回调中输出。
+    """
+
+    def __init__(self):
+        self._slots: List[Callable] = []
+        self._lock = threading.Lock()
+
+    def connect(self, slot: Callable):
+        """连接回调"""
+        with self._lock:
+            self._slots.append(slot)
+
+    def disconnect(self, slot: Callable):
+        """断开回调，未连接时抛出TypeError，与pyqtSignal一致"""
+        with self._lock:
+            try:
+                self._slots.remove(slot)
+            except ValueError:
+                raise TypeError("回调未连接到该信号")
+
+    def emit(self, *args):
+        """依次调用已连接的回调，单个回调出错不影响其他回调"""
+        with self._lock:
+            slots = list(self._slots)
+        for slot in slots:
+            try:
+                slot(*args)
+            except Exception as e:
+                logger.error(f"信号回调执行出错: {e}", exc_info=True)
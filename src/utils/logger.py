@@ -18,6 +18,9 @@ DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 # 保存所有创建的日志记录器
 _loggers = {}
 
+# 控制台处理器的日志级别，命令行模式下调高以免干扰进度输出
+_console_level = logging.INFO
+
 def setup_logger(name: str) -> logging.Logger:
     """
     设置并返回一个命名的日志记录器
@@ -45,7 +48,7 @@ def setup_logger(name: str) -> logging.Logger:
     
     # 控制台处理器
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
+    console_handler.setLevel(_console_level)
     console_handler.setFormatter(formatter)
     logger.addHandler(console_handler)
     
@@ -72,7 +75,9 @@ def set_debug_mode(enable: bool = True):
     Args:
         enable: 是否启用调试模式，默认为True
     """
+    global _console_level
     level = logging.DEBUG if enable else logging.INFO
+    _console_level = level
     
     # 设置所有日志记录器的级别
     for logger_name, logger in _loggers.items():
@@ -86,5 +91,23 @@ def set_debug_mode(enable: bool = True):
         if enable:
             logger.debug(f"已启用调试模式: {logger_name}")
 
+def get_console_level() -> int:
+    """获取控制台输出的日志级别，用于传给子进程"""
+    return _console_level
+
+def set_console_level(level: int):
+    """
+    设置所有日志记录器控制台输出的级别，文件日志不受影响
+    
+    Args:
+        level: 日志级别，如logging.WARNING
+    """
+    global _console_level
+    _console_level = level
+    for logger in _loggers.values():
+        for handler in logger.handlers:
+            if isinstance(handler, logging.StreamHandler) and not isinstance(handler, RotatingFileHandler):
+                handler.setLevel(level)
+
 # 创建默认日志记录器
 logger = setup_logger("deepstress")
@@ -0,0 +1,258 @@
+"""
+重试策略模块，提供带抖动的指数退避、Retry-After解析以及按端点的熔断器
+"""
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field, fields
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+from src.utils.config import config
+from src.utils.logger import setup_logger
+
+logger = setup_logger("retry_policy")
+
+# 熔断器状态
+CIRCUIT_CLOSED = "closed"        # 正常放行
+CIRCUIT_OPEN = "open"            # 拒绝请求，等待冷却
+CIRCUIT_HALF_OPEN = "half_open"  # 冷却结束，放行少量探测请求
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    解析Retry-After响应头
+
+    Args:
+        value: 秒数或HTTP日期
+
+    Returns:
+        Optional[float]: 需要等待的秒数，无法解析时返回None
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def is_endpoint_failure(status: int) -> bool:
+    """HTTP状态码是否说明端点过载或故障（5xx和429），其余4xx视为请求本身的问题"""
+    return status >= 500 or status == 429
+
+
+@dataclass
+class RetryPolicy:
+    """
+    重试策略数据类
+
+    退避时间采用"full jitter"：在[0, min(max_delay, base_delay * multiplier^(n-1))]内均匀取值，
+    避免大量客户端在同一时刻重试；服务端返回Retry-After时至少等待该时长。
+    """
+    max_attempts: int = 1  # 总尝试次数（含首次），1表示不重试
+    base_delay: float = 0.5  # 退避基数（秒）
+    max_delay: float = 30.0  # 单次退避上限（秒）
+    multiplier: float = 2.0  # 指数增长倍数
+    retry_statuses: Tuple[int, ...] = (429, 500, 502, 503, 504)  # 可重试的HTTP状态码
+    retry_on_timeout: bool = True  # 超时是否重试
+    respect_retry_after: bool = True  # 是否遵循Retry-After
+    max_retry_after: float = 60.0  # Retry-After的等待上限（秒）
+
+    def __post_init__(self):
+        if self.max_attempts < 1:
+            raise ValueError("最大尝试次数必须大于0")
+        self.retry_statuses = tuple(self.retry_statuses)
+
+    @classmethod
+    def from_config(cls, key: str = "test.retry", **overrides) -> "RetryPolicy":
+        """
+        从全局配置创建重试策略，忽略未知字段
+
+        Args:
+            key: 配置路径，如test.retry或benchmark.retry
+            **overrides: 优先于配置的字段，值为None时忽略
+        """
+        names = {f.name for f in fields(cls)}
+        data = {k: v for k, v in (config.get(key, {}) or {}).items() if k in names}
+        data.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(**data)
+
+    def should_retry(self, attempt: int, status: Optional[int] = None, timed_out: bool = False) -> bool:
+        """
+        判断第attempt次尝试失败后是否重试
+
+        Args:
+            attempt: 已完成的尝试次数（从1开始）
+            status: HTTP状态码，连接错误等没有状态码时为None
+            timed_out: 是否超时
+        """
+        if attempt >= self.max_attempts:
+            return False
+        if status is not None:
+            return status in self.retry_statuses
+        if timed_out:
+            return self.retry_on_timeout
+        # 连接被拒绝、重置等网络错误
+        return True
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        计算第attempt次尝试失败后的等待时间（秒）
+
+        Args:
+            attempt: 已完成的尝试次数（从1开始）
+            retry_after: 服务端要求的等待时间（秒）
+        """
+        ceiling = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        delay = random.uniform(0, ceiling)
+        if self.respect_retry_after and retry_after is not None:
+            # 在服务端要求的时间之后再加抖动，避免同时恢复
+            delay = min(retry_after, self.max_retry_after) + random.uniform(0, self.base_delay)
+        return delay
+
+
+@dataclass
+class CircuitBreaker:
+    """
+    熔断器数据类
+
+    在最近window个请求中失败率达到error_threshold（且样本数不少于min_requests）时打开，
+    open_duration秒内直接拒绝请求；之后进入半开状态，放行half_open_requests个探测请求，
+    全部成功则关闭，任一失败则重新打开。
+
+    放行的请求结束时必须调用record_success()、record_failure()或release()之一，
+    4xx、取消等不反映端点健康状况的结果调用release()归还探测名额。半开状态持续open_duration秒
+    仍未得出结论时重新开始一轮探测，调用方遗漏归还也不会一直拒绝请求。
+    """
+    endpoint: str = ""
+    enabled: bool = False
+    window: int = 50
+    min_requests: int = 20
+    error_threshold: float = 0.5
+    open_duration: float = 10.0
+    half_open_requests: int = 3
+    state: str = CIRCUIT_CLOSED
+    opened_count: int = 0  # 打开次数
+    rejected: int = 0  # 被拒绝的请求数
+    _outcomes: deque = field(default_factory=deque, repr=False)
+    _opened_at: float = field(default=0.0, repr=False)
+    _probes: int = field(default=0, repr=False)
+    _probe_successes: int = field(default=0, repr=False)
+    _half_open_at: float = field(default=0.0, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def allow_request(self) -> bool:
+        """判断是否放行请求，半开状态下会占用一个探测名额"""
+        if not self.enabled:
+            return True
+        with self._lock:
+            if self.state == CIRCUIT_OPEN:
+                if time.monotonic() - self._opened_at < self.open_duration:
+                    self.rejected += 1
+                    return False
+                self._enter_half_open()
+                logger.info(f"熔断器进入半开状态: {self.endpoint}")
+            if self.state == CIRCUIT_HALF_OPEN:
+                if (self._probes >= self.half_open_requests
+                        and time.monotonic() - self._half_open_at >= self.open_duration):
+                    # 探测请求迟迟没有结论，重新开始一轮探测
+                    self._enter_half_open()
+                if self._probes >= self.half_open_requests:
+                    self.rejected += 1
+                    return False
+                self._probes += 1
+            return True
+
+    def record_success(self):
+        """记录一次成功"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.state == CIRCUIT_HALF_OPEN:
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_requests:
+                    self.state = CIRCUIT_CLOSED
+                    self._outcomes.clear()
+                    logger.info(f"熔断器已关闭: {self.endpoint}")
+                return
+            self._record(True)
+
+    def release(self):
+        """结束一次放行的请求但不计入成功或失败，半开状态下归还探测名额"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.state == CIRCUIT_HALF_OPEN and self._probes > self._probe_successes:
+                self._probes -= 1
+
+    def record_failure(self):
+        """记录一次失败（5xx、429、超时或连接错误）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.state == CIRCUIT_HALF_OPEN:
+                self._open("半开探测失败")
+                return
+            self._record(False)
+            failures = self._outcomes.count(False)
+            if (self.state == CIRCUIT_CLOSED and len(self._outcomes) >= self.min_requests
+                    and failures / len(self._outcomes) >= self.error_threshold):
+                self._open(f"最近 {len(self._outcomes)} 个请求失败 {failures} 个")
+
+    def _enter_half_open(self):
+        self.state = CIRCUIT_HALF_OPEN
+        self._probes = 0
+        self._probe_successes = 0
+        self._half_open_at = time.monotonic()
+
+    def _record(self, success: bool):
+        self._outcomes.append(success)
+        if len(self._outcomes) > self.window:
+            self._outcomes.popleft()
+
+    def _open(self, reason: str):
+        self.state = CIRCUIT_OPEN
+        self._opened_at = time.monotonic()
+        self.opened_count += 1
+        self._outcomes.clear()
+        logger.warning(f"熔断器已打开: {self.endpoint}, {reason}, {self.open_duration}s后进入半开状态")
+
+
+# 按端点共享的熔断器
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def reset_circuit_breakers():
+    """
+    清空按端点共享的熔断器，每次测试或跑分开始时调用
+
+    上一次运行的打开状态和配置不会带入新的运行，新的熔断器按当前配置创建。
+    正在运行的客户端仍持有各自的熔断器，不受影响。
+    """
+    with _circuit_breakers_lock:
+        _circuit_breakers.clear()
+
+
+def get_circuit_breaker(endpoint: str, key: str = "test.retry.circuit_breaker") -> CircuitBreaker:
+    """
+    获取端点对应的熔断器，首次获取时按全局配置创建
+
+    Args:
+        endpoint: 端点地址，同一地址的所有客户端共享一个熔断器
+        key: 熔断器配置路径
+    """
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(endpoint)
+        if breaker is None:
+            names = {f.name for f in fields(CircuitBreaker) if not f.name.startswith("_")}
+            settings = {k: v for k, v in (config.get(key, {}) or {}).items() if k in names}
+            breaker = CircuitBreaker(endpoint=endpoint, **settings)
+            _circuit_breakers[endpoint] = breaker
+        return breaker
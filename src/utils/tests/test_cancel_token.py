@@ -0,0 +1,80 @@
+"""
+取消令牌测试
+"""
+import asyncio
+import threading
+import time
+import unittest
+
+from src.utils.cancel_token import CancelToken
+
+
+class CancelTokenTest(unittest.TestCase):
+
+    def test_sleep_interrupted_from_other_thread(self):
+        async def run():
+            token = CancelToken(grace_period=1.0)
+            token.bind()
+            self.assertFalse(await token.sleep(0.01))
+            threading.Timer(0.05, token.cancel).start()
+            started = time.monotonic()
+            self.assertTrue(await token.sleep(5))
+            return time.monotonic() - started, token
+
+        elapsed, token = asyncio.run(run())
+        self.assertLess(elapsed, 1.0)
+        self.assertTrue(token.cancelled)
+        self.assertIsNotNone(token.cancelled_at)
+
+    def test_cancel_before_bind(self):
+        async def run():
+            token = CancelToken(grace_period=1.0)
+            token.cancel()
+            token.cancel()  # 重复调用无副作用
+            token.bind()
+            await asyncio.wait_for(token.wait(), 1.0)
+            return await token.sleep(5)
+
+        self.assertTrue(asyncio.run(run()))
+
+    def test_grace_period_then_force_cancel(self):
+        async def run():
+            token = CancelToken(grace_period=0.05)
+            token.bind()
+            finished = []
+
+            async def request(delay):
+                with token.tracking():
+                    try:
+                        await asyncio.sleep(delay)
+                        finished.append(delay)
+                    except asyncio.CancelledError:
+                        finished.append("cancelled")
+                        raise
+
+            tasks = [asyncio.create_task(request(0.01)), asyncio.create_task(request(5))]
+            await asyncio.sleep(0)
+            token.cancel()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            return finished, results
+
+        finished, results = asyncio.run(run())
+        # 宽限期内结束的请求正常完成，超过宽限期的请求被取消
+        self.assertEqual(finished, [0.01, "cancelled"])
+        self.assertIsInstance(results[1], asyncio.CancelledError)
+
+    def test_untracked_task_not_cancelled(self):
+        async def run():
+            token = CancelToken(grace_period=0.01)
+            token.bind()
+            with token.tracking():
+                pass
+            token.cancel()
+            await asyncio.sleep(0.05)
+            return "done"
+
+        self.assertEqual(asyncio.run(run()), "done")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+重试策略和熔断器测试
+"""
+import unittest
+from email.utils import formatdate
+import time
+
+from src.utils.retry_policy import (
+    CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN, CircuitBreaker, RetryPolicy, get_circuit_breaker,
+    parse_retry_after, reset_circuit_breakers
+)
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def test_should_retry(self):
+        policy = RetryPolicy(max_attempts=3)
+        self.assertTrue(policy.should_retry(1, status=503))
+        self.assertTrue(policy.should_retry(2, status=429))
+        self.assertFalse(policy.should_retry(3, status=503))
+        self.assertFalse(policy.should_retry(1, status=400))
+        self.assertTrue(policy.should_retry(1, timed_out=True))
+        self.assertFalse(RetryPolicy(max_attempts=3, retry_on_timeout=False).should_retry(1, timed_out=True))
+
+    def test_backoff_bounds(self):
+        policy = RetryPolicy(max_attempts=10, base_delay=0.5, max_delay=2.0)
+        for attempt in range(1, 10):
+            ceiling = min(2.0, 0.5 * 2 ** (attempt - 1))
+            for _ in range(50):
+                self.assertTrue(0 <= policy.backoff(attempt) <= ceiling)
+
+    def test_retry_after(self):
+        policy = RetryPolicy(max_attempts=3, base_delay=0.5, max_retry_after=5.0)
+        self.assertTrue(3.0 <= policy.backoff(1, retry_after=3.0) <= 3.5)
+        self.assertTrue(5.0 <= policy.backoff(1, retry_after=100.0) <= 5.5)
+        self.assertEqual(parse_retry_after("7"), 7.0)
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertAlmostEqual(parse_retry_after(formatdate(time.time() + 30, usegmt=True)), 30, delta=2)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def test_open_half_open_close(self):
+        breaker = CircuitBreaker(enabled=True, window=4, min_requests=4, error_threshold=0.5,
+                                 open_duration=0.05, half_open_requests=2)
+        for _ in range(2):
+            breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CIRCUIT_CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CIRCUIT_OPEN)
+        self.assertFalse(breaker.allow_request())
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(breaker.state, CIRCUIT_HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+        breaker.record_success()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CIRCUIT_CLOSED)
+
+    def test_half_open_release_and_timeout(self):
+        breaker = CircuitBreaker(enabled=True, window=2, min_requests=2, error_threshold=0.5,
+                                 open_duration=0.05, half_open_requests=1)
+        breaker.record_failure()
+        breaker.record_failure()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+        # 4xx或取消归还探测名额
+        breaker.release()
+        self.assertTrue(breaker.allow_request())
+        # 探测请求没有结论时，超过open_duration后重新开始探测
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CIRCUIT_CLOSED)
+
+    def test_reset_circuit_breakers(self):
+        breaker = get_circuit_breaker("http://reset.test/v1")
+        self.assertIs(get_circuit_breaker("http://reset.test/v1"), breaker)
+        reset_circuit_breakers()
+        self.assertIsNot(get_circuit_breaker("http://reset.test/v1"), breaker)
+
+    def test_disabled_never_opens(self):
+        breaker = CircuitBreaker(enabled=False, window=2, min_requests=1)
+        for _ in range(10):
+            breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(breaker.state, CIRCUIT_CLOSED)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+Token计数缓存和异步攒批测试
+"""
+import asyncio
+import unittest
+from unittest import mock
+
+from src.utils.token_counter import AsyncTokenCounter, TokenCounter
+
+
+class SpaceEncoder:
+    """按空格切分计数的编码器，记录每次批量编码的文本数"""
+    name = "space_test"
+
+    def __init__(self):
+        self.batches = []
+
+    def encode_ordinary(self, text):
+        return text.split()
+
+    def encode_ordinary_batch(self, texts):
+        self.batches.append(len(texts))
+        return [self.encode_ordinary(text) for text in texts]
+
+
+def _new_counter(encoder, cache_size=100):
+    """创建独立于全局单例的计数器，编码器固定为encoder"""
+    counter = object.__new__(TokenCounter)
+    TokenCounter.__init__(counter)
+    counter._prompt_cache_size = cache_size
+    counter.get_encoder = lambda model_name=None: encoder
+    return counter
+
+
+class PromptCacheTest(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        encoder = SpaceEncoder()
+        counter = _new_counter(encoder, cache_size=2)
+        counter.count_prompt_tokens("a b")
+        counter.count_prompt_tokens("c d e")
+        self.assertEqual(counter.get_cached_prompt_tokens("a b"), 2)  # a b变为最近使用
+        counter.count_prompt_tokens("f")
+        self.assertIsNone(counter.get_cached_prompt_tokens("c d e"))
+        self.assertEqual(counter.get_cached_prompt_tokens("a b"), 2)
+        self.assertEqual(counter.get_cached_prompt_tokens("f"), 1)
+        info = counter.prompt_cache_info()
+        self.assertEqual((info["size"], info["max_size"]), (2, 2))
+
+    def test_single_and_batch_agree(self):
+        counter = _new_counter(SpaceEncoder())
+        texts = ["x <|endoftext|> y", "one two three"]
+        self.assertEqual([counter.count_tokens(text) for text in texts], counter.count_tokens_batch(texts))
+
+
+class AsyncTokenCounterTest(unittest.TestCase):
+
+    def test_batching(self):
+        encoder = SpaceEncoder()
+        async_counter = AsyncTokenCounter(_new_counter(encoder), max_workers=1, batch_size=4, batch_delay=0.01)
+        texts = [" ".join(["w"] * n) for n in range(1, 11)]
+
+        async def run():
+            counts = await async_counter.count_tokens_batch(texts + [""])
+            single = await async_counter.count_tokens("a b c")
+            return counts, single
+
+        try:
+            counts, single = asyncio.run(run())
+        finally:
+            async_counter.shutdown()
+        self.assertEqual(counts, list(range(1, 11)) + [0])
+        self.assertEqual(single, 3)
+        # 满批立即提交，剩余部分等待batch_delay后提交，空文本不进入批次
+        self.assertEqual(encoder.batches, [4, 4, 2, 1])
+
+    def test_matches_sync_batch(self):
+        # 攒批拆分和合并后结果顺序与同步批量计数一致，包括空文本和重复文本
+        counter = _new_counter(SpaceEncoder())
+        async_counter = AsyncTokenCounter(counter, max_workers=2, batch_size=3, batch_delay=0.005)
+        texts = ["a", "", "b c d", "e f", "a", "g h i j k", "l m", ""]
+
+        async def run():
+            return await asyncio.gather(async_counter.count_tokens_batch(texts),
+                                        *(async_counter.count_tokens(text) for text in texts))
+
+        try:
+            batched, *single = asyncio.run(run())
+        finally:
+            async_counter.shutdown()
+        expected = counter.count_tokens_batch(texts)
+        self.assertEqual(batched, expected)
+        self.assertEqual(single, expected)
+
+    def test_prompt_cache_skips_encoding(self):
+        encoder = SpaceEncoder()
+        counter = _new_counter(encoder)
+        async_counter = AsyncTokenCounter(counter, max_workers=1, batch_size=8, batch_delay=0.0)
+
+        async def run():
+            return [await async_counter.count_prompt_tokens("p q") for _ in range(3)]
+
+        try:
+            with mock.patch.object(counter, "count_tokens", side_effect=AssertionError("不应逐条编码")):
+                self.assertEqual(asyncio.run(run()), [2, 2, 2])
+        finally:
+            async_counter.shutdown()
+        self.assertEqual(encoder.batches, [1])
+        self.assertEqual(counter.prompt_cache_info()["hits"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,23 @@
 """
 Token计数工具模块
 """
+import re
+import json
+import asyncio
+import hashlib
+import threading
 import tiktoken
-from typing import Optional, Dict
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Tuple, Iterable
 from src.utils.logger import setup_logger
-from src.utils.config import config
+from src.utils.config import config, DATA_DIR
 
 logger = setup_logger("token_counter")
 
+# 输入token数持久化缓存目录
+PROMPT_CACHE_DIR = DATA_DIR / "cache" / "token_counts"
+
 class TokenCounter:
     """Token计数器类"""
     
@@ -41,6 +51,12 @@ class TokenCounter:
             self.initialized = True
             self._default_model = "cl100k_base"
             self._load_custom_encoders()
+            # 输入token数LRU缓存，键为(编码器名称, 文本哈希)
+            self._prompt_cache: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+            self._prompt_cache_size = config.get("tokenizer.prompt_cache_size", 100000)
+            self._prompt_cache_lock = threading.Lock()
+            self._prompt_cache_hits = 0
+            self._prompt_cache_misses = 0
     
     def _load_custom_encoders(self):
         """从配置文件加载自定义编码器配置"""
@@ -147,17 +163,291 @@ class TokenCounter:
         return self.MODEL_ENCODERS.copy()
     
     def count_tokens(self, text: str, model_name: Optional[str] = None) -> int:
-        """计算文本的token数量"""
+        """
+        计算文本的token数量
+        
+        与count_tokens_batch一样使用encode_ordinary，特殊token按普通文本计数，
+        两者结果一致，可以共用输入token数缓存
+        """
         try:
             encoder = self.get_encoder(model_name or self._default_model)
-            return len(encoder.encode(text))
+            return len(encoder.encode_ordinary(text))
         except Exception as e:
             logger.error(f"计算token数量失败: {e}")
             return len(text.split())
     
     def count_tokens_batch(self, texts: list[str], model_name: Optional[str] = None) -> list[int]:
-        """批量计算多个文本的token数量"""
-        return [self.count_tokens(text, model_name) for text in texts]
+        """批量计算多个文本的token数量
+        
+        使用tiktoken的encode_ordinary_batch一次性编码，由tiktoken内部线程并行处理
+        """
+        if not texts:
+            return []
+        try:
+            encoder = self.get_encoder(model_name or self._default_model)
+            return [len(tokens) for tokens in encoder.encode_ordinary_batch(texts)]
+        except Exception as e:
+            logger.error(f"批量计算token数量失败: {e}")
+            return [len(text.split()) for text in texts]
+
+    
+    @staticmethod
+    def _text_hash(text: str) -> str:
+        """计算文本哈希，用作缓存键的一部分"""
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+    
+    def _prompt_cache_key(self, text: str, model_name: Optional[str]) -> Tuple[str, str]:
+        """构造缓存键：同一编码器下相同文本的token数相同，与具体模型名称无关"""
+        encoder = self.get_encoder(model_name or self._default_model)
+        return encoder.name, self._text_hash(text)
+    
+    def get_cached_prompt_tokens(self, text: str, model_name: Optional[str] = None) -> Optional[int]:
+        """
+        查询缓存中的输入token数
+        
+        Returns:
+            Optional[int]: 命中时返回token数，未命中返回None
+        """
+        key = self._prompt_cache_key(text, model_name)
+        with self._prompt_cache_lock:
+            count = self._prompt_cache.get(key)
+            if count is None:
+                self._prompt_cache_misses += 1
+                return None
+            self._prompt_cache.move_to_end(key)
+            self._prompt_cache_hits += 1
+            return count
+    
+    def store_prompt_tokens(self, text: str, model_name: Optional[str], count: int):
+        """写入输入token数缓存"""
+        self._store_cache_entry(self._prompt_cache_key(text, model_name), count)
+    
+    def store_encoder_tokens(self, text: str, encoder_name: str, count: int):
+        """按编码器名称写入输入token数缓存，用于已知编码器而不知道模型名称的场景"""
+        self._store_cache_entry((encoder_name, self._text_hash(text)), count)
+    
+    def _store_cache_entry(self, key: Tuple[str, str], count: int):
+        """写入一条缓存记录，超出容量时淘汰最久未使用的记录"""
+        with self._prompt_cache_lock:
+            self._prompt_cache[key] = count
+            self._prompt_cache.move_to_end(key)
+            while len(self._prompt_cache) > self._prompt_cache_size:
+                self._prompt_cache.popitem(last=False)
+    
+    def count_prompt_tokens(self, text: str, model_name: Optional[str] = None) -> int:
+        """计算输入文本的token数量，优先使用LRU缓存"""
+        count = self.get_cached_prompt_tokens(text, model_name)
+        if count is None:
+            count = self.count_tokens(text, model_name)
+            self.store_prompt_tokens(text, model_name, count)
+        return count
+    
+    def prompt_cache_info(self) -> Dict[str, float]:
+        """获取输入token数缓存的命中统计"""
+        with self._prompt_cache_lock:
+            lookups = self._prompt_cache_hits + self._prompt_cache_misses
+            return {
+                "hits": self._prompt_cache_hits,
+                "misses": self._prompt_cache_misses,
+                "hit_rate": self._prompt_cache_hits / lookups if lookups else 0.0,
+                "size": len(self._prompt_cache),
+                "max_size": self._prompt_cache_size
+            }
+    
+    def clear_prompt_cache(self):
+        """清空输入token数缓存及统计"""
+        with self._prompt_cache_lock:
+            self._prompt_cache.clear()
+            self._prompt_cache_hits = 0
+            self._prompt_cache_misses = 0
+    
+    @staticmethod
+    def _prompt_cache_file(dataset_key: str):
+        """获取数据集对应的缓存文件路径"""
+        safe_key = re.sub(r"[^\w.\-]", "_", str(dataset_key))
+        return PROMPT_CACHE_DIR / f"{safe_key}.json"
+    
+    def load_prompt_cache(self, dataset_key: str) -> int:
+        """
+        从磁盘加载指定数据集版本的输入token数缓存
+        
+        Args:
+            dataset_key: 数据集标识（名称或版本）
+            
+        Returns:
+            int: 加载的缓存记录数
+        """
+        cache_file = self._prompt_cache_file(dataset_key)
+        if not cache_file.exists():
+            return 0
+        try:
+            with open(cache_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            loaded = 0
+            for encoder_name, counts in data.items():
+                for text_hash, count in counts.items():
+                    self._store_cache_entry((encoder_name, text_hash), count)
+                    loaded += 1
+            logger.info(f"已加载数据集 {dataset_key} 的token缓存: {loaded} 条")
+            return loaded
+        except Exception as e:
+            logger.error(f"加载token缓存失败: {e}")
+            return 0
+    
+    def save_prompt_cache(self, dataset_key: str, texts: Iterable[str], model_name: Optional[str] = None) -> int:
+        """
+        将指定数据集文本的已缓存token数保存到磁盘
+        
+        Args:
+            dataset_key: 数据集标识（名称或版本）
+            texts: 数据集中的输入文本
+            model_name: 模型名称，用于确定编码器
+            
+        Returns:
+            int: 保存的缓存记录数
+        """
+        try:
+            encoder_name = self.get_encoder(model_name or self._default_model).name
+            cache_file = self._prompt_cache_file(dataset_key)
+            data = {}
+            if cache_file.exists():
+                with open(cache_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            counts = data.setdefault(encoder_name, {})
+            with self._prompt_cache_lock:
+                for text in texts:
+                    text_hash = self._text_hash(text)
+                    count = self._prompt_cache.get((encoder_name, text_hash))
+                    if count is not None:
+                        counts[text_hash] = count
+            PROMPT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            with open(cache_file, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            logger.info(f"已保存数据集 {dataset_key} 的token缓存: {len(counts)} 条")
+            return len(counts)
+        except Exception as e:
+            logger.error(f"保存token缓存失败: {e}")
+            return 0
+
+
+class AsyncTokenCounter:
+    """异步Token计数服务
+    
+    将计数请求按模型攒批，在线程池中调用encode_ordinary_batch完成编码，
+    调用方只需await返回的future，事件循环不会被BPE编码阻塞。
+    """
+    
+    def __init__(self, counter: TokenCounter, max_workers: int = None,
+                 batch_size: int = None, batch_delay: float = None):
+        """
+        初始化异步Token计数服务
+        
+        Args:
+            counter: 同步Token计数器
+            max_workers: 线程池大小，默认读取tokenizer.worker_threads
+            batch_size: 单批最大文本数，默认读取tokenizer.batch_size
+            batch_delay: 攒批最长等待时间（秒），默认读取tokenizer.batch_delay
+        """
+        self._counter = counter
+        self._max_workers = max_workers or config.get("tokenizer.worker_threads", 2)
+        self._batch_size = batch_size or config.get("tokenizer.batch_size", 64)
+        self._batch_delay = batch_delay if batch_delay is not None else config.get("tokenizer.batch_delay", 0.005)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # 待处理批次，按(事件循环, 模型名称)分组，保证future只在创建它的事件循环中完成
+        self._pending: Dict[Tuple[int, Optional[str]], List[Tuple[str, asyncio.Future]]] = {}
+        self._flush_handles: Dict[Tuple[int, Optional[str]], asyncio.TimerHandle] = {}
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """获取（按需创建）编码线程池"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers,
+                thread_name_prefix="token_counter"
+            )
+        return self._executor
+    
+    def submit(self, text: str, model_name: Optional[str] = None) -> asyncio.Future:
+        """
+        提交一个文本的计数请求
+        
+        Args:
+            text: 待计数文本
+            model_name: 模型名称
+            
+        Returns:
+            asyncio.Future: 完成后结果为token数量
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not text:
+            future.set_result(0)
+            return future
+        
+        key = (id(loop), model_name)
+        batch = self._pending.setdefault(key, [])
+        batch.append((text, future))
+        
+        if len(batch) >= self._batch_size:
+            self._flush(loop, key)
+        elif key not in self._flush_handles:
+            self._flush_handles[key] = loop.call_later(self._batch_delay, self._flush, loop, key)
+        return future
+    
+    async def count_tokens(self, text: str, model_name: Optional[str] = None) -> int:
+        """异步计算文本的token数量"""
+        return await self.submit(text, model_name)
+    
+    async def count_tokens_batch(self, texts: List[str], model_name: Optional[str] = None) -> List[int]:
+        """异步批量计算多个文本的token数量"""
+        return list(await asyncio.gather(*(self.submit(text, model_name) for text in texts)))
+    
+    async def count_prompt_tokens(self, text: str, model_name: Optional[str] = None) -> int:
+        """异步计算输入文本的token数量，命中LRU缓存时不进行编码"""
+        count = self._counter.get_cached_prompt_tokens(text, model_name)
+        if count is None:
+            count = await self.submit(text, model_name)
+            self._counter.store_prompt_tokens(text, model_name, count)
+        return count
+    
+    def _flush(self, loop: asyncio.AbstractEventLoop, key: Tuple[int, Optional[str]]):
+        """将一个批次交给线程池编码"""
+        handle = self._flush_handles.pop(key, None)
+        if handle is not None:
+            handle.cancel()
+        batch = self._pending.pop(key, None)
+        if not batch:
+            return
+        
+        texts = [text for text, _ in batch]
+        futures = [future for _, future in batch]
+        executor_future = loop.run_in_executor(
+            self._get_executor(), self._counter.count_tokens_batch, texts, key[1]
+        )
+        
+        def _on_done(done: asyncio.Future):
+            if done.cancelled():
+                for future in futures:
+                    if not future.done():
+                        future.cancel()
+                return
+            error = done.exception()
+            counts = None if error else done.result()
+            for index, future in enumerate(futures):
+                if future.done():
+                    continue
+                if error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(counts[index])
+        
+        executor_future.add_done_callback(_on_done)
+    
+    def shutdown(self):
+        """关闭编码线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
 
 # 全局单例实例
-token_counter = TokenCounter() 
\ No newline at end of file
+token_counter = TokenCounter()
+async_token_counter = AsyncTokenCounter(token_counter)
\ No newline at end of file